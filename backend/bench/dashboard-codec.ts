@@ -0,0 +1,146 @@
+/**
+ * Dashboard wire encoding benchmark: bytes per event and encode/decode CPU
+ * for JSON vs pack1, with and without deflate.
+ *
+ *   bun run bench/dashboard-codec.ts [iterations]
+ *
+ * Traffic is a synthetic session shaped like production: each song request
+ * arrives (request:new), is matched (request:update with full track
+ * metadata), later confirmed, with gifts in between, coalesced into 50ms
+ * frames. Deflate is per message without context takeover, so it's a
+ * conservative stand-in for permessage-deflate.
+ */
+import { deflateRawSync } from "node:zlib";
+import { packMessage, unpackMessage } from "../src/lib/dashboard-codec";
+
+const ITERATIONS = Number(process.argv[2] ?? 200);
+const REQUESTS = 500;
+const EVENTS_PER_FRAME = 3;
+
+const VIEWERS = Array.from({ length: 60 }, (_, i) => `viewer_${(i * 7919).toString(36)}`);
+const TRACKS = [
+  ["Shape of You", "Ed Sheeran", "÷ (Deluxe)", 233712],
+  ["Blinding Lights", "The Weeknd", "After Hours", 200040],
+  ["Levitating", "Dua Lipa", "Future Nostalgia", 203064],
+  ["As It Was", "Harry Styles", "Harry's House", 167303],
+  ["Flowers", "Miley Cyrus", "Endless Summer Vacation", 200455],
+] as const;
+
+function buildFrames(): unknown[] {
+  const sessionId = "0193a1b2-c3d4-7e5f-8a9b-0c1d2e3f4a5b";
+  const start = Date.UTC(2026, 9, 17, 20);
+  const events: unknown[] = [];
+
+  for (let i = 0; i < REQUESTS; i++) {
+    const [trackName, trackArtist, albumName, durationMs] = TRACKS[i % TRACKS.length]!;
+    const trackId = `7qiZfU4dY1lWllzX7mPBI${i % TRACKS.length}`;
+    const viewerUsername = VIEWERS[(i * 13) % VIEWERS.length]!;
+    const base = {
+      id: `0193a1b2-${(0x1000 + i).toString(16)}-7e5f-8a9b-0c1d2e3f4a5b`,
+      liveSessionId: sessionId,
+      viewerUsername,
+      rawMessage: `!play ${trackName}`,
+      parsedQuery: trackName,
+      searchStatus: "pending",
+      spotifyTrackId: null,
+      trackName: null,
+      trackArtist: null,
+      albumName: null,
+      albumImageUrl: null,
+      durationMs: null,
+      spotifyUri: null,
+      playStatus: null,
+      requestedAt: new Date(start + i * 4000),
+      matchedAt: null,
+      confirmedAt: null,
+    };
+    const matched = {
+      ...base,
+      searchStatus: "matched",
+      spotifyTrackId: trackId,
+      trackName,
+      trackArtist,
+      albumName,
+      albumImageUrl: `https://i.scdn.co/image/ab67616d0000b273${trackId.toLowerCase()}`,
+      durationMs,
+      spotifyUri: `spotify:track:${trackId}`,
+      matchedAt: new Date(start + i * 4000 + 350),
+    };
+    events.push({ type: "request:new", request: base });
+    events.push({ type: "request:update", request: matched });
+    events.push({ type: "request:update", request: { ...matched, playStatus: "confirmed" } });
+    if (i % 3 === 0) {
+      events.push({
+        type: "gift:new",
+        gift: {
+          id: `0193a1b3-${(0x1000 + i).toString(16)}-7e5f-8a9b-0c1d2e3f4a5b`,
+          liveSessionId: sessionId,
+          viewerUsername,
+          giftId: 5655,
+          giftName: "Rose",
+          diamondCount: 1,
+          repeatCount: 1 + (i % 5),
+          receivedAt: new Date(start + i * 4000 + 900),
+        },
+      });
+    }
+  }
+
+  const frames: unknown[] = [];
+  for (let i = 0; i < events.length; i += EVENTS_PER_FRAME) {
+    frames.push({
+      type: "frame",
+      v: 1,
+      sessionId,
+      epoch: "5f3a9c21",
+      seq: frames.length + 1,
+      events: events.slice(i, i + EVENTS_PER_FRAME),
+    });
+  }
+  return frames;
+}
+
+const frames = buildFrames();
+const eventCount = frames.reduce<number>((n, f) => n + (f as { events: unknown[] }).events.length, 0);
+const jsonMessages = frames.map((f) => JSON.stringify(f));
+const packedMessages = frames.map((f) => packMessage(f));
+
+function perEvent(total: number): string {
+  return (total / eventCount).toFixed(0).padStart(7);
+}
+
+const jsonBytes = jsonMessages.reduce((n, m) => n + Buffer.byteLength(m), 0);
+const packBytes = packedMessages.reduce((n, m) => n + m.length, 0);
+const jsonDeflated = jsonMessages.reduce((n, m) => n + deflateRawSync(m).length, 0);
+const packDeflated = packedMessages.reduce((n, m) => n + deflateRawSync(m).length, 0);
+
+console.log(`Bytes per event (${eventCount} events in ${frames.length} frames)`);
+console.log("encoding".padEnd(16), "raw".padStart(7), "deflate".padStart(7));
+console.log("json".padEnd(16), perEvent(jsonBytes), perEvent(jsonDeflated));
+console.log("pack1".padEnd(16), perEvent(packBytes), perEvent(packDeflated));
+console.log(`pack1 saves ${((1 - packBytes / jsonBytes) * 100).toFixed(1)}% raw, ` +
+  `${((1 - packDeflated / jsonDeflated) * 100).toFixed(1)}% deflated`);
+
+function timePerEvent(run: () => number): number {
+  let sink = 0;
+  const start = performance.now();
+  for (let i = 0; i < ITERATIONS; i++) sink += run();
+  const elapsed = performance.now() - start;
+  if (sink === 0) console.log("unreachable");
+  return (elapsed * 1000) / (ITERATIONS * eventCount);
+}
+
+const runs = {
+  "json encode": () => frames.reduce<number>((n, f) => n + JSON.stringify(f).length, 0),
+  "pack1 encode": () => frames.reduce<number>((n, f) => n + packMessage(f).length, 0),
+  "json decode": () => jsonMessages.reduce((n, m) => n + (JSON.parse(m) as { seq: number }).seq, 0),
+  "pack1 decode": () => packedMessages.reduce((n, m) => n + (unpackMessage(m) as { seq: number }).seq, 0),
+};
+
+// Warm up every path before timing
+for (const run of Object.values(runs)) timePerEvent(run);
+
+console.log(`\nCPU per event (${ITERATIONS} iterations)`);
+for (const [name, run] of Object.entries(runs)) {
+  console.log(`${name.padEnd(13)} ${timePerEvent(run).toFixed(2)}µs`);
+}
@@ -0,0 +1,104 @@
+/**
+ * Request page latency by session size: keyset pages (the /requests
+ * query) at the start, middle and end of a session, next to OFFSET pages
+ * for comparison. Needs a database with the current schema pushed; seeds a
+ * scratch user with one session per size and deletes it afterwards.
+ *
+ *   DATABASE_URL=... bun run bench/keyset-pagination.ts [sizes] [pageSize]
+ *
+ * e.g. `bench/keyset-pagination.ts 100,10000,500000 50`. Keyset latency
+ * should stay flat across sizes and depths; OFFSET grows with depth.
+ */
+import { eq, desc, sql } from "drizzle-orm";
+import { db } from "../src/db/client";
+import { users, liveSessions, songRequests, type SongRequest } from "../src/db/schema";
+import { createLiveSession, getRequestsForSession, insertSongRequests } from "../src/db/queries";
+
+const SIZES = (process.argv[2] ?? "100,10000,500000").split(",").map(Number);
+const PAGE_SIZE = Number(process.argv[3] ?? 50);
+const INSERT_BATCH = 2_000;
+const RUNS = 20;
+
+// Several requests per millisecond, so pages split runs of equal timestamps
+function requestRow(sessionId: string, i: number, base: number): SongRequest {
+  return {
+    id: crypto.randomUUID(),
+    liveSessionId: sessionId,
+    viewerUsername: `viewer${i % 5_000}`,
+    rawMessage: `!play song ${i}`,
+    parsedQuery: `song ${i}`,
+    spotifyTrackId: null,
+    trackName: null,
+    trackArtist: null,
+    albumName: null,
+    albumImageUrl: null,
+    durationMs: null,
+    spotifyUri: null,
+    searchStatus: "pending",
+    playStatus: "pending",
+    requestedAt: new Date(base + Math.floor(i / 4)),
+    matchedAt: null,
+    confirmedAt: null,
+  };
+}
+
+async function median(run: () => Promise<unknown>): Promise<number> {
+  await run(); // warm up
+  const times: number[] = [];
+  for (let i = 0; i < RUNS; i++) {
+    const began = performance.now();
+    await run();
+    times.push(performance.now() - began);
+  }
+  times.sort((a, b) => a - b);
+  return times[Math.floor(times.length / 2)]!;
+}
+
+const [user] = await db.insert(users).values({ name: "keyset-pagination-bench" }).returning();
+const sessionIds: string[] = [];
+try {
+  console.log(`page size ${PAGE_SIZE}, median of ${RUNS} runs (ms)`);
+  console.log(`${"rows".padStart(9)}  ${"depth".padEnd(6)} ${"keyset".padStart(8)} ${"offset".padStart(8)}`);
+
+  for (const size of SIZES) {
+    const session = await createLiveSession(user!.id, "bench");
+    sessionIds.push(session.id);
+    const base = Date.UTC(2026, 9, 17, 20);
+    for (let i = 0; i < size; i += INSERT_BATCH) {
+      const batch = Array.from({ length: Math.min(INSERT_BATCH, size - i) }, (_, j) => requestRow(session.id, i + j, base));
+      await insertSongRequests(batch);
+    }
+    await db.execute(sql`analyze song_request`);
+
+    for (const [label, fraction] of [["start", 0], ["middle", 0.5], ["end", 1]] as const) {
+      const offset = Math.max(0, Math.min(size - PAGE_SIZE, Math.floor(size * fraction)));
+      // The cursor a client would hold after paging to this depth
+      const [anchor] = await db
+        .select({ at: songRequests.requestedAt, id: songRequests.id })
+        .from(songRequests)
+        .where(eq(songRequests.liveSessionId, session.id))
+        .orderBy(desc(songRequests.requestedAt), desc(songRequests.id))
+        .offset(offset)
+        .limit(1);
+      const cursor = offset === 0 || !anchor ? null : anchor;
+
+      const keyset = await median(() => getRequestsForSession(session.id, cursor, PAGE_SIZE + 1));
+      const offsetPage = await median(() =>
+        db
+          .select()
+          .from(songRequests)
+          .where(eq(songRequests.liveSessionId, session.id))
+          .orderBy(desc(songRequests.requestedAt), desc(songRequests.id))
+          .offset(offset)
+          .limit(PAGE_SIZE + 1)
+      );
+      console.log(
+        `${size.toLocaleString().padStart(9)}  ${label.padEnd(6)} ${keyset.toFixed(2).padStart(8)} ${offsetPage.toFixed(2).padStart(8)}`
+      );
+    }
+  }
+} finally {
+  for (const sessionId of sessionIds) await db.delete(liveSessions).where(eq(liveSessions.id, sessionId));
+  await db.delete(users).where(eq(users.id, user!.id));
+}
+process.exit(0);
@@ -0,0 +1,62 @@
+/**
+ * Viewer rate limiter benchmark: check() throughput and memory with a large
+ * number of distinct viewers, and expiry cost once they go idle.
+ *
+ *   bun run bench/rate-limit.ts [viewers]
+ *
+ * Time is simulated: every viewer sends three requests within 20 seconds of
+ * one session, so all of them are live at once and the third is usually
+ * limited; then the clock jumps past every window so the timer wheel
+ * expires them all.
+ */
+import { ViewerRateLimiter, type RateLimitPolicy } from "../src/lib/rate-limit";
+
+const VIEWERS = Number(process.argv[2] ?? 1_000_000);
+const CHECKS = VIEWERS * 3;
+const SPAN_MS = 20_000;
+
+const policies: Record<string, RateLimitPolicy> = {
+  "sliding-window": { kind: "sliding-window", limit: 2, windowMs: 30_000 },
+  "token-bucket": { kind: "token-bucket", capacity: 2, refillPerMinute: 4 },
+};
+
+const viewers = Array.from({ length: VIEWERS }, (_, i) => `viewer_${i.toString(36)}`);
+
+function heapMb(): number {
+  // Collect first where the runtime allows it (Bun, or node --expose-gc)
+  const runtime = globalThis as { Bun?: { gc(force: boolean): void }; gc?: () => void };
+  if (runtime.Bun) runtime.Bun.gc(true);
+  else runtime.gc?.();
+  return process.memoryUsage().heapUsed / 1024 / 1024;
+}
+
+for (const [name, policy] of Object.entries(policies)) {
+  const start = Date.UTC(2026, 9, 17, 20);
+  const heapBefore = heapMb();
+  const limiter = new ViewerRateLimiter({ maxEntries: VIEWERS, now: start });
+  limiter.setPolicy("session", policy);
+
+  let allowed = 0;
+  const began = performance.now();
+  for (let i = 0; i < CHECKS; i++) {
+    // Pseudo-random viewer order, so repeat requests land at varied intervals
+    const viewer = viewers[(i * 7_919) % VIEWERS]!;
+    if (limiter.check("session", viewer, start + Math.floor((i / CHECKS) * SPAN_MS))) allowed++;
+  }
+  const elapsed = performance.now() - began;
+  const heapAfter = heapMb();
+  const peak = limiter.stats.entries;
+
+  const expiredBefore = limiter.stats.expired;
+  const expireBegan = performance.now();
+  limiter.check("session", "late_viewer", start + SPAN_MS + 60 * 60_000);
+  const expireElapsed = performance.now() - expireBegan;
+
+  console.log(`${name}: ${VIEWERS.toLocaleString()} viewers, ${CHECKS.toLocaleString()} checks`);
+  console.log(`  ${(CHECKS / (elapsed / 1000) / 1e6).toFixed(2)}M checks/s, ` +
+    `${((elapsed * 1e6) / CHECKS).toFixed(0)}ns/check, ${((allowed / CHECKS) * 100).toFixed(1)}% allowed`);
+  console.log(`  ${peak.toLocaleString()} entries, ~${(heapAfter - heapBefore).toFixed(0)}MB heap ` +
+    `(${(((heapAfter - heapBefore) * 1024 * 1024) / Math.max(1, peak)).toFixed(0)}B/entry)`);
+  console.log(`  expired ${(limiter.stats.expired - expiredBefore).toLocaleString()} idle entries in ${expireElapsed.toFixed(0)}ms, ` +
+    `${limiter.stats.evicted} evicted`);
+}
@@ -0,0 +1,82 @@
+/**
+ * Raw event payload benchmark: stored bytes and CPU per event, before and
+ * after projection.
+ *
+ *   bun run bench/raw-event-projection.ts [iterations]
+ *
+ * "before" mirrors the old path: stringify the full connector payload to
+ * measure it, then stringify it again for the JSONB insert.
+ *
+ * fixtures/raw-events.json is synthetic: hand-built payloads shaped like
+ * the connector's (field names, nesting, badge and image lists) with
+ * placeholder values, not a capture of a real stream. Absolute byte counts
+ * are indicative; the before/after ratio is what the benchmark tracks.
+ */
+import { projectRawEvent, MAX_RAW_PAYLOAD_BYTES } from "../src/lib/raw-event-projection";
+import fixtures from "./fixtures/raw-events.json";
+
+const ITERATIONS = Number(process.argv[2] ?? 20_000);
+
+interface FixtureEvent {
+  eventType: string;
+  data: unknown;
+}
+
+const events = fixtures as FixtureEvent[];
+
+function before(data: unknown): string {
+  const measured = JSON.stringify(data);
+  const payload =
+    measured.length > MAX_RAW_PAYLOAD_BYTES ? { _truncated: true, _originalSize: measured.length } : data;
+  return JSON.stringify(payload); // driver-side serialization
+}
+
+function bytesByType(serialize: (e: FixtureEvent) => string): Map<string, { events: number; bytes: number }> {
+  const totals = new Map<string, { events: number; bytes: number }>();
+  for (const event of events) {
+    const entry = totals.get(event.eventType) ?? { events: 0, bytes: 0 };
+    entry.events++;
+    entry.bytes += Buffer.byteLength(serialize(event));
+    totals.set(event.eventType, entry);
+  }
+  return totals;
+}
+
+function timePerEvent(serialize: (e: FixtureEvent) => string): number {
+  let sink = 0;
+  const start = performance.now();
+  for (let i = 0; i < ITERATIONS; i++) {
+    for (const event of events) sink += serialize(event).length;
+  }
+  const elapsed = performance.now() - start;
+  if (sink === 0) console.log("unreachable");
+  return (elapsed * 1000) / (ITERATIONS * events.length);
+}
+
+const beforeBytes = bytesByType((e) => before(e.data));
+const afterBytes = bytesByType((e) => projectRawEvent(e.eventType, e.data));
+
+console.log(`Stored bytes per event (${events.length} synthetic events)`);
+console.log("type".padEnd(10), "before".padStart(8), "after".padStart(8), "saved".padStart(7));
+for (const [type, b] of beforeBytes) {
+  const a = afterBytes.get(type)!;
+  const perBefore = b.bytes / b.events;
+  const perAfter = a.bytes / a.events;
+  console.log(
+    type.padEnd(10),
+    perBefore.toFixed(0).padStart(8),
+    perAfter.toFixed(0).padStart(8),
+    `${((1 - perAfter / perBefore) * 100).toFixed(1)}%`.padStart(7)
+  );
+}
+
+// Warm up both paths before timing
+timePerEvent((e) => before(e.data));
+timePerEvent((e) => projectRawEvent(e.eventType, e.data));
+
+const beforeUs = timePerEvent((e) => before(e.data));
+const afterUs = timePerEvent((e) => projectRawEvent(e.eventType, e.data));
+
+console.log(`\nCPU per event (${ITERATIONS} iterations)`);
+console.log(`before: ${beforeUs.toFixed(2)}µs`);
+console.log(`after:  ${afterUs.toFixed(2)}µs (${(beforeUs / afterUs).toFixed(1)}x faster)`);
@@ -0,0 +1,124 @@
+/**
+ * Request priority benchmark: the IndexedHeap behind RequestPriorityQueue
+ * vs re-sorting an array, at a given number of pending requests.
+ *
+ *   bun run bench/request-priority.ts [pending] [operations]
+ *
+ * The workload mixes what a busy session does: new requests arrive, gifts
+ * decrease the key of a viewer's pending requests, the head gets played,
+ * and every change is followed by an overlay read of the next 5 (plus a
+ * /queue read of the next 50 every tenth change).
+ */
+import { IndexedHeap } from "../src/lib/indexed-heap";
+
+const PENDING = Number(process.argv[2] ?? 10_000);
+const OPERATIONS = Number(process.argv[3] ?? 20_000);
+const VIEWERS = Math.max(1, Math.floor(PENDING / 4));
+const BOOST_MS_PER_DIAMOND = 5_000;
+
+interface Item {
+  id: string;
+  viewer: number;
+  requestedAt: number;
+  priority: number;
+}
+
+type Op = { kind: "add"; item: Item } | { kind: "gift"; viewer: number; diamonds: number } | { kind: "play" };
+
+// Deterministic pseudo-random sequence, so both runs see the same workload
+let seed = 42;
+function random(): number {
+  seed = (seed * 1_103_515_245 + 12_345) % 2 ** 31;
+  return seed / 2 ** 31;
+}
+
+const start = Date.UTC(2026, 9, 17, 20);
+let nextId = 0;
+function newItem(at: number): Item {
+  const requestedAt = start + at;
+  return { id: `r${nextId++}`, viewer: Math.floor(random() * VIEWERS), requestedAt, priority: requestedAt };
+}
+
+const initial = Array.from({ length: PENDING }, (_, i) => newItem(i * 100));
+const ops: Op[] = [];
+for (let i = 0; i < OPERATIONS; i++) {
+  const r = random();
+  if (r < 0.4) ops.push({ kind: "add", item: newItem(PENDING * 100 + i * 100) });
+  else if (r < 0.6) ops.push({ kind: "gift", viewer: Math.floor(random() * VIEWERS), diamonds: 1 + Math.floor(random() * 100) });
+  else ops.push({ kind: "play" });
+}
+
+function runHeap(): number {
+  const heap = new IndexedHeap<Item>();
+  const byViewer = new Map<number, Set<string>>();
+  const track = (item: Item) => {
+    heap.push(item.id, item.priority, item);
+    let ids = byViewer.get(item.viewer);
+    if (!ids) byViewer.set(item.viewer, (ids = new Set()));
+    ids.add(item.id);
+  };
+  for (const item of initial) track({ ...item });
+
+  let sink = 0;
+  ops.forEach((op, i) => {
+    if (op.kind === "add") {
+      track({ ...op.item });
+    } else if (op.kind === "gift") {
+      for (const id of byViewer.get(op.viewer) ?? []) {
+        const entry = heap.get(id)!;
+        entry.value.priority -= op.diamonds * BOOST_MS_PER_DIAMOND;
+        heap.update(id, entry.value.priority);
+      }
+    } else {
+      const played = heap.pop();
+      if (played) byViewer.get(played.value.viewer)!.delete(played.id);
+    }
+    sink += heap.top(5).length;
+    if (i % 10 === 0) sink += heap.top(50).length;
+  });
+  return sink;
+}
+
+function runSort(): number {
+  const items = new Map<string, Item>();
+  for (const item of initial) items.set(item.id, { ...item });
+  const order = () =>
+    [...items.values()].sort((a, b) => a.priority - b.priority || (a.id < b.id ? -1 : a.id > b.id ? 1 : 0));
+
+  let sink = 0;
+  ops.forEach((op, i) => {
+    if (op.kind === "add") {
+      items.set(op.item.id, { ...op.item });
+    } else if (op.kind === "gift") {
+      for (const item of items.values()) {
+        if (item.viewer === op.viewer) item.priority -= op.diamonds * BOOST_MS_PER_DIAMOND;
+      }
+    } else {
+      const head = order()[0];
+      if (head) items.delete(head.id);
+    }
+    const sorted = order();
+    sink += sorted.slice(0, 5).length;
+    if (i % 10 === 0) sink += sorted.slice(0, 50).length;
+  });
+  return sink;
+}
+
+function time(name: string, run: () => number, operations: number): number {
+  const began = performance.now();
+  const sink = run();
+  const elapsed = performance.now() - began;
+  if (sink === 0) console.log("unreachable");
+  const perOp = (elapsed * 1000) / operations;
+  console.log(`${name.padEnd(12)} ${elapsed.toFixed(0).padStart(7)}ms  ${perOp.toFixed(2).padStart(9)}µs/op`);
+  return perOp;
+}
+
+console.log(`${PENDING.toLocaleString()} pending requests, ${OPERATIONS.toLocaleString()} operations`);
+runHeap(); // warm up
+const heapPerOp = time("indexed heap", runHeap, OPERATIONS);
+// Sorting is slow enough that a slice of the workload is representative
+const sortOps = Math.min(OPERATIONS, 1_000);
+ops.length = sortOps;
+const sortPerOp = time("array sort", runSort, sortOps);
+console.log(`heap is ${(sortPerOp / heapPerOp).toFixed(0)}x faster per operation`);
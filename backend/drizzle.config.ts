@@ -4,6 +4,8 @@ export default defineConfig({
   schema: "./src/db/schema.ts",
   out: "./drizzle",
   dialect: "postgresql",
+  // Daily tiktok_raw_event partitions are managed at runtime, not by drizzle
+  tablesFilter: ["!tiktok_raw_event_p*", "!tiktok_raw_event_default"],
   dbCredentials: {
     url: process.env.DATABASE_URL!,
   },
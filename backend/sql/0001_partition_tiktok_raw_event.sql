@@ -0,0 +1,56 @@
+-- Convert tiktok_raw_event into a table range-partitioned by day on received_at.
+--
+-- drizzle-kit can't declare partitioning, so run this once after `db:push`
+-- (it works on an empty or populated table):
+--
+--   psql "$DATABASE_URL" -f sql/0001_partition_tiktok_raw_event.sql
+--
+-- Afterwards the backend keeps partitions created a few days ahead
+-- (RawEventPartitionManager), and drizzle.config.ts ignores the
+-- tiktok_raw_event_p* / _default child tables.
+
+BEGIN;
+
+ALTER TABLE tiktok_raw_event RENAME TO tiktok_raw_event_legacy;
+ALTER INDEX tiktok_raw_event_session_idx RENAME TO tiktok_raw_event_legacy_session_idx;
+ALTER INDEX tiktok_raw_event_session_event_idx RENAME TO tiktok_raw_event_legacy_session_event_idx;
+
+CREATE TABLE tiktok_raw_event (
+  id text NOT NULL,
+  live_session_id text NOT NULL REFERENCES live_session(id) ON DELETE CASCADE,
+  event_type text NOT NULL,
+  viewer_username text,
+  payload jsonb,
+  received_at timestamp NOT NULL,
+  CONSTRAINT tiktok_raw_event_id_received_at_pk PRIMARY KEY (id, received_at)
+) PARTITION BY RANGE (received_at);
+
+CREATE INDEX tiktok_raw_event_session_idx ON tiktok_raw_event (live_session_id);
+CREATE INDEX tiktok_raw_event_session_event_idx ON tiktok_raw_event (live_session_id, event_type);
+
+-- Catches rows outside every daily partition (e.g. replay of very old spill files)
+CREATE TABLE tiktok_raw_event_default PARTITION OF tiktok_raw_event DEFAULT;
+
+-- One partition per day from the oldest existing row through three days ahead
+DO $$
+DECLARE
+  day date := COALESCE((SELECT min(received_at)::date FROM tiktok_raw_event_legacy), current_date);
+BEGIN
+  WHILE day <= current_date + 3 LOOP
+    EXECUTE format(
+      'CREATE TABLE IF NOT EXISTS %I PARTITION OF tiktok_raw_event FOR VALUES FROM (%L) TO (%L)',
+      'tiktok_raw_event_p' || to_char(day, 'YYYYMMDD'),
+      day::timestamp,
+      (day + 1)::timestamp
+    );
+    day := day + 1;
+  END LOOP;
+END $$;
+
+INSERT INTO tiktok_raw_event (id, live_session_id, event_type, viewer_username, payload, received_at)
+SELECT id, live_session_id, event_type, viewer_username, payload, received_at
+FROM tiktok_raw_event_legacy;
+
+DROP TABLE tiktok_raw_event_legacy;
+
+COMMIT;
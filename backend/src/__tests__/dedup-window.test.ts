@@ -0,0 +1,51 @@
+import { describe, it, expect } from "bun:test";
+import { DedupWindow } from "../lib/dedup-window";
+
+describe("DedupWindow", () => {
+  it("should suppress a repeat within the window and allow it after", () => {
+    const dedup = new DedupWindow(5_000, 1_000);
+    expect(dedup.checkAndRecord("alice\u0000levitating", 10_000)).toBe(true);
+    expect(dedup.checkAndRecord("alice\u0000levitating", 14_999)).toBe(false);
+    expect(dedup.checkAndRecord("bob\u0000levitating", 14_999)).toBe(true);
+
+    // Granularity is one bucket: remembered until the window has passed
+    // the end of the bucket it was recorded in
+    expect(dedup.has("alice\u0000levitating", 15_999)).toBe(true);
+    expect(dedup.has("alice\u0000levitating", 16_000)).toBe(false);
+    expect(dedup.checkAndRecord("alice\u0000levitating", 16_000)).toBe(true);
+  });
+
+  it("should clear a bucket when the ring wraps onto it", () => {
+    const dedup = new DedupWindow(5_000, 1_000);
+    dedup.record("old", 0);
+    expect(dedup.has("old", 500)).toBe(true);
+
+    // 6 buckets: epoch 6 reuses epoch 0's slot
+    dedup.record("new", 6_000);
+    expect(dedup.has("old", 500)).toBe(false);
+    expect(dedup.has("new", 6_000)).toBe(true);
+
+    // A key older than anything the ring holds doesn't evict newer ones
+    dedup.record("stale", 0);
+    expect(dedup.has("new", 6_000)).toBe(true);
+    expect(dedup.has("stale", 500)).toBe(false);
+  });
+
+  it("should not match keys from buckets ahead of now", () => {
+    const dedup = new DedupWindow(5_000, 1_000);
+    dedup.record("later", 3_000);
+    expect(dedup.has("later", 2_999)).toBe(false);
+    expect(dedup.has("later", 3_000)).toBe(true);
+  });
+
+  it("should seed from persisted requests", () => {
+    const dedup = new DedupWindow(5_000, 1_000);
+    dedup.seed([
+      { key: "alice\u0000levitating", at: new Date(1_000) },
+      { key: "bob\u0000as it was", at: new Date(4_500) },
+    ]);
+    expect(dedup.checkAndRecord("alice\u0000levitating", 5_000)).toBe(false);
+    expect(dedup.checkAndRecord("bob\u0000as it was", 9_000)).toBe(false);
+    expect(dedup.checkAndRecord("alice\u0000levitating", 7_000)).toBe(true);
+  });
+});
@@ -0,0 +1,65 @@
+import { describe, it, expect } from "bun:test";
+import { csvCell, encodeHeader, encodeRows, type ExportColumn } from "../lib/export-format";
+
+interface Row {
+  viewer: string;
+  message: string | null;
+  diamonds: number;
+  at: Date;
+}
+
+const COLUMNS: ExportColumn<Row>[] = [
+  { name: "viewer", value: (r) => r.viewer },
+  { name: "message", value: (r) => r.message },
+  { name: "diamonds", value: (r) => r.diamonds },
+  { name: "at", value: (r) => r.at },
+];
+
+const ROWS: Row[] = [
+  { viewer: "alice", message: "!play Shape of You", diamonds: 0, at: new Date("2026-10-17T20:00:00Z") },
+  { viewer: "bob", message: 'say "hi", then\nplay', diamonds: -1, at: new Date("2026-10-17T20:00:01Z") },
+  { viewer: "eve", message: null, diamonds: 5, at: new Date("2026-10-17T20:00:02Z") },
+];
+
+describe("csvCell", () => {
+  it("should quote cells containing separators, quotes or newlines", () => {
+    expect(csvCell("plain")).toBe("plain");
+    expect(csvCell("a,b")).toBe('"a,b"');
+    expect(csvCell('say "hi"')).toBe('"say ""hi"""');
+    expect(csvCell("two\nlines")).toBe('"two\nlines"');
+  });
+
+  it("should neutralize text a spreadsheet would run as a formula", () => {
+    expect(csvCell("=HYPERLINK(\"http://x\")")).toBe("\"'=HYPERLINK(\"\"http://x\"\")\"");
+    expect(csvCell("+1")).toBe("'+1");
+    expect(csvCell("@viewer")).toBe("'@viewer");
+    // Numbers aren't text
+    expect(csvCell(-5)).toBe("-5");
+  });
+
+  it("should write nulls as empty cells and dates as ISO strings", () => {
+    expect(csvCell(null)).toBe("");
+    expect(csvCell(undefined)).toBe("");
+    expect(csvCell(new Date("2026-10-17T20:00:00Z"))).toBe("2026-10-17T20:00:00.000Z");
+  });
+});
+
+describe("encodeRows", () => {
+  it("should encode CSV with a header and CRLF line endings", () => {
+    const csv = encodeHeader("csv", COLUMNS) + encodeRows("csv", COLUMNS, ROWS);
+    expect(csv).toBe(
+      "viewer,message,diamonds,at\r\n" +
+        "alice,!play Shape of You,0,2026-10-17T20:00:00.000Z\r\n" +
+        'bob,"say ""hi"", then\nplay",-1,2026-10-17T20:00:01.000Z\r\n' +
+        "eve,,5,2026-10-17T20:00:02.000Z\r\n"
+    );
+  });
+
+  it("should encode one JSON object per line for NDJSON", () => {
+    const ndjson = encodeHeader("ndjson", COLUMNS) + encodeRows("ndjson", COLUMNS, ROWS);
+    const lines = ndjson.trimEnd().split("\n").map((line) => JSON.parse(line));
+    expect(lines).toHaveLength(3);
+    expect(lines[1]).toEqual({ viewer: "bob", message: 'say "hi", then\nplay', diamonds: -1, at: "2026-10-17T20:00:01.000Z" });
+    expect(lines[2].message).toBeNull();
+  });
+});
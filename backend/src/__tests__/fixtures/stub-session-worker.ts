@@ -0,0 +1,27 @@
+/**
+ * Session worker stand-in for WorkerPool tests: speaks worker-protocol
+ * and accepts every session without connecting anywhere.
+ */
+import type { SupervisorMessage, WorkerMessage } from "../../services/worker-protocol";
+
+declare var self: Worker;
+
+function post(message: WorkerMessage): void {
+  self.postMessage(message);
+}
+
+self.onmessage = (e: MessageEvent<SupervisorMessage>) => {
+  const msg = e.data;
+  switch (msg.type) {
+    case "init":
+      post({ type: "ready" });
+      break;
+    case "start":
+      post({ type: "result", requestId: msg.requestId, ok: true, value: true });
+      break;
+    case "stop":
+    case "shutdown":
+      post({ type: "result", requestId: msg.requestId, ok: true });
+      break;
+  }
+};
@@ -0,0 +1,72 @@
+import { describe, it, expect } from "bun:test";
+import { IndexedHeap, type HeapEntry } from "../lib/indexed-heap";
+
+const ids = (entries: HeapEntry<unknown>[]) => entries.map((entry) => entry.id);
+
+describe("IndexedHeap", () => {
+  it("should return the k smallest entries in order, ties broken by id", () => {
+    const heap = new IndexedHeap<null>();
+    for (const [id, priority] of [["e", 5], ["b", 2], ["d", 2], ["a", 9], ["c", 1]] as const) {
+      heap.push(id, priority, null);
+    }
+
+    expect(ids(heap.top(3))).toEqual(["c", "b", "d"]);
+    expect(ids(heap.top(10))).toEqual(["c", "b", "d", "e", "a"]);
+    expect(heap.top(0)).toEqual([]);
+    // top() leaves the heap as it was
+    expect(heap.size).toBe(5);
+    expect(heap.peek()?.id).toBe("c");
+  });
+
+  it("should move an entry up on decrease-key and down on increase-key", () => {
+    const heap = new IndexedHeap<string>();
+    for (let i = 0; i < 10; i++) heap.push(`r${i}`, i * 10, `request ${i}`);
+
+    expect(heap.update("r7", -1)).toBe(true);
+    expect(ids(heap.top(3))).toEqual(["r7", "r0", "r1"]);
+    expect(heap.update("r0", 55)).toBe(true);
+    expect(ids(heap.top(10))).toEqual(["r7", "r1", "r2", "r3", "r4", "r5", "r0", "r6", "r8", "r9"]);
+    expect(heap.update("missing", 0)).toBe(false);
+
+    // push on an existing id updates both priority and value
+    heap.push("r9", -5, "boosted");
+    expect(heap.peek()).toEqual({ id: "r9", priority: -5, value: "boosted" });
+    expect(heap.size).toBe(10);
+  });
+
+  it("should match a sorted array through random pushes, updates and removes", () => {
+    const heap = new IndexedHeap<number>();
+    const reference = new Map<string, number>();
+    const sorted = () =>
+      [...reference.entries()]
+        .sort(([a, pa], [b, pb]) => pa - pb || (a < b ? -1 : a > b ? 1 : 0))
+        .map(([id]) => id);
+
+    for (let step = 0; step < 5_000; step++) {
+      const id = `i${Math.floor(Math.random() * 300)}`;
+      const priority = Math.floor(Math.random() * 1_000);
+      const action = Math.random();
+      if (action < 0.4) {
+        heap.push(id, priority, priority);
+        reference.set(id, priority);
+      } else if (action < 0.7) {
+        expect(heap.update(id, priority)).toBe(reference.has(id));
+        if (reference.has(id)) reference.set(id, priority);
+      } else if (action < 0.9) {
+        expect(heap.remove(id)?.id).toBe(reference.has(id) ? id : undefined);
+        reference.delete(id);
+      } else {
+        const top = heap.pop();
+        expect(top?.id).toBe(sorted()[0]);
+        if (top) reference.delete(top.id);
+      }
+
+      if (step % 100 === 0) {
+        const k = Math.floor(Math.random() * 40);
+        expect(ids(heap.top(k))).toEqual(sorted().slice(0, k));
+      }
+    }
+    expect(heap.size).toBe(reference.size);
+    expect(ids(heap.top(heap.size))).toEqual(sorted());
+  });
+});
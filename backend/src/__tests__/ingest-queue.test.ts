@@ -0,0 +1,100 @@
+import { describe, it, expect } from "bun:test";
+import { IngestQueue, type IngestTask } from "../lib/ingest-queue";
+
+/** A task that runs until released, recording start, drop and finish */
+function gated(log: string[], name: string, droppable = true) {
+  let release!: () => void;
+  const done = new Promise<void>((resolve) => {
+    release = resolve;
+  });
+  const task: IngestTask = {
+    kind: droppable ? "chat" : "gift",
+    droppable,
+    run: async () => {
+      log.push(`start ${name}`);
+      await done;
+      log.push(`end ${name}`);
+    },
+    onDrop: () => log.push(`drop ${name}`),
+  };
+  return { task, release };
+}
+
+describe("IngestQueue", () => {
+  it("should run at most `concurrency` tasks at once, in order", async () => {
+    const log: string[] = [];
+    const queue = new IngestQueue("test", { concurrency: 2, maxDepth: 10 });
+    const tasks = ["a", "b", "c"].map((name) => gated(log, name));
+    for (const { task } of tasks) queue.push(task);
+
+    expect(log).toEqual(["start a", "start b"]);
+    expect(queue.stats).toMatchObject({ depth: 1, inFlight: 2 });
+
+    tasks[1]!.release();
+    await Bun.sleep(0);
+    expect(log).toEqual(["start a", "start b", "end b", "start c"]);
+
+    tasks[0]!.release();
+    tasks[2]!.release();
+    await queue.drain();
+    expect(queue.stats).toMatchObject({ depth: 0, inFlight: 0, processed: 3, dropped: 0 });
+  });
+
+  it("should shed the oldest queued request when full, but never a gift", async () => {
+    const log: string[] = [];
+    const queue = new IngestQueue("test", { concurrency: 1, maxDepth: 2 });
+    const running = gated(log, "running");
+    queue.push(running.task);
+
+    const gift = gated(log, "gift", false);
+    const tasks = [gated(log, "chat1"), gift, gated(log, "chat2"), gated(log, "chat3")];
+    const accepted = tasks.map(({ task }) => queue.push(task));
+    expect(accepted).toEqual([true, true, true, true]);
+    // chat1 made room for chat2, then chat2 for chat3; the gift stays
+    expect(log).toEqual(["start running", "drop chat1", "drop chat2"]);
+    expect(queue.stats).toMatchObject({ depth: 2, peakDepth: 2, dropped: 2 });
+
+    // Only gifts left queued: a new request is shed itself, a gift still fits
+    const full = new IngestQueue("gifts", { concurrency: 1, maxDepth: 1 });
+    const blocker = gated(log, "blocker", false);
+    full.push(blocker.task);
+    full.push(gated(log, "gift2", false).task);
+    expect(full.push(gated(log, "chat4").task)).toBe(false);
+    expect(full.push(gated(log, "gift3", false).task)).toBe(true);
+    expect(full.stats).toMatchObject({ depth: 2, dropped: 1 });
+
+    for (const { release } of [running, ...tasks]) release();
+    await queue.drain();
+    expect(log.filter((line) => line.startsWith("end"))).toEqual(["end running", "end gift", "end chat3"]);
+  });
+
+  it("should count failed tasks and keep going", async () => {
+    const queue = new IngestQueue("test", { concurrency: 1, maxDepth: 10 });
+    let ran = 0;
+    queue.push({ kind: "chat", droppable: true, run: async () => Promise.reject(new Error("search failed")) });
+    queue.push({ kind: "chat", droppable: true, run: async () => void ran++ });
+    await queue.drain();
+    expect(ran).toBe(1);
+    expect(queue.stats).toMatchObject({ processed: 1, failed: 1 });
+  });
+
+  it("should drop tasks pushed after drain or discard", async () => {
+    const log: string[] = [];
+    const drained = new IngestQueue("test", { concurrency: 1, maxDepth: 10 });
+    await drained.drain();
+    expect(drained.push(gated(log, "late").task)).toBe(false);
+    expect(log).toEqual(["drop late"]);
+
+    // discard throws queued work away without drop handlers
+    const discarded = new IngestQueue("test", { concurrency: 1, maxDepth: 10 });
+    const running = gated(log, "running");
+    discarded.push(running.task);
+    discarded.push(gated(log, "queued").task);
+    discarded.discard();
+    expect(discarded.stats.depth).toBe(0);
+    expect(discarded.push(gated(log, "after").task)).toBe(false);
+    running.release();
+    await discarded.drain();
+    expect(log).toEqual(["drop late", "start running", "drop after", "end running"]);
+  });
+});
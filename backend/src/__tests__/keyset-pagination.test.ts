@@ -0,0 +1,111 @@
+import { describe, it, expect } from "bun:test";
+import { encodeCursor, decodeCursor, toPage, type KeysetCursor } from "../lib/keyset-cursor";
+
+const position = (row: { at: Date; id: string }): KeysetCursor => row;
+
+describe("keyset cursors", () => {
+  it("should round-trip a position through an opaque cursor", () => {
+    const cursor = { at: new Date("2026-10-17T20:00:00.123Z"), id: "0b9c5a1e-2f4d-4c3b-9a8e-1d2c3b4a5f60" };
+    const encoded = encodeCursor(cursor);
+    expect(encoded).toMatch(/^[A-Za-z0-9_-]+$/);
+    expect(decodeCursor(encoded)).toEqual(cursor);
+  });
+
+  it("should reject malformed cursors", () => {
+    expect(decodeCursor(undefined)).toBeNull();
+    expect(decodeCursor("")).toBeNull();
+    expect(decodeCursor("not a cursor")).toBeNull();
+    expect(decodeCursor(Buffer.from("abc:r1").toString("base64url"))).toBeNull();
+    expect(decodeCursor(Buffer.from("1760731200000:").toString("base64url"))).toBeNull();
+    expect(decodeCursor("a".repeat(1_000))).toBeNull();
+  });
+
+  it("should only return a next cursor when a row beyond the page was fetched", () => {
+    const rows = [1, 2, 3].map((n) => ({ at: new Date(n), id: `r${n}` }));
+    expect(toPage(rows, 3, position)).toEqual({ items: rows, nextCursor: null });
+
+    const page = toPage(rows, 2, position);
+    expect(page.items).toEqual(rows.slice(0, 2));
+    expect(decodeCursor(page.nextCursor)).toEqual({ at: new Date(2), id: "r2" });
+  });
+});
+
+describe.skipIf(!process.env.DATABASE_URL)("keyset pagination (Postgres)", () => {
+  it("should page through rows sharing timestamps without skipping or repeating", async () => {
+    const { db } = await import("../db/client");
+    const { users, liveSessions, giftEvents } = await import("../db/schema");
+    const queries = await import("../db/queries");
+    const { eq } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "pagination-test" }).returning();
+    const session = await queries.createLiveSession(user!.id, "pagination_test");
+    try {
+      // 503 rows over only 7 distinct timestamps
+      const base = Date.UTC(2026, 9, 17, 20);
+      const requests = Array.from({ length: 503 }, (_, i) => ({
+        id: crypto.randomUUID(),
+        liveSessionId: session.id,
+        viewerUsername: `viewer${i % 31}`,
+        rawMessage: `!play ${i}`,
+        parsedQuery: String(i),
+        spotifyTrackId: null,
+        trackName: null,
+        trackArtist: null,
+        albumName: null,
+        albumImageUrl: null,
+        durationMs: null,
+        spotifyUri: null,
+        searchStatus: "pending" as const,
+        playStatus: "pending" as const,
+        requestedAt: new Date(base + (i % 7) * 1_000),
+        matchedAt: null,
+        confirmedAt: null,
+      }));
+      await queries.insertSongRequests(requests);
+      await db.insert(giftEvents).values(
+        requests.slice(0, 101).map((r) => ({
+          liveSessionId: session.id,
+          viewerUsername: r.viewerUsername,
+          giftId: 5655,
+          giftName: "Rose",
+          diamondCount: 1,
+          repeatCount: 1,
+          receivedAt: r.requestedAt,
+        }))
+      );
+
+      const newestFirst = (a: { at: Date; id: string }, b: { at: Date; id: string }) =>
+        b.at.getTime() - a.at.getTime() || (a.id < b.id ? 1 : a.id > b.id ? -1 : 0);
+
+      const seenRequests: string[] = [];
+      for (let cursor: KeysetCursor | null = null, pages = 0; ; pages++) {
+        expect(pages).toBeLessThan(100);
+        const rows = await queries.getRequestsForSession(session.id, cursor, 21);
+        const page = toPage(rows, 20, (r) => ({ at: r.requestedAt, id: r.id }));
+        seenRequests.push(...page.items.map((r) => r.id));
+        if (!page.nextCursor) break;
+        cursor = decodeCursor(page.nextCursor);
+      }
+      const expectedRequests = requests
+        .map((r) => ({ at: r.requestedAt, id: r.id }))
+        .sort(newestFirst)
+        .map((r) => r.id);
+      expect(seenRequests).toEqual(expectedRequests);
+
+      const allGifts = await queries.getGiftEventsForSession(session.id, null, 1_000);
+      const seenGifts: string[] = [];
+      for (let cursor: KeysetCursor | null = null; ; ) {
+        const rows = await queries.getGiftEventsForSession(session.id, cursor, 8);
+        const page = toPage(rows, 7, (g) => ({ at: g.receivedAt, id: g.id }));
+        seenGifts.push(...page.items.map((g) => g.id));
+        if (!page.nextCursor) break;
+        cursor = decodeCursor(page.nextCursor);
+      }
+      expect(seenGifts).toHaveLength(101);
+      expect(seenGifts).toEqual(allGifts.map((g) => g.id));
+    } finally {
+      await db.delete(liveSessions).where(eq(liveSessions.id, session.id));
+      await db.delete(users).where(eq(users.id, user!.id));
+    }
+  });
+});
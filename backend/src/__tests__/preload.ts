@@ -0,0 +1,9 @@
+/**
+ * bun test setup. Tests that touch Postgres only run against
+ * TEST_DATABASE_URL, never the DATABASE_URL bun loads from .env.
+ */
+if (process.env.TEST_DATABASE_URL) {
+  process.env.DATABASE_URL = process.env.TEST_DATABASE_URL;
+} else {
+  delete process.env.DATABASE_URL;
+}
@@ -0,0 +1,133 @@
+import { describe, it, expect } from "bun:test";
+import { OrderedIndex, type Positioned } from "../lib/ordered-index";
+
+const byPosition = (a: Positioned, b: Positioned) =>
+  a.position - b.position || (a.id < b.id ? -1 : a.id > b.id ? 1 : 0);
+
+describe("OrderedIndex", () => {
+  it("should keep items ordered by position, then id", () => {
+    const index = new OrderedIndex<Positioned>();
+    index.insert({ id: "c", position: 2 });
+    index.insert({ id: "b", position: 1 });
+    index.insert({ id: "a", position: 2 });
+    index.insert({ id: "d", position: 0.5 });
+
+    expect(index.toArray().map((item) => item.id)).toEqual(["d", "b", "a", "c"]);
+    expect(index.at(2)?.id).toBe("a");
+    expect(index.at(4)).toBe(undefined);
+    expect(index.indexOf("c")).toBe(3);
+    expect(index.indexOf("missing")).toBe(-1);
+  });
+
+  it("should replace an item inserted again with the same id", () => {
+    const index = new OrderedIndex<Positioned>();
+    index.insert({ id: "a", position: 1 });
+    index.insert({ id: "b", position: 2 });
+    index.insert({ id: "a", position: 3 });
+
+    expect(index.size).toBe(2);
+    expect(index.toArray()).toEqual([{ id: "b", position: 2 }, { id: "a", position: 3 }]);
+    expect(index.get("a")?.position).toBe(3);
+  });
+
+  it("should match a sorted array through random inserts and removes", () => {
+    const index = new OrderedIndex<Positioned>();
+    const reference = new Map<string, Positioned>();
+
+    for (let step = 0; step < 5_000; step++) {
+      const id = `i${Math.floor(Math.random() * 500)}`;
+      if (Math.random() < 0.35) {
+        expect(index.remove(id)).toBe(reference.get(id));
+        reference.delete(id);
+      } else {
+        // Few distinct positions, so ties on position are common
+        const item = { id, position: Math.floor(Math.random() * 50) };
+        index.insert(item);
+        reference.set(id, item);
+      }
+
+      if (step % 250 === 0) {
+        const sorted = [...reference.values()].sort(byPosition);
+        expect(index.toArray()).toEqual(sorted);
+        for (let i = 0; i < sorted.length; i += 17) {
+          expect(index.at(i)).toBe(sorted[i]);
+          expect(index.indexOf(sorted[i]!.id)).toBe(i);
+        }
+      }
+    }
+    expect(index.size).toBe(reference.size);
+  });
+
+  it("should rebuild toArray after a change without touching the old array", () => {
+    const index = new OrderedIndex<Positioned>();
+    index.insert({ id: "a", position: 1 });
+    const before = index.toArray();
+    expect(index.toArray()).toBe(before);
+
+    index.insert({ id: "b", position: 0 });
+    expect(before.map((item) => item.id)).toEqual(["a"]);
+    expect(index.toArray().map((item) => item.id)).toEqual(["b", "a"]);
+  });
+});
+
+describe.skipIf(!process.env.DATABASE_URL)("QueueEngine (Postgres)", () => {
+  it("should move items by changing one position, renumbering once the gap runs out", async () => {
+    const { db } = await import("../db/client");
+    const { users, liveSessions } = await import("../db/schema");
+    const { createLiveSession } = await import("../db/queries");
+    const { QueueEngine } = await import("../services/queue-engine");
+    const { eq } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "queue-engine-test" }).returning();
+    const session = await createLiveSession(user!.id, "queue_engine_test");
+    try {
+      const events: { type: string; queue?: unknown[] }[] = [];
+      const engine = new QueueEngine((_userId, _sessionId, event) => events.push(event as { type: string }));
+      const add = (n: number) =>
+        engine.add(user!.id, session.id, {
+          viewerUsername: `viewer${n}`,
+          spotifyTrackId: `track${n}`,
+          trackTitle: `Track ${n}`,
+          trackArtist: "Artist",
+        });
+
+      const [a, b, c] = [await add(1), await add(2), await add(3)];
+      expect((await engine.list(session.id)).map((item) => item.id)).toEqual([a.id, b.id, c.id]);
+
+      // Only the moved item gets a new position
+      const moved = await engine.move(user!.id, session.id, c.id, 0);
+      const afterMove = await engine.list(session.id);
+      expect(afterMove.map((item) => item.id)).toEqual([c.id, a.id, b.id]);
+      expect(afterMove[1]!.position).toBe(a.position);
+      expect(afterMove[2]!.position).toBe(b.position);
+      expect(moved!.position).toBeLessThan(a.position);
+      expect(await engine.move(user!.id, session.id, "missing", 0)).toBeNull();
+
+      // Keep moving the last item between the first two: the gap halves
+      // each time until the session is renumbered
+      for (let i = 0; i < 40; i++) {
+        const queue = await engine.list(session.id);
+        const last = queue[queue.length - 1]!;
+        await engine.move(user!.id, session.id, last.id, 1);
+        expect((await engine.list(session.id))[1]!.id).toBe(last.id);
+      }
+      expect(engine.stats.renumbers).toBe(1);
+      // The renumber covers the items left while one was being moved
+      const renumbered = events.find((event) => event.queue);
+      expect(renumbered?.queue).toHaveLength(2);
+
+      const final = await engine.list(session.id);
+      for (let i = 1; i < final.length; i++) {
+        expect(final[i]!.position - final[i - 1]!.position > 1e-6).toBe(true);
+      }
+
+      // What was persisted loads back in the same order
+      await engine.flush();
+      const reloaded = new QueueEngine(() => {});
+      expect((await reloaded.list(session.id)).map((item) => item.id)).toEqual(final.map((item) => item.id));
+    } finally {
+      await db.delete(liveSessions).where(eq(liveSessions.id, session.id));
+      await db.delete(users).where(eq(users.id, user!.id));
+    }
+  });
+});
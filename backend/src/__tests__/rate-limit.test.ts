@@ -0,0 +1,103 @@
+import { describe, it, expect } from "bun:test";
+import { ViewerRateLimiter, type RateLimitPolicy } from "../lib/rate-limit";
+
+const MINUTE = 60_000;
+
+describe("ViewerRateLimiter", () => {
+  it("should allow `limit` requests per sliding window", () => {
+    const limiter = new ViewerRateLimiter({ now: 0 });
+    limiter.setPolicy("s", { kind: "sliding-window", limit: 2, windowMs: 30_000 });
+
+    expect(limiter.check("s", "alice", 1_000)).toBe(true);
+    expect(limiter.check("s", "alice", 2_000)).toBe(true);
+    expect(limiter.check("s", "alice", 3_000)).toBe(false);
+    // Other viewers have their own allowance
+    expect(limiter.check("s", "bob", 3_000)).toBe(true);
+
+    // Half way into the next window the previous one still counts for half
+    expect(limiter.check("s", "alice", 45_000)).toBe(true);
+    expect(limiter.check("s", "alice", 45_000)).toBe(false);
+    expect(limiter.check("s", "alice", 61_000)).toBe(true);
+    expect(limiter.stats.limited).toBe(2);
+  });
+
+  it("should refill token buckets over time", () => {
+    const limiter = new ViewerRateLimiter({ now: 0 });
+    limiter.setPolicy("s", { kind: "token-bucket", capacity: 2, refillPerMinute: 2 });
+
+    expect(limiter.check("s", "alice", 0)).toBe(true);
+    expect(limiter.check("s", "alice", 0)).toBe(true);
+    expect(limiter.check("s", "alice", 10_000)).toBe(false);
+    expect(limiter.check("s", "alice", 30_000)).toBe(true);
+    expect(limiter.check("s", "alice", 30_000)).toBe(false);
+  });
+
+  it("should spend gift bonus before the policy allowance", () => {
+    const limiter = new ViewerRateLimiter({ now: 0 });
+    limiter.setPolicy("s", {
+      kind: "sliding-window",
+      limit: 1,
+      windowMs: 30_000,
+      giftBoost: { diamondsPerRequest: 10, maxBonus: 2 },
+    });
+
+    limiter.boost("s", "alice", 50, 0); // capped at maxBonus
+    expect(limiter.check("s", "alice", 1_000)).toBe(true);
+    expect(limiter.check("s", "alice", 1_000)).toBe(true);
+    expect(limiter.check("s", "alice", 1_000)).toBe(true);
+    expect(limiter.check("s", "alice", 1_000)).toBe(false);
+    expect(limiter.stats.boosts).toBe(1);
+  });
+
+  it("should expire entries once they are idle", () => {
+    const limiter = new ViewerRateLimiter({ now: 0 });
+    limiter.check("s", "alice", 0);
+    limiter.check("s", "bob", 31_000);
+    expect(limiter.stats.entries).toBe(2);
+
+    // alice is idle two 30s windows after her window started
+    limiter.check("s", "carol", 59_000);
+    expect(limiter.stats.entries).toBe(3);
+    limiter.check("s", "carol", 60_000);
+    expect(limiter.stats).toMatchObject({ entries: 2, expired: 1 });
+
+    // Far in the future: everything due at once
+    limiter.check("s", "dave", 24 * 60 * MINUTE);
+    expect(limiter.stats).toMatchObject({ entries: 1, expired: 3 });
+  });
+
+  it("should keep entries idle beyond the wheel's horizon until they are due", () => {
+    const limiter = new ViewerRateLimiter({ now: 0 });
+    // 90 tokens short at 1 per minute: idle after 90 minutes (> 68 min wheel)
+    const policy: RateLimitPolicy = { kind: "token-bucket", capacity: 100, refillPerMinute: 1 };
+    limiter.setPolicy("s", policy);
+    // Only advances the clock: stays well clear of expiry itself
+    limiter.setPolicy("probe", { kind: "sliding-window", limit: 100, windowMs: 24 * 60 * MINUTE });
+    for (let i = 0; i < 90; i++) limiter.check("s", "alice", 0);
+
+    for (let minute = 1; minute < 90; minute++) limiter.check("probe", "bob", minute * MINUTE);
+    expect(limiter.stats.expired).toBe(0);
+    expect(limiter.stats.entries).toBe(2);
+
+    limiter.check("probe", "bob", 90 * MINUTE + 1_000);
+    expect(limiter.stats.expired).toBe(1);
+    expect(limiter.stats.entries).toBe(1);
+  });
+
+  it("should evict the entries closest to expiring at capacity", () => {
+    const limiter = new ViewerRateLimiter({ maxEntries: 3, now: 0 });
+    limiter.setPolicy("short", { kind: "sliding-window", limit: 1, windowMs: 2_000 });
+    limiter.setPolicy("long", { kind: "sliding-window", limit: 1, windowMs: 60_000 });
+
+    limiter.check("long", "alice", 0);
+    limiter.check("short", "bob", 0);
+    limiter.check("long", "carol", 0);
+    limiter.check("long", "dave", 0);
+    expect(limiter.stats).toMatchObject({ entries: 3, evicted: 1 });
+
+    // bob was evicted and starts over; alice and carol kept their state
+    expect(limiter.check("long", "alice", 500)).toBe(false);
+    expect(limiter.check("long", "carol", 500)).toBe(false);
+    expect(limiter.check("short", "bob", 500)).toBe(true);
+  });
+});
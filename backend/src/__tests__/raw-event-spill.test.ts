@@ -0,0 +1,100 @@
+import { describe, it, expect } from "bun:test";
+import { encodeSpillChunk, decodeSegment } from "../lib/spill-segment";
+
+const event = (n: number, liveSessionId = "s1") => ({
+  liveSessionId,
+  eventType: "chat",
+  viewerUsername: n % 2 === 0 ? `viewer${n}` : null,
+  payload: JSON.stringify({ comment: `!play ${n}`, n }),
+  receivedAt: new Date(Date.UTC(2026, 9, 17, 20, 0, n)),
+});
+
+const range = (from: number, to: number) => Array.from({ length: to - from }, (_, i) => event(from + i));
+
+describe("spill segments", () => {
+  it("should round-trip events across appended chunks", () => {
+    for (const compress of [false, true]) {
+      const chunks = [encodeSpillChunk(range(0, 3), compress), encodeSpillChunk(range(3, 5), compress)];
+      const segment = Buffer.concat(chunks);
+      expect(decodeSegment(segment, compress)).toEqual(range(0, 5));
+    }
+  });
+
+  it("should keep the events before a torn line", () => {
+    const segment = Buffer.concat([encodeSpillChunk(range(0, 3), false), encodeSpillChunk(range(3, 5), false)]);
+    const torn = segment.subarray(0, segment.length - 20);
+    expect(decodeSegment(torn, false)).toEqual(range(0, 4));
+  });
+
+  it("should keep the intact members of a truncated gzip segment", () => {
+    const last = encodeSpillChunk(range(6, 9), true);
+    const segment = Buffer.concat([encodeSpillChunk(range(0, 3), true), encodeSpillChunk(range(3, 6), true), last]);
+
+    // Cut inside the last member's header, and inside its deflate data
+    expect(decodeSegment(segment.subarray(0, segment.length - last.length + 4), true)).toEqual(range(0, 6));
+    const partial = decodeSegment(segment.subarray(0, segment.length - last.length / 2), true);
+    expect(partial.slice(0, 6)).toEqual(range(0, 6));
+    expect(partial.length).toBeLessThan(9);
+  });
+
+  it("should throw on a corrupt gzip segment", () => {
+    const segment = Buffer.concat([encodeSpillChunk(range(0, 3), true), Buffer.from("not gzip at all")]);
+    expect(() => decodeSegment(segment, true)).toThrow();
+  });
+});
+
+describe.skipIf(!process.env.DATABASE_URL)("RawEventArchiver (Postgres)", () => {
+  it("should spill failed flushes to disk and replay them, parking corrupt segments", async () => {
+    const { mkdtemp, mkdir, writeFile, readdir, rm } = await import("node:fs/promises");
+    const { tmpdir } = await import("node:os");
+    const { join } = await import("node:path");
+    const spillDir = await mkdtemp(join(tmpdir(), "raw-event-spill-"));
+    process.env.RAW_EVENT_SPILL_DIR = spillDir;
+
+    const { db } = await import("../db/client");
+    const { users, liveSessions, tiktokRawEvents } = await import("../db/schema");
+    const { RawEventArchiver } = await import("../services/raw-event-archiver");
+    const { eq, count } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "spill-test" }).returning();
+    const sessionId = crypto.randomUUID();
+    try {
+      const slotDir = join(spillDir, "test");
+      await mkdir(slotDir, { recursive: true });
+      // Left behind by a crash: a truncated gzip segment and a corrupt one
+      const last = encodeSpillChunk([event(100, sessionId)], true);
+      const truncated = Buffer.concat([
+        encodeSpillChunk([event(0, sessionId), event(1, sessionId)], true),
+        last.subarray(0, 15),
+      ]);
+      await writeFile(join(slotDir, "raw-000000000000001-000000.ndjson.gz"), truncated);
+      await writeFile(join(slotDir, "raw-000000000000002-000000.ndjson.gz"), Buffer.from("corrupt"));
+
+      // The session doesn't exist yet, so the flush fails and spills
+      const archiver = new RawEventArchiver("test");
+      for (let i = 2; i < 7; i++) archiver.push(event(i, sessionId));
+      await archiver.flush();
+      expect(archiver.stats).toMatchObject({ flushFailures: 1, spilledEvents: 5 });
+
+      await db
+        .insert(liveSessions)
+        .values({ id: sessionId, userId: user!.id, tiktokUsername: "spill_test", startedAt: new Date() });
+      const replay = () => (archiver as unknown as { replay(): Promise<void> }).replay();
+      for (let i = 0; i < 5; i++) await replay();
+
+      const [saved] = await db
+        .select({ n: count() })
+        .from(tiktokRawEvents)
+        .where(eq(tiktokRawEvents.liveSessionId, sessionId));
+      // 2 from the truncated segment, 5 spilled; the corrupt one is parked
+      expect(saved?.n).toBe(7);
+      expect(archiver.stats.replayedEvents).toBe(7);
+      expect(await readdir(slotDir)).toEqual(["raw-000000000000002-000000.ndjson.gz.failed"]);
+      await archiver.stop();
+    } finally {
+      await db.delete(liveSessions).where(eq(liveSessions.id, sessionId));
+      await db.delete(users).where(eq(users.id, user!.id));
+      await rm(spillDir, { recursive: true, force: true });
+    }
+  });
+});
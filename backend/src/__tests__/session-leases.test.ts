@@ -0,0 +1,96 @@
+import { describe, it, expect } from "bun:test";
+
+const heartbeat = (keeper: object) => (keeper as { heartbeat(): Promise<void> }).heartbeat();
+
+async function until(condition: () => boolean, timeoutMs = 10_000): Promise<void> {
+  const deadline = Date.now() + timeoutMs;
+  while (!condition()) {
+    if (Date.now() > deadline) throw new Error("Timed out waiting for condition");
+    await Bun.sleep(20);
+  }
+}
+
+describe.skipIf(!process.env.DATABASE_URL)("SessionLeaseKeeper (Postgres)", () => {
+  it("should hand a session to one owner and report it lost once taken over or ended", async () => {
+    const { db } = await import("../db/client");
+    const { users, liveSessions, liveSessionLeases } = await import("../db/schema");
+    const { createLiveSession, endLiveSession } = await import("../db/queries");
+    const { SessionLeaseKeeper } = await import("../services/session-leases");
+    const { eq, sql } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "lease-test" }).returning();
+    const first = await createLiveSession(user!.id, "lease_test");
+    const second = await createLiveSession(user!.id, "lease_test_2");
+    try {
+      const lostByA: string[] = [];
+      const a = new SessionLeaseKeeper(`lease-test-a-${crypto.randomUUID()}`, (id) => lostByA.push(id));
+      const b = new SessionLeaseKeeper(`lease-test-b-${crypto.randomUUID()}`, () => {});
+
+      expect(await a.claim(first.id)).toBe(true);
+      expect(await a.claim(first.id)).toBe(true); // re-claim by the holder
+      expect(await b.claim(first.id)).toBe(false);
+      expect(b.stats).toMatchObject({ held: 0, conflicts: 1 });
+
+      // a missed its heartbeats: once the lease expires b may take over
+      await db
+        .update(liveSessionLeases)
+        .set({ expiresAt: sql`now() - interval '1 second'` })
+        .where(eq(liveSessionLeases.liveSessionId, first.id));
+      expect(await b.claim(first.id)).toBe(true);
+
+      expect(await a.claim(second.id)).toBe(true);
+      await heartbeat(a);
+      expect(lostByA).toEqual([first.id]);
+      expect(a.stats).toMatchObject({ held: 1, lost: 1 });
+
+      // Ending the session also loses the lease
+      await endLiveSession(second.id);
+      await heartbeat(a);
+      expect(lostByA).toEqual([first.id, second.id]);
+      expect(a.stats.held).toBe(0);
+
+      // Released leases are free to claim right away
+      await b.release(first.id);
+      expect(await a.claim(first.id)).toBe(true);
+      await a.stop();
+      const leases = await db.select().from(liveSessionLeases).where(eq(liveSessionLeases.liveSessionId, first.id));
+      expect(leases).toEqual([]);
+      await b.stop();
+    } finally {
+      await db.delete(liveSessions).where(eq(liveSessions.userId, user!.id));
+      await db.delete(users).where(eq(users.id, user!.id));
+    }
+  });
+});
+
+describe.skipIf(!process.env.DATABASE_URL)("WorkerPool (Postgres)", () => {
+  it("should respawn a dead worker and reassign its sessions across the pool", async () => {
+    const { WorkerPool } = await import("../services/worker-pool");
+
+    const stub = new URL("./fixtures/stub-session-worker.ts", import.meta.url).href;
+    const pool = new WorkerPool(2, () => {}, stub);
+    try {
+      const sessions = ["s1", "s2", "s3"].map((name) => `${name}-${crypto.randomUUID()}`);
+      for (const sessionId of sessions) {
+        expect(await pool.startListening(sessionId, "tiktok_user", "user")).toBe(true);
+      }
+      // Least loaded first: worker 0 gets s1 and s3
+      expect(pool.stats.workers.map((worker) => worker.sessions)).toEqual([2, 1]);
+      // Already assigned: no second start
+      expect(await pool.startListening(sessions[0]!, "tiktok_user", "user")).toBe(true);
+
+      const workers = (pool as unknown as { workers: { worker: Worker }[] }).workers;
+      workers[0]!.worker.terminate();
+      await until(() => pool.stats.restarts === 1 && pool.activeConnections === 3);
+
+      const stats = pool.stats.workers;
+      expect(stats[0]!.ownerId.endsWith("/w0.1")).toBe(true);
+      expect(stats.map((worker) => worker.sessions).sort()).toEqual([1, 2]);
+
+      await pool.stopListening(sessions[1]!);
+      expect(pool.activeConnections).toBe(2);
+    } finally {
+      await pool.disconnectAll();
+    }
+  });
+});
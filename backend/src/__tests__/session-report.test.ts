@@ -0,0 +1,209 @@
+import { describe, it, expect } from "bun:test";
+import { SessionReportAggregate, type ReportRequest, type SessionReport } from "../lib/session-report";
+
+type Row = ReportRequest & { id: string };
+type Gift = { diamondCount: number | null; repeatCount: number };
+
+const TRACKS = [
+  { spotifyTrackId: "t1", trackName: "Shape of You", trackArtist: "Ed Sheeran", albumImageUrl: "https://i.scdn.co/1" },
+  { spotifyTrackId: "t2", trackName: "Levitating", trackArtist: "Dua Lipa", albumImageUrl: null },
+  { spotifyTrackId: "t3", trackName: "As It Was", trackArtist: "Harry Styles", albumImageUrl: "https://i.scdn.co/3" },
+];
+
+/** getSessionReport's queries, evaluated over rows in memory */
+function sqlReport(rows: Row[], gifts: Gift[]): SessionReport {
+  const groups = new Map<string, { row: Row; requestCount: number; viewers: Set<string> }>();
+  for (const row of rows) {
+    if (row.searchStatus !== "matched") continue;
+    const key = JSON.stringify([row.spotifyTrackId, row.trackName, row.trackArtist, row.albumImageUrl, row.playStatus]);
+    const group = groups.get(key) ?? { row, requestCount: 0, viewers: new Set<string>() };
+    group.requestCount++;
+    group.viewers.add(row.viewerUsername);
+    groups.set(key, group);
+  }
+  return {
+    tracks: [...groups.values()].map(({ row, requestCount, viewers }) => ({
+      spotifyTrackId: row.spotifyTrackId,
+      trackName: row.trackName,
+      trackArtist: row.trackArtist,
+      albumImageUrl: row.albumImageUrl,
+      playStatus: row.playStatus,
+      requestCount,
+      uniqueViewers: viewers.size,
+    })),
+    failedCount: rows.filter((r) => r.searchStatus !== "matched").length,
+    gifts: {
+      totalDiamonds: gifts.reduce<number>((n, g) => n + (g.diamondCount ?? 0) * g.repeatCount, 0),
+      giftCount: gifts.length,
+    },
+  };
+}
+
+/** Reports compare equal regardless of track order */
+function normalize(report: SessionReport): SessionReport {
+  const key = (t: SessionReport["tracks"][number]) => `${t.spotifyTrackId}|${t.albumImageUrl}|${t.playStatus}`;
+  return { ...report, tracks: [...report.tracks].sort((a, b) => key(a).localeCompare(key(b))) };
+}
+
+function pendingRow(id: string, viewer: string, searchStatus: Row["searchStatus"] = "pending"): Row {
+  return {
+    id,
+    viewerUsername: viewer,
+    spotifyTrackId: null,
+    trackName: null,
+    trackArtist: null,
+    albumImageUrl: null,
+    searchStatus,
+    playStatus: "pending",
+  };
+}
+
+describe("SessionReportAggregate", () => {
+  it("should follow a request from pending to matched to played", () => {
+    const aggregate = new SessionReportAggregate();
+    aggregate.addRequest("r1", pendingRow("r1", "alice"));
+    expect(aggregate.report().failedCount).toBe(1);
+
+    aggregate.updateRequest("r1", { ...TRACKS[0]!, searchStatus: "matched" });
+    expect(aggregate.report().failedCount).toBe(0);
+    expect(aggregate.report().tracks).toEqual([
+      { ...TRACKS[0]!, playStatus: "pending", requestCount: 1, uniqueViewers: 1 },
+    ]);
+
+    aggregate.updateRequest("r1", { playStatus: "confirmed" });
+    expect(aggregate.report().tracks).toEqual([
+      { ...TRACKS[0]!, playStatus: "confirmed", requestCount: 1, uniqueViewers: 1 },
+    ]);
+  });
+
+  it("should count distinct viewers per track and status", () => {
+    const aggregate = new SessionReportAggregate();
+    ["alice", "alice", "bob"].forEach((viewer, i) => {
+      aggregate.addRequest(`r${i}`, { ...pendingRow(`r${i}`, viewer), ...TRACKS[1]!, searchStatus: "matched" });
+    });
+    expect(aggregate.report().tracks[0]).toMatchObject({ requestCount: 3, uniqueViewers: 2 });
+
+    // alice's second request moves to confirmed: she's still pending once
+    aggregate.updateRequest("r1", { playStatus: "confirmed" });
+    expect(normalize(aggregate.report()).tracks.map((t) => [t.playStatus, t.requestCount, t.uniqueViewers])).toEqual([
+      ["confirmed", 1, 1],
+      ["pending", 2, 2],
+    ]);
+  });
+
+  it("should ignore patches for unknown requests", () => {
+    const aggregate = new SessionReportAggregate();
+    expect(aggregate.updateRequest("missing", { searchStatus: "matched" })).toBe(false);
+    expect(aggregate.report()).toEqual({ tracks: [], failedCount: 0, gifts: { totalDiamonds: 0, giftCount: 0 } });
+  });
+
+  it("should match the SQL report after any sequence of writes", () => {
+    let seed = 7;
+    const random = () => {
+      seed = (seed * 1_103_515_245 + 12_345) % 2 ** 31;
+      return seed / 2 ** 31;
+    };
+    const pick = <T>(items: readonly T[]): T => items[Math.floor(random() * items.length)]!;
+
+    const aggregate = new SessionReportAggregate();
+    const rows = new Map<string, Row>();
+    const gifts: Gift[] = [];
+
+    for (let i = 0; i < 5_000; i++) {
+      const r = random();
+      const ids = [...rows.keys()];
+      if (r < 0.35 || ids.length === 0) {
+        const status = pick(["pending", "pending", "pending", "rate_limited", "dropped"] as const);
+        const row = pendingRow(`r${i}`, `viewer${Math.floor(random() * 40)}`, status);
+        rows.set(row.id, row);
+        aggregate.addRequest(row.id, row);
+      } else if (r < 0.65) {
+        const id = pick(ids);
+        const patch: Partial<Row> =
+          random() < 0.7 ? { ...pick(TRACKS), searchStatus: "matched" } : { searchStatus: pick(["not_found", "error"] as const) };
+        Object.assign(rows.get(id)!, patch);
+        aggregate.updateRequest(id, patch);
+      } else if (r < 0.85) {
+        const id = pick(ids);
+        const patch = { playStatus: pick(["confirmed", "pending"] as const) };
+        Object.assign(rows.get(id)!, patch);
+        aggregate.updateRequest(id, patch);
+      } else {
+        const gift = {
+          diamondCount: random() < 0.1 ? null : Math.floor(random() * 500),
+          repeatCount: 1 + Math.floor(random() * 5),
+        };
+        gifts.push(gift);
+        aggregate.addGift(gift.diamondCount, gift.repeatCount);
+      }
+      if (i % 500 === 0) {
+        expect(normalize(aggregate.report())).toEqual(normalize(sqlReport([...rows.values()], gifts)));
+      }
+    }
+
+    for (const row of rows.values()) {
+      if (row.searchStatus === "matched" && row.playStatus === "pending") row.playStatus = "not_played";
+    }
+    aggregate.markPendingNotPlayed();
+    expect(normalize(aggregate.report())).toEqual(normalize(sqlReport([...rows.values()], gifts)));
+  });
+});
+
+describe.skipIf(!process.env.DATABASE_URL)("session report checkpoints (Postgres)", () => {
+  it("should checkpoint the same report getSessionReport computes", async () => {
+    const { db } = await import("../db/client");
+    const { users, liveSessions } = await import("../db/schema");
+    const queries = await import("../db/queries");
+    const { SessionReportTracker } = await import("../services/session-report-tracker");
+    const { SongRequestWriter } = await import("../services/song-request-writer");
+    const { eq } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "report-test" }).returning();
+    const session = await queries.createLiveSession(user!.id, "report_test");
+    try {
+      const tracker = new SessionReportTracker();
+      const writer = new SongRequestWriter(tracker);
+      await tracker.open(session.id);
+
+      for (let i = 0; i < 200; i++) {
+        const row = writer.insert({
+          liveSessionId: session.id,
+          viewerUsername: `viewer${i % 17}`,
+          rawMessage: `!play ${i}`,
+          parsedQuery: String(i),
+          searchStatus: i % 11 === 0 ? "rate_limited" : undefined,
+        });
+        if (i % 11 === 0) continue;
+        const track = TRACKS[i % TRACKS.length]!;
+        writer.update(
+          row.id,
+          i % 5 === 0
+            ? queries.searchResultPatch({ status: "not_found" })
+            : { ...track, searchStatus: "matched", matchedAt: new Date() }
+        );
+        if (i % 3 === 0) writer.update(row.id, { playStatus: "confirmed", confirmedAt: new Date() });
+      }
+      for (let i = 0; i < 10; i++) {
+        const gift = await queries.logGiftEvent(session.id, `viewer${i}`, 5655, "Rose", i === 3 ? null : i * 10, 1 + (i % 3));
+        tracker.addGift(session.id, gift.diamondCount, gift.repeatCount);
+      }
+      await writer.flush();
+      await queries.markPendingNotPlayed(session.id);
+      await tracker.close(session.id);
+
+      const expected = normalize(await queries.getSessionReport(session.id));
+      const checkpoint = await queries.getCheckpointedSessionReport(session.id);
+      expect(normalize(checkpoint!.report)).toEqual(expected);
+
+      // A restarted process rebuilds the same aggregate
+      const rebuilt = new SessionReportTracker();
+      await rebuilt.open(session.id);
+      await rebuilt.close(session.id);
+      expect(normalize((await queries.getCheckpointedSessionReport(session.id))!.report)).toEqual(expected);
+    } finally {
+      // live_session doesn't cascade from user; its rows cascade from it
+      await db.delete(liveSessions).where(eq(liveSessions.id, session.id));
+      await db.delete(users).where(eq(users.id, user!.id));
+    }
+  });
+});
@@ -0,0 +1,142 @@
+import { describe, it, expect } from "bun:test";
+
+const request = (liveSessionId: string, query: string) => ({
+  liveSessionId,
+  viewerUsername: "viewer",
+  rawMessage: `!play ${query}`,
+  parsedQuery: query,
+});
+
+describe.skipIf(!process.env.DATABASE_URL)("SongRequestWriter (Postgres)", () => {
+  it("should merge patches into buffered inserts and batch the rest as one update", async () => {
+    const { db } = await import("../db/client");
+    const { users, liveSessions, songRequests } = await import("../db/schema");
+    const queries = await import("../db/queries");
+    const { SongRequestWriter } = await import("../services/song-request-writer");
+    const { eq } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "writer-test" }).returning();
+    const session = await queries.createLiveSession(user!.id, "writer_test");
+    try {
+      const seen: string[] = [];
+      const writer = new SongRequestWriter({
+        inserted: (row) => seen.push(`insert ${row.parsedQuery}`),
+        updated: (_id, patch) => seen.push(`update ${Object.keys(patch).join(",")}`),
+      });
+      const rows = ["one", "two", "three"].map((query) => writer.insert(request(session.id, query)));
+      writer.update(rows[0]!.id, queries.searchResultPatch({ status: "not_found" }));
+      writer.update(rows[1]!.id, { playStatus: "confirmed" });
+      writer.update(rows[1]!.id, { confirmedAt: new Date() });
+      await writer.flush();
+
+      // Patches to buffered rows cost nothing extra
+      expect(writer.stats).toMatchObject({ flushes: 1, flushedRows: 3, pendingInserts: 0, pendingUpdates: 0 });
+      expect(seen).toEqual([
+        "insert one",
+        "insert two",
+        "insert three",
+        "update searchStatus",
+        "update playStatus",
+        "update confirmedAt",
+      ]);
+
+      // Patches to flushed rows merge per row and go out together
+      writer.update(rows[2]!.id, { searchStatus: "error" });
+      writer.update(rows[0]!.id, { playStatus: "not_played" });
+      writer.update(rows[2]!.id, { playStatus: "not_played" });
+      expect(writer.stats.pendingUpdates).toBe(2);
+      await writer.flush();
+      expect(writer.stats).toMatchObject({ flushes: 2, flushedRows: 5 });
+
+      const saved = new Map(
+        (await db.select().from(songRequests).where(eq(songRequests.liveSessionId, session.id))).map((row) => [
+          row.parsedQuery,
+          row,
+        ])
+      );
+      expect(saved.get("one")).toMatchObject({ searchStatus: "not_found", playStatus: "not_played" });
+      expect(saved.get("two")?.playStatus).toBe("confirmed");
+      expect(saved.get("two")?.confirmedAt).not.toBeNull();
+      expect(saved.get("three")).toMatchObject({ searchStatus: "error", playStatus: "not_played" });
+    } finally {
+      await db.delete(liveSessions).where(eq(liveSessions.id, session.id));
+      await db.delete(users).where(eq(users.id, user!.id));
+    }
+  });
+
+  it("should keep a failed batch buffered, reject drain until it lands, then save it", async () => {
+    const { db } = await import("../db/client");
+    const { users, liveSessions, songRequests } = await import("../db/schema");
+    const { SongRequestWriter } = await import("../services/song-request-writer");
+    const { eq } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "writer-test" }).returning();
+    const sessionId = crypto.randomUUID();
+    try {
+      const writer = new SongRequestWriter();
+      // No live_session row yet: every flush fails on the foreign key
+      const first = writer.insert(request(sessionId, "a"));
+      await expect(writer.flush()).rejects.toThrow();
+      expect(writer.stats).toMatchObject({ failedFlushes: 1, pendingInserts: 1, flushes: 0 });
+
+      // Writes made while failing queue up behind the failed batch
+      writer.update(first.id, { searchStatus: "not_found" });
+      const second = writer.insert(request(sessionId, "b"));
+      expect(writer.stats.pendingInserts).toBe(2);
+      await expect(writer.drain(1_500)).rejects.toThrow();
+
+      await db
+        .insert(liveSessions)
+        .values({ id: sessionId, userId: user!.id, tiktokUsername: "writer_test", startedAt: new Date() });
+      await writer.drain();
+      expect(writer.stats).toMatchObject({ pendingInserts: 0, pendingUpdates: 0, droppedRows: 0 });
+
+      const saved = await db.select().from(songRequests).where(eq(songRequests.liveSessionId, sessionId));
+      expect(saved.map((row) => [row.id, row.searchStatus]).sort()).toEqual(
+        [
+          [first.id, "not_found"],
+          [second.id, "pending"],
+        ].sort()
+      );
+    } finally {
+      await db.delete(liveSessions).where(eq(liveSessions.id, sessionId));
+      await db.delete(users).where(eq(users.id, user!.id));
+    }
+  });
+
+  it("should apply merged patches when a retried insert finds its row already committed", async () => {
+    const { db } = await import("../db/client");
+    const { users, liveSessions, songRequests } = await import("../db/schema");
+    const queries = await import("../db/queries");
+    const { SongRequestWriter } = await import("../services/song-request-writer");
+    const { eq } = await import("drizzle-orm");
+
+    const [user] = await db.insert(users).values({ name: "writer-test" }).returning();
+    const sessionId = crypto.randomUUID();
+    try {
+      const writer = new SongRequestWriter();
+      // No live_session row yet: the first flush fails and is requeued
+      const row = writer.insert(request(sessionId, "levitating"));
+      const committed = { ...row };
+      await expect(writer.flush()).rejects.toThrow();
+      expect(writer.stats.pendingInserts).toBe(1);
+
+      // A patch lands on the requeued row, then it turns out the insert
+      // had committed after all (only the ack was lost)
+      writer.update(row.id, queries.searchResultPatch({ status: "not_found" }));
+      await db
+        .insert(liveSessions)
+        .values({ id: sessionId, userId: user!.id, tiktokUsername: "writer_test", startedAt: new Date() });
+      expect(await queries.insertSongRequests([committed])).toEqual([row.id]);
+
+      // The retry skips the duplicate and updates the existing row instead
+      await writer.drain();
+      expect(writer.stats).toMatchObject({ pendingInserts: 0, pendingUpdates: 0, droppedRows: 0 });
+      const [saved] = await db.select().from(songRequests).where(eq(songRequests.id, row.id));
+      expect(saved?.searchStatus).toBe("not_found");
+    } finally {
+      await db.delete(liveSessions).where(eq(liveSessions.id, sessionId));
+      await db.delete(users).where(eq(users.id, user!.id));
+    }
+  });
+});
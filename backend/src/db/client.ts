@@ -8,5 +8,10 @@ if (!connectionString) {
   throw new Error("DATABASE_URL is required");
 }
 
-const client = postgres(connectionString);
-export const db = drizzle(client, { schema });
+// Raw client for what drizzle can't express (COPY, partition DDL)
+// Each session worker has its own pool, so keep DATABASE_POOL_MAX modest
+// when WORKER_COUNT is high
+export const pgClient = postgres(connectionString, {
+  max: Number(process.env.DATABASE_POOL_MAX ?? 10),
+});
+export const db = drizzle(pgClient, { schema });
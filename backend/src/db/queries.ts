@@ -1,26 +1,52 @@
-import { db } from "./client";
+import { Readable } from "node:stream";
+import { pipeline } from "node:stream/promises";
+import { db, pgClient } from "./client";
 import {
   sessions,
   users,
   liveSessions,
+  liveSessionLeases,
   queueItems,
   songRequests,
   giftEvents,
-  tiktokRawEvents,
+  tiktokEventRollups,
+  retentionCheckpoints,
+  dashboardEventPayloads,
+  overlayTokens,
+  rateLimitPolicies,
+  viewerRateLimits,
+  sessionReports,
+  sessionSnapshots,
+  dailyStats,
+  dailyTrackStats,
+  dailyViewerStats,
 } from "./schema";
-import { eq, and, gt, gte, desc, sql, count, countDistinct } from "drizzle-orm";
+import { eq, and, or, gt, gte, lt, lte, asc, desc, isNull, isNotNull, sql, count, countDistinct, getTableColumns, type SQL } from "drizzle-orm";
+import type { AnyPgColumn } from "drizzle-orm/pg-core";
+import type { SessionReport, ReportRequest } from "../lib/session-report";
+import type { KeysetCursor } from "../lib/keyset-cursor";
+import { logger } from "../lib/logger";
 import type {
   User,
   LiveSession,
   QueueItem,
   SongRequest,
   GiftEvent,
+  TikTokEventRollup,
+  RetentionCheckpoint,
+  SessionSnapshot,
+  DailyStats,
 } from "./schema";
 
+/** The db, or a transaction on it */
+type Executor = Pick<typeof db, "select" | "insert" | "execute">;
+
 /**
- * Validate session token and return user
+ * Validate session token and return its user and expiry
  */
-export async function getUserFromSessionToken(sessionToken: string): Promise<User | null> {
+export async function getUserFromSessionToken(
+  sessionToken: string
+): Promise<{ user: User; expires: Date } | null> {
   const result = await db
     .select({
       user: users,
@@ -36,7 +62,8 @@ export async function getUserFromSessionToken(sessionToken: string): Promise<Use
     )
     .limit(1);
 
-  return result[0]?.user ?? null;
+  const row = result[0];
+  return row ? { user: row.user, expires: row.session.expires } : null;
 }
 
 /**
@@ -52,6 +79,21 @@ export async function getUserTiktokUsername(userId: string): Promise<string | nu
   return user?.tiktokUsername ?? null;
 }
 
+type LiveSessionListener = (userId: string) => void;
+const liveSessionListeners: LiveSessionListener[] = [];
+
+/**
+ * Register a callback for when one of a user's live sessions starts or ends
+ * through this process (used to invalidate cached lookups).
+ */
+export function onLiveSessionChange(listener: LiveSessionListener): void {
+  liveSessionListeners.push(listener);
+}
+
+function notifyLiveSessionChange(userId: string): void {
+  for (const listener of liveSessionListeners) listener(userId);
+}
+
 /**
  * Get active session for a user
  */
@@ -98,20 +140,32 @@ export async function createLiveSession(
     .returning();
 
   if (!session) throw new Error("Failed to create session");
+  notifyLiveSessionChange(userId);
   return session;
 }
 
 /**
- * End a live session
+ * End a live session (no-op if it already ended) and snapshot it for
+ * analytics. A failed snapshot is retried by the analytics sweep.
  */
 export async function endLiveSession(sessionId: string): Promise<void> {
-  await db
+  const ended = await db
     .update(liveSessions)
     .set({
       status: "ended",
       endedAt: new Date(),
     })
-    .where(eq(liveSessions.id, sessionId));
+    .where(and(eq(liveSessions.id, sessionId), eq(liveSessions.status, "active")))
+    .returning({ userId: liveSessions.userId });
+
+  for (const { userId } of ended) notifyLiveSessionChange(userId);
+  if (ended.length === 0) return;
+
+  try {
+    await snapshotSession(sessionId);
+  } catch (err) {
+    logger.error("Failed to snapshot ended session", { sessionId, error: String(err) });
+  }
 }
 
 /**
@@ -131,110 +185,70 @@ export async function getQueueForSession(sessionId: string): Promise<QueueItem[]
 }
 
 /**
- * Add item to queue
- */
-export async function addQueueItem(
-  sessionId: string,
-  item: {
-    viewerUsername: string | null;
-    spotifyTrackId: string;
-    trackTitle: string;
-    trackArtist: string;
-  }
-): Promise<QueueItem> {
-  // Get next position
-  const existing = await db
-    .select()
-    .from(queueItems)
-    .where(eq(queueItems.liveSessionId, sessionId));
-
-  const position = existing.length;
-
-  const [queueItem] = await db
-    .insert(queueItems)
-    .values({
-      liveSessionId: sessionId,
-      viewerUsername: item.viewerUsername,
-      spotifyTrackId: item.spotifyTrackId,
-      trackTitle: item.trackTitle,
-      trackArtist: item.trackArtist,
-      status: "queued",
-      position,
-      requestedAt: new Date(),
-    })
-    .returning();
-
-  if (!queueItem) throw new Error("Failed to add queue item");
-  return queueItem;
-}
-
-/**
- * Remove/skip item from queue
+ * Write queue items (new or changed), as one multi-row upsert. Only status
+ * and position change after insert.
  */
-export async function skipQueueItem(itemId: string): Promise<void> {
+export async function upsertQueueItems(rows: QueueItem[]): Promise<void> {
+  if (rows.length === 0) return;
   await db
-    .update(queueItems)
-    .set({ status: "skipped" })
-    .where(eq(queueItems.id, itemId));
+    .insert(queueItems)
+    .values(rows)
+    .onConflictDoUpdate({
+      target: queueItems.id,
+      set: { status: sql`excluded.status`, position: sql`excluded.position` },
+    });
 }
 
 // ============ Song Request Logging Queries ============
 
 /**
- * Dedup check: find a recent request with same session + viewer + query
- * within the given window (default 5s). Returns the row if exists.
+ * Recent requests for a session within the given window (default 5s),
+ * used to seed the in-memory dedup window on session recovery.
  */
-export async function findRecentDuplicate(
+export async function getRecentRequestKeys(
   sessionId: string,
-  viewerUsername: string,
-  parsedQuery: string,
   windowMs = 5000
-): Promise<SongRequest | null> {
+): Promise<{ viewerUsername: string; parsedQuery: string; requestedAt: Date }[]> {
   const cutoff = new Date(Date.now() - windowMs);
-  const [existing] = await db
-    .select()
+  return db
+    .select({
+      viewerUsername: songRequests.viewerUsername,
+      parsedQuery: songRequests.parsedQuery,
+      requestedAt: songRequests.requestedAt,
+    })
     .from(songRequests)
     .where(
       and(
         eq(songRequests.liveSessionId, sessionId),
-        eq(songRequests.viewerUsername, viewerUsername),
-        eq(songRequests.parsedQuery, parsedQuery),
         gte(songRequests.requestedAt, cutoff)
       )
     )
-    .limit(1);
-
-  return existing ?? null;
+    .orderBy(songRequests.requestedAt);
 }
 
 /**
- * Insert a new song request row with initial pending status.
+ * Columns that change after a request row is created (search result and
+ * play confirmation). Unset fields are left untouched.
  */
-export async function logSongRequest(
-  sessionId: string,
-  viewerUsername: string,
-  rawMessage: string,
-  parsedQuery: string
-): Promise<SongRequest> {
-  const [request] = await db
-    .insert(songRequests)
-    .values({
-      liveSessionId: sessionId,
-      viewerUsername,
-      rawMessage,
-      parsedQuery,
-      searchStatus: "pending",
-      playStatus: "pending",
-      requestedAt: new Date(),
-    })
-    .returning();
-
-  if (!request) throw new Error("Failed to log song request");
-  return request;
-}
+export type SongRequestPatch = Partial<
+  Pick<
+    SongRequest,
+    | "spotifyTrackId"
+    | "trackName"
+    | "trackArtist"
+    | "albumName"
+    | "albumImageUrl"
+    | "durationMs"
+    | "spotifyUri"
+    | "searchStatus"
+    | "playStatus"
+    | "matchedAt"
+    | "confirmedAt"
+  >
+>;
 
 /**
- * Update a request after Spotify search completes.
+ * Outcome of a Spotify search for a request.
  * Discriminated union: matched result sets track columns, failed result sets status only.
  */
 export type SearchResult =
@@ -252,55 +266,115 @@ export type SearchResult =
     }
   | { status: "not_found" | "error" | "rate_limited" };
 
-export async function updateRequestAfterSearch(
-  requestId: string,
-  result: SearchResult
-): Promise<void> {
-  if (result.status === "matched") {
-    await db
-      .update(songRequests)
-      .set({
-        spotifyTrackId: result.track.id,
-        trackName: result.track.name,
-        trackArtist: result.track.artist,
-        albumName: result.track.albumName,
-        albumImageUrl: result.track.albumImageUrl,
-        durationMs: result.track.durationMs,
-        spotifyUri: result.track.uri,
-        searchStatus: "matched",
-        matchedAt: new Date(),
-      })
-      .where(eq(songRequests.id, requestId));
-  } else {
-    await db
-      .update(songRequests)
-      .set({ searchStatus: result.status })
-      .where(eq(songRequests.id, requestId));
-  }
+/**
+ * Convert a search result into the row patch it implies.
+ */
+export function searchResultPatch(result: SearchResult): SongRequestPatch {
+  if (result.status !== "matched") return { searchStatus: result.status };
+
+  return {
+    spotifyTrackId: result.track.id,
+    trackName: result.track.name,
+    trackArtist: result.track.artist,
+    albumName: result.track.albumName,
+    albumImageUrl: result.track.albumImageUrl,
+    durationMs: result.track.durationMs,
+    spotifyUri: result.track.uri,
+    searchStatus: "matched",
+    matchedAt: new Date(),
+  };
+}
+
+/**
+ * Multi-row insert of fully-formed song request rows (ids assigned by caller).
+ * Rows whose id already exists are skipped, so a batch retried after a
+ * commit whose ack was lost doesn't fail; returns the ids actually inserted.
+ */
+export async function insertSongRequests(rows: SongRequest[]): Promise<string[]> {
+  if (rows.length === 0) return [];
+  const inserted = await db
+    .insert(songRequests)
+    .values(rows)
+    .onConflictDoNothing({ target: songRequests.id })
+    .returning({ id: songRequests.id });
+  return inserted.map((row) => row.id);
 }
 
 /**
- * Update play status (confirmed or not_played).
+ * Apply many row patches in a single UPDATE ... FROM (VALUES ...) statement.
  */
-export async function updatePlayStatus(
-  requestId: string,
-  status: "confirmed" | "not_played"
+export async function applySongRequestPatches(
+  patches: [id: string, patch: SongRequestPatch][]
 ): Promise<void> {
-  await db
+  if (patches.length === 0) return;
+
+  const values = sql.join(
+    patches.map(
+      ([id, p]) => sql`(
+        ${id}::text,
+        ${p.searchStatus ?? null}::text,
+        ${p.playStatus ?? null}::text,
+        ${p.spotifyTrackId ?? null}::text,
+        ${p.trackName ?? null}::text,
+        ${p.trackArtist ?? null}::text,
+        ${p.albumName ?? null}::text,
+        ${p.albumImageUrl ?? null}::text,
+        ${p.durationMs ?? null}::integer,
+        ${p.spotifyUri ?? null}::text,
+        ${p.matchedAt?.toISOString() ?? null}::timestamp,
+        ${p.confirmedAt?.toISOString() ?? null}::timestamp
+      )`
+    ),
+    sql`, `
+  );
+
+  await db.execute(sql`
+    UPDATE ${songRequests} AS s SET
+      search_status = COALESCE(v.search_status, s.search_status),
+      play_status = COALESCE(v.play_status, s.play_status),
+      spotify_track_id = COALESCE(v.spotify_track_id, s.spotify_track_id),
+      track_name = COALESCE(v.track_name, s.track_name),
+      track_artist = COALESCE(v.track_artist, s.track_artist),
+      album_name = COALESCE(v.album_name, s.album_name),
+      album_image_url = COALESCE(v.album_image_url, s.album_image_url),
+      duration_ms = COALESCE(v.duration_ms, s.duration_ms),
+      spotify_uri = COALESCE(v.spotify_uri, s.spotify_uri),
+      matched_at = COALESCE(v.matched_at, s.matched_at),
+      confirmed_at = COALESCE(v.confirmed_at, s.confirmed_at)
+    FROM (VALUES ${values}) AS v(
+      id, search_status, play_status, spotify_track_id, track_name, track_artist,
+      album_name, album_image_url, duration_ms, spotify_uri, matched_at, confirmed_at
+    )
+    WHERE s.id = v.id
+  `);
+}
+
+/**
+ * Mark every still-pending matched request of a session as not_played.
+ * Returns the number of rows finalized.
+ */
+export async function markPendingNotPlayed(sessionId: string): Promise<number> {
+  const rows = await db
     .update(songRequests)
-    .set({
-      playStatus: status,
-      ...(status === "confirmed" ? { confirmedAt: new Date() } : {}),
-    })
-    .where(eq(songRequests.id, requestId));
+    .set({ playStatus: "not_played" })
+    .where(
+      and(
+        eq(songRequests.liveSessionId, sessionId),
+        eq(songRequests.playStatus, "pending"),
+        eq(songRequests.searchStatus, "matched")
+      )
+    )
+    .returning({ id: songRequests.id });
+
+  return rows.length;
 }
 
 /**
- * Get all pending requests that were matched (for poller to check against
- * recently-played).
+ * Get pending requests that were matched, oldest first (for poller to
+ * check against recently-played, and for the request priority queue).
  */
-export async function getPendingRequests(sessionId: string): Promise<SongRequest[]> {
-  return db
+export async function getPendingRequests(sessionId: string, limit?: number): Promise<SongRequest[]> {
+  const query = db
     .select()
     .from(songRequests)
     .where(
@@ -309,28 +383,31 @@ export async function getPendingRequests(sessionId: string): Promise<SongRequest
         eq(songRequests.playStatus, "pending"),
         eq(songRequests.searchStatus, "matched")
       )
-    );
+    )
+    .orderBy(asc(songRequests.requestedAt));
+  return limit === undefined ? query : query.limit(limit);
 }
 
 /**
- * Get requests for a session, paginated by cursor (requestedAt desc).
+ * Get requests for a session, newest first, one page before `before`
+ * (keyset on (requestedAt, id), read backwards along
+ * song_request_session_requested_idx).
  */
 export async function getRequestsForSession(
   sessionId: string,
-  beforeDate?: Date,
+  before: KeysetCursor | null = null,
   limit = 50
 ): Promise<SongRequest[]> {
-  const conditions = [eq(songRequests.liveSessionId, sessionId)];
-  if (beforeDate) {
-    // Use < for cursor pagination (strictly before)
-    conditions.push(sql`${songRequests.requestedAt} < ${beforeDate}`);
-  }
-
   return db
     .select()
     .from(songRequests)
-    .where(and(...conditions))
-    .orderBy(desc(songRequests.requestedAt))
+    .where(
+      and(
+        eq(songRequests.liveSessionId, sessionId),
+        beforeCursor(songRequests.requestedAt, songRequests.id, before)
+      )
+    )
+    .orderBy(desc(songRequests.requestedAt), desc(songRequests.id))
     .limit(limit);
 }
 
@@ -363,38 +440,537 @@ export async function logGiftEvent(
 }
 
 /**
- * Get all gift events for a session.
+ * Get gift events for a session, newest first, one page before `before`
+ * (keyset on (receivedAt, id), like getRequestsForSession).
  */
-export async function getGiftEventsForSession(sessionId: string): Promise<GiftEvent[]> {
+export async function getGiftEventsForSession(
+  sessionId: string,
+  before: KeysetCursor | null = null,
+  limit = 50
+): Promise<GiftEvent[]> {
   return db
     .select()
     .from(giftEvents)
-    .where(eq(giftEvents.liveSessionId, sessionId))
-    .orderBy(desc(giftEvents.receivedAt));
+    .where(and(eq(giftEvents.liveSessionId, sessionId), beforeCursor(giftEvents.receivedAt, giftEvents.id, before)))
+    .orderBy(desc(giftEvents.receivedAt), desc(giftEvents.id))
+    .limit(limit);
+}
+
+/** (column, id) strictly after a keyset cursor (true without one) */
+function afterCursor(column: AnyPgColumn, idColumn: AnyPgColumn, cursor: KeysetCursor | null): SQL {
+  if (!cursor) return sql`true`;
+  return sql`(${column}, ${idColumn}) > (${cursor.at.toISOString()}::timestamp, ${cursor.id})`;
+}
+
+/** (column, id) strictly before a keyset cursor (true without one) */
+function beforeCursor(column: AnyPgColumn, idColumn: AnyPgColumn, cursor: KeysetCursor | null): SQL {
+  if (!cursor) return sql`true`;
+  return sql`(${column}, ${idColumn}) < (${cursor.at.toISOString()}::timestamp, ${cursor.id})`;
 }
 
 /**
- * Batch-insert raw TikTok events.
+ * Raw TikTok event row as buffered before insert.
  */
-export async function logRawTikTokEvents(
-  batch: {
-    liveSessionId: string;
-    eventType: string;
-    viewerUsername: string | null;
-    payload: unknown;
-  }[]
-): Promise<void> {
+export interface RawTikTokEventInput {
+  liveSessionId: string;
+  eventType: string;
+  viewerUsername: string | null;
+  /** Pre-serialized JSON (see projectRawEvent) */
+  payload: string;
+  receivedAt: Date;
+}
+
+const COPY_CHUNK_ROWS = 500;
+
+/**
+ * Bulk-load raw TikTok events with COPY FROM STDIN. Payloads are already
+ * JSON and go in as-is; ids are UUIDv7 stamped with the receive time so
+ * each daily partition's index is appended to in order.
+ */
+export async function logRawTikTokEvents(batch: RawTikTokEventInput[]): Promise<void> {
   if (batch.length === 0) return;
 
-  await db.insert(tiktokRawEvents).values(
-    batch.map((e) => ({
-      liveSessionId: e.liveSessionId,
-      eventType: e.eventType,
-      viewerUsername: e.viewerUsername,
-      payload: e.payload,
-      receivedAt: new Date(),
-    }))
+  const copy = await pgClient`
+    COPY tiktok_raw_event (id, live_session_id, event_type, viewer_username, payload, received_at)
+    FROM STDIN
+  `.writable();
+  await pipeline(Readable.from(copyChunks(batch)), copy);
+}
+
+function* copyChunks(batch: RawTikTokEventInput[]): Generator<string> {
+  for (let i = 0; i < batch.length; i += COPY_CHUNK_ROWS) {
+    let chunk = "";
+    for (const e of batch.slice(i, i + COPY_CHUNK_ROWS)) {
+      chunk +=
+        Bun.randomUUIDv7("hex", e.receivedAt) +
+        "\t" + copyText(e.liveSessionId) +
+        "\t" + copyText(e.eventType) +
+        "\t" + copyText(e.viewerUsername) +
+        "\t" + copyText(e.payload) +
+        "\t" + e.receivedAt.toISOString() +
+        "\n";
+    }
+    yield chunk;
+  }
+}
+
+const COPY_ESCAPES: Record<string, string> = { "\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t" };
+
+/**
+ * Escape a value for COPY text format.
+ */
+function copyText(value: string | null): string {
+  if (value === null) return "\\N";
+  return value.replace(/[\\\n\r\t]/g, (ch) => COPY_ESCAPES[ch]!);
+}
+
+const RAW_EVENT_PARTITION_PREFIX = "tiktok_raw_event_p";
+
+/**
+ * Whether tiktok_raw_event has been converted to a partitioned table.
+ */
+export async function isRawEventTablePartitioned(): Promise<boolean> {
+  const rows = await pgClient<{ partitioned: boolean }[]>`
+    select exists (
+      select 1 from pg_partitioned_table where partrelid = to_regclass('tiktok_raw_event')
+    ) as partitioned
+  `;
+  return rows[0]?.partitioned === true;
+}
+
+/**
+ * Daily partitions of tiktok_raw_event, oldest first, with their UTC day.
+ */
+export async function listRawEventPartitions(): Promise<{ name: string; day: Date }[]> {
+  const rows = await pgClient<{ name: string }[]>`
+    select c.relname as name
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = to_regclass('tiktok_raw_event')
+      and c.relname like ${RAW_EVENT_PARTITION_PREFIX + "%"}
+    order by c.relname
+  `;
+  return rows.map(({ name }) => {
+    const ymd = name.slice(RAW_EVENT_PARTITION_PREFIX.length);
+    return {
+      name,
+      day: new Date(Date.UTC(Number(ymd.slice(0, 4)), Number(ymd.slice(4, 6)) - 1, Number(ymd.slice(6, 8)))),
+    };
+  });
+}
+
+/**
+ * Create the daily partition covering the UTC day of `day`.
+ */
+export async function createRawEventPartition(day: Date): Promise<string> {
+  const start = new Date(Date.UTC(day.getUTCFullYear(), day.getUTCMonth(), day.getUTCDate()));
+  const end = new Date(start.getTime() + 86_400_000);
+  const name = RAW_EVENT_PARTITION_PREFIX + start.toISOString().slice(0, 10).replaceAll("-", "");
+
+  await pgClient.unsafe(
+    `create table if not exists ${name} partition of tiktok_raw_event ` +
+      `for values from ('${start.toISOString()}') to ('${end.toISOString()}')`
   );
+  return name;
+}
+
+/**
+ * Upsert per-second event rollups, adding to any counts already stored for
+ * the same (session, event type, second).
+ */
+export async function upsertEventRollups(rows: TikTokEventRollup[]): Promise<void> {
+  if (rows.length === 0) return;
+
+  await db
+    .insert(tiktokEventRollups)
+    .values(rows)
+    .onConflictDoUpdate({
+      target: [tiktokEventRollups.liveSessionId, tiktokEventRollups.eventType, tiktokEventRollups.bucketStart],
+      set: {
+        eventCount: sql`${tiktokEventRollups.eventCount} + excluded.event_count`,
+        valueSum: sql`${tiktokEventRollups.valueSum} + excluded.value_sum`,
+        valueMax: sql`GREATEST(${tiktokEventRollups.valueMax}, excluded.value_max)`,
+      },
+    });
+}
+
+/**
+ * Drop a raw event partition (detached first so the parent isn't locked
+ * for the duration of the drop).
+ */
+export async function dropRawEventPartition(name: string): Promise<void> {
+  await pgClient.unsafe(`alter table tiktok_raw_event detach partition ${name}`);
+  await pgClient.unsafe(`drop table ${name}`);
+}
+
+// ============ Session leases ============
+
+/**
+ * Claim (or re-claim) a session for `ownerId`. Succeeds if the session has
+ * no lease, the lease expired, or `ownerId` already holds it. Expiry is
+ * computed on the DB clock so instances with skewed clocks agree.
+ */
+export async function claimSessionLease(sessionId: string, ownerId: string, ttlMs: number): Promise<boolean> {
+  const rows = await db.execute(sql`
+    insert into live_session_lease (live_session_id, owner_id, expires_at, heartbeat_at)
+    values (${sessionId}, ${ownerId}, now() + ${ttlMs} * interval '1 millisecond', now())
+    on conflict (live_session_id) do update
+      set owner_id = excluded.owner_id,
+          expires_at = excluded.expires_at,
+          heartbeat_at = excluded.heartbeat_at
+      where live_session_lease.owner_id = excluded.owner_id
+         or live_session_lease.expires_at < now()
+    returning live_session_id
+  `);
+  return rows.length > 0;
+}
+
+/**
+ * Extend every lease held by `ownerId` whose session is still active.
+ * Returns the session ids still held; anything missing was lost (taken
+ * over after expiry) or its session has ended.
+ */
+export async function renewSessionLeases(ownerId: string, ttlMs: number): Promise<string[]> {
+  const rows = await db.execute<{ live_session_id: string }>(sql`
+    update live_session_lease l
+    set expires_at = now() + ${ttlMs} * interval '1 millisecond', heartbeat_at = now()
+    from live_session s
+    where l.owner_id = ${ownerId}
+      and s.id = l.live_session_id
+      and s.status = 'active'
+    returning l.live_session_id
+  `);
+  return rows.map((r) => r.live_session_id);
+}
+
+export async function releaseSessionLease(sessionId: string, ownerId: string): Promise<void> {
+  await db
+    .delete(liveSessionLeases)
+    .where(and(eq(liveSessionLeases.liveSessionId, sessionId), eq(liveSessionLeases.ownerId, ownerId)));
+}
+
+export async function releaseLeasesForOwner(ownerId: string): Promise<void> {
+  await db.delete(liveSessionLeases).where(eq(liveSessionLeases.ownerId, ownerId));
+}
+
+/**
+ * Active sessions nobody is listening to: no lease, or an expired one.
+ */
+export async function getOrphanedSessions(limit: number): Promise<LiveSession[]> {
+  const rows = await db
+    .select({ session: liveSessions })
+    .from(liveSessions)
+    .leftJoin(liveSessionLeases, eq(liveSessionLeases.liveSessionId, liveSessions.id))
+    .where(
+      and(
+        eq(liveSessions.status, "active"),
+        or(isNull(liveSessionLeases.liveSessionId), lt(liveSessionLeases.expiresAt, sql`now()`))
+      )
+    )
+    .orderBy(liveSessions.startedAt)
+    .limit(limit);
+  return rows.map((r) => r.session);
+}
+
+// ============ Event bus ============
+
+export async function insertEventPayload(id: string, payload: string): Promise<void> {
+  await db.insert(dashboardEventPayloads).values({ id, payload, createdAt: new Date() });
+}
+
+export async function getEventPayload(id: string): Promise<string | null> {
+  const [row] = await db
+    .select({ payload: dashboardEventPayloads.payload })
+    .from(dashboardEventPayloads)
+    .where(eq(dashboardEventPayloads.id, id))
+    .limit(1);
+  return row?.payload ?? null;
+}
+
+export async function deleteEventPayloadsBefore(before: Date): Promise<void> {
+  await db.delete(dashboardEventPayloads).where(lt(dashboardEventPayloads.createdAt, before));
+}
+
+// ============ Overlay ============
+
+export async function getOverlayTokenForUser(userId: string): Promise<string | null> {
+  const [row] = await db
+    .select({ token: overlayTokens.token })
+    .from(overlayTokens)
+    .where(eq(overlayTokens.userId, userId))
+    .limit(1);
+  return row?.token ?? null;
+}
+
+export async function getUserIdForOverlayToken(token: string): Promise<string | null> {
+  const [row] = await db
+    .select({ userId: overlayTokens.userId })
+    .from(overlayTokens)
+    .where(eq(overlayTokens.token, token))
+    .limit(1);
+  return row?.userId ?? null;
+}
+
+/**
+ * Issue a new overlay token for a user, replacing any existing one.
+ */
+export async function rotateOverlayToken(userId: string): Promise<string> {
+  const token = Buffer.from(crypto.getRandomValues(new Uint8Array(24))).toString("base64url");
+  await db
+    .insert(overlayTokens)
+    .values({ token, userId, createdAt: new Date() })
+    .onConflictDoUpdate({ target: overlayTokens.userId, set: { token, createdAt: new Date() } });
+  return token;
+}
+
+/**
+ * The session's most recently confirmed (now playing) request
+ */
+export async function getNowPlayingRequest(sessionId: string): Promise<SongRequest | null> {
+  const [nowPlaying] = await db
+    .select()
+    .from(songRequests)
+    .where(
+      and(
+        eq(songRequests.liveSessionId, sessionId),
+        eq(songRequests.playStatus, "confirmed"),
+        isNotNull(songRequests.confirmedAt)
+      )
+    )
+    .orderBy(desc(songRequests.confirmedAt))
+    .limit(1);
+  return nowPlaying ?? null;
+}
+
+/**
+ * Diamonds per viewer from gifts received since `since`
+ */
+export async function getViewerDiamondsSince(
+  sessionId: string,
+  since: Date
+): Promise<{ viewerUsername: string; diamonds: number; lastGiftAt: Date }[]> {
+  const rows = await db
+    .select({
+      viewerUsername: giftEvents.viewerUsername,
+      diamonds: sql<string>`COALESCE(SUM(${giftEvents.diamondCount} * ${giftEvents.repeatCount}), 0)`,
+      lastGiftAt: sql<string>`MAX(${giftEvents.receivedAt})`,
+    })
+    .from(giftEvents)
+    .where(and(eq(giftEvents.liveSessionId, sessionId), gte(giftEvents.receivedAt, since)))
+    .groupBy(giftEvents.viewerUsername);
+  return rows.map((r) => ({
+    viewerUsername: r.viewerUsername,
+    diamonds: Number(r.diamonds),
+    lastGiftAt: new Date(r.lastGiftAt),
+  }));
+}
+
+// ============ Rate limits ============
+
+export async function getRateLimitPolicy(userId: string): Promise<unknown | null> {
+  const [row] = await db
+    .select({ policy: rateLimitPolicies.policy })
+    .from(rateLimitPolicies)
+    .where(eq(rateLimitPolicies.userId, userId))
+    .limit(1);
+  return row?.policy ?? null;
+}
+
+export async function setRateLimitPolicy(userId: string, policy: unknown): Promise<void> {
+  await db
+    .insert(rateLimitPolicies)
+    .values({ userId, policy, updatedAt: new Date() })
+    .onConflictDoUpdate({ target: rateLimitPolicies.userId, set: { policy, updatedAt: new Date() } });
+}
+
+export interface ViewerRateLimitState {
+  a: number;
+  b: number;
+  at: number;
+  bonus: number;
+  bonusUntil: number;
+}
+
+/**
+ * Read-modify-write one viewer's limiter state under a row lock.
+ * `update` gets the current state (null if none or expired), mutates or
+ * replaces it, and returns the new state, when it expires, and a result.
+ *
+ * The row is created (already expired) before it is locked: FOR UPDATE
+ * locks nothing when there is no row, so two first requests from the same
+ * viewer would otherwise both read null and both be admitted.
+ */
+export async function updateViewerRateLimit<T>(
+  sessionId: string,
+  viewerUsername: string,
+  update: (state: ViewerRateLimitState | null) => { state: ViewerRateLimitState; expiresAt: Date; result: T }
+): Promise<T> {
+  return db.transaction(async (tx) => {
+    await tx
+      .insert(viewerRateLimits)
+      .values({ liveSessionId: sessionId, viewerUsername, a: 0, b: 0, at: 0, expiresAt: new Date(0) })
+      .onConflictDoNothing();
+
+    const [row] = await tx
+      .select()
+      .from(viewerRateLimits)
+      .where(
+        and(
+          eq(viewerRateLimits.liveSessionId, sessionId),
+          eq(viewerRateLimits.viewerUsername, viewerUsername)
+        )
+      )
+      .for("update");
+
+    const current =
+      row && row.expiresAt > new Date()
+        ? { a: row.a, b: row.b, at: row.at, bonus: row.bonus, bonusUntil: row.bonusUntil }
+        : null;
+    const { state, expiresAt, result } = update(current);
+    // Upsert: the expiry sweep may have deleted an expired row meanwhile
+    const values = { a: state.a, b: state.b, at: state.at, bonus: state.bonus, bonusUntil: state.bonusUntil, expiresAt };
+    await tx
+      .insert(viewerRateLimits)
+      .values({ liveSessionId: sessionId, viewerUsername, ...values })
+      .onConflictDoUpdate({
+        target: [viewerRateLimits.liveSessionId, viewerRateLimits.viewerUsername],
+        set: values,
+      });
+    return result;
+  });
+}
+
+export async function deleteExpiredViewerRateLimits(now: Date): Promise<number> {
+  const deleted = await db
+    .delete(viewerRateLimits)
+    .where(lt(viewerRateLimits.expiresAt, now))
+    .returning({ sessionId: viewerRateLimits.liveSessionId });
+  return deleted.length;
+}
+
+export async function countViewerRateLimits(): Promise<number> {
+  const [row] = await db.select({ n: count() }).from(viewerRateLimits);
+  return row?.n ?? 0;
+}
+
+// ============ Retention ============
+
+export type RetentionTable = "tiktok_raw_event" | "gift_event" | "song_request";
+
+/**
+ * Ended sessions older than `endedBefore` that still have rows in `table`.
+ * Sessions not yet snapshotted for analytics are left alone until they are.
+ */
+export async function getExpiredSessionIds(
+  table: RetentionTable,
+  endedBefore: Date,
+  limit: number
+): Promise<string[]> {
+  const rows = await db.execute<{ id: string }>(sql`
+    select s.id from live_session s
+    where s.status = 'ended'
+      and s.ended_at < ${endedBefore.toISOString()}::timestamp
+      and exists (select 1 from ${sql.identifier(table)} t where t.live_session_id = s.id)
+      and exists (select 1 from session_snapshot ss where ss.live_session_id = s.id)
+    order by s.ended_at
+    limit ${limit}
+  `);
+  return rows.map((r) => r.id);
+}
+
+/**
+ * Next batch of rows to archive, in id order. `source` is a retention table
+ * (filtered to `sessionId`) or a raw event partition (whole table).
+ */
+export async function fetchRowsForArchive(
+  source: string,
+  sessionId: string | null,
+  afterId: string | null,
+  limit: number
+): Promise<Record<string, unknown>[]> {
+  const rows = await db.execute<Record<string, unknown>>(sql`
+    select * from ${sql.identifier(source)}
+    where ${sessionId === null ? sql`true` : sql`live_session_id = ${sessionId}`}
+      and ${afterId === null ? sql`true` : sql`id > ${afterId}`}
+    order by id
+    limit ${limit}
+  `);
+  return [...rows];
+}
+
+export async function getRetentionCheckpoint(
+  table: string,
+  scope: string
+): Promise<RetentionCheckpoint | null> {
+  const [row] = await db
+    .select()
+    .from(retentionCheckpoints)
+    .where(and(eq(retentionCheckpoints.tableName, table), eq(retentionCheckpoints.scope, scope)))
+    .limit(1);
+  return row ?? null;
+}
+
+/**
+ * Record an archived batch. When `deleteFromSession` is set, the archived
+ * rows (id <= lastId) are deleted in the same transaction, so a crash
+ * never leaves rows both deleted and unrecorded.
+ */
+export async function commitRetentionBatch(
+  checkpoint: RetentionCheckpoint,
+  deleteFromSession: { table: RetentionTable; sessionId: string } | null
+): Promise<void> {
+  await db.transaction(async (tx) => {
+    if (deleteFromSession && checkpoint.lastId !== null) {
+      await tx.execute(sql`
+        delete from ${sql.identifier(deleteFromSession.table)}
+        where live_session_id = ${deleteFromSession.sessionId} and id <= ${checkpoint.lastId}
+      `);
+    }
+    await tx
+      .insert(retentionCheckpoints)
+      .values(checkpoint)
+      .onConflictDoUpdate({
+        target: [retentionCheckpoints.tableName, retentionCheckpoints.scope],
+        set: {
+          lastId: checkpoint.lastId,
+          archivedRows: checkpoint.archivedRows,
+          archivedBytes: checkpoint.archivedBytes,
+          completedAt: checkpoint.completedAt,
+          updatedAt: checkpoint.updatedAt,
+        },
+      });
+  });
+}
+
+const RETENTION_LOCK_KEY = "songflow:retention";
+
+/**
+ * Run `fn` under a Postgres advisory lock so only one instance runs the
+ * retention job at a time. Returns false if another instance holds it.
+ */
+export async function withRetentionLock(fn: () => Promise<void>): Promise<boolean> {
+  const conn = await pgClient.reserve();
+  try {
+    const [row] = await conn<{ locked: boolean }[]>`
+      select pg_try_advisory_lock(hashtext(${RETENTION_LOCK_KEY})) as locked
+    `;
+    if (!row?.locked) return false;
+    try {
+      await fn();
+    } finally {
+      await conn`select pg_advisory_unlock(hashtext(${RETENTION_LOCK_KEY}))`;
+    }
+    return true;
+  } finally {
+    conn.release();
+  }
+}
+
+/**
+ * Cheap connectivity probe.
+ */
+export async function pingDatabase(): Promise<void> {
+  await db.execute(sql`select 1`);
 }
 
 /**
@@ -402,9 +978,9 @@ export async function logRawTikTokEvents(
  * Only groups matched requests (searchStatus = 'matched') to avoid
  * collapsing failed requests (null spotifyTrackId) into one row.
  */
-export async function getSessionReport(sessionId: string) {
+export async function getSessionReport(sessionId: string, executor: Executor = db): Promise<SessionReport> {
   // Track-level aggregation (matched only)
-  const tracks = await db
+  const tracks = await executor
     .select({
       spotifyTrackId: songRequests.spotifyTrackId,
       trackName: songRequests.trackName,
@@ -430,7 +1006,7 @@ export async function getSessionReport(sessionId: string) {
     );
 
   // Count failed requests separately
-  const [failedResult] = await db
+  const [failedResult] = await executor
     .select({ failedCount: count(songRequests.id) })
     .from(songRequests)
     .where(
@@ -440,21 +1016,456 @@ export async function getSessionReport(sessionId: string) {
       )
     );
 
-  // Gift summary
-  const [giftSummary] = await db
+  const gifts = await getGiftTotals(sessionId, executor);
+
+  return {
+    tracks,
+    failedCount: failedResult?.failedCount ?? 0,
+    gifts,
+  };
+}
+
+// ============ Session report checkpoints ============
+
+/**
+ * Write checkpointed session reports (one multi-row upsert)
+ */
+export async function upsertSessionReports(rows: { sessionId: string; report: SessionReport }[]): Promise<void> {
+  if (rows.length === 0) return;
+  const updatedAt = new Date();
+  await db
+    .insert(sessionReports)
+    .values(rows.map((r) => ({ liveSessionId: r.sessionId, report: r.report, updatedAt })))
+    .onConflictDoUpdate({
+      target: sessionReports.liveSessionId,
+      set: { report: sql`excluded.report`, updatedAt: sql`excluded.updated_at` },
+    });
+}
+
+/**
+ * Last checkpointed report for a session, or null if none yet
+ */
+export async function getCheckpointedSessionReport(
+  sessionId: string
+): Promise<{ report: SessionReport; updatedAt: Date } | null> {
+  const [row] = await db
+    .select({ report: sessionReports.report, updatedAt: sessionReports.updatedAt })
+    .from(sessionReports)
+    .where(eq(sessionReports.liveSessionId, sessionId))
+    .limit(1);
+  return row ? { report: row.report as SessionReport, updatedAt: row.updatedAt } : null;
+}
+
+/**
+ * Every request in a session with the fields the report uses (to rebuild
+ * the report aggregate after a restart)
+ */
+export async function getReportRequests(sessionId: string): Promise<(ReportRequest & { id: string })[]> {
+  return db
+    .select({
+      id: songRequests.id,
+      viewerUsername: songRequests.viewerUsername,
+      spotifyTrackId: songRequests.spotifyTrackId,
+      trackName: songRequests.trackName,
+      trackArtist: songRequests.trackArtist,
+      albumImageUrl: songRequests.albumImageUrl,
+      searchStatus: songRequests.searchStatus,
+      playStatus: songRequests.playStatus,
+    })
+    .from(songRequests)
+    .where(eq(songRequests.liveSessionId, sessionId));
+}
+
+/**
+ * Gift totals for a session. Total diamonds counts each gift event as
+ * diamond_count × repeat_count, the same as snapshotSession and analytics.
+ */
+export async function getGiftTotals(
+  sessionId: string,
+  executor: Executor = db
+): Promise<{ totalDiamonds: number; giftCount: number }> {
+  const [totals] = await executor
     .select({
-      totalDiamonds: sql<number>`COALESCE(SUM(${giftEvents.diamondCount}), 0)`,
+      totalDiamonds: sql<number>`COALESCE(SUM(${giftEvents.diamondCount} * ${giftEvents.repeatCount}), 0)`.mapWith(Number),
       giftCount: count(giftEvents.id),
     })
     .from(giftEvents)
     .where(eq(giftEvents.liveSessionId, sessionId));
+  return { totalDiamonds: totals?.totalDiamonds ?? 0, giftCount: totals?.giftCount ?? 0 };
+}
 
-  return {
-    tracks,
-    failedCount: failedResult?.failedCount ?? 0,
-    gifts: {
-      totalDiamonds: giftSummary?.totalDiamonds ?? 0,
-      giftCount: giftSummary?.giftCount ?? 0,
-    },
-  };
+// ============ Analytics ============
+
+/**
+ * Write an ended session's snapshot and add the session to its streamer's
+ * daily rollups, in one transaction. Returns false if the session hasn't
+ * ended or already has a snapshot, so rollups are only ever added once
+ * (a concurrent snapshot of the same session waits on the insert, then
+ * does nothing).
+ */
+export async function snapshotSession(sessionId: string): Promise<boolean> {
+  return db.transaction(async (tx) => {
+    const [session] = await tx
+      .select()
+      .from(liveSessions)
+      .where(and(eq(liveSessions.id, sessionId), eq(liveSessions.status, "ended")))
+      .limit(1);
+    if (!session) return false;
+
+    const report = await getSessionReport(sessionId, tx);
+    const [requests] = await tx
+      .select({
+        requestCount: count(),
+        matchedCount: sql<number>`count(*) filter (where ${songRequests.searchStatus} = 'matched')`.mapWith(Number),
+        playedCount: sql<number>`count(*) filter (where ${songRequests.playStatus} = 'confirmed')`.mapWith(Number),
+        uniqueRequesters: countDistinct(songRequests.viewerUsername),
+      })
+      .from(songRequests)
+      .where(eq(songRequests.liveSessionId, sessionId));
+    const [gifts] = await tx
+      .select({
+        giftCount: count(),
+        totalDiamonds: sql<number>`COALESCE(SUM(${giftEvents.diamondCount} * ${giftEvents.repeatCount}), 0)`.mapWith(Number),
+      })
+      .from(giftEvents)
+      .where(eq(giftEvents.liveSessionId, sessionId));
+
+    const inserted = await tx
+      .insert(sessionSnapshots)
+      .values({
+        liveSessionId: session.id,
+        userId: session.userId,
+        tiktokUsername: session.tiktokUsername,
+        startedAt: session.startedAt,
+        endedAt: session.endedAt ?? new Date(),
+        requestCount: requests?.requestCount ?? 0,
+        matchedCount: requests?.matchedCount ?? 0,
+        playedCount: requests?.playedCount ?? 0,
+        uniqueRequesters: requests?.uniqueRequesters ?? 0,
+        giftCount: gifts?.giftCount ?? 0,
+        totalDiamonds: gifts?.totalDiamonds ?? 0,
+        report,
+        createdAt: new Date(),
+      })
+      .onConflictDoNothing()
+      .returning({ sessionId: sessionSnapshots.liveSessionId });
+    if (inserted.length === 0) return false;
+
+    // Rows count toward the UTC day they happened; the session itself
+    // toward the day it started
+    await tx.execute(sql`
+      insert into analytics_daily
+        (user_id, day, session_count, request_count, matched_count, played_count, gift_count, total_diamonds)
+      select ${session.userId}, day, sum(sessions), sum(requests), sum(matched), sum(played), sum(gifts), sum(diamonds)
+      from (
+        select ${session.startedAt.toISOString()}::timestamp::date as day,
+          1 as sessions, 0 as requests, 0 as matched, 0 as played, 0 as gifts, 0::bigint as diamonds
+        union all
+        select requested_at::date, 0, 1, (search_status = 'matched')::int, (play_status = 'confirmed')::int, 0, 0
+        from song_request where live_session_id = ${sessionId}
+        union all
+        select received_at::date, 0, 0, 0, 0, 1, coalesce(diamond_count, 0)::bigint * repeat_count
+        from gift_event where live_session_id = ${sessionId}
+      ) t
+      group by day
+      on conflict (user_id, day) do update set
+        session_count = analytics_daily.session_count + excluded.session_count,
+        request_count = analytics_daily.request_count + excluded.request_count,
+        matched_count = analytics_daily.matched_count + excluded.matched_count,
+        played_count = analytics_daily.played_count + excluded.played_count,
+        gift_count = analytics_daily.gift_count + excluded.gift_count,
+        total_diamonds = analytics_daily.total_diamonds + excluded.total_diamonds
+    `);
+    await tx.execute(sql`
+      insert into analytics_daily_track
+        (user_id, day, spotify_track_id, track_name, track_artist, album_image_url, request_count, played_count)
+      select ${session.userId}, requested_at::date, spotify_track_id,
+        max(track_name), max(track_artist), max(album_image_url),
+        count(*), count(*) filter (where play_status = 'confirmed')
+      from song_request
+      where live_session_id = ${sessionId} and search_status = 'matched' and spotify_track_id is not null
+      group by requested_at::date, spotify_track_id
+      on conflict (user_id, day, spotify_track_id) do update set
+        track_name = excluded.track_name,
+        track_artist = excluded.track_artist,
+        album_image_url = coalesce(excluded.album_image_url, analytics_daily_track.album_image_url),
+        request_count = analytics_daily_track.request_count + excluded.request_count,
+        played_count = analytics_daily_track.played_count + excluded.played_count
+    `);
+    await tx.execute(sql`
+      insert into analytics_daily_viewer
+        (user_id, day, viewer_username, request_count, matched_count, gift_count, diamonds)
+      select ${session.userId}, day, viewer_username, sum(requests), sum(matched), sum(gifts), sum(diamonds)
+      from (
+        select requested_at::date as day, viewer_username,
+          1 as requests, (search_status = 'matched')::int as matched, 0 as gifts, 0::bigint as diamonds
+        from song_request where live_session_id = ${sessionId}
+        union all
+        select received_at::date, viewer_username, 0, 0, 1, coalesce(diamond_count, 0)::bigint * repeat_count
+        from gift_event where live_session_id = ${sessionId}
+      ) t
+      group by day, viewer_username
+      on conflict (user_id, day, viewer_username) do update set
+        request_count = analytics_daily_viewer.request_count + excluded.request_count,
+        matched_count = analytics_daily_viewer.matched_count + excluded.matched_count,
+        gift_count = analytics_daily_viewer.gift_count + excluded.gift_count,
+        diamonds = analytics_daily_viewer.diamonds + excluded.diamonds
+    `);
+    return true;
+  });
+}
+
+/**
+ * Ended sessions without a snapshot, oldest first (for the analytics sweep)
+ */
+export async function getUnsnapshottedSessionIds(limit: number): Promise<string[]> {
+  const rows = await db
+    .select({ id: liveSessions.id })
+    .from(liveSessions)
+    .leftJoin(sessionSnapshots, eq(sessionSnapshots.liveSessionId, liveSessions.id))
+    .where(and(eq(liveSessions.status, "ended"), isNull(sessionSnapshots.liveSessionId)))
+    .orderBy(liveSessions.endedAt)
+    .limit(limit);
+  return rows.map((r) => r.id);
+}
+
+export type SessionSnapshotSummary = Omit<SessionSnapshot, "report">;
+
+const { report: _report, ...snapshotSummaryColumns } = getTableColumns(sessionSnapshots);
+
+/**
+ * A user's session snapshots, most recently ended first, one page before
+ * `before` (keyset on (endedAt, id)). Reports are left out; see
+ * getSessionSnapshot.
+ */
+export async function getSessionSnapshots(
+  userId: string,
+  before: KeysetCursor | null = null,
+  limit = 20
+): Promise<SessionSnapshotSummary[]> {
+  return db
+    .select(snapshotSummaryColumns)
+    .from(sessionSnapshots)
+    .where(
+      and(
+        eq(sessionSnapshots.userId, userId),
+        beforeCursor(sessionSnapshots.endedAt, sessionSnapshots.liveSessionId, before)
+      )
+    )
+    .orderBy(desc(sessionSnapshots.endedAt), desc(sessionSnapshots.liveSessionId))
+    .limit(limit);
+}
+
+export async function getSessionSnapshot(userId: string, sessionId: string): Promise<SessionSnapshot | null> {
+  const [row] = await db
+    .select()
+    .from(sessionSnapshots)
+    .where(and(eq(sessionSnapshots.liveSessionId, sessionId), eq(sessionSnapshots.userId, userId)))
+    .limit(1);
+  return row ?? null;
+}
+
+/**
+ * Snapshots of sessions that ended in [from, to), oldest first, one page
+ * after `after` (for exports)
+ */
+export async function getSessionSnapshotPage(
+  userId: string,
+  from: Date,
+  to: Date,
+  after: KeysetCursor | null,
+  limit: number
+): Promise<SessionSnapshotSummary[]> {
+  return db
+    .select(snapshotSummaryColumns)
+    .from(sessionSnapshots)
+    .where(
+      and(
+        eq(sessionSnapshots.userId, userId),
+        gte(sessionSnapshots.endedAt, from),
+        lt(sessionSnapshots.endedAt, to),
+        afterCursor(sessionSnapshots.endedAt, sessionSnapshots.liveSessionId, after)
+      )
+    )
+    .orderBy(asc(sessionSnapshots.endedAt), asc(sessionSnapshots.liveSessionId))
+    .limit(limit);
+}
+
+/**
+ * Daily rollups for `from`..`to` (inclusive YYYY-MM-DD UTC days), oldest
+ * first. Days without a session have no row.
+ */
+export async function getDailyStats(userId: string, from: string, to: string): Promise<DailyStats[]> {
+  return db
+    .select()
+    .from(dailyStats)
+    .where(and(eq(dailyStats.userId, userId), gte(dailyStats.day, from), lte(dailyStats.day, to)))
+    .orderBy(asc(dailyStats.day));
+}
+
+export interface TopTrack {
+  spotifyTrackId: string;
+  trackName: string | null;
+  trackArtist: string | null;
+  albumImageUrl: string | null;
+  requestCount: number;
+  playedCount: number;
+}
+
+/**
+ * Most requested tracks over a day range
+ */
+export async function getTopTracks(userId: string, from: string, to: string, limit: number): Promise<TopTrack[]> {
+  const requestCount = sql<number>`SUM(${dailyTrackStats.requestCount})`.mapWith(Number);
+  return db
+    .select({
+      spotifyTrackId: dailyTrackStats.spotifyTrackId,
+      trackName: sql<string | null>`MAX(${dailyTrackStats.trackName})`,
+      trackArtist: sql<string | null>`MAX(${dailyTrackStats.trackArtist})`,
+      albumImageUrl: sql<string | null>`MAX(${dailyTrackStats.albumImageUrl})`,
+      requestCount,
+      playedCount: sql<number>`SUM(${dailyTrackStats.playedCount})`.mapWith(Number),
+    })
+    .from(dailyTrackStats)
+    .where(
+      and(eq(dailyTrackStats.userId, userId), gte(dailyTrackStats.day, from), lte(dailyTrackStats.day, to))
+    )
+    .groupBy(dailyTrackStats.spotifyTrackId)
+    .orderBy(desc(requestCount), asc(dailyTrackStats.spotifyTrackId))
+    .limit(limit);
+}
+
+export interface TopViewer {
+  viewerUsername: string;
+  requestCount: number;
+  matchedCount: number;
+  giftCount: number;
+  diamonds: number;
+}
+
+/**
+ * Viewers with the most requests (or diamonds) over a day range
+ */
+export async function getTopViewers(
+  userId: string,
+  from: string,
+  to: string,
+  by: "requests" | "diamonds",
+  limit: number
+): Promise<TopViewer[]> {
+  const requestCount = sql<number>`SUM(${dailyViewerStats.requestCount})`.mapWith(Number);
+  const diamonds = sql<number>`SUM(${dailyViewerStats.diamonds})`.mapWith(Number);
+  const [primary, secondary] = by === "requests" ? [requestCount, diamonds] : [diamonds, requestCount];
+  return db
+    .select({
+      viewerUsername: dailyViewerStats.viewerUsername,
+      requestCount,
+      matchedCount: sql<number>`SUM(${dailyViewerStats.matchedCount})`.mapWith(Number),
+      giftCount: sql<number>`SUM(${dailyViewerStats.giftCount})`.mapWith(Number),
+      diamonds,
+    })
+    .from(dailyViewerStats)
+    .where(
+      and(eq(dailyViewerStats.userId, userId), gte(dailyViewerStats.day, from), lte(dailyViewerStats.day, to))
+    )
+    .groupBy(dailyViewerStats.viewerUsername)
+    .having(sql`${primary} > 0`)
+    .orderBy(desc(primary), desc(secondary), asc(dailyViewerStats.viewerUsername))
+    .limit(limit);
+}
+
+/**
+ * Distinct viewers who made a request over a day range
+ */
+export async function countUniqueRequesters(userId: string, from: string, to: string): Promise<number> {
+  const [row] = await db
+    .select({ n: countDistinct(dailyViewerStats.viewerUsername) })
+    .from(dailyViewerStats)
+    .where(
+      and(
+        eq(dailyViewerStats.userId, userId),
+        gte(dailyViewerStats.day, from),
+        lte(dailyViewerStats.day, to),
+        gt(dailyViewerStats.requestCount, 0)
+      )
+    );
+  return row?.n ?? 0;
+}
+
+/**
+ * A user's sessions overlapping [from, to), by start time, one page after
+ * `after` (for exports)
+ */
+export async function getSessionsPage(
+  userId: string,
+  from: Date,
+  to: Date,
+  after: KeysetCursor | null,
+  limit: number
+): Promise<LiveSession[]> {
+  return db
+    .select()
+    .from(liveSessions)
+    .where(
+      and(
+        eq(liveSessions.userId, userId),
+        lt(liveSessions.startedAt, to),
+        or(isNull(liveSessions.endedAt), gte(liveSessions.endedAt, from)),
+        afterCursor(liveSessions.startedAt, liveSessions.id, after)
+      )
+    )
+    .orderBy(asc(liveSessions.startedAt), asc(liveSessions.id))
+    .limit(limit);
+}
+
+/**
+ * A session's requests made in [from, to), oldest first, one page after
+ * `after`
+ */
+export async function getSongRequestPage(
+  sessionId: string,
+  from: Date,
+  to: Date,
+  after: KeysetCursor | null,
+  limit: number
+): Promise<SongRequest[]> {
+  return db
+    .select()
+    .from(songRequests)
+    .where(
+      and(
+        eq(songRequests.liveSessionId, sessionId),
+        gte(songRequests.requestedAt, from),
+        lt(songRequests.requestedAt, to),
+        afterCursor(songRequests.requestedAt, songRequests.id, after)
+      )
+    )
+    .orderBy(asc(songRequests.requestedAt), asc(songRequests.id))
+    .limit(limit);
+}
+
+/**
+ * A session's gifts received in [from, to), oldest first, one page after
+ * `after`
+ */
+export async function getGiftEventPage(
+  sessionId: string,
+  from: Date,
+  to: Date,
+  after: KeysetCursor | null,
+  limit: number
+): Promise<GiftEvent[]> {
+  return db
+    .select()
+    .from(giftEvents)
+    .where(
+      and(
+        eq(giftEvents.liveSessionId, sessionId),
+        gte(giftEvents.receivedAt, from),
+        lt(giftEvents.receivedAt, to),
+        afterCursor(giftEvents.receivedAt, giftEvents.id, after)
+      )
+    )
+    .orderBy(asc(giftEvents.receivedAt), asc(giftEvents.id))
+    .limit(limit);
 }
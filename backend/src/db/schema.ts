@@ -1,4 +1,4 @@
-import { pgTable, text, timestamp, integer, primaryKey, jsonb, index } from "drizzle-orm/pg-core";
+import { pgTable, text, timestamp, date, integer, bigint, doublePrecision, primaryKey, jsonb, index } from "drizzle-orm/pg-core";
 
 // ============ NextAuth Tables (must match frontend) ============
 
@@ -44,6 +44,17 @@ export const liveSessions = pgTable("live_session", {
   endedAt: timestamp("ended_at", { mode: "date" }),
 });
 
+// Which worker is listening to a live session. Held by heartbeat; once
+// expires_at passes, any instance may claim the session.
+export const liveSessionLeases = pgTable("live_session_lease", {
+  liveSessionId: text("live_session_id").primaryKey().references(() => liveSessions.id, { onDelete: "cascade" }),
+  ownerId: text("owner_id").notNull(),
+  expiresAt: timestamp("expires_at", { mode: "date" }).notNull(),
+  heartbeatAt: timestamp("heartbeat_at", { mode: "date" }).notNull(),
+}, (table) => ({
+  ownerIdx: index("live_session_lease_owner_idx").on(table.ownerId),
+}));
+
 export const queueItems = pgTable("queue_item", {
   id: text("id").primaryKey().$defaultFn(() => crypto.randomUUID()),
   liveSessionId: text("live_session_id").notNull().references(() => liveSessions.id, { onDelete: "cascade" }),
@@ -52,7 +63,8 @@ export const queueItems = pgTable("queue_item", {
   trackTitle: text("track_title").notNull(),
   trackArtist: text("track_artist").notNull(),
   status: text("status", { enum: ["queued", "playing", "played", "skipped", "revoked"] }).default("queued").notNull(),
-  position: integer("position").notNull(),
+  // Fractional: a reorder moves one item between its neighbours
+  position: doublePrecision("position").notNull(),
   requestedAt: timestamp("requested_at", { mode: "date" }).notNull(),
 });
 
@@ -72,7 +84,7 @@ export const songRequests = pgTable("song_request", {
   durationMs: integer("duration_ms"),
   spotifyUri: text("spotify_uri"),
   searchStatus: text("search_status", {
-    enum: ["pending", "matched", "not_found", "error", "rate_limited"],
+    enum: ["pending", "matched", "not_found", "error", "rate_limited", "dropped"],
   }).default("pending").notNull(),
   playStatus: text("play_status", {
     enum: ["pending", "confirmed", "not_played"],
@@ -81,7 +93,8 @@ export const songRequests = pgTable("song_request", {
   matchedAt: timestamp("matched_at", { mode: "date" }),
   confirmedAt: timestamp("confirmed_at", { mode: "date" }),
 }, (table) => ({
-  sessionIdx: index("song_request_session_idx").on(table.liveSessionId),
+  // Keyset pagination (and any lookup by session, as its prefix)
+  sessionRequestedIdx: index("song_request_session_requested_idx").on(table.liveSessionId, table.requestedAt, table.id),
   sessionTrackIdx: index("song_request_session_track_idx").on(table.liveSessionId, table.spotifyTrackId),
   dedupIdx: index("song_request_dedup_idx").on(table.liveSessionId, table.viewerUsername, table.parsedQuery),
 }));
@@ -96,21 +109,165 @@ export const giftEvents = pgTable("gift_event", {
   repeatCount: integer("repeat_count").default(1).notNull(),
   receivedAt: timestamp("received_at", { mode: "date" }).notNull(),
 }, (table) => ({
-  sessionIdx: index("gift_event_session_idx").on(table.liveSessionId),
+  sessionReceivedIdx: index("gift_event_session_received_idx").on(table.liveSessionId, table.receivedAt, table.id),
 }));
 
+// Range-partitioned by day on received_at (see sql/0001_partition_tiktok_raw_event.sql;
+// drizzle-kit can't declare partitioning). The partition key must be part of
+// the primary key. Ids are UUIDv7 so inserts append to the end of the index.
 export const tiktokRawEvents = pgTable("tiktok_raw_event", {
-  id: text("id").primaryKey().$defaultFn(() => crypto.randomUUID()),
+  id: text("id").notNull().$defaultFn(() => Bun.randomUUIDv7()),
   liveSessionId: text("live_session_id").notNull().references(() => liveSessions.id, { onDelete: "cascade" }),
   eventType: text("event_type").notNull(),
   viewerUsername: text("viewer_username"),
   payload: jsonb("payload"),
   receivedAt: timestamp("received_at", { mode: "date" }).notNull(),
 }, (table) => ({
+  pk: primaryKey({ columns: [table.id, table.receivedAt] }),
   sessionIdx: index("tiktok_raw_event_session_idx").on(table.liveSessionId),
   sessionEventIdx: index("tiktok_raw_event_session_event_idx").on(table.liveSessionId, table.eventType),
 }));
 
+// Per-second counters for high-volume events (like/member/roomUser) stored
+// instead of one raw row per event. valueSum/valueMax carry the event's
+// numeric payload (likeCount, viewerCount) when it has one.
+export const tiktokEventRollups = pgTable("tiktok_event_rollup", {
+  liveSessionId: text("live_session_id").notNull().references(() => liveSessions.id, { onDelete: "cascade" }),
+  eventType: text("event_type").notNull(),
+  bucketStart: timestamp("bucket_start", { mode: "date" }).notNull(),
+  eventCount: integer("event_count").notNull(),
+  valueSum: integer("value_sum").notNull(),
+  valueMax: integer("value_max").notNull(),
+}, (table) => ({
+  pk: primaryKey({ columns: [table.liveSessionId, table.eventType, table.bucketStart] }),
+}));
+
+// Dashboard events too large for a NOTIFY payload; the notification
+// carries the id instead. Short-lived, swept after a few minutes.
+export const dashboardEventPayloads = pgTable("dashboard_event_payload", {
+  id: text("id").primaryKey(),
+  payload: text("payload").notNull(),
+  createdAt: timestamp("created_at", { mode: "date" }).notNull(),
+});
+
+// Retention job progress per (table, scope). scope is a live session id or
+// a raw event partition name. archivedBytes is the archive file length as of
+// the last committed batch, so a restarted run cuts off any partial append.
+export const retentionCheckpoints = pgTable("retention_checkpoint", {
+  tableName: text("table_name").notNull(),
+  scope: text("scope").notNull(),
+  lastId: text("last_id"),
+  archivedRows: integer("archived_rows").default(0).notNull(),
+  archivedBytes: bigint("archived_bytes", { mode: "number" }).default(0).notNull(),
+  completedAt: timestamp("completed_at", { mode: "date" }),
+  updatedAt: timestamp("updated_at", { mode: "date" }).notNull(),
+}, (table) => ({
+  pk: primaryKey({ columns: [table.tableName, table.scope] }),
+}));
+
+// Secret token in an overlay (OBS browser source) URL. One per user;
+// rotating replaces it, which cuts off every overlay using the old one.
+export const overlayTokens = pgTable("overlay_token", {
+  token: text("token").primaryKey(),
+  userId: text("user_id").notNull().unique().references(() => users.id, { onDelete: "cascade" }),
+  createdAt: timestamp("created_at", { mode: "date" }).notNull(),
+});
+
+// Live session report (lib/session-report SessionReport), checkpointed
+// from the in-memory aggregate so /report is a primary key lookup
+export const sessionReports = pgTable("session_report", {
+  liveSessionId: text("live_session_id").primaryKey().references(() => liveSessions.id, { onDelete: "cascade" }),
+  report: jsonb("report").notNull(),
+  updatedAt: timestamp("updated_at", { mode: "date" }).notNull(),
+});
+
+// ============ Analytics ============
+
+// Immutable summary of an ended session, written once when it ends (see
+// snapshotSession). Outlives the session's requests and gifts, which the
+// retention job may delete. Diamonds here count repeats (diamond_count ×
+// repeat_count); `report` is the live SessionReport as of the end.
+export const sessionSnapshots = pgTable("session_snapshot", {
+  liveSessionId: text("live_session_id").primaryKey().references(() => liveSessions.id, { onDelete: "cascade" }),
+  userId: text("user_id").notNull().references(() => users.id, { onDelete: "cascade" }),
+  tiktokUsername: text("tiktok_username").notNull(),
+  startedAt: timestamp("started_at", { mode: "date" }).notNull(),
+  endedAt: timestamp("ended_at", { mode: "date" }).notNull(),
+  requestCount: integer("request_count").notNull(),
+  matchedCount: integer("matched_count").notNull(),
+  playedCount: integer("played_count").notNull(),
+  uniqueRequesters: integer("unique_requesters").notNull(),
+  giftCount: integer("gift_count").notNull(),
+  totalDiamonds: bigint("total_diamonds", { mode: "number" }).notNull(),
+  report: jsonb("report").notNull(),
+  createdAt: timestamp("created_at", { mode: "date" }).notNull(),
+}, (table) => ({
+  userEndedIdx: index("session_snapshot_user_ended_idx").on(table.userId, table.endedAt, table.liveSessionId),
+}));
+
+// Per-streamer daily rollups (UTC days), added to as each session is
+// snapshotted. A session crossing midnight counts toward both days.
+export const dailyStats = pgTable("analytics_daily", {
+  userId: text("user_id").notNull().references(() => users.id, { onDelete: "cascade" }),
+  day: date("day", { mode: "string" }).notNull(),
+  sessionCount: integer("session_count").notNull(),
+  requestCount: integer("request_count").notNull(),
+  matchedCount: integer("matched_count").notNull(),
+  playedCount: integer("played_count").notNull(),
+  giftCount: integer("gift_count").notNull(),
+  totalDiamonds: bigint("total_diamonds", { mode: "number" }).notNull(),
+}, (table) => ({
+  pk: primaryKey({ columns: [table.userId, table.day] }),
+}));
+
+export const dailyTrackStats = pgTable("analytics_daily_track", {
+  userId: text("user_id").notNull().references(() => users.id, { onDelete: "cascade" }),
+  day: date("day", { mode: "string" }).notNull(),
+  spotifyTrackId: text("spotify_track_id").notNull(),
+  trackName: text("track_name"),
+  trackArtist: text("track_artist"),
+  albumImageUrl: text("album_image_url"),
+  requestCount: integer("request_count").notNull(),
+  playedCount: integer("played_count").notNull(),
+}, (table) => ({
+  pk: primaryKey({ columns: [table.userId, table.day, table.spotifyTrackId] }),
+}));
+
+export const dailyViewerStats = pgTable("analytics_daily_viewer", {
+  userId: text("user_id").notNull().references(() => users.id, { onDelete: "cascade" }),
+  day: date("day", { mode: "string" }).notNull(),
+  viewerUsername: text("viewer_username").notNull(),
+  requestCount: integer("request_count").notNull(),
+  matchedCount: integer("matched_count").notNull(),
+  giftCount: integer("gift_count").notNull(),
+  diamonds: bigint("diamonds", { mode: "number" }).notNull(),
+}, (table) => ({
+  pk: primaryKey({ columns: [table.userId, table.day, table.viewerUsername] }),
+}));
+
+// Streamer's song request rate limit policy (lib/rate-limit RateLimitPolicy)
+export const rateLimitPolicies = pgTable("rate_limit_policy", {
+  userId: text("user_id").primaryKey().references(() => users.id, { onDelete: "cascade" }),
+  policy: jsonb("policy").notNull(),
+  updatedAt: timestamp("updated_at", { mode: "date" }).notNull(),
+});
+
+// Shared limiter state per (session, viewer) for RATE_LIMIT_STORE=postgres
+// (see LimiterState). Rows past expires_at are equivalent to no row.
+export const viewerRateLimits = pgTable("viewer_rate_limit", {
+  liveSessionId: text("live_session_id").notNull().references(() => liveSessions.id, { onDelete: "cascade" }),
+  viewerUsername: text("viewer_username").notNull(),
+  a: doublePrecision("a").notNull(),
+  b: doublePrecision("b").notNull(),
+  at: bigint("at", { mode: "number" }).notNull(),
+  bonus: integer("bonus").default(0).notNull(),
+  bonusUntil: bigint("bonus_until", { mode: "number" }).default(0).notNull(),
+  expiresAt: timestamp("expires_at", { mode: "date" }).notNull(),
+}, (table) => ({
+  pk: primaryKey({ columns: [table.liveSessionId, table.viewerUsername] }),
+  expiresIdx: index("viewer_rate_limit_expires_idx").on(table.expiresAt),
+}));
+
 // Types
 export type User = typeof users.$inferSelect;
 export type Session = typeof sessions.$inferSelect;
@@ -120,3 +277,8 @@ export type Account = typeof accounts.$inferSelect;
 export type SongRequest = typeof songRequests.$inferSelect;
 export type GiftEvent = typeof giftEvents.$inferSelect;
 export type TikTokRawEvent = typeof tiktokRawEvents.$inferSelect;
+export type TikTokEventRollup = typeof tiktokEventRollups.$inferSelect;
+export type RetentionCheckpoint = typeof retentionCheckpoints.$inferSelect;
+export type OverlayToken = typeof overlayTokens.$inferSelect;
+export type SessionSnapshot = typeof sessionSnapshots.$inferSelect;
+export type DailyStats = typeof dailyStats.$inferSelect;
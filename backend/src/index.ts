@@ -1,37 +1,176 @@
 import { Elysia } from "elysia";
 import { cors } from "@elysiajs/cors";
-import { TikTokService } from "./services/tiktok";
-import { getSpotifyToken } from "./services/spotify";
+import { LocalSessionHost, type SessionHost } from "./services/session-host";
+import { WorkerPool } from "./services/worker-pool";
+import { createEventBus } from "./services/event-bus";
+import { DashboardHub, WS_BACKPRESSURE_LIMIT } from "./services/dashboard-hub";
+import { RetentionJob } from "./services/retention";
+import { OverlayHub } from "./services/overlay-hub";
+import { QueueEngine } from "./services/queue-engine";
+import { RequestPriorityQueue } from "./services/request-priority";
+import {
+  AnalyticsSweep,
+  getAnalyticsSummary,
+  exportHistory,
+  parseDayRange,
+  parseExportDataset,
+} from "./services/analytics";
+import {
+  getSpotifyToken,
+  getSearchCacheStats,
+  getSingleFlightStats,
+  getTokenManagerStats,
+  getSpotifyHttpStats,
+} from "./services/spotify";
+import { validateRequest, getActiveSession, invalidateActiveSession, getAuthCacheStats } from "./services/auth";
 import { authDerive } from "./lib/auth-middleware";
 import {
-  getAllActiveSessions,
+  getOrphanedSessions,
   createLiveSession,
   endLiveSession,
-  getQueueForSession,
-  skipQueueItem,
   getUserTiktokUsername,
   getRequestsForSession,
   getGiftEventsForSession,
   getSessionReport,
+  getCheckpointedSessionReport,
+  getOverlayTokenForUser,
+  rotateOverlayToken,
+  getRateLimitPolicy,
+  setRateLimitPolicy,
+  getSessionSnapshots,
+  getSessionSnapshot,
+  getActiveSessionForUser,
+  onLiveSessionChange,
 } from "./db/queries";
 import { logger } from "./lib/logger";
-
-// WebSocket clients by userId
-const wsClients = new Map<string, Set<{ send: (data: string) => void }>>();
+import { INSTANCE_ID } from "./lib/instance";
+import { PACK_ENCODING } from "./lib/dashboard-codec";
+import { parseRateLimitPolicy, DEFAULT_RATE_LIMIT_POLICY } from "./lib/rate-limit";
+import { parseExportFormat, EXPORT_CONTENT_TYPES } from "./lib/export-format";
+import { decodeCursor, toPage, type KeysetCursor } from "./lib/keyset-cursor";
+
+const WORKER_COUNT = Number(process.env.WORKER_COUNT ?? 0);
+// permessage-deflate on dashboard sockets (off: WS_COMPRESSION=false)
+const WS_COMPRESSION = process.env.WS_COMPRESSION !== "false";
+const ORPHAN_SWEEP_INTERVAL_MS = 15_000;
+const ORPHAN_SWEEP_BATCH = 50;
+// Requests and gifts in a dashboard `init`; older ones are paged in
+// with the snapshot's cursors
+const SNAPSHOT_PAGE_ROWS = 50;
+const MAX_PAGE_ROWS = 200;
+
+// Dashboard WebSockets (Bun pub/sub topics per user and per session)
+const dashboardHub = new DashboardHub(loadDashboardSnapshot);
+
+// Gift-boosted play order of pending requests (for /queue and overlays)
+const requestPriority = new RequestPriorityQueue();
+
+// Overlay feeds (per-user snapshot shared by every overlay client)
+const overlayHub = new OverlayHub(requestPriority);
+overlayHub.start();
+
+// Dashboard events go through the bus so every instance's sockets see them
+const eventBus = createEventBus();
 
 // Event emitter for TikTok events
-function emitToUser(userId: string, event: unknown) {
-  const clients = wsClients.get(userId);
-  if (!clients) return;
+function emitToUser(userId: string, sessionId: string, event: unknown) {
+  eventBus.publish(userId, sessionId, event);
+}
 
-  const message = JSON.stringify(event);
-  for (const client of clients) {
-    client.send(message);
+// Per-session queues held in memory, persisted in the background
+const queueEngine = new QueueEngine(emitToUser);
+
+// Deliver bus events to sockets held by this instance
+eventBus.subscribe((userId, sessionId, event) => {
+  // Sessions started or ended in a worker or on another instance
+  const type = (event as { type?: string }).type;
+  if (type === "session:connected" || type === "session:ended") invalidateActiveSession(userId);
+  if (type === "session:changed") {
+    invalidateActiveSession(userId);
+    return;
+  }
+  if (type === "overlay:revoked") {
+    // Not a session event: nothing else to update
+    overlayHub.revokeToken(userId, (event as { token: string | null }).token);
+    return;
   }
+
+  queueEngine.apply(sessionId, event);
+  requestPriority.apply(sessionId, event);
+  dashboardHub.publish(userId, sessionId, event);
+  overlayHub.publish(userId, sessionId, event);
+});
+eventBus.start().catch((err) => logger.error("Event bus failed to start", { error: String(err) }));
+
+// Sessions created or ended here (POST/DELETE /session, failed connects,
+// recovery) must drop every instance's cached active session, not just ours
+onLiveSessionChange((userId) => eventBus.publish(userId, "", { type: "session:changed" }));
+
+/**
+ * Dashboard state for a user's active session (sent as `init`): the queue
+ * plus the latest page of requests and gifts, with cursors for /requests
+ * and /gifts to page back from.
+ */
+async function loadDashboardSnapshot(userId: string) {
+  const session = await getActiveSession(userId);
+  if (!session) return null;
+
+  const [queue, requestRows, giftRows] = await Promise.all([
+    queueEngine.list(session.id),
+    getRequestsForSession(session.id, null, SNAPSHOT_PAGE_ROWS + 1),
+    getGiftEventsForSession(session.id, null, SNAPSHOT_PAGE_ROWS + 1),
+  ]);
+  const requests = toPage(requestRows, SNAPSHOT_PAGE_ROWS, requestPosition);
+  const gifts = toPage(giftRows, SNAPSHOT_PAGE_ROWS, giftPosition);
+  return {
+    type: "init",
+    session,
+    queue,
+    requests: requests.items,
+    requestsCursor: requests.nextCursor,
+    gifts: gifts.items,
+    giftsCursor: gifts.nextCursor,
+  };
 }
 
-// Initialize TikTok service
-const tiktokService = new TikTokService(emitToUser);
+const requestPosition = (r: { requestedAt: Date; id: string }): KeysetCursor => ({ at: r.requestedAt, id: r.id });
+const giftPosition = (g: { receivedAt: Date; id: string }): KeysetCursor => ({ at: g.receivedAt, id: g.id });
+
+/**
+ * Page size and starting cursor from ?limit&cursor. `before` (an ISO
+ * timestamp) is still accepted for clients that predate cursors. Null if
+ * the cursor is malformed.
+ */
+function parsePageQuery(
+  query: Record<string, string | undefined>,
+  defaultLimit: number
+): { limit: number; cursor: KeysetCursor | null } | null {
+  const limit = Math.min(Math.max(Number(query.limit) || defaultLimit, 1), MAX_PAGE_ROWS);
+  if (query.cursor) {
+    const cursor = decodeCursor(query.cursor);
+    return cursor ? { limit, cursor } : null;
+  }
+  if (query.before) {
+    const before = new Date(query.before);
+    // No id sorts below "", so (before, "") means strictly before `before`
+    return Number.isNaN(before.getTime()) ? null : { limit, cursor: { at: before, id: "" } };
+  }
+  return { limit, cursor: null };
+}
+
+// TikTok connections: in this process, or sharded across session workers
+const sessionHost: SessionHost =
+  WORKER_COUNT > 0
+    ? new WorkerPool(WORKER_COUNT, emitToUser)
+    : new LocalSessionHost(emitToUser, `${INSTANCE_ID}/main`);
+
+// Archive + delete expired raw events, gifts and requests
+const retentionJob = new RetentionJob();
+retentionJob.start();
+
+// Snapshot ended sessions that endLiveSession missed
+const analyticsSweep = new AnalyticsSweep();
+analyticsSweep.start();
 
 // Normalize FRONTEND_URL (remove trailing slash if present)
 const frontendUrl = (process.env.FRONTEND_URL ?? "http://localhost:3000").replace(/\/$/, "");
@@ -67,12 +206,64 @@ const app = new Elysia()
     },
     credentials: true,
   }))
+
+  // Overlay state for polling clients. Authenticated by the token in the
+  // URL, so registered before authDerive (no cookie or session lookup).
+  .get("/overlay/:token/state", async ({ params, request }) => {
+    const ifNoneMatch = request.headers.get("if-none-match");
+    const render = await overlayHub.getState(params.token, ifNoneMatch);
+    if (!render) {
+      return Response.json({ error: "Unknown overlay" }, { status: 404 });
+    }
+
+    const headers = { etag: render.etag, "cache-control": "no-cache" };
+    if (ifNoneMatch === render.etag) {
+      return new Response(null, { status: 304, headers });
+    }
+    return new Response(render.body, { headers: { ...headers, "content-type": "application/json" } });
+  })
+
+  // Overlay state as Server-Sent Events (one `state` event per change)
+  .get("/overlay/:token/events", async ({ params, request }) => {
+    const stream = await overlayHub.openStream(params.token, request.signal);
+    if (!stream) {
+      return Response.json({ error: "Unknown overlay" }, { status: 404 });
+    }
+    return new Response(stream, {
+      headers: {
+        "content-type": "text/event-stream",
+        "cache-control": "no-cache",
+        // Don't let reverse proxies buffer the stream
+        "x-accel-buffering": "no",
+      },
+    });
+  })
+
   .use(authDerive)
 
   // Health endpoint
   .get("/health", () => ({
     status: "ok",
-    activeConnections: tiktokService.activeConnections,
+    activeConnections: sessionHost.activeConnections,
+  }))
+
+  // Process-level counters (ingest queues, caches)
+  .get("/metrics", () => ({
+    sessions: sessionHost.stats,
+    eventBus: eventBus.stats,
+    dashboardSockets: dashboardHub.stats,
+    retention: retentionJob.stats,
+    analytics: analyticsSweep.stats,
+    overlay: overlayHub.stats,
+    queue: queueEngine.stats,
+    requestPriority: requestPriority.stats,
+    auth: getAuthCacheStats(),
+    spotify: {
+      searchCache: getSearchCacheStats(),
+      singleFlight: getSingleFlightStats(),
+      tokens: getTokenManagerStats(),
+      http: getSpotifyHttpStats(),
+    },
   }))
 
   // Start session
@@ -82,8 +273,8 @@ const app = new Elysia()
       return { error: "Unauthorized" };
     }
 
-    // Check for existing session (re-fetch for freshness since authDerive may have stale data)
-    const { getActiveSessionForUser } = await import("./db/queries");
+    // Check for existing session in the DB, not authDerive's cached copy:
+    // a stale "none" here would start a second session
     const existing = await getActiveSessionForUser(user.id);
     if (existing) {
       set.status = 409;
@@ -110,7 +301,7 @@ const app = new Elysia()
 
     // Start TikTok listener (H1: no spotifyToken param)
     try {
-      await tiktokService.startListening(
+      await sessionHost.startListening(
         session.id,
         session.tiktokUsername,
         user.id
@@ -138,65 +329,115 @@ const app = new Elysia()
     }
 
     // Sequential shutdown: poller → finalize → flush → disconnect
-    await tiktokService.stopListening(activeSession.id);
+    try {
+      await sessionHost.stopListening(activeSession.id);
+    } catch (err) {
+      // Request rows aren't durable yet; ending now would lose them
+      logger.error("Failed to stop session", { sessionId: activeSession.id, error: String(err) });
+      set.status = 503;
+      return { error: "Could not save session data, try again" };
+    }
     await endLiveSession(activeSession.id);
+    emitToUser(user.id, activeSession.id, { type: "session:ended", reason: "stopped" });
 
     return { success: true };
   })
 
   // Get queue
-  .get("/queue", async ({ user, activeSession }) => {
+  // Queue, plus matched requests in gift-boosted play order (?limit, max 500)
+  .get("/queue", async ({ user, activeSession, query }) => {
     if (!user) {
-      return { queue: [], hasSession: false };
+      return { queue: [], upNext: [], hasSession: false };
     }
 
     if (!activeSession) {
-      return { queue: [], hasSession: false };
+      return { queue: [], upNext: [], hasSession: false };
     }
 
-    const queue = await getQueueForSession(activeSession.id);
-    return { queue, hasSession: true, sessionId: activeSession.id };
+    const limit = Math.min(Math.max(Number(query.limit) || 50, 1), 500);
+    const [queue, upNext] = await Promise.all([
+      queueEngine.list(activeSession.id),
+      requestPriority.list(activeSession.id, limit),
+    ]);
+    return { queue, upNext, hasSession: true, sessionId: activeSession.id };
   })
 
   // Remove from queue
-  .delete("/queue/:id", async ({ user, params, set }) => {
+  .delete("/queue/:id", async ({ user, activeSession, params, set }) => {
     if (!user) {
       set.status = 401;
       return { error: "Unauthorized" };
     }
 
-    await skipQueueItem(params.id);
+    const item = activeSession
+      ? await queueEngine.setStatus(user.id, activeSession.id, params.id, "skipped")
+      : null;
+    if (!item) {
+      set.status = 404;
+      return { error: "Queue item not found" };
+    }
     return { success: true };
   })
 
-  // Get song requests (paginated)
-  .get("/requests", async ({ user, activeSession, query }) => {
+  // Reorder: move an item to a 0-based index in the queue
+  .patch("/queue/:id", async ({ user, activeSession, params, body, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const index = (body as { index?: unknown } | null)?.index;
+    if (typeof index !== "number" || !Number.isInteger(index) || index < 0) {
+      set.status = 400;
+      return { error: "index must be a non-negative integer" };
+    }
+
+    const item = activeSession ? await queueEngine.move(user.id, activeSession.id, params.id, index) : null;
+    if (!item) {
+      set.status = 404;
+      return { error: "Queue item not found" };
+    }
+    return { item };
+  })
+
+  // Get song requests, newest first (?limit, ?cursor from nextCursor)
+  .get("/requests", async ({ user, activeSession, query, set }) => {
     if (!user) {
-      return { requests: [], hasSession: false };
+      return { requests: [], nextCursor: null, hasSession: false };
     }
 
     if (!activeSession) {
-      return { requests: [], hasSession: false };
+      return { requests: [], nextCursor: null, hasSession: false };
     }
 
-    const before = query.before ? new Date(query.before as string) : undefined;
-    const limit = query.limit ? Number(query.limit) : 50;
-    const requests = await getRequestsForSession(activeSession.id, before, limit);
-    return { requests, hasSession: true, sessionId: activeSession.id };
+    const page = parsePageQuery(query, 50);
+    if (!page) {
+      set.status = 400;
+      return { error: "Invalid cursor" };
+    }
+    const rows = await getRequestsForSession(activeSession.id, page.cursor, page.limit + 1);
+    const { items, nextCursor } = toPage(rows, page.limit, requestPosition);
+    return { requests: items, nextCursor, hasSession: true, sessionId: activeSession.id };
   })
 
-  // Get gift events
-  .get("/gifts", async ({ user, activeSession }) => {
+  // Get gift events, newest first (?limit, ?cursor from nextCursor)
+  .get("/gifts", async ({ user, activeSession, query, set }) => {
     if (!user) {
-      return { gifts: [], hasSession: false };
+      return { gifts: [], nextCursor: null, hasSession: false };
     }
 
     if (!activeSession) {
-      return { gifts: [], hasSession: false };
+      return { gifts: [], nextCursor: null, hasSession: false };
     }
 
-    const gifts = await getGiftEventsForSession(activeSession.id);
-    return { gifts, hasSession: true, sessionId: activeSession.id };
+    const page = parsePageQuery(query, 50);
+    if (!page) {
+      set.status = 400;
+      return { error: "Invalid cursor" };
+    }
+    const rows = await getGiftEventsForSession(activeSession.id, page.cursor, page.limit + 1);
+    const { items, nextCursor } = toPage(rows, page.limit, giftPosition);
+    return { gifts: items, nextCursor, hasSession: true, sessionId: activeSession.id };
   })
 
   // Get session report
@@ -211,12 +452,145 @@ const app = new Elysia()
       return { error: "No active session" };
     }
 
-    const report = await getSessionReport(activeSession.id);
-    return { report, sessionId: activeSession.id };
+    // Checkpointed by the session's TikTokService; the full aggregate
+    // queries only run before its first checkpoint
+    const checkpoint = await getCheckpointedSessionReport(activeSession.id);
+    const report = checkpoint?.report ?? (await getSessionReport(activeSession.id));
+    return { report, sessionId: activeSession.id, updatedAt: checkpoint?.updatedAt ?? new Date() };
+  })
+
+  // Totals, per-day rollups and leaderboards over ?from..to (UTC days,
+  // default last 30), across every session
+  .get("/analytics", async ({ user, query, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const range = parseDayRange(query);
+    if (!range) {
+      set.status = 400;
+      return { error: "from/to must be YYYY-MM-DD days, at most 366 apart" };
+    }
+    const limit = Math.min(Math.max(Number(query.limit) || 10, 1), 100);
+    return getAnalyticsSummary(user.id, range, limit);
+  })
+
+  // Ended sessions' snapshots, most recent first (?limit, ?cursor)
+  .get("/analytics/sessions", async ({ user, query, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const page = parsePageQuery(query, 20);
+    if (!page) {
+      set.status = 400;
+      return { error: "Invalid cursor" };
+    }
+    const rows = await getSessionSnapshots(user.id, page.cursor, page.limit + 1);
+    const { items, nextCursor } = toPage(rows, page.limit, (s) => ({ at: s.endedAt, id: s.liveSessionId }));
+    return { sessions: items, nextCursor };
+  })
+
+  // One ended session's snapshot, with its full report
+  .get("/analytics/sessions/:id", async ({ user, params, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const snapshot = await getSessionSnapshot(user.id, params.id);
+    if (!snapshot) {
+      set.status = 404;
+      return { error: "Session snapshot not found" };
+    }
+    return { snapshot };
+  })
+
+  // Streaming export: ?dataset=sessions|daily|requests|gifts&format=csv|ndjson&from&to
+  .get("/analytics/export", async ({ user, query, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const dataset = parseExportDataset(query.dataset);
+    const format = parseExportFormat(query.format ?? "csv");
+    const range = parseDayRange(query);
+    if (!dataset || !format || !range) {
+      set.status = 400;
+      return { error: "Invalid dataset, format or date range" };
+    }
+
+    const filename = `songflow-${dataset}-${range.from}-${range.to}.${format}`;
+    return new Response(exportHistory(user.id, dataset, format, range), {
+      headers: {
+        "content-type": EXPORT_CONTENT_TYPES[format],
+        "content-disposition": `attachment; filename="${filename}"`,
+        "cache-control": "no-store",
+      },
+    });
+  })
+
+  // Overlay URL token (created on first request)
+  .get("/overlay/token", async ({ user, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const token = (await getOverlayTokenForUser(user.id)) ?? (await rotateOverlayToken(user.id));
+    return { token };
+  })
+
+  // Issue a new overlay token; overlays using the old one stop updating
+  .post("/overlay/token", async ({ user, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const previous = await getOverlayTokenForUser(user.id);
+    const token = await rotateOverlayToken(user.id);
+    // Every instance may have the old token cached or overlays open on it
+    eventBus.publish(user.id, "", { type: "overlay:revoked", token: previous });
+    return { token };
+  })
+
+  // Song request rate limit policy (applies from the next session start)
+  .get("/settings/rate-limit", async ({ user, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const policy = parseRateLimitPolicy(await getRateLimitPolicy(user.id)) ?? DEFAULT_RATE_LIMIT_POLICY;
+    return { policy };
+  })
+
+  .put("/settings/rate-limit", async ({ user, body, set }) => {
+    if (!user) {
+      set.status = 401;
+      return { error: "Unauthorized" };
+    }
+
+    const policy = parseRateLimitPolicy((body as { policy?: unknown } | null)?.policy);
+    if (!policy) {
+      set.status = 400;
+      return { error: "Invalid rate limit policy" };
+    }
+
+    await setRateLimitPolicy(user.id, policy);
+    return { policy };
   })
 
   // WebSocket for real-time updates
   .ws("/ws/dashboard", {
+    backpressureLimit: WS_BACKPRESSURE_LIMIT,
+    // Slow consumers are paused and evicted by DashboardHub instead
+    closeOnBackpressureLimit: false,
+    perMessageDeflate: WS_COMPRESSION,
     async open(ws) {
       // Parse cookie from upgrade headers - type varies by runtime
       const headers = (ws.data as { headers?: { get?: (name: string) => string; cookie?: string } })?.headers;
@@ -224,7 +598,6 @@ const app = new Elysia()
         ? headers.get("cookie")
         : (headers?.cookie ?? "");
 
-      const { validateRequest } = await import("./services/auth");
       const user = await validateRequest(cookieHeader ?? "");
 
       if (!user) {
@@ -232,33 +605,25 @@ const app = new Elysia()
         return;
       }
 
-      // Register client
-      if (!wsClients.has(user.id)) {
-        wsClients.set(user.id, new Set());
-      }
-      wsClients.get(user.id)!.add(ws);
-
-      // Send current state
-      const { getActiveSessionForUser } = await import("./db/queries");
-      const session = await getActiveSessionForUser(user.id);
-      if (session) {
-        const queue = await getQueueForSession(session.id);
-        const requests = await getRequestsForSession(session.id, undefined, 50);
-        const gifts = await getGiftEventsForSession(session.id);
-        ws.send(JSON.stringify({ type: "init", session, queue, requests, gifts }));
-      }
+      // ?v=1 selects sequenced frames, &enc=pack1 binary encoding;
+      // session/epoch/seq resume a stream
+      const query = (ws.data as { query?: Record<string, string | undefined> })?.query ?? {};
+      const protocol = query.v === "1" ? 1 : 0;
+      const encoding = query.enc === PACK_ENCODING ? "pack" : "json";
+      const seq = Number(query.seq);
+      const resume = query.session && query.epoch && Number.isInteger(seq)
+        ? { sessionId: query.session, epoch: query.epoch, seq }
+        : null;
+
+      // Register client, then send current state (or the frames it missed)
+      dashboardHub.add(ws.id, ws.raw, user.id, protocol, encoding);
+      await dashboardHub.openStream(ws.id, resume);
     },
-    async close(ws) {
-      // Find and remove client
-      for (const [userId, clients] of wsClients) {
-        if (clients.has(ws as { send: (data: string) => void })) {
-          clients.delete(ws as { send: (data: string) => void });
-          if (clients.size === 0) {
-            wsClients.delete(userId);
-          }
-          break;
-        }
-      }
+    close(ws) {
+      dashboardHub.remove(ws.id);
+    },
+    drain(ws) {
+      dashboardHub.drained(ws.id);
     },
     message(ws, message) {
       // Handle client messages if needed
@@ -269,45 +634,71 @@ const app = new Elysia()
   .listen(process.env.PORT ?? 4000);
 
 logger.info("Backend server started", { port: app.server?.port });
+dashboardHub.attach(app.server!);
 
-// Startup recovery
-async function recoverSessions() {
-  const activeSessions = await getAllActiveSessions();
-  logger.info("Starting session recovery", { count: activeSessions.length });
+// Session recovery: pick up active sessions nobody holds a lease on (after
+// a restart, or when another instance died). Runs at startup and then
+// periodically, so any instance can take over.
+let recovering = false;
 
-  for (const session of activeSessions) {
-    const sessionLogger = logger.child({ sessionId: session.id, username: session.tiktokUsername });
-    try {
-      // H1: no spotifyToken in startListening — token is lazy-fetched
-      await tiktokService.startListening(
-        session.id,
-        session.tiktokUsername,
-        session.userId
-      );
-      sessionLogger.info("Session recovered successfully");
-    } catch {
-      sessionLogger.warn("Stream ended during recovery");
-      await endLiveSession(session.id);
+async function recoverSessions() {
+  if (recovering) return;
+  recovering = true;
+
+  try {
+    const orphaned = await getOrphanedSessions(ORPHAN_SWEEP_BATCH);
+    if (orphaned.length === 0) return;
+    logger.info("Starting session recovery", { count: orphaned.length });
+
+    for (const session of orphaned) {
+      const sessionLogger = logger.child({ sessionId: session.id, username: session.tiktokUsername });
+      try {
+        // H1: no spotifyToken in startListening — token is lazy-fetched
+        const started = await sessionHost.startListening(
+          session.id,
+          session.tiktokUsername,
+          session.userId
+        );
+        if (started) {
+          // Rebuild the in-memory queue before the dashboard asks for it
+          queueEngine.list(session.id).catch(() => {});
+          sessionLogger.info("Session recovered successfully");
+        }
+      } catch {
+        sessionLogger.warn("Stream ended during recovery");
+        await endLiveSession(session.id);
+      }
     }
+  } finally {
+    recovering = false;
   }
 }
 
-// Run recovery after startup
+// Run recovery after startup, then keep sweeping for orphaned sessions
 recoverSessions().catch((err) => logger.error("Session recovery failed", { error: String(err) }));
+setInterval(() => {
+  recoverSessions().catch((err) => logger.error("Session recovery failed", { error: String(err) }));
+}, ORPHAN_SWEEP_INTERVAL_MS);
 
 // Graceful shutdown
 process.on("SIGTERM", async () => {
   logger.info("Received SIGTERM, shutting down gracefully");
 
   // Notify connected clients
-  for (const clients of wsClients.values()) {
-    for (const client of clients) {
-      client.send(JSON.stringify({ type: "server:shutdown" }));
-    }
+  dashboardHub.broadcast({ type: "server:shutdown" });
+  dashboardHub.stop();
+  overlayHub.stop();
+
+  // Disconnect all TikTok connections and release their leases
+  await sessionHost.disconnectAll();
+  await retentionJob.stop();
+  await analyticsSweep.stop();
+  try {
+    await queueEngine.flush();
+  } catch (err) {
+    logger.error("Shutting down with unsaved queue changes", { error: String(err) });
   }
-
-  // Disconnect all TikTok connections (now async for poller finalization)
-  await tiktokService.disconnectAll();
+  await eventBus.stop();
 
   // Close server
   app.stop();
@@ -1,13 +1,18 @@
 import { Elysia } from "elysia";
-import { validateRequest } from "../services/auth";
-import { getActiveSessionForUser } from "../db/queries";
+import { validateSessionToken, getActiveSession, SESSION_COOKIE_NAMES } from "../services/auth";
 import type { User, LiveSession } from "../db/schema";
 
+// Routes that never look at the caller (overlay feeds are registered
+// before authDerive and skip it anyway)
+const PUBLIC_PATHS = new Set(["/health", "/metrics"]);
+
 /**
  * Elysia derive plugin that extracts auth + active session from cookies.
  *
  * Replaces the duplicated cookie-parse → validateRequest → getActiveSession
- * pattern that was repeated in every endpoint.
+ * pattern that was repeated in every endpoint. Both lookups are cached
+ * (see services/auth), so a dashboard API call is normally served from
+ * memory; public routes and requests without a session cookie skip them.
  *
  * Usage:
  *   app.use(authDerive).get("/foo", ({ user, activeSession }) => { ... })
@@ -16,17 +21,29 @@ import type { User, LiveSession } from "../db/schema";
  * - `activeSession` is null if no active live session (or unauthenticated)
  */
 export const authDerive = new Elysia({ name: "auth" }).derive(
-  async ({ cookie }): Promise<{ user: User | null; activeSession: LiveSession | null }> => {
-    const cookieHeader = Object.entries(cookie)
-      .map(([name, c]) => `${name}=${c.value}`)
-      .join("; ");
+  async ({ cookie, path }): Promise<{ user: User | null; activeSession: LiveSession | null }> => {
+    if (PUBLIC_PATHS.has(path)) {
+      return { user: null, activeSession: null };
+    }
+
+    let sessionToken: string | undefined;
+    for (const name of SESSION_COOKIE_NAMES) {
+      const value = cookie[name]?.value;
+      if (typeof value === "string" && value) {
+        sessionToken = value;
+        break;
+      }
+    }
+    if (!sessionToken) {
+      return { user: null, activeSession: null };
+    }
 
-    const user = await validateRequest(cookieHeader);
+    const user = await validateSessionToken(sessionToken);
     if (!user) {
       return { user: null, activeSession: null };
     }
 
-    const activeSession = await getActiveSessionForUser(user.id);
+    const activeSession = await getActiveSession(user.id);
     return { user, activeSession };
   }
 );
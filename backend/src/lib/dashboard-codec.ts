@@ -0,0 +1,331 @@
+/**
+ * Compact binary encoding for dashboard protocol v1 (`?enc=pack1`).
+ *
+ * MessagePack, with three additions the client decoder must mirror
+ * (src/lib/dashboard/codec.ts in the frontend):
+ *  - map keys listed in PACK_KEYS are written as their index (a positive
+ *    fixint), so `albumImageUrl` costs one byte instead of fourteen;
+ *  - strings of MIN_INTERN_LENGTH+ characters are interned per message:
+ *    the first occurrence is written as a string and appended to a table,
+ *    repeats (usernames, track and artist names) are ext type 1 holding
+ *    the table index;
+ *  - Dates, and strings holding a canonical ISO timestamp, are the
+ *    standard timestamp extension (type -1), decoded back to ISO strings,
+ *    so the client sees the same shapes as with JSON.
+ *
+ * Interning is scoped to one message rather than the connection: a frame
+ * is encoded once per topic and replayed to resuming clients, so it can't
+ * depend on what a particular socket saw before. permessage-deflate covers
+ * redundancy across messages.
+ */
+
+export const PACK_ENCODING = "pack1";
+
+/** Append-only: reordering or removing entries breaks deployed clients */
+export const PACK_KEYS = [
+  "type", "v", "sessionId", "epoch", "seq", "events", "state", "session",
+  "queue", "requests", "gifts", "request", "gift", "item", "id", "userId",
+  "liveSessionId", "viewerUsername", "rawMessage", "parsedQuery", "searchStatus",
+  "spotifyTrackId", "trackName", "trackArtist", "trackTitle", "albumName",
+  "albumImageUrl", "durationMs", "spotifyUri", "playStatus", "requestedAt",
+  "matchedAt", "confirmedAt", "giftId", "giftName", "diamondCount", "repeatCount",
+  "receivedAt", "tiktokUsername", "status", "startedAt", "endedAt", "position",
+  "roomId", "reason", "message",
+] as const;
+
+const MIN_INTERN_LENGTH = 4;
+const MAX_INTERNED = 0xffff;
+const EXT_STRING_REF = 1;
+const EXT_TIMESTAMP = -1;
+const ISO_TIMESTAMP = /^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$/;
+
+const KEY_INDEX = new Map<string, number>(PACK_KEYS.map((key, i) => [key, i]));
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+class Writer {
+  bytes = new Uint8Array(1024);
+  view = new DataView(this.bytes.buffer);
+  length = 0;
+  interned = new Map<string, number>();
+
+  ensure(n: number): void {
+    if (this.length + n <= this.bytes.length) return;
+    let size = this.bytes.length * 2;
+    while (size < this.length + n) size *= 2;
+    const grown = new Uint8Array(size);
+    grown.set(this.bytes.subarray(0, this.length));
+    this.bytes = grown;
+    this.view = new DataView(grown.buffer);
+  }
+
+  u8(value: number): void {
+    this.ensure(1);
+    this.bytes[this.length++] = value;
+  }
+
+  u16(value: number): void {
+    this.ensure(2);
+    this.view.setUint16(this.length, value);
+    this.length += 2;
+  }
+
+  u32(value: number): void {
+    this.ensure(4);
+    this.view.setUint32(this.length, value);
+    this.length += 4;
+  }
+
+  value(value: unknown): void {
+    if (value === null || value === undefined) return this.u8(0xc0);
+    switch (typeof value) {
+      case "boolean":
+        return this.u8(value ? 0xc3 : 0xc2);
+      case "number":
+        return this.number(value);
+      case "string":
+        return this.string(value);
+      case "object":
+        if (value instanceof Date) return this.timestamp(value);
+        if (Array.isArray(value)) return this.array(value);
+        return this.map(value as Record<string, unknown>);
+      default:
+        return this.u8(0xc0);
+    }
+  }
+
+  number(value: number): void {
+    if (!Number.isInteger(value) || value < -0x80000000 || value > 0xffffffff) {
+      this.u8(0xcb);
+      this.ensure(8);
+      this.view.setFloat64(this.length, value);
+      this.length += 8;
+    } else if (value >= 0) {
+      if (value < 0x80) {
+        this.u8(value);
+      } else if (value <= 0xff) {
+        this.u8(0xcc);
+        this.u8(value);
+      } else if (value <= 0xffff) {
+        this.u8(0xcd);
+        this.u16(value);
+      } else {
+        this.u8(0xce);
+        this.u32(value);
+      }
+    } else if (value >= -32) {
+      this.u8(value & 0xff);
+    } else if (value >= -0x80) {
+      this.u8(0xd0);
+      this.u8(value & 0xff);
+    } else if (value >= -0x8000) {
+      this.u8(0xd1);
+      this.u16(value & 0xffff);
+    } else {
+      this.u8(0xd2);
+      this.u32(value >>> 0);
+    }
+  }
+
+  /** Header for arrays/maps: fix form below 16 entries, else 16/32-bit */
+  header(fix: number, n: number, wide16: number): void {
+    if (n < 16) {
+      this.u8(fix | n);
+    } else if (n <= 0xffff) {
+      this.u8(wide16);
+      this.u16(n);
+    } else {
+      this.u8(wide16 + 1);
+      this.u32(n);
+    }
+  }
+
+  string(value: string): void {
+    // Dates that already went through JSON (e.g. via the event bus)
+    if (value.length === 24 && value[23] === "Z" && ISO_TIMESTAMP.test(value)) {
+      const ms = Date.parse(value);
+      if (new Date(ms).toISOString() === value && this.epochMs(ms)) return;
+    }
+
+    if (value.length >= MIN_INTERN_LENGTH) {
+      const ref = this.interned.get(value);
+      if (ref !== undefined) {
+        if (ref <= 0xff) {
+          this.u8(0xd4);
+          this.u8(EXT_STRING_REF);
+          this.u8(ref);
+        } else {
+          this.u8(0xd5);
+          this.u8(EXT_STRING_REF);
+          this.u16(ref);
+        }
+        return;
+      }
+      if (this.interned.size < MAX_INTERNED) this.interned.set(value, this.interned.size);
+    }
+
+    // Worst case 3 bytes per UTF-16 unit, plus a 5 byte header
+    this.ensure(value.length * 3 + 5);
+    const start = this.length + 5;
+    const size = textEncoder.encodeInto(value, this.bytes.subarray(start)).written;
+    let header: number;
+    if (size < 32) {
+      this.bytes[this.length] = 0xa0 | size;
+      header = 1;
+    } else if (size <= 0xff) {
+      this.bytes[this.length] = 0xd9;
+      this.bytes[this.length + 1] = size;
+      header = 2;
+    } else if (size <= 0xffff) {
+      this.bytes[this.length] = 0xda;
+      this.view.setUint16(this.length + 1, size);
+      header = 3;
+    } else {
+      this.bytes[this.length] = 0xdb;
+      this.view.setUint32(this.length + 1, size);
+      header = 5;
+    }
+    this.bytes.copyWithin(this.length + header, start, start + size);
+    this.length += header + size;
+  }
+
+  timestamp(date: Date): void {
+    if (!this.epochMs(date.getTime())) this.value(Number.isNaN(date.getTime()) ? null : date.toISOString());
+  }
+
+  /** timestamp 64 (30-bit nanoseconds, 34-bit seconds); false if out of range */
+  epochMs(ms: number): boolean {
+    const sec = Math.floor(ms / 1000);
+    if (!(sec >= 0 && sec < 2 ** 34)) return false;
+    const nsec = (ms - sec * 1000) * 1e6;
+    this.u8(0xd7);
+    this.u8(EXT_TIMESTAMP & 0xff);
+    this.u32(nsec * 4 + Math.floor(sec / 2 ** 32));
+    this.u32(sec >>> 0);
+    return true;
+  }
+
+  array(items: unknown[]): void {
+    this.header(0x90, items.length, 0xdc);
+    for (const item of items) this.value(item);
+  }
+
+  map(object: Record<string, unknown>): void {
+    // Like JSON.stringify: undefined fields are left out
+    const keys = Object.keys(object).filter((key) => object[key] !== undefined);
+    this.header(0x80, keys.length, 0xde);
+    for (const key of keys) {
+      const index = KEY_INDEX.get(key);
+      if (index !== undefined) this.u8(index);
+      else this.string(key);
+      this.value(object[key]);
+    }
+  }
+}
+
+/**
+ * Encode a dashboard message.
+ */
+export function packMessage(message: unknown): Uint8Array {
+  const writer = new Writer();
+  writer.value(message);
+  return writer.bytes.slice(0, writer.length);
+}
+
+class Reader {
+  bytes: Uint8Array;
+  view: DataView;
+  offset = 0;
+  interned: string[] = [];
+
+  constructor(bytes: Uint8Array) {
+    this.bytes = bytes;
+    this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  }
+
+  value(): unknown {
+    const byte = this.view.getUint8(this.offset++);
+    if (byte < 0x80) return byte;
+    if (byte >= 0xe0) return byte - 0x100;
+    if (byte >= 0xa0 && byte < 0xc0) return this.string(byte & 0x1f);
+    if (byte >= 0x90 && byte < 0xa0) return this.array(byte & 0x0f);
+    if (byte >= 0x80 && byte < 0x90) return this.map(byte & 0x0f);
+
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xcc: return this.view.getUint8(this.advance(1));
+      case 0xcd: return this.view.getUint16(this.advance(2));
+      case 0xce: return this.view.getUint32(this.advance(4));
+      case 0xd0: return this.view.getInt8(this.advance(1));
+      case 0xd1: return this.view.getInt16(this.advance(2));
+      case 0xd2: return this.view.getInt32(this.advance(4));
+      case 0xca: return this.view.getFloat32(this.advance(4));
+      case 0xcb: return this.view.getFloat64(this.advance(8));
+      case 0xd9: return this.string(this.view.getUint8(this.advance(1)));
+      case 0xda: return this.string(this.view.getUint16(this.advance(2)));
+      case 0xdb: return this.string(this.view.getUint32(this.advance(4)));
+      case 0xdc: return this.array(this.view.getUint16(this.advance(2)));
+      case 0xdd: return this.array(this.view.getUint32(this.advance(4)));
+      case 0xde: return this.map(this.view.getUint16(this.advance(2)));
+      case 0xdf: return this.map(this.view.getUint32(this.advance(4)));
+      case 0xd4: return this.ext(1);
+      case 0xd5: return this.ext(2);
+      case 0xd7: return this.ext(8);
+    }
+    throw new Error(`Unsupported pack byte 0x${byte.toString(16)} at ${this.offset - 1}`);
+  }
+
+  advance(n: number): number {
+    const at = this.offset;
+    this.offset += n;
+    return at;
+  }
+
+  string(size: number): string {
+    const start = this.advance(size);
+    const value = textDecoder.decode(this.bytes.subarray(start, start + size));
+    if (value.length >= MIN_INTERN_LENGTH && this.interned.length < MAX_INTERNED) this.interned.push(value);
+    return value;
+  }
+
+  array(n: number): unknown[] {
+    const items = new Array<unknown>(n);
+    for (let i = 0; i < n; i++) items[i] = this.value();
+    return items;
+  }
+
+  map(n: number): Record<string, unknown> {
+    const object: Record<string, unknown> = {};
+    for (let i = 0; i < n; i++) {
+      const key = this.value();
+      object[typeof key === "number" ? (PACK_KEYS[key] ?? String(key)) : String(key)] = this.value();
+    }
+    return object;
+  }
+
+  ext(size: number): unknown {
+    const type = this.view.getInt8(this.advance(1));
+    if (type === EXT_STRING_REF) {
+      const ref = size === 1 ? this.view.getUint8(this.advance(1)) : this.view.getUint16(this.advance(2));
+      return this.interned[ref];
+    }
+    if (type === EXT_TIMESTAMP && size === 8) {
+      const hi = this.view.getUint32(this.advance(4));
+      const lo = this.view.getUint32(this.advance(4));
+      const sec = (hi & 0x3) * 2 ** 32 + lo;
+      const nsec = hi >>> 2;
+      return new Date(sec * 1000 + Math.round(nsec / 1e6)).toISOString();
+    }
+    throw new Error(`Unsupported pack extension ${type}`);
+  }
+}
+
+/**
+ * Decode a dashboard message (timestamps come back as ISO strings, as
+ * they would from JSON). Used by tests and the codec benchmark.
+ */
+export function unpackMessage(bytes: Uint8Array): unknown {
+  return new Reader(bytes).value();
+}
@@ -0,0 +1,66 @@
+/**
+ * In-memory sliding dedup window built from a ring of time buckets.
+ *
+ * Each bucket holds the keys seen during one `bucketMs` slice; a bucket is
+ * cleared when the ring wraps onto it, so memory is bounded by the keys seen
+ * in the last window. Lookups touch a fixed number of buckets, making the
+ * check O(1). Granularity is one bucket: a key may be remembered for up to
+ * `windowMs + bucketMs`.
+ */
+
+interface Bucket {
+  epoch: number;
+  keys: Set<string>;
+}
+
+export class DedupWindow {
+  private readonly bucketMs: number;
+  private readonly span: number;
+  private readonly ring: Bucket[];
+
+  constructor(windowMs = 5_000, bucketMs = 1_000) {
+    this.bucketMs = bucketMs;
+    this.span = Math.ceil(windowMs / bucketMs);
+    this.ring = Array.from({ length: this.span + 1 }, () => ({ epoch: -1, keys: new Set<string>() }));
+  }
+
+  /**
+   * Record the key unless it was already seen within the window.
+   * @returns true if the key is new, false if it is a duplicate
+   */
+  checkAndRecord(key: string, now = Date.now()): boolean {
+    if (this.has(key, now)) return false;
+    this.record(key, now);
+    return true;
+  }
+
+  has(key: string, now = Date.now()): boolean {
+    const current = Math.floor(now / this.bucketMs);
+    for (const bucket of this.ring) {
+      if (bucket.epoch >= current - this.span && bucket.epoch <= current && bucket.keys.has(key)) {
+        return true;
+      }
+    }
+    return false;
+  }
+
+  record(key: string, at = Date.now()): void {
+    const epoch = Math.floor(at / this.bucketMs);
+    const bucket = this.ring[epoch % this.ring.length]!;
+    if (bucket.epoch !== epoch) {
+      if (bucket.epoch > epoch) return; // older than anything the ring still holds
+      bucket.epoch = epoch;
+      bucket.keys.clear();
+    }
+    bucket.keys.add(key);
+  }
+
+  /**
+   * Seed from persisted requests (e.g. after a restart).
+   */
+  seed(entries: { key: string; at: Date }[]): void {
+    for (const entry of entries) {
+      this.record(entry.key, entry.at.getTime());
+    }
+  }
+}
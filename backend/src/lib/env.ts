@@ -0,0 +1,15 @@
+import { logger } from "./logger";
+
+/**
+ * A positive integer setting; unset or invalid values (e.g. a typo that
+ * parses to NaN, which would silently disable a size bound or interval)
+ * use the default.
+ */
+export function positiveIntEnv(name: string, fallback: number): number {
+  const raw = process.env[name];
+  if (raw === undefined || raw === "") return fallback;
+  const value = Number(raw);
+  if (Number.isInteger(value) && value >= 1) return value;
+  logger.warn("Invalid setting, using default", { name, value: raw, default: fallback });
+  return fallback;
+}
@@ -0,0 +1,58 @@
+/**
+ * Per-event-type retention policy for raw TikTok events.
+ *
+ * - raw:      store every event as a `tiktok_raw_event` row
+ * - sample:N  store 1 in N events
+ * - rollup:   only count into per-session per-second `tiktok_event_rollup` rows
+ * - drop:     store nothing
+ *
+ * Configured with RAW_EVENT_POLICY, e.g. "like=rollup,member=sample:10,share=raw".
+ * Unlisted event types fall back to DEFAULT_POLICIES, then to raw.
+ */
+
+export type RawEventPolicy =
+  | { mode: "raw" }
+  | { mode: "sample"; every: number }
+  | { mode: "rollup" }
+  | { mode: "drop" };
+
+const RAW: RawEventPolicy = { mode: "raw" };
+
+// High-volume events carry little per-row value; keep their time series only
+const DEFAULT_POLICIES: Record<string, RawEventPolicy> = {
+  like: { mode: "rollup" },
+  member: { mode: "rollup" },
+  roomUser: { mode: "rollup" },
+};
+
+/**
+ * Parse a policy string. Invalid entries are ignored.
+ */
+export function parseEventPolicies(spec: string | undefined): Record<string, RawEventPolicy> {
+  const policies: Record<string, RawEventPolicy> = { ...DEFAULT_POLICIES };
+  if (!spec) return policies;
+
+  for (const entry of spec.split(",")) {
+    const [eventType, rule] = entry.split("=").map((part) => part.trim());
+    if (!eventType || !rule) continue;
+
+    if (rule === "raw" || rule === "rollup" || rule === "drop") {
+      policies[eventType] = { mode: rule };
+      continue;
+    }
+
+    const sample = rule.match(/^sample:(\d+)$/);
+    if (sample?.[1] && Number(sample[1]) >= 1) {
+      policies[eventType] = { mode: "sample", every: Number(sample[1]) };
+    }
+  }
+
+  return policies;
+}
+
+export function policyFor(
+  policies: Record<string, RawEventPolicy>,
+  eventType: string
+): RawEventPolicy {
+  return policies[eventType] ?? RAW;
+}
@@ -0,0 +1,57 @@
+/**
+ * Row encoding for history exports: CSV (RFC 4180, CRLF line endings) or
+ * NDJSON, one page of rows at a time.
+ *
+ * CSV cells that a spreadsheet would run as a formula (text starting with
+ * = + - @ or a control character) are prefixed with a quote, since most of
+ * the text comes from viewers' chat messages.
+ */
+
+export type ExportFormat = "csv" | "ndjson";
+
+export const EXPORT_CONTENT_TYPES: Record<ExportFormat, string> = {
+  csv: "text/csv; charset=utf-8",
+  ndjson: "application/x-ndjson",
+};
+
+/** A named output column and how to read it from a row */
+export interface ExportColumn<T> {
+  name: string;
+  value: (row: T) => unknown;
+}
+
+export function parseExportFormat(value: unknown): ExportFormat | null {
+  return value === "csv" || value === "ndjson" ? value : null;
+}
+
+/** The CSV header line; NDJSON has none */
+export function encodeHeader<T>(format: ExportFormat, columns: ExportColumn<T>[]): string {
+  if (format === "ndjson") return "";
+  return columns.map((column) => csvCell(column.name)).join(",") + "\r\n";
+}
+
+export function encodeRows<T>(format: ExportFormat, columns: ExportColumn<T>[], rows: T[]): string {
+  let out = "";
+  for (const row of rows) {
+    if (format === "csv") {
+      out += columns.map((column) => csvCell(column.value(row))).join(",") + "\r\n";
+    } else {
+      const record: Record<string, unknown> = {};
+      for (const column of columns) record[column.name] = column.value(row) ?? null;
+      out += JSON.stringify(record) + "\n";
+    }
+  }
+  return out;
+}
+
+const FORMULA_PREFIX = /^[=+\-@\t\r]/;
+const NEEDS_QUOTES = /[",\r\n]/;
+
+export function csvCell(value: unknown): string {
+  if (value === null || value === undefined) return "";
+  if (value instanceof Date) return value.toISOString();
+  if (typeof value !== "string") return String(value);
+
+  const text = FORMULA_PREFIX.test(value) ? `'${value}` : value;
+  return NEEDS_QUOTES.test(text) ? `"${text.replaceAll('"', '""')}"` : text;
+}
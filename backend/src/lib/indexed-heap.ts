@@ -0,0 +1,170 @@
+/**
+ * Binary min-heap addressable by id.
+ *
+ * A side map from id to array slot makes update (decrease- or
+ * increase-key) and remove O(log n), which a plain heap can't do without
+ * a linear search. Ties on priority are broken by id so the order is
+ * deterministic.
+ */
+
+export interface HeapEntry<T> {
+  id: string;
+  priority: number;
+  value: T;
+}
+
+export class IndexedHeap<T> {
+  private entries: HeapEntry<T>[] = [];
+  private slots = new Map<string, number>();
+
+  get size(): number {
+    return this.entries.length;
+  }
+
+  has(id: string): boolean {
+    return this.slots.has(id);
+  }
+
+  get(id: string): HeapEntry<T> | undefined {
+    const slot = this.slots.get(id);
+    return slot === undefined ? undefined : this.entries[slot];
+  }
+
+  /** Insert, or update priority and value if the id is already present */
+  push(id: string, priority: number, value: T): void {
+    const slot = this.slots.get(id);
+    if (slot !== undefined) {
+      this.entries[slot]!.value = value;
+      this.update(id, priority);
+      return;
+    }
+    this.entries.push({ id, priority, value });
+    this.slots.set(id, this.entries.length - 1);
+    this.siftUp(this.entries.length - 1);
+  }
+
+  /** Change an entry's priority. Returns false if the id isn't present. */
+  update(id: string, priority: number): boolean {
+    const slot = this.slots.get(id);
+    if (slot === undefined) return false;
+    const entry = this.entries[slot]!;
+    const previous = entry.priority;
+    entry.priority = priority;
+    if (priority < previous) this.siftUp(slot);
+    else if (priority > previous) this.siftDown(slot);
+    return true;
+  }
+
+  remove(id: string): HeapEntry<T> | undefined {
+    const slot = this.slots.get(id);
+    if (slot === undefined) return undefined;
+    const entry = this.entries[slot]!;
+    const last = this.entries.pop()!;
+    this.slots.delete(id);
+    if (slot < this.entries.length) {
+      this.entries[slot] = last;
+      this.slots.set(last.id, slot);
+      this.siftUp(slot);
+      this.siftDown(this.slots.get(last.id)!);
+    }
+    return entry;
+  }
+
+  peek(): HeapEntry<T> | undefined {
+    return this.entries[0];
+  }
+
+  pop(): HeapEntry<T> | undefined {
+    const top = this.entries[0];
+    if (top) this.remove(top.id);
+    return top;
+  }
+
+  /**
+   * The `k` smallest entries in order, without modifying the heap:
+   * O(k log k), walking the heap with a small frontier heap of slots.
+   */
+  top(k: number): HeapEntry<T>[] {
+    const out: HeapEntry<T>[] = [];
+    if (k <= 0 || this.entries.length === 0) return out;
+
+    const frontier: number[] = [0];
+    while (frontier.length > 0 && out.length < k) {
+      const slot = popSlot(frontier, this.entries);
+      out.push(this.entries[slot]!);
+      const left = 2 * slot + 1;
+      if (left < this.entries.length) pushSlot(frontier, this.entries, left);
+      if (left + 1 < this.entries.length) pushSlot(frontier, this.entries, left + 1);
+    }
+    return out;
+  }
+
+  private siftUp(slot: number): void {
+    const entry = this.entries[slot]!;
+    while (slot > 0) {
+      const parentSlot = (slot - 1) >> 1;
+      const parent = this.entries[parentSlot]!;
+      if (!less(entry, parent)) break;
+      this.entries[slot] = parent;
+      this.slots.set(parent.id, slot);
+      slot = parentSlot;
+    }
+    this.entries[slot] = entry;
+    this.slots.set(entry.id, slot);
+  }
+
+  private siftDown(slot: number): void {
+    const entry = this.entries[slot]!;
+    const length = this.entries.length;
+    for (;;) {
+      const left = 2 * slot + 1;
+      if (left >= length) break;
+      const right = left + 1;
+      const child = right < length && less(this.entries[right]!, this.entries[left]!) ? right : left;
+      const childEntry = this.entries[child]!;
+      if (!less(childEntry, entry)) break;
+      this.entries[slot] = childEntry;
+      this.slots.set(childEntry.id, slot);
+      slot = child;
+    }
+    this.entries[slot] = entry;
+    this.slots.set(entry.id, slot);
+  }
+}
+
+function less<T>(a: HeapEntry<T>, b: HeapEntry<T>): boolean {
+  return a.priority < b.priority || (a.priority === b.priority && a.id < b.id);
+}
+
+// Frontier for top(): a min-heap of slots in `entries`, ordered by their entry
+
+function pushSlot<T>(frontier: number[], entries: HeapEntry<T>[], slot: number): void {
+  let i = frontier.length;
+  frontier.push(slot);
+  while (i > 0) {
+    const parent = (i - 1) >> 1;
+    if (!less(entries[frontier[i]!]!, entries[frontier[parent]!]!)) break;
+    [frontier[i], frontier[parent]] = [frontier[parent]!, frontier[i]!];
+    i = parent;
+  }
+}
+
+function popSlot<T>(frontier: number[], entries: HeapEntry<T>[]): number {
+  const top = frontier[0]!;
+  const last = frontier.pop()!;
+  if (frontier.length > 0) {
+    frontier[0] = last;
+    let i = 0;
+    for (;;) {
+      const left = 2 * i + 1;
+      if (left >= frontier.length) break;
+      const right = left + 1;
+      const child =
+        right < frontier.length && less(entries[frontier[right]!]!, entries[frontier[left]!]!) ? right : left;
+      if (!less(entries[frontier[child]!]!, entries[frontier[i]!]!)) break;
+      [frontier[i], frontier[child]] = [frontier[child]!, frontier[i]!];
+      i = child;
+    }
+  }
+  return top;
+}
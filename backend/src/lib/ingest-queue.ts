@@ -0,0 +1,154 @@
+/**
+ * Bounded per-session ingest queue with load shedding.
+ *
+ * TikTok events are pushed synchronously from connector callbacks and
+ * processed by at most `concurrency` workers. When the queue is full the
+ * oldest droppable task (a `!play` request) is shed; non-droppable tasks
+ * (gifts) are always accepted, even past `maxDepth`.
+ */
+
+import { logger } from "./logger";
+
+export interface IngestTask {
+  /** Task kind, used for logs and stats */
+  kind: string;
+  /** Droppable tasks may be shed under load (never set for gifts) */
+  droppable: boolean;
+  run: () => Promise<void>;
+  /** Called instead of `run` when the task is shed */
+  onDrop?: () => void;
+}
+
+export interface IngestQueueOptions {
+  concurrency: number;
+  maxDepth: number;
+}
+
+export interface IngestQueueStats {
+  depth: number;
+  peakDepth: number;
+  inFlight: number;
+  processed: number;
+  failed: number;
+  dropped: number;
+}
+
+export class IngestQueue {
+  private readonly name: string;
+  private readonly concurrency: number;
+  private readonly maxDepth: number;
+  private pending: IngestTask[] = [];
+  private inFlight = 0;
+  private peakDepth = 0;
+  private processed = 0;
+  private failed = 0;
+  private dropped = 0;
+  private closed = false;
+  private idleWaiters: (() => void)[] = [];
+
+  constructor(name: string, options: IngestQueueOptions) {
+    this.name = name;
+    this.concurrency = Math.max(1, options.concurrency);
+    this.maxDepth = Math.max(1, options.maxDepth);
+  }
+
+  /**
+   * Enqueue a task. Returns false if the task itself was shed.
+   */
+  push(task: IngestTask): boolean {
+    if (this.closed) {
+      this.drop(task);
+      return false;
+    }
+
+    if (this.pending.length >= this.maxDepth && task.droppable) {
+      // Shed the oldest droppable task to make room
+      const oldest = this.pending.findIndex((t) => t.droppable);
+      if (oldest === -1) {
+        this.drop(task);
+        return false;
+      }
+      const [shed] = this.pending.splice(oldest, 1);
+      if (shed) this.drop(shed);
+    }
+
+    this.pending.push(task);
+    if (this.pending.length > this.peakDepth) this.peakDepth = this.pending.length;
+    this.pump();
+    return true;
+  }
+
+  /**
+   * Stop accepting tasks and wait for queued + in-flight tasks to finish.
+   */
+  async drain(): Promise<void> {
+    this.closed = true;
+    if (this.pending.length === 0 && this.inFlight === 0) return;
+    await new Promise<void>((resolve) => this.idleWaiters.push(resolve));
+  }
+
+  /**
+   * Stop accepting tasks and discard queued ones without running them or
+   * their drop handlers. In-flight tasks still finish.
+   */
+  discard(): void {
+    this.closed = true;
+    this.pending = [];
+    if (this.inFlight === 0) {
+      for (const resolve of this.idleWaiters.splice(0)) resolve();
+    }
+  }
+
+  get stats(): IngestQueueStats {
+    return {
+      depth: this.pending.length,
+      peakDepth: this.peakDepth,
+      inFlight: this.inFlight,
+      processed: this.processed,
+      failed: this.failed,
+      dropped: this.dropped,
+    };
+  }
+
+  private pump(): void {
+    while (this.inFlight < this.concurrency && this.pending.length > 0) {
+      const task = this.pending.shift()!;
+      this.inFlight++;
+      task
+        .run()
+        .then(
+          () => {
+            this.processed++;
+          },
+          (err) => {
+            this.failed++;
+            logger.error("Ingest task failed", {
+              queue: this.name,
+              kind: task.kind,
+              error: String(err),
+            });
+          }
+        )
+        .finally(() => {
+          this.inFlight--;
+          this.pump();
+          if (this.pending.length === 0 && this.inFlight === 0) {
+            for (const resolve of this.idleWaiters.splice(0)) resolve();
+          }
+        });
+    }
+  }
+
+  private drop(task: IngestTask): void {
+    this.dropped++;
+    try {
+      task.onDrop?.();
+    } catch (err) {
+      logger.error("Ingest drop handler failed", {
+        queue: this.name,
+        kind: task.kind,
+        error: String(err),
+      });
+    }
+  }
+}
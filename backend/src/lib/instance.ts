@@ -0,0 +1,8 @@
+import { hostname } from "node:os";
+
+/**
+ * Identifies this backend process across instances (lease owners, event
+ * origins). Override with INSTANCE_ID for stable names in logs.
+ */
+export const INSTANCE_ID =
+  process.env.INSTANCE_ID ?? `${hostname()}-${process.pid}-${crypto.randomUUID().slice(0, 8)}`;
@@ -0,0 +1,49 @@
+/**
+ * Keyset pagination over (timestamp, id).
+ *
+ * A page is fetched from strictly after (or before) the position of the
+ * previous page's last row, so it costs one index range scan wherever it
+ * starts, and rows sharing a timestamp are neither skipped nor repeated.
+ * Clients see positions as opaque base64url cursors. Timestamps are kept
+ * to the millisecond, which is all the rows written from a JS Date have.
+ */
+
+export interface KeysetCursor {
+  at: Date;
+  id: string;
+}
+
+const MAX_CURSOR_LENGTH = 256;
+
+export function encodeCursor(cursor: KeysetCursor): string {
+  return Buffer.from(`${cursor.at.getTime()}:${cursor.id}`).toString("base64url");
+}
+
+/** Parse a cursor from a query string; null if missing or malformed */
+export function decodeCursor(value: unknown): KeysetCursor | null {
+  if (typeof value !== "string" || value.length === 0 || value.length > MAX_CURSOR_LENGTH) return null;
+  const text = Buffer.from(value, "base64url").toString();
+  const separator = text.indexOf(":");
+  if (separator <= 0) return null;
+
+  const ms = Number(text.slice(0, separator));
+  const id = text.slice(separator + 1);
+  if (!Number.isSafeInteger(ms) || id.length === 0) return null;
+  return { at: new Date(ms), id };
+}
+
+export interface Page<T> {
+  items: T[];
+  /** Cursor for the next page, or null if this is the last */
+  nextCursor: string | null;
+}
+
+/**
+ * Turn `limit + 1` fetched rows into a page of `limit`; the extra row only
+ * tells whether there's another page.
+ */
+export function toPage<T>(rows: T[], limit: number, position: (row: T) => KeysetCursor): Page<T> {
+  if (rows.length <= limit) return { items: rows, nextCursor: null };
+  const items = rows.slice(0, limit);
+  return { items, nextCursor: encodeCursor(position(items[items.length - 1]!)) };
+}
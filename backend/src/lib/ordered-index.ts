@@ -0,0 +1,162 @@
+/**
+ * Ordered collection keyed by (position, id), with O(log n) insert, remove,
+ * rank and index lookups.
+ *
+ * Implemented as a treap (a binary search tree balanced by random node
+ * priorities) with subtree sizes, so "the item at index k" and "the index
+ * of this item" are both logarithmic. An item's position must not change
+ * while it's in the index: remove it, update it, and insert it again.
+ */
+
+export interface Positioned {
+  id: string;
+  position: number;
+}
+
+interface Node<T> {
+  item: T;
+  priority: number;
+  size: number;
+  left: Node<T> | null;
+  right: Node<T> | null;
+}
+
+function compare(a: Positioned, b: Positioned): number {
+  if (a.position !== b.position) return a.position < b.position ? -1 : 1;
+  return a.id < b.id ? -1 : a.id > b.id ? 1 : 0;
+}
+
+function size<T>(node: Node<T> | null): number {
+  return node ? node.size : 0;
+}
+
+function update<T>(node: Node<T>): Node<T> {
+  node.size = 1 + size(node.left) + size(node.right);
+  return node;
+}
+
+/** Split into (< key, >= key) */
+function split<T extends Positioned>(node: Node<T> | null, key: Positioned): [Node<T> | null, Node<T> | null] {
+  if (!node) return [null, null];
+  if (compare(node.item, key) < 0) {
+    const [left, right] = split(node.right, key);
+    node.right = left;
+    return [update(node), right];
+  }
+  const [left, right] = split(node.left, key);
+  node.left = right;
+  return [left, update(node)];
+}
+
+/** Join two trees where every key in `a` sorts before every key in `b` */
+function merge<T>(a: Node<T> | null, b: Node<T> | null): Node<T> | null {
+  if (!a) return b;
+  if (!b) return a;
+  if (a.priority > b.priority) {
+    a.right = merge(a.right, b);
+    return update(a);
+  }
+  b.left = merge(a, b.left);
+  return update(b);
+}
+
+export class OrderedIndex<T extends Positioned> {
+  private root: Node<T> | null = null;
+  private byId = new Map<string, T>();
+  // In-order copy for reads, rebuilt lazily after a change
+  private snapshot: T[] | null = [];
+
+  get size(): number {
+    return this.byId.size;
+  }
+
+  get(id: string): T | undefined {
+    return this.byId.get(id);
+  }
+
+  /** Add an item (replacing any item with the same id) */
+  insert(item: T): void {
+    if (this.byId.has(item.id)) this.remove(item.id);
+    const [left, right] = split(this.root, item);
+    const node: Node<T> = { item, priority: Math.random(), size: 1, left: null, right: null };
+    this.root = merge(merge(left, node), right);
+    this.byId.set(item.id, item);
+    this.snapshot = null;
+  }
+
+  remove(id: string): T | undefined {
+    const item = this.byId.get(id);
+    if (!item) return undefined;
+    this.root = this.removeNode(this.root, item);
+    this.byId.delete(id);
+    this.snapshot = null;
+    return item;
+  }
+
+  /** Item at a 0-based index in order */
+  at(index: number): T | undefined {
+    let node = this.root;
+    while (node) {
+      const leftSize = size(node.left);
+      if (index < leftSize) {
+        node = node.left;
+      } else if (index === leftSize) {
+        return node.item;
+      } else {
+        index -= leftSize + 1;
+        node = node.right;
+      }
+    }
+    return undefined;
+  }
+
+  /** 0-based index of an item, or -1 */
+  indexOf(id: string): number {
+    const item = this.byId.get(id);
+    if (!item) return -1;
+    let index = 0;
+    let node = this.root;
+    while (node) {
+      const order = compare(item, node.item);
+      if (order === 0) return index + size(node.left);
+      if (order < 0) {
+        node = node.left;
+      } else {
+        index += size(node.left) + 1;
+        node = node.right;
+      }
+    }
+    return -1;
+  }
+
+  /** All items in order. The array is shared until the next change; don't mutate it. */
+  toArray(): readonly T[] {
+    if (this.snapshot) return this.snapshot;
+    const out: T[] = [];
+    const stack: Node<T>[] = [];
+    let node = this.root;
+    while (node || stack.length > 0) {
+      while (node) {
+        stack.push(node);
+        node = node.left;
+      }
+      node = stack.pop()!;
+      out.push(node.item);
+      node = node.right;
+    }
+    this.snapshot = out;
+    return out;
+  }
+
+  private removeNode(node: Node<T> | null, item: T): Node<T> | null {
+    if (!node) return null;
+    const order = compare(item, node.item);
+    if (order === 0) return merge(node.left, node.right);
+    if (order < 0) {
+      node.left = this.removeNode(node.left, item);
+    } else {
+      node.right = this.removeNode(node.right, item);
+    }
+    return update(node);
+  }
+}
@@ -1,53 +1,327 @@
 /**
- * In-memory rate limiter
- * For production with multiple instances, use Redis
+ * Song request rate limiting per (live session, viewer).
+ *
+ * Each streamer picks a policy: a token bucket (burst of `capacity`,
+ * refilled continuously) or a sliding window (at most `limit` per
+ * `windowMs`, approximated from the current and previous fixed windows).
+ * Gifts can buy extra requests on top of either.
+ *
+ * The policy math works on a small plain state object so the in-memory
+ * limiter here and the shared Postgres limiter (services/rate-limiter)
+ * behave identically.
  */
 
-interface RateLimitEntry {
-  count: number;
-  resetAt: number;
+import { positiveIntEnv } from "./env";
+
+export interface GiftBoost {
+  /** Diamonds per extra request */
+  diamondsPerRequest: number;
+  /** Most extra requests a viewer can hold */
+  maxBonus: number;
 }
 
-const limits = new Map<string, RateLimitEntry>();
+export type RateLimitPolicy =
+  | { kind: "token-bucket"; capacity: number; refillPerMinute: number; giftBoost?: GiftBoost }
+  | { kind: "sliding-window"; limit: number; windowMs: number; giftBoost?: GiftBoost };
+
+/** 2 requests per 30 seconds, no gift boost */
+export const DEFAULT_RATE_LIMIT_POLICY: RateLimitPolicy = { kind: "sliding-window", limit: 2, windowMs: 30_000 };
 
-// Configuration
-const WINDOW_MS = 30_000; // 30 seconds
-const MAX_REQUESTS = 2; // 2 requests per window
+// Unused gift bonus lapses after this long
+const BONUS_TTL_MS = 30 * 60_000;
 
 /**
- * Check if a viewer can make a request
- * @returns true if allowed, false if rate limited
+ * Limiter state for one viewer. Token bucket: `a` tokens as of `at`.
+ * Sliding window: `a` requests in the window starting at `at`, `b` in the
+ * window before it.
  */
-export function checkRateLimit(viewerId: string): boolean {
-  const now = Date.now();
-  const entry = limits.get(viewerId);
+export interface LimiterState {
+  a: number;
+  b: number;
+  at: number;
+  bonus: number;
+  bonusUntil: number;
+}
+
+export function freshState(policy: RateLimitPolicy, now: number): LimiterState {
+  if (policy.kind === "token-bucket") {
+    return { a: policy.capacity, b: 0, at: now, bonus: 0, bonusUntil: 0 };
+  }
+  return { a: 0, b: 0, at: Math.floor(now / policy.windowMs) * policy.windowMs, bonus: 0, bonusUntil: 0 };
+}
+
+/** Bring `state` forward to `now` (refill tokens, roll windows, lapse bonus) */
+function advance(policy: RateLimitPolicy, state: LimiterState, now: number): void {
+  if (state.bonus > 0 && now >= state.bonusUntil) state.bonus = 0;
 
-  // No entry or expired window
-  if (!entry || now > entry.resetAt) {
-    limits.set(viewerId, { count: 1, resetAt: now + WINDOW_MS });
+  if (policy.kind === "token-bucket") {
+    const elapsed = Math.max(0, now - state.at);
+    state.a = Math.min(policy.capacity, state.a + (elapsed * policy.refillPerMinute) / 60_000);
+    state.at = now;
+    return;
+  }
+
+  const windowStart = Math.floor(now / policy.windowMs) * policy.windowMs;
+  if (windowStart === state.at) return;
+  state.b = windowStart - state.at === policy.windowMs ? state.a : 0;
+  state.a = 0;
+  state.at = windowStart;
+}
+
+/**
+ * Take one request from `state` (mutated). Gift bonus is spent first.
+ */
+export function consume(policy: RateLimitPolicy, state: LimiterState, now: number): boolean {
+  advance(policy, state, now);
+
+  if (state.bonus > 0) {
+    state.bonus--;
     return true;
   }
 
-  // Within window, check count
-  if (entry.count >= MAX_REQUESTS) {
-    return false;
+  if (policy.kind === "token-bucket") {
+    if (state.a < 1) return false;
+    state.a -= 1;
+    return true;
   }
 
-  entry.count++;
+  const previousWeight = 1 - (now - state.at) / policy.windowMs;
+  if (state.a + state.b * previousWeight >= policy.limit) return false;
+  state.a++;
   return true;
 }
 
 /**
- * Clean up expired entries (call periodically)
+ * Credit a gift to `state` (mutated). Returns the requests it bought.
  */
-export function cleanupRateLimits(): void {
-  const now = Date.now();
-  for (const [key, entry] of limits) {
-    if (now > entry.resetAt) {
-      limits.delete(key);
-    }
+export function addGiftBonus(policy: RateLimitPolicy, state: LimiterState, diamonds: number, now: number): number {
+  const boost = policy.giftBoost;
+  if (!boost || diamonds <= 0) return 0;
+  advance(policy, state, now);
+
+  const granted = Math.min(Math.floor(diamonds / boost.diamondsPerRequest), boost.maxBonus - state.bonus);
+  if (granted <= 0) return 0;
+  state.bonus += granted;
+  state.bonusUntil = now + BONUS_TTL_MS;
+  return granted;
+}
+
+/**
+ * When `state` becomes indistinguishable from a fresh one (and can be
+ * forgotten).
+ */
+export function idleAt(policy: RateLimitPolicy, state: LimiterState): number {
+  let until: number;
+  if (policy.kind === "token-bucket") {
+    until = state.at + ((policy.capacity - state.a) * 60_000) / policy.refillPerMinute;
+  } else {
+    until = state.at + (state.a > 0 ? 2 : state.b > 0 ? 1 : 0) * policy.windowMs;
+  }
+  return state.bonus > 0 ? Math.max(until, state.bonusUntil) : until;
+}
+
+function positive(value: unknown, max: number): value is number {
+  return typeof value === "number" && Number.isFinite(value) && value > 0 && value <= max;
+}
+
+/**
+ * Validate a policy from the API or the DB. Returns null if invalid.
+ */
+export function parseRateLimitPolicy(input: unknown): RateLimitPolicy | null {
+  if (!input || typeof input !== "object") return null;
+  const p = input as Record<string, unknown>;
+
+  let giftBoost: GiftBoost | undefined;
+  if (p.giftBoost !== undefined && p.giftBoost !== null) {
+    const g = p.giftBoost as Record<string, unknown>;
+    if (!positive(g.diamondsPerRequest, 1_000_000) || !positive(g.maxBonus, 100)) return null;
+    if (!Number.isInteger(g.maxBonus)) return null;
+    giftBoost = { diamondsPerRequest: g.diamondsPerRequest, maxBonus: g.maxBonus };
+  }
+
+  if (p.kind === "token-bucket") {
+    if (!positive(p.capacity, 100) || !positive(p.refillPerMinute, 600)) return null;
+    return { kind: "token-bucket", capacity: p.capacity, refillPerMinute: p.refillPerMinute, giftBoost };
   }
+  if (p.kind === "sliding-window") {
+    if (!positive(p.limit, 100) || !positive(p.windowMs, 24 * 60 * 60_000)) return null;
+    return { kind: "sliding-window", limit: p.limit, windowMs: p.windowMs, giftBoost };
+  }
+  return null;
 }
 
-// Cleanup every 5 minutes
-setInterval(cleanupRateLimits, 5 * 60 * 1000);
+export interface RateLimiterStats {
+  store: "memory" | "postgres";
+  entries: number;
+  maxEntries: number;
+  checks: number;
+  limited: number;
+  boosts: number;
+  expired: number;
+  evicted: number;
+}
+
+/**
+ * Rate limiter as used by TikTokService: in memory (ViewerRateLimiter) or
+ * shared through Postgres.
+ */
+export interface RateLimiter {
+  setPolicy(sessionId: string, policy: RateLimitPolicy): void;
+  clearSession(sessionId: string): void;
+  /** Take one request for a viewer; false if they're over the limit */
+  check(sessionId: string, viewer: string): boolean | Promise<boolean>;
+  /** Credit a gift (total diamonds) toward extra requests */
+  boost(sessionId: string, viewer: string, diamonds: number): void | Promise<void>;
+  readonly stats: RateLimiterStats;
+  /** Stop background work, if any */
+  stop?(): void;
+}
+
+const TICK_MS = 1_000;
+const WHEEL_SLOTS = 4_096; // ~68 minute horizon; later expiries wait in the last slot
+const DEFAULT_MAX_ENTRIES = positiveIntEnv("RATE_LIMIT_MAX_ENTRIES", 500_000);
+const EVICT_FRACTION = 0.01;
+
+interface Entry extends LimiterState {
+  key: string;
+  /** Tick at which the entry is idle */
+  tick: number;
+  /** Wheel slot currently holding it */
+  slot: number;
+}
+
+/**
+ * In-memory limiter. Entries are dropped once idle (back to a fresh state)
+ * using a timer wheel: each entry sits in the slot for its idle tick, and
+ * advancing the clock only visits the slots that came due, so expiry is
+ * O(1) per entry with no full scans. At maxEntries, the entries closest
+ * to expiring are evicted first; an evicted viewer starts over with a full
+ * allowance.
+ */
+export class ViewerRateLimiter implements RateLimiter {
+  private entries = new Map<string, Entry>();
+  private policies = new Map<string, RateLimitPolicy>();
+  private wheel: Set<Entry>[] = Array.from({ length: WHEEL_SLOTS }, () => new Set<Entry>());
+  private currentTick: number;
+  private readonly maxEntries: number;
+  private checks = 0;
+  private limited = 0;
+  private boosts = 0;
+  private expired = 0;
+  private evicted = 0;
+
+  constructor(options: { maxEntries?: number; now?: number } = {}) {
+    this.maxEntries = Math.max(1, options.maxEntries ?? DEFAULT_MAX_ENTRIES);
+    this.currentTick = Math.floor((options.now ?? Date.now()) / TICK_MS);
+  }
+
+  setPolicy(sessionId: string, policy: RateLimitPolicy): void {
+    this.policies.set(sessionId, policy);
+  }
+
+  /** Forget a session's policy; its entries expire on their own */
+  clearSession(sessionId: string): void {
+    this.policies.delete(sessionId);
+  }
+
+  check(sessionId: string, viewer: string, now = Date.now()): boolean {
+    this.checks++;
+    this.tick(now);
+    const policy = this.policies.get(sessionId) ?? DEFAULT_RATE_LIMIT_POLICY;
+    const entry = this.entryFor(sessionId, viewer, policy, now);
+
+    const allowed = consume(policy, entry, now);
+    if (!allowed) this.limited++;
+    this.schedule(entry, idleAt(policy, entry));
+    return allowed;
+  }
+
+  boost(sessionId: string, viewer: string, diamonds: number, now = Date.now()): void {
+    const policy = this.policies.get(sessionId) ?? DEFAULT_RATE_LIMIT_POLICY;
+    if (!policy.giftBoost) return;
+    this.tick(now);
+    const entry = this.entryFor(sessionId, viewer, policy, now);
+    if (addGiftBonus(policy, entry, diamonds, now) > 0) this.boosts++;
+    this.schedule(entry, idleAt(policy, entry));
+  }
+
+  get stats(): RateLimiterStats {
+    return {
+      store: "memory",
+      entries: this.entries.size,
+      maxEntries: this.maxEntries,
+      checks: this.checks,
+      limited: this.limited,
+      boosts: this.boosts,
+      expired: this.expired,
+      evicted: this.evicted,
+    };
+  }
+
+  private entryFor(sessionId: string, viewer: string, policy: RateLimitPolicy, now: number): Entry {
+    const key = `${sessionId}\n${viewer}`;
+    let entry = this.entries.get(key);
+    if (!entry) {
+      if (this.entries.size >= this.maxEntries) this.evict();
+      entry = { key, tick: -1, slot: -1, ...freshState(policy, now) };
+      this.entries.set(key, entry);
+    }
+    return entry;
+  }
+
+  private schedule(entry: Entry, idleUntil: number): void {
+    const tick = Math.max(this.currentTick + 1, Math.ceil(idleUntil / TICK_MS));
+    const slot = Math.min(tick, this.currentTick + WHEEL_SLOTS - 1) % WHEEL_SLOTS;
+    entry.tick = tick;
+    if (slot === entry.slot) return;
+    if (entry.slot !== -1) this.wheel[entry.slot]!.delete(entry);
+    this.wheel[slot]!.add(entry);
+    entry.slot = slot;
+  }
+
+  /** Advance the wheel to `now`, expiring entries in the slots passed */
+  private tick(now: number): void {
+    const target = Math.floor(now / TICK_MS);
+    if (target <= this.currentTick) return;
+
+    if (target - this.currentTick >= WHEEL_SLOTS) {
+      // Idle for a whole rotation: every slot is due
+      this.currentTick = target;
+      for (let slot = 0; slot < WHEEL_SLOTS; slot++) this.expireSlot(slot);
+      return;
+    }
+    while (this.currentTick < target) {
+      this.currentTick++;
+      this.expireSlot(this.currentTick % WHEEL_SLOTS);
+    }
+  }
+
+  private expireSlot(slot: number): void {
+    const due = this.wheel[slot]!;
+    if (due.size === 0) return;
+    for (const entry of due) {
+      if (entry.tick <= this.currentTick) {
+        due.delete(entry);
+        this.entries.delete(entry.key);
+        this.expired++;
+      } else {
+        // Beyond the wheel's horizon when scheduled: move closer
+        this.schedule(entry, entry.tick * TICK_MS);
+      }
+    }
+  }
+
+  /** Drop the entries closest to expiring (they matter least) */
+  private evict(): void {
+    let remaining = Math.max(1, Math.floor(this.maxEntries * EVICT_FRACTION));
+    for (let i = 1; i <= WHEEL_SLOTS && remaining > 0; i++) {
+      const due = this.wheel[(this.currentTick + i) % WHEEL_SLOTS]!;
+      for (const entry of due) {
+        due.delete(entry);
+        this.entries.delete(entry.key);
+        this.evicted++;
+        if (--remaining === 0) break;
+      }
+    }
+  }
+}
@@ -0,0 +1,76 @@
+/**
+ * Schema-driven projection of raw TikTok connector events.
+ *
+ * Connector payloads carry full user profiles, badge arrays and image URL
+ * lists that have no value in `tiktok_raw_event`. Each event type keeps a
+ * whitelist of fields, and the projected object is serialized exactly once;
+ * the resulting JSON string is what gets size-capped, inserted as JSONB and
+ * spilled to disk.
+ */
+
+export const MAX_RAW_PAYLOAD_BYTES = 10_240; // 10KB
+
+/** Output key → candidate source paths (first defined value wins) */
+type FieldSpec = readonly [key: string, ...paths: readonly string[][]];
+
+const UNIQUE_ID: FieldSpec = ["uniqueId", ["uniqueId"], ["user", "uniqueId"]];
+const MSG_ID: FieldSpec = ["msgId", ["msgId"], ["common", "msgId"]];
+const CREATE_TIME: FieldSpec = ["createTime", ["createTime"], ["common", "createTime"]];
+const COMMON_FIELDS = [UNIQUE_ID, MSG_ID, CREATE_TIME] as const;
+
+const PROJECTIONS: Record<string, readonly FieldSpec[]> = {
+  chat: [...COMMON_FIELDS, ["comment", ["comment"]]],
+  gift: [
+    ...COMMON_FIELDS,
+    ["giftId", ["giftId"]],
+    ["giftName", ["giftName"], ["giftDetails", "giftName"]],
+    ["diamondCount", ["diamondCount"], ["giftDetails", "diamondCount"]],
+    ["repeatCount", ["repeatCount"]],
+    ["repeatEnd", ["repeatEnd"]],
+    ["giftType", ["giftType"], ["giftDetails", "giftType"]],
+  ],
+  like: [...COMMON_FIELDS, ["likeCount", ["likeCount"]], ["totalLikeCount", ["totalLikeCount"]]],
+  member: [...COMMON_FIELDS, ["actionId", ["actionId"]]],
+  roomUser: [MSG_ID, CREATE_TIME, ["viewerCount", ["viewerCount"]]],
+  subscribe: [...COMMON_FIELDS, ["subMonth", ["subMonth"]]],
+};
+
+/**
+ * Project an event to its whitelisted fields and serialize it once.
+ * Returns the JSON string to store (capped at MAX_RAW_PAYLOAD_BYTES).
+ */
+export function projectRawEvent(eventType: string, data: unknown): string {
+  const fields = PROJECTIONS[eventType] ?? COMMON_FIELDS;
+  const projected: Record<string, unknown> = {};
+
+  for (const [key, ...paths] of fields) {
+    for (const path of paths) {
+      const value = readPath(data, path);
+      if (value !== undefined) {
+        projected[key] = value;
+        break;
+      }
+    }
+  }
+
+  let json: string;
+  try {
+    json = JSON.stringify(projected);
+  } catch {
+    return '{"_serializationError":true}';
+  }
+
+  if (json.length > MAX_RAW_PAYLOAD_BYTES) {
+    return `{"_truncated":true,"_originalSize":${json.length}}`;
+  }
+  return json;
+}
+
+function readPath(data: unknown, path: readonly string[]): unknown {
+  let current = data;
+  for (const segment of path) {
+    if (current === null || typeof current !== "object") return undefined;
+    current = (current as Record<string, unknown>)[segment];
+  }
+  return current;
+}
@@ -0,0 +1,185 @@
+/**
+ * Incrementally maintained session report.
+ *
+ * Produces the same result as getSessionReport's queries (matched requests
+ * grouped by track and play status with request and distinct viewer
+ * counts, everything else counted as failed, and gift totals) from the
+ * request rows and patches as they're written, so the report never needs
+ * a rescan. Requests move between groups as they're matched and played, so
+ * distinct viewers are counted exactly (per-group viewer multisets)
+ * rather than with a sketch that can't un-count.
+ */
+import type { SongRequest } from "../db/schema";
+
+export interface ReportTrack {
+  spotifyTrackId: string | null;
+  trackName: string | null;
+  trackArtist: string | null;
+  albumImageUrl: string | null;
+  playStatus: SongRequest["playStatus"];
+  requestCount: number;
+  uniqueViewers: number;
+}
+
+export interface SessionReport {
+  tracks: ReportTrack[];
+  failedCount: number;
+  gifts: {
+    /** Sum of diamond_count × repeat_count over the session's gift events */
+    totalDiamonds: number;
+    giftCount: number;
+  };
+}
+
+/** The request fields the report depends on */
+export type ReportRequest = Pick<
+  SongRequest,
+  "viewerUsername" | "spotifyTrackId" | "trackName" | "trackArtist" | "albumImageUrl" | "searchStatus" | "playStatus"
+>;
+
+interface TrackGroup {
+  track: Omit<ReportTrack, "requestCount" | "uniqueViewers">;
+  requestCount: number;
+  /** viewer → requests from them in this group */
+  viewers: Map<string, number>;
+}
+
+function groupKey(request: ReportRequest): string | null {
+  if (request.searchStatus !== "matched") return null;
+  return JSON.stringify([
+    request.spotifyTrackId,
+    request.trackName,
+    request.trackArtist,
+    request.albumImageUrl,
+    request.playStatus,
+  ]);
+}
+
+export class SessionReportAggregate {
+  private requests = new Map<string, ReportRequest>();
+  private groups = new Map<string, TrackGroup>();
+  private failedCount = 0;
+  private totalDiamonds = 0;
+  private giftCount = 0;
+  private cached: SessionReport | null = null;
+  /** Bumped on every change */
+  version = 0;
+
+  get requestCount(): number {
+    return this.requests.size;
+  }
+
+  /** Count a new request row (or replace a known one) */
+  addRequest(id: string, request: ReportRequest): void {
+    const previous = this.requests.get(id);
+    if (previous) this.remove(previous);
+    const copy: ReportRequest = {
+      viewerUsername: request.viewerUsername,
+      spotifyTrackId: request.spotifyTrackId,
+      trackName: request.trackName,
+      trackArtist: request.trackArtist,
+      albumImageUrl: request.albumImageUrl,
+      searchStatus: request.searchStatus,
+      playStatus: request.playStatus,
+    };
+    this.requests.set(id, copy);
+    this.add(copy);
+    this.changed();
+  }
+
+  /** Apply a patch to a known request. Returns false if the id is unknown. */
+  updateRequest(id: string, patch: Partial<ReportRequest>): boolean {
+    const request = this.requests.get(id);
+    if (!request) return false;
+    this.remove(request);
+    for (const field of Object.keys(patch) as (keyof ReportRequest)[]) {
+      if (field in request && patch[field] !== undefined) {
+        (request as Record<keyof ReportRequest, unknown>)[field] = patch[field];
+      }
+    }
+    this.add(request);
+    this.changed();
+    return true;
+  }
+
+  /** Mirror markPendingNotPlayed: matched requests still pending weren't played */
+  markPendingNotPlayed(): void {
+    for (const request of this.requests.values()) {
+      if (request.searchStatus !== "matched" || request.playStatus !== "pending") continue;
+      this.remove(request);
+      request.playStatus = "not_played";
+      this.add(request);
+    }
+    this.changed();
+  }
+
+  addGift(diamondCount: number | null, repeatCount: number): void {
+    this.addGifts((diamondCount ?? 0) * repeatCount, 1);
+  }
+
+  addGifts(totalDiamonds: number, giftCount: number): void {
+    this.giftCount += giftCount;
+    this.totalDiamonds += totalDiamonds;
+    this.changed();
+  }
+
+  /** The report (cached until the next change) */
+  report(): SessionReport {
+    if (this.cached) return this.cached;
+    const tracks: ReportTrack[] = [];
+    for (const group of this.groups.values()) {
+      tracks.push({ ...group.track, requestCount: group.requestCount, uniqueViewers: group.viewers.size });
+    }
+    this.cached = {
+      tracks,
+      failedCount: this.failedCount,
+      gifts: { totalDiamonds: this.totalDiamonds, giftCount: this.giftCount },
+    };
+    return this.cached;
+  }
+
+  private add(request: ReportRequest): void {
+    const key = groupKey(request);
+    if (key === null) {
+      this.failedCount++;
+      return;
+    }
+    let group = this.groups.get(key);
+    if (!group) {
+      group = {
+        track: {
+          spotifyTrackId: request.spotifyTrackId,
+          trackName: request.trackName,
+          trackArtist: request.trackArtist,
+          albumImageUrl: request.albumImageUrl,
+          playStatus: request.playStatus,
+        },
+        requestCount: 0,
+        viewers: new Map(),
+      };
+      this.groups.set(key, group);
+    }
+    group.requestCount++;
+    group.viewers.set(request.viewerUsername, (group.viewers.get(request.viewerUsername) ?? 0) + 1);
+  }
+
+  private remove(request: ReportRequest): void {
+    const key = groupKey(request);
+    if (key === null) {
+      this.failedCount--;
+      return;
+    }
+    const group = this.groups.get(key);
+    if (!group) return;
+    group.requestCount--;
+    const n = (group.viewers.get(request.viewerUsername) ?? 1) - 1;
+    if (n === 0) group.viewers.delete(request.viewerUsername);
+    else group.viewers.set(request.viewerUsername, n);
+    if (group.requestCount === 0) this.groups.delete(key);
+  }
+
+  private changed(): void {
+    this.cached = null;
+    this.version++;
+  }
+}
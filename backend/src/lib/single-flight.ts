@@ -0,0 +1,43 @@
+/**
+ * Single-flight call coalescing.
+ *
+ * Concurrent callers asking for the same key share one in-flight promise;
+ * the key is released as soon as that promise settles, so later callers
+ * start a fresh call.
+ */
+
+export interface SingleFlightStats {
+  inFlight: number;
+  calls: number;
+  coalesced: number;
+}
+
+export class SingleFlight<T> {
+  private inFlight = new Map<string, Promise<T>>();
+  private calls = 0;
+  private coalesced = 0;
+
+  do(key: string, fn: () => Promise<T>): Promise<T> {
+    this.calls++;
+
+    const existing = this.inFlight.get(key);
+    if (existing) {
+      this.coalesced++;
+      return existing;
+    }
+
+    const promise = fn().finally(() => {
+      this.inFlight.delete(key);
+    });
+    this.inFlight.set(key, promise);
+    return promise;
+  }
+
+  get stats(): SingleFlightStats {
+    return {
+      inFlight: this.inFlight.size,
+      calls: this.calls,
+      coalesced: this.coalesced,
+    };
+  }
+}
@@ -0,0 +1,64 @@
+/**
+ * On-disk format of raw event spill segments (see RawEventArchiver).
+ *
+ * A segment is NDJSON, one event per line, written as a series of appended
+ * chunks; compressed segments hold one gzip member per chunk. A process
+ * that dies mid-append leaves a torn last line, or a truncated last gzip
+ * member: decoding keeps everything before the tear and skips the rest.
+ */
+
+import { gzipSync, gunzipSync, constants as zlibConstants } from "node:zlib";
+import type { RawTikTokEventInput } from "../db/queries";
+
+/**
+ * Encode events as one appendable chunk.
+ */
+export function encodeSpillChunk(events: RawTikTokEventInput[], compress: boolean): Buffer {
+  const lines = events.map(toSpillLine).join("\n") + "\n";
+  return compress ? gzipSync(lines) : Buffer.from(lines);
+}
+
+/**
+ * Decode a segment's events. Throws if the data is corrupt rather than
+ * merely truncated.
+ */
+export function decodeSegment(raw: Buffer, compressed: boolean): RawTikTokEventInput[] {
+  // Sync flush: a truncated final member yields what was decoded so far
+  // instead of an "unexpected end of file" error
+  const text = compressed
+    ? gunzipSync(raw, { finishFlush: zlibConstants.Z_SYNC_FLUSH }).toString("utf8")
+    : raw.toString("utf8");
+
+  const events: RawTikTokEventInput[] = [];
+  for (const line of text.split("\n")) {
+    if (!line) continue;
+    try {
+      const e = JSON.parse(line) as Omit<RawTikTokEventInput, "payload" | "receivedAt"> & {
+        payload: unknown;
+        receivedAt: string;
+      };
+      events.push({
+        ...e,
+        payload: JSON.stringify(e.payload),
+        receivedAt: new Date(e.receivedAt),
+      });
+    } catch {
+      // Torn write at crash time; skip the line
+    }
+  }
+  return events;
+}
+
+/**
+ * One NDJSON line per event. The payload is already JSON and is embedded
+ * as-is rather than re-encoded as a string.
+ */
+function toSpillLine(e: RawTikTokEventInput): string {
+  return (
+    `{"liveSessionId":${JSON.stringify(e.liveSessionId)}` +
+    `,"eventType":${JSON.stringify(e.eventType)}` +
+    `,"viewerUsername":${JSON.stringify(e.viewerUsername)}` +
+    `,"receivedAt":${JSON.stringify(e.receivedAt)}` +
+    `,"payload":${e.payload}}`
+  );
+}
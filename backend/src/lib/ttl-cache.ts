@@ -0,0 +1,87 @@
+/**
+ * Size-bounded LRU cache with per-entry TTL.
+ *
+ * Relies on Map insertion order: a hit re-inserts the key so the first key
+ * is always the least recently used. `get` returns `undefined` on a miss,
+ * so `null` can be cached as a value (negative caching).
+ */
+
+interface CacheEntry<V> {
+  value: V;
+  expiresAt: number;
+}
+
+export interface TtlCacheStats {
+  size: number;
+  maxEntries: number;
+  hits: number;
+  misses: number;
+  evictions: number;
+  expirations: number;
+}
+
+export class TtlCache<K, V> {
+  private entries = new Map<K, CacheEntry<V>>();
+  private readonly maxEntries: number;
+  private readonly defaultTtlMs: number;
+  private hits = 0;
+  private misses = 0;
+  private evictions = 0;
+  private expirations = 0;
+
+  constructor(options: { maxEntries: number; defaultTtlMs: number }) {
+    this.maxEntries = Math.max(1, options.maxEntries);
+    this.defaultTtlMs = options.defaultTtlMs;
+  }
+
+  get(key: K): V | undefined {
+    const entry = this.entries.get(key);
+    if (!entry) {
+      this.misses++;
+      return undefined;
+    }
+
+    if (entry.expiresAt <= Date.now()) {
+      this.entries.delete(key);
+      this.expirations++;
+      this.misses++;
+      return undefined;
+    }
+
+    // Move to most-recently-used position
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.hits++;
+    return entry.value;
+  }
+
+  set(key: K, value: V, ttlMs = this.defaultTtlMs): void {
+    this.entries.delete(key);
+    this.entries.set(key, { value, expiresAt: Date.now() + ttlMs });
+
+    while (this.entries.size > this.maxEntries) {
+      const oldest = this.entries.keys().next().value as K;
+      this.entries.delete(oldest);
+      this.evictions++;
+    }
+  }
+
+  delete(key: K): boolean {
+    return this.entries.delete(key);
+  }
+
+  clear(): void {
+    this.entries.clear();
+  }
+
+  get stats(): TtlCacheStats {
+    return {
+      size: this.entries.size,
+      maxEntries: this.maxEntries,
+      hits: this.hits,
+      misses: this.misses,
+      evictions: this.evictions,
+      expirations: this.expirations,
+    };
+  }
+}
@@ -0,0 +1,400 @@
+import {
+  snapshotSession,
+  getUnsnapshottedSessionIds,
+  getDailyStats,
+  getTopTracks,
+  getTopViewers,
+  countUniqueRequesters,
+  getSessionSnapshotPage,
+  getSessionsPage,
+  getSongRequestPage,
+  getGiftEventPage,
+  type SessionSnapshotSummary,
+  type TopTrack,
+  type TopViewer,
+} from "../db/queries";
+import type { DailyStats, GiftEvent, SongRequest } from "../db/schema";
+import type { KeysetCursor } from "../lib/keyset-cursor";
+import { encodeHeader, encodeRows, type ExportColumn, type ExportFormat } from "../lib/export-format";
+import { logger } from "../lib/logger";
+
+const DAY_MS = 86_400_000;
+const DEFAULT_RANGE_DAYS = 30;
+const MAX_RANGE_DAYS = 366;
+const SWEEP_BATCH = 50;
+const FIRST_SWEEP_DELAY_MS = 30_000;
+const SWEEP_INTERVAL_MS = Number(process.env.ANALYTICS_SWEEP_MINUTES ?? 15) * 60_000;
+const EXPORT_PAGE_ROWS = 1_000;
+const EXPORT_SESSION_PAGE = 100;
+
+// ============ Day ranges ============
+
+/** Inclusive range of UTC days, with the instants it covers ([start, end)) */
+export interface DayRange {
+  from: string;
+  to: string;
+  start: Date;
+  end: Date;
+}
+
+const DAY_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+
+function parseDay(value: string): Date | null {
+  if (!DAY_PATTERN.test(value)) return null;
+  const day = new Date(`${value}T00:00:00Z`);
+  return Number.isNaN(day.getTime()) || day.toISOString().slice(0, 10) !== value ? null : day;
+}
+
+/**
+ * Parse ?from=YYYY-MM-DD&to=YYYY-MM-DD (UTC, inclusive). Defaults to the
+ * last DEFAULT_RANGE_DAYS days; null if invalid or longer than
+ * MAX_RANGE_DAYS.
+ */
+export function parseDayRange(query: { from?: unknown; to?: unknown }, now = new Date()): DayRange | null {
+  const today = new Date(Date.UTC(now.getUTCFullYear(), now.getUTCMonth(), now.getUTCDate()));
+  const to = typeof query.to === "string" ? parseDay(query.to) : today;
+  if (!to) return null;
+  const from =
+    typeof query.from === "string" ? parseDay(query.from) : new Date(to.getTime() - (DEFAULT_RANGE_DAYS - 1) * DAY_MS);
+  if (!from || from > to || to.getTime() - from.getTime() >= MAX_RANGE_DAYS * DAY_MS) return null;
+
+  return {
+    from: from.toISOString().slice(0, 10),
+    to: to.toISOString().slice(0, 10),
+    start: from,
+    end: new Date(to.getTime() + DAY_MS),
+  };
+}
+
+// ============ Range summaries ============
+
+export interface AnalyticsDay extends Omit<DailyStats, "userId"> {
+  matchRate: number;
+}
+
+export interface AnalyticsSummary {
+  from: string;
+  to: string;
+  totals: Omit<AnalyticsDay, "day"> & { uniqueRequesters: number };
+  days: AnalyticsDay[];
+  topTracks: TopTrack[];
+  topRequesters: TopViewer[];
+  topGifters: TopViewer[];
+}
+
+function matchRate(matched: number, requests: number): number {
+  return requests > 0 ? matched / requests : 0;
+}
+
+/**
+ * Totals, per-day rows and leaderboards for a day range, all read from
+ * the daily rollups (so the cost depends on the range, not on history).
+ */
+export async function getAnalyticsSummary(userId: string, range: DayRange, limit: number): Promise<AnalyticsSummary> {
+  const [daily, topTracks, topRequesters, topGifters, uniqueRequesters] = await Promise.all([
+    getDailyStats(userId, range.from, range.to),
+    getTopTracks(userId, range.from, range.to, limit),
+    getTopViewers(userId, range.from, range.to, "requests", limit),
+    getTopViewers(userId, range.from, range.to, "diamonds", limit),
+    countUniqueRequesters(userId, range.from, range.to),
+  ]);
+
+  const totals = {
+    sessionCount: 0,
+    requestCount: 0,
+    matchedCount: 0,
+    playedCount: 0,
+    giftCount: 0,
+    totalDiamonds: 0,
+    matchRate: 0,
+    uniqueRequesters,
+  };
+  const days = daily.map(({ userId: _userId, ...day }) => {
+    totals.sessionCount += day.sessionCount;
+    totals.requestCount += day.requestCount;
+    totals.matchedCount += day.matchedCount;
+    totals.playedCount += day.playedCount;
+    totals.giftCount += day.giftCount;
+    totals.totalDiamonds += day.totalDiamonds;
+    return { ...day, matchRate: matchRate(day.matchedCount, day.requestCount) };
+  });
+  totals.matchRate = matchRate(totals.matchedCount, totals.requestCount);
+
+  return { from: range.from, to: range.to, totals, days, topTracks, topRequesters, topGifters };
+}
+
+// ============ Snapshot sweep ============
+
+export interface AnalyticsSweepStats {
+  running: boolean;
+  runs: number;
+  snapshots: number;
+  failures: number;
+  lastRunAt: string | null;
+}
+
+/**
+ * Snapshots ended sessions that endLiveSession couldn't (a failed
+ * snapshot, or sessions that ended before analytics existed). Retention
+ * skips sessions until they have a snapshot, so nothing is deleted
+ * before it's counted. Safe to run on every instance: a session is only
+ * ever snapshotted once.
+ */
+export class AnalyticsSweep {
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private running: Promise<void> | null = null;
+  private stopping = false;
+  private runs = 0;
+  private snapshots = 0;
+  private failures = 0;
+  private lastRunAt: Date | null = null;
+
+  start(): void {
+    if (this.timer) return;
+    this.stopping = false;
+    this.schedule(FIRST_SWEEP_DELAY_MS);
+  }
+
+  async stop(): Promise<void> {
+    this.stopping = true;
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+    await this.running;
+  }
+
+  /** Run one sweep now (no-op if one is already running) */
+  async run(): Promise<void> {
+    if (this.running) return this.running;
+    this.running = this.sweep().finally(() => {
+      this.running = null;
+    });
+    return this.running;
+  }
+
+  get stats(): AnalyticsSweepStats {
+    return {
+      running: this.running !== null,
+      runs: this.runs,
+      snapshots: this.snapshots,
+      failures: this.failures,
+      lastRunAt: this.lastRunAt?.toISOString() ?? null,
+    };
+  }
+
+  private schedule(delayMs: number): void {
+    this.timer = setTimeout(() => {
+      this.timer = null;
+      this.run()
+        .catch((err) => logger.error("Analytics sweep failed", { error: String(err) }))
+        .finally(() => {
+          if (!this.stopping) this.schedule(SWEEP_INTERVAL_MS);
+        });
+    }, delayMs);
+  }
+
+  private async sweep(): Promise<void> {
+    this.runs++;
+    this.lastRunAt = new Date();
+    while (!this.stopping) {
+      const sessionIds = await getUnsnapshottedSessionIds(SWEEP_BATCH);
+      let progressed = false;
+      for (const sessionId of sessionIds) {
+        if (this.stopping) return;
+        try {
+          if (await snapshotSession(sessionId)) this.snapshots++;
+          progressed = true;
+        } catch (err) {
+          this.failures++;
+          logger.error("Failed to snapshot session", { sessionId, error: String(err) });
+        }
+      }
+      // Stop when done, or when only failing sessions are left (retried next run)
+      if (!progressed) return;
+    }
+  }
+}
+
+// ============ History export ============
+
+export type ExportDataset = "sessions" | "daily" | "requests" | "gifts";
+
+export function parseExportDataset(value: unknown): ExportDataset | null {
+  return value === "sessions" || value === "daily" || value === "requests" || value === "gifts" ? value : null;
+}
+
+const SESSION_COLUMNS: ExportColumn<SessionSnapshotSummary>[] = [
+  { name: "sessionId", value: (s) => s.liveSessionId },
+  { name: "tiktokUsername", value: (s) => s.tiktokUsername },
+  { name: "startedAt", value: (s) => s.startedAt },
+  { name: "endedAt", value: (s) => s.endedAt },
+  { name: "requestCount", value: (s) => s.requestCount },
+  { name: "matchedCount", value: (s) => s.matchedCount },
+  { name: "playedCount", value: (s) => s.playedCount },
+  { name: "uniqueRequesters", value: (s) => s.uniqueRequesters },
+  { name: "giftCount", value: (s) => s.giftCount },
+  { name: "totalDiamonds", value: (s) => s.totalDiamonds },
+];
+
+const DAILY_COLUMNS: ExportColumn<DailyStats>[] = [
+  { name: "day", value: (d) => d.day },
+  { name: "sessionCount", value: (d) => d.sessionCount },
+  { name: "requestCount", value: (d) => d.requestCount },
+  { name: "matchedCount", value: (d) => d.matchedCount },
+  { name: "playedCount", value: (d) => d.playedCount },
+  { name: "matchRate", value: (d) => matchRate(d.matchedCount, d.requestCount) },
+  { name: "giftCount", value: (d) => d.giftCount },
+  { name: "totalDiamonds", value: (d) => d.totalDiamonds },
+];
+
+const REQUEST_COLUMNS: ExportColumn<SongRequest>[] = [
+  { name: "sessionId", value: (r) => r.liveSessionId },
+  { name: "requestedAt", value: (r) => r.requestedAt },
+  { name: "viewerUsername", value: (r) => r.viewerUsername },
+  { name: "rawMessage", value: (r) => r.rawMessage },
+  { name: "parsedQuery", value: (r) => r.parsedQuery },
+  { name: "searchStatus", value: (r) => r.searchStatus },
+  { name: "playStatus", value: (r) => r.playStatus },
+  { name: "spotifyTrackId", value: (r) => r.spotifyTrackId },
+  { name: "trackName", value: (r) => r.trackName },
+  { name: "trackArtist", value: (r) => r.trackArtist },
+  { name: "albumName", value: (r) => r.albumName },
+  { name: "matchedAt", value: (r) => r.matchedAt },
+  { name: "confirmedAt", value: (r) => r.confirmedAt },
+];
+
+const GIFT_COLUMNS: ExportColumn<GiftEvent>[] = [
+  { name: "sessionId", value: (g) => g.liveSessionId },
+  { name: "receivedAt", value: (g) => g.receivedAt },
+  { name: "viewerUsername", value: (g) => g.viewerUsername },
+  { name: "giftId", value: (g) => g.giftId },
+  { name: "giftName", value: (g) => g.giftName },
+  { name: "diamondCount", value: (g) => g.diamondCount },
+  { name: "repeatCount", value: (g) => g.repeatCount },
+];
+
+/** Pages of a keyset scan, each fetched only when the previous is consumed */
+async function* keysetPages<T>(
+  fetch: (after: KeysetCursor | null) => Promise<T[]>,
+  cursor: (row: T) => KeysetCursor,
+  pageSize: number
+): AsyncGenerator<T[]> {
+  let after: KeysetCursor | null = null;
+  for (;;) {
+    const page = await fetch(after);
+    if (page.length > 0) yield page;
+    if (page.length < pageSize) return;
+    after = cursor(page[page.length - 1]!);
+  }
+}
+
+/** Pages of rows from each of the user's sessions overlapping the range */
+async function* sessionRowPages<T>(
+  userId: string,
+  range: DayRange,
+  fetch: (sessionId: string, after: KeysetCursor | null) => Promise<T[]>,
+  cursor: (row: T) => KeysetCursor
+): AsyncGenerator<T[]> {
+  const sessions = keysetPages(
+    (after) => getSessionsPage(userId, range.start, range.end, after, EXPORT_SESSION_PAGE),
+    (s) => ({ at: s.startedAt, id: s.id }),
+    EXPORT_SESSION_PAGE
+  );
+  for await (const page of sessions) {
+    for (const session of page) {
+      yield* keysetPages((after) => fetch(session.id, after), cursor, EXPORT_PAGE_ROWS);
+    }
+  }
+}
+
+function encodeStream<T>(
+  format: ExportFormat,
+  columns: ExportColumn<T>[],
+  pages: AsyncGenerator<T[]>,
+  onError: (err: unknown) => void
+): ReadableStream<Uint8Array> {
+  const encoder = new TextEncoder();
+  return new ReadableStream<Uint8Array>({
+    start(controller) {
+      const header = encodeHeader(format, columns);
+      if (header) controller.enqueue(encoder.encode(header));
+    },
+    // Pulled as the client reads, so at most a page or two is held
+    async pull(controller) {
+      try {
+        const { value, done } = await pages.next();
+        if (done) controller.close();
+        else controller.enqueue(encoder.encode(encodeRows(format, columns, value)));
+      } catch (err) {
+        onError(err);
+        controller.error(err);
+      }
+    },
+    async cancel() {
+      await pages.return(undefined);
+    },
+  });
+}
+
+/**
+ * Stream a user's history for a day range as CSV or NDJSON, paging
+ * through it with keyset queries as the client reads. `sessions` and
+ * `daily` come from snapshots and rollups and cover all history;
+ * `requests` and `gifts` only what retention hasn't deleted yet.
+ */
+export function exportHistory(
+  userId: string,
+  dataset: ExportDataset,
+  format: ExportFormat,
+  range: DayRange
+): ReadableStream<Uint8Array> {
+  const onError = (err: unknown) =>
+    logger.error("History export failed", { userId, dataset, error: String(err) });
+
+  switch (dataset) {
+    case "sessions":
+      return encodeStream(
+        format,
+        SESSION_COLUMNS,
+        keysetPages(
+          (after) => getSessionSnapshotPage(userId, range.start, range.end, after, EXPORT_PAGE_ROWS),
+          (s) => ({ at: s.endedAt, id: s.liveSessionId }),
+          EXPORT_PAGE_ROWS
+        ),
+        onError
+      );
+    case "daily":
+      // At most MAX_RANGE_DAYS rows
+      return encodeStream(
+        format,
+        DAILY_COLUMNS,
+        (async function* () {
+          yield await getDailyStats(userId, range.from, range.to);
+        })(),
+        onError
+      );
+    case "requests":
+      return encodeStream(
+        format,
+        REQUEST_COLUMNS,
+        sessionRowPages(
+          userId,
+          range,
+          (sessionId, after) => getSongRequestPage(sessionId, range.start, range.end, after, EXPORT_PAGE_ROWS),
+          (r) => ({ at: r.requestedAt, id: r.id })
+        ),
+        onError
+      );
+    case "gifts":
+      return encodeStream(
+        format,
+        GIFT_COLUMNS,
+        sessionRowPages(
+          userId,
+          range,
+          (sessionId, after) => getGiftEventPage(sessionId, range.start, range.end, after, EXPORT_PAGE_ROWS),
+          (g) => ({ at: g.receivedAt, id: g.id })
+        ),
+        onError
+      );
+  }
+}
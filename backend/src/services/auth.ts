@@ -1,5 +1,43 @@
-import { getUserFromSessionToken } from "../db/queries";
-import type { User } from "../db/schema";
+import { getUserFromSessionToken, getActiveSessionForUser, onLiveSessionChange } from "../db/queries";
+import type { User, LiveSession } from "../db/schema";
+import { TtlCache, type TtlCacheStats } from "../lib/ttl-cache";
+import { SingleFlight } from "../lib/single-flight";
+
+// A signed-out session stays usable on this instance for up to this long
+const USER_CACHE_TTL_MS = 30_000;
+const INVALID_TOKEN_TTL_MS = 5_000;
+const ACTIVE_SESSION_TTL_MS = 30_000;
+const MAX_CACHED_USERS = 10_000;
+
+export const SESSION_COOKIE_NAMES = ["authjs.session-token", "__Secure-authjs.session-token"] as const;
+
+// sessionToken → user (null: invalid or expired token)
+const userCache = new TtlCache<string, User | null>({
+  maxEntries: MAX_CACHED_USERS,
+  defaultTtlMs: USER_CACHE_TTL_MS,
+});
+// userId → active live session (null: none)
+const activeSessionCache = new TtlCache<string, LiveSession | null>({
+  maxEntries: MAX_CACHED_USERS,
+  defaultTtlMs: ACTIVE_SESSION_TTL_MS,
+});
+const userLookups = new SingleFlight<User | null>();
+const activeSessionLookups = new SingleFlight<LiveSession | null>();
+// Bumped on every invalidation, so a lookup that started before one
+// doesn't cache what it read
+let activeSessionGeneration = 0;
+
+/**
+ * Drop a user's cached active session. Called for sessions started or ended
+ * in this thread (via onLiveSessionChange) and, for other workers and
+ * instances, from session events on the event bus.
+ */
+export function invalidateActiveSession(userId: string): void {
+  activeSessionGeneration++;
+  activeSessionCache.delete(userId);
+}
+
+onLiveSessionChange(invalidateActiveSession);
 
 /**
  * Parse session token from cookie header
@@ -8,20 +46,35 @@ function parseSessionCookie(cookieHeader: string | null): string | null {
   if (!cookieHeader) return null;
 
   const cookies = cookieHeader.split(";").map((c) => c.trim());
-  for (const cookie of cookies) {
-    // NextAuth v5 uses "authjs.session-token"
-    if (cookie.startsWith("authjs.session-token=")) {
-      return decodeURIComponent(cookie.slice("authjs.session-token=".length));
-    }
-    // Fallback for encrypted sessions
-    if (cookie.startsWith("__Secure-authjs.session-token=")) {
-      return decodeURIComponent(cookie.slice("__Secure-authjs.session-token=".length));
-    }
+  for (const name of SESSION_COOKIE_NAMES) {
+    const prefix = `${name}=`;
+    const cookie = cookies.find((c) => c.startsWith(prefix));
+    if (cookie) return decodeURIComponent(cookie.slice(prefix.length));
   }
 
   return null;
 }
 
+/**
+ * Validate a session token and return its user (cached)
+ */
+export async function validateSessionToken(sessionToken: string): Promise<User | null> {
+  const cached = userCache.get(sessionToken);
+  if (cached !== undefined) return cached;
+
+  return userLookups.do(sessionToken, async () => {
+    const result = await getUserFromSessionToken(sessionToken);
+    if (!result) {
+      userCache.set(sessionToken, null, INVALID_TOKEN_TTL_MS);
+      return null;
+    }
+    // Never serve a token past its expiry
+    const ttl = Math.min(USER_CACHE_TTL_MS, result.expires.getTime() - Date.now());
+    if (ttl > 0) userCache.set(sessionToken, result.user, ttl);
+    return result.user;
+  });
+}
+
 /**
  * Validate request and return user
  */
@@ -29,7 +82,28 @@ export async function validateRequest(cookieHeader: string | null): Promise<User
   const sessionToken = parseSessionCookie(cookieHeader);
   if (!sessionToken) return null;
 
-  return getUserFromSessionToken(sessionToken);
+  return validateSessionToken(sessionToken);
+}
+
+/**
+ * A user's active live session (cached, invalidated on start/end)
+ */
+export async function getActiveSession(userId: string): Promise<LiveSession | null> {
+  const cached = activeSessionCache.get(userId);
+  if (cached !== undefined) return cached;
+
+  // Keyed by generation too: a caller arriving after an invalidation must
+  // not join a lookup that started before it
+  const generation = activeSessionGeneration;
+  return activeSessionLookups.do(`${userId}:${generation}`, async () => {
+    const session = await getActiveSessionForUser(userId);
+    if (generation === activeSessionGeneration) activeSessionCache.set(userId, session);
+    return session;
+  });
+}
+
+export function getAuthCacheStats(): { users: TtlCacheStats; activeSessions: TtlCacheStats } {
+  return { users: userCache.stats, activeSessions: activeSessionCache.stats };
 }
 
 /**
@@ -0,0 +1,427 @@
+import { TtlCache } from "../lib/ttl-cache";
+import { logger } from "../lib/logger";
+import { packMessage } from "../lib/dashboard-codec";
+import { SessionStream, FRAME_INTERVAL_MS, PROTOCOL_VERSION, type StreamFrame } from "./dashboard-stream";
+
+// Bun's per-socket send buffer cap; past it Bun drops frames for the socket
+export const WS_BACKPRESSURE_LIMIT = 1024 * 1024;
+const SLOW_CONSUMER_BYTES = 256 * 1024; // buffered past this: stop live updates
+const RECOVERED_BYTES = 16 * 1024; // drained below this: resync and resume
+const MAX_SLOW_MS = 30_000; // slow for longer than this: evict
+const SWEEP_INTERVAL_MS = 1_000;
+// Streams (and their replay rings) outlive their session's last event by
+// this much, so a dashboard can still resume after a short outage
+const STREAM_IDLE_TTL_MS = 10 * 60_000;
+const MAX_STREAMS = 10_000;
+
+/** The parts of Bun's ServerWebSocket the hub uses */
+export interface HubSocket {
+  send(data: string | Uint8Array): number;
+  subscribe(topic: string): void;
+  unsubscribe(topic: string): void;
+  getBufferedAmount(): number;
+  close(code?: number, reason?: string): void;
+}
+
+/** The parts of Bun's Server the hub uses */
+export interface HubServer {
+  publish(topic: string, data: string | Uint8Array): number;
+}
+
+/**
+ * Current state for a dashboard (`init` message), sent on connect and after
+ * a slow consumer catches up (replaces every update it missed).
+ */
+export type SnapshotLoader = (userId: string) => Promise<{ session: { id: string } } | null>;
+
+/** Wire encoding of a v1 socket: JSON text, or binary pack1 (lib/dashboard-codec) */
+export type DashboardEncoding = "json" | "pack";
+
+/** Where a v1 client left off */
+export interface StreamPosition {
+  sessionId: string;
+  epoch: string;
+  seq: number;
+}
+
+export interface DashboardHubStats {
+  sockets: number;
+  slowSockets: number;
+  messagesPublished: number;
+  framesPublished: number;
+  coalescedEvents: number;
+  resumes: number;
+  snapshots: number;
+  bytesSent: number;
+  droppedFrames: number;
+  backpressureEvents: number;
+  resyncs: number;
+  evictions: number;
+}
+
+interface SocketState {
+  socket: HubSocket;
+  userId: string;
+  /** 0: one message per event (legacy); 1: sequenced frames */
+  protocol: 0 | 1;
+  encoding: DashboardEncoding;
+  topic: string;
+  subscribed: boolean;
+  slowSince: number | null;
+}
+
+export function userTopic(userId: string): string {
+  return `user:${userId}`;
+}
+
+function frameTopic(userId: string, encoding: DashboardEncoding): string {
+  return `v${PROTOCOL_VERSION}:${encoding}:user:${userId}`;
+}
+
+/**
+ * Dashboard WebSocket fan-out on Bun's native pub/sub.
+ *
+ * Sockets subscribe to their user's topic and each message is serialized
+ * once and published to the topic, so fan-out happens in Bun rather than
+ * in a JS loop. Legacy sockets get one message per event. Protocol v1
+ * sockets get sequenced frames: events are coalesced per session into a
+ * frame every FRAME_INTERVAL_MS, and a reconnecting v1 client is sent only
+ * the frames it missed from the session's replay ring, or a snapshot if it
+ * fell off the ring.
+ * v1 sockets pick JSON or binary (pack) encoding; each has its own topic
+ * and a frame is packed only while a packed socket of that user is open.
+ *
+ * A sweep watches each socket's buffered amount: a socket past
+ * SLOW_CONSUMER_BYTES is unsubscribed, and the updates it would have
+ * received are dropped (counted) instead of queued. Once it drains it gets
+ * one fresh snapshot in place of everything it missed and is resubscribed;
+ * if it stays slow for MAX_SLOW_MS it is closed. Sockets are tracked by
+ * id, so removal on close is O(1).
+ */
+export class DashboardHub {
+  private server: HubServer | null = null;
+  private sockets = new Map<string, SocketState>();
+  private slowByTopic = new Map<string, number>();
+  private streams = new TtlCache<string, SessionStream>({
+    maxEntries: MAX_STREAMS,
+    defaultTtlMs: STREAM_IDLE_TTL_MS,
+  });
+  private dirtyStreams = new Set<SessionStream>();
+  // userId → number of connected pack-encoded sockets
+  private packSockets = new Map<string, number>();
+  // userId → their current session (dropped once it ends)
+  private userSessions = new Map<string, string>();
+  private loadSnapshot: SnapshotLoader;
+  private sweepTimer: ReturnType<typeof setInterval> | null = null;
+  private frameTimer: ReturnType<typeof setInterval> | null = null;
+  private messagesPublished = 0;
+  private framesPublished = 0;
+  private coalescedEvents = 0;
+  private resumes = 0;
+  private snapshots = 0;
+  private bytesSent = 0;
+  private droppedFrames = 0;
+  private backpressureEvents = 0;
+  private resyncs = 0;
+  private evictions = 0;
+
+  constructor(loadSnapshot: SnapshotLoader) {
+    this.loadSnapshot = loadSnapshot;
+  }
+
+  /**
+   * Attach to the listening server and start the frame and slow-consumer
+   * timers.
+   */
+  attach(server: HubServer): void {
+    this.server = server;
+    if (!this.sweepTimer) {
+      this.sweepTimer = setInterval(() => this.sweep(), SWEEP_INTERVAL_MS);
+      this.frameTimer = setInterval(() => this.flushFrames(), FRAME_INTERVAL_MS);
+    }
+  }
+
+  stop(): void {
+    this.flushFrames();
+    if (this.sweepTimer) clearInterval(this.sweepTimer);
+    if (this.frameTimer) clearInterval(this.frameTimer);
+    this.sweepTimer = null;
+    this.frameTimer = null;
+  }
+
+  /**
+   * Register an authenticated socket. Legacy sockets are subscribed
+   * straight away; v1 sockets once openStream has caught them up.
+   */
+  add(id: string, socket: HubSocket, userId: string, protocol: 0 | 1 = 0, encoding: DashboardEncoding = "json"): void {
+    // Binary encoding is only defined for v1
+    if (protocol === 0) encoding = "json";
+    const topic = protocol === 1 ? frameTopic(userId, encoding) : userTopic(userId);
+    const state: SocketState = { socket, userId, protocol, encoding, topic, subscribed: false, slowSince: null };
+    this.sockets.set(id, state);
+    if (encoding === "pack") this.packSockets.set(userId, (this.packSockets.get(userId) ?? 0) + 1);
+    if (protocol === 0) this.subscribe(state);
+  }
+
+  remove(id: string): void {
+    const state = this.sockets.get(id);
+    if (!state) return;
+    this.sockets.delete(id);
+    if (state.slowSince !== null) this.adjustSlow(state.topic, -1);
+    if (state.encoding === "pack") {
+      const count = (this.packSockets.get(state.userId) ?? 0) - 1;
+      if (count > 0) this.packSockets.set(state.userId, count);
+      else this.packSockets.delete(state.userId);
+    }
+  }
+
+  /**
+   * Send directly to one socket (snapshots, replies).
+   */
+  send(id: string, message: object): void {
+    const state = this.sockets.get(id);
+    if (state) this.sendMessage(state, message);
+  }
+
+  /**
+   * Catch a v1 socket up and subscribe it: replay missed frames when
+   * `resume` is still covered by the ring, otherwise send a snapshot.
+   * Only the session's own user can resume it; the position comes from the
+   * client, so anything else falls back to the user's own snapshot.
+   */
+  async openStream(id: string, resume: StreamPosition | null): Promise<void> {
+    const state = this.sockets.get(id);
+    if (!state) return;
+
+    if (resume) {
+      const stream = this.streams.get(resume.sessionId);
+      const missed =
+        stream?.userId === state.userId && stream.epoch === resume.epoch ? stream.since(resume.seq) : null;
+      if (missed) {
+        // Synchronous from here: no frame can be published in between
+        for (const frame of missed) this.sendFrame(state, frame);
+        this.subscribe(state);
+        this.resumes++;
+        return;
+      }
+    }
+
+    await this.sendSnapshot(id, state);
+  }
+
+  /**
+   * Publish an event to a user's dashboards. Serialized once for all
+   * subscribers; v1 sockets get it in the session's next frame.
+   */
+  publish(userId: string, sessionId: string, event: unknown): void {
+    if (!this.server) return;
+    const message = JSON.stringify(event);
+    this.messagesPublished++;
+    this.publishTo(userTopic(userId), message);
+
+    if ((event as { type?: string }).type === "session:ended") {
+      if (this.userSessions.get(userId) === sessionId) this.userSessions.delete(userId);
+    } else {
+      this.userSessions.set(userId, sessionId);
+    }
+    const stream = this.streamFor(sessionId, userId);
+    if (stream.push(event)) this.coalescedEvents++;
+    this.dirtyStreams.add(stream);
+  }
+
+  /**
+   * Send to every connected socket (e.g. server:shutdown).
+   */
+  broadcast(event: unknown): void {
+    const message = JSON.stringify(event);
+    let packed: Uint8Array | null = null;
+    for (const state of this.sockets.values()) {
+      if (state.encoding === "pack") this.sendTo(state, (packed ??= packMessage(event)));
+      else this.sendTo(state, message);
+    }
+  }
+
+  /**
+   * Bun drain callback: a socket's buffer emptied out.
+   */
+  drained(id: string): void {
+    const state = this.sockets.get(id);
+    if (state && state.slowSince !== null) this.checkSocket(id, state, Date.now());
+  }
+
+  get stats(): DashboardHubStats {
+    let slowSockets = 0;
+    for (const count of this.slowByTopic.values()) slowSockets += count;
+    return {
+      sockets: this.sockets.size,
+      slowSockets,
+      messagesPublished: this.messagesPublished,
+      framesPublished: this.framesPublished,
+      coalescedEvents: this.coalescedEvents,
+      resumes: this.resumes,
+      snapshots: this.snapshots,
+      bytesSent: this.bytesSent,
+      droppedFrames: this.droppedFrames,
+      backpressureEvents: this.backpressureEvents,
+      resyncs: this.resyncs,
+      evictions: this.evictions,
+    };
+  }
+
+  private streamFor(sessionId: string, userId: string): SessionStream {
+    let stream = this.streams.get(sessionId);
+    if (!stream) {
+      stream = new SessionStream(sessionId, userId);
+      this.streams.set(sessionId, stream);
+    }
+    return stream;
+  }
+
+  private flushFrames(): void {
+    for (const stream of this.dirtyStreams) {
+      const frame = stream.flush(this.packSockets.has(stream.userId));
+      if (!frame) continue;
+      this.framesPublished++;
+      this.publishTo(frameTopic(stream.userId, "json"), frame.message);
+      if (frame.packed) this.publishTo(frameTopic(stream.userId, "pack"), frame.packed);
+      // Refresh the idle TTL of streams that are still producing
+      this.streams.set(stream.sessionId, stream);
+    }
+    this.dirtyStreams.clear();
+  }
+
+  /**
+   * Send a state snapshot (format per protocol) and subscribe. A v1
+   * snapshot is stamped with the stream position read before loading, and
+   * frames published while it loaded are replayed after it (applying an
+   * event the snapshot already has is a no-op upsert on the client).
+   */
+  private async sendSnapshot(id: string, state: SocketState): Promise<void> {
+    this.snapshots++;
+    let before: { stream: SessionStream; seq: number } | null = null;
+    if (state.protocol === 1) {
+      const sessionId = this.userSessions.get(state.userId);
+      const stream = sessionId ? this.streams.get(sessionId) : undefined;
+      if (stream) {
+        this.flushFrames();
+        before = { stream, seq: stream.lastSeq };
+      }
+    }
+
+    const snapshot = await this.loadSnapshot(state.userId);
+    if (this.sockets.get(id) !== state) return;
+
+    if (state.protocol === 0) {
+      if (snapshot) this.sendTo(state, JSON.stringify(snapshot));
+      this.subscribe(state);
+      return;
+    }
+
+    if (!snapshot) {
+      this.sendMessage(state, { type: "snapshot", v: PROTOCOL_VERSION, sessionId: null, state: null });
+      this.subscribe(state);
+      return;
+    }
+
+    this.flushFrames();
+    const stream = this.streamFor(snapshot.session.id, state.userId);
+    const missed = before?.stream === stream ? stream.since(before.seq) : null;
+    const seq = missed ? before!.seq : stream.lastSeq;
+    this.sendMessage(state, {
+      type: "snapshot",
+      v: PROTOCOL_VERSION,
+      sessionId: stream.sessionId,
+      epoch: stream.epoch,
+      seq,
+      state: snapshot,
+    });
+    for (const frame of missed ?? []) this.sendFrame(state, frame);
+    this.subscribe(state);
+  }
+
+  private subscribe(state: SocketState): void {
+    if (state.subscribed) return;
+    state.socket.subscribe(state.topic);
+    state.subscribed = true;
+  }
+
+  private unsubscribe(state: SocketState): void {
+    if (!state.subscribed) return;
+    state.socket.unsubscribe(state.topic);
+    state.subscribed = false;
+  }
+
+  private publishTo(topic: string, message: string | Uint8Array): void {
+    const result = this.server!.publish(topic, message);
+    if (result > 0) this.bytesSent += result;
+    else if (result === -1) this.backpressureEvents++;
+    // Slow sockets are unsubscribed; this is the update they lose
+    this.droppedFrames += this.slowByTopic.get(topic) ?? 0;
+  }
+
+  private sendMessage(state: SocketState, message: unknown): void {
+    this.sendTo(state, state.encoding === "pack" ? packMessage(message) : JSON.stringify(message));
+  }
+
+  private sendFrame(state: SocketState, frame: StreamFrame): void {
+    if (state.encoding === "json") return this.sendTo(state, frame.message);
+    // Flushed while no packed client was connected
+    frame.packed ??= packMessage(JSON.parse(frame.message));
+    this.sendTo(state, frame.packed);
+  }
+
+  private sendTo(state: SocketState, message: string | Uint8Array): void {
+    const result = state.socket.send(message);
+    if (result > 0) this.bytesSent += result;
+    else if (result === -1) this.backpressureEvents++;
+    else this.droppedFrames++;
+  }
+
+  private sweep(): void {
+    const now = Date.now();
+    for (const [id, state] of this.sockets) this.checkSocket(id, state, now);
+  }
+
+  private checkSocket(id: string, state: SocketState, now: number): void {
+    const buffered = state.socket.getBufferedAmount();
+
+    if (state.slowSince === null) {
+      if (buffered <= SLOW_CONSUMER_BYTES) return;
+      state.slowSince = now;
+      this.unsubscribe(state);
+      this.adjustSlow(state.topic, 1);
+      this.backpressureEvents++;
+      logger.warn("Dashboard socket is slow, pausing live updates", { userId: state.userId, buffered });
+      return;
+    }
+
+    if (buffered <= RECOVERED_BYTES) {
+      this.resync(id, state);
+    } else if (now - state.slowSince > MAX_SLOW_MS) {
+      this.evictions++;
+      logger.warn("Evicting slow dashboard socket", { userId: state.userId, buffered });
+      this.remove(id);
+      state.socket.close(1013, "Too slow");
+    }
+  }
+
+  /**
+   * Catch a recovered socket up with one snapshot (the dashboard replaces
+   * its state with it), then resume live updates.
+   */
+  private resync(id: string, state: SocketState): void {
+    state.slowSince = null;
+    this.adjustSlow(state.topic, -1);
+    this.resyncs++;
+
+    this.sendSnapshot(id, state).catch((err) => {
+      logger.error("Failed to resync dashboard socket", { error: String(err) });
+    });
+  }
+
+  private adjustSlow(topic: string, delta: number): void {
+    const count = (this.slowByTopic.get(topic) ?? 0) + delta;
+    if (count > 0) this.slowByTopic.set(topic, count);
+    else this.slowByTopic.delete(topic);
+  }
+}
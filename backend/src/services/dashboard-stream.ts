@@ -0,0 +1,117 @@
+import { packMessage } from "../lib/dashboard-codec";
+
+/**
+ * Per-session sequenced event stream for dashboard protocol v1.
+ *
+ * Events are coalesced into frames (flushed by DashboardHub every
+ * FRAME_INTERVAL_MS), each with the next sequence number. The last frames
+ * are kept in a bounded replay ring so a reconnecting client can resume
+ * from its last sequence. `epoch` identifies this stream instance: a
+ * client holding a position from another epoch (restart, other replica,
+ * evicted ring) gets a snapshot instead.
+ */
+
+export const FRAME_INTERVAL_MS = 50;
+export const PROTOCOL_VERSION = 1;
+const RING_MAX_FRAMES = 512;
+const RING_MAX_BYTES = 512 * 1024;
+
+export interface StreamFrame {
+  seq: number;
+  message: string;
+  /** Binary (pack1) encoding, when a packed client needs it */
+  packed?: Uint8Array;
+}
+
+interface DashboardEvent {
+  type?: string;
+  request?: { id?: string };
+}
+
+export class SessionStream {
+  readonly sessionId: string;
+  readonly userId: string;
+  readonly epoch = crypto.randomUUID().slice(0, 8);
+  private seq = 0;
+  private pending: DashboardEvent[] = [];
+  // request id → index in `pending`, for coalescing updates
+  private pendingRequests = new Map<string, number>();
+  private ring: StreamFrame[] = [];
+  private ringBytes = 0;
+
+  constructor(sessionId: string, userId: string) {
+    this.sessionId = sessionId;
+    this.userId = userId;
+  }
+
+  get lastSeq(): number {
+    return this.seq;
+  }
+
+  get hasPending(): boolean {
+    return this.pending.length > 0;
+  }
+
+  /**
+   * Queue an event for the next frame. Updates to a request already in the
+   * pending frame replace it in place (last state wins, original position).
+   * Returns true if the event was merged into one already pending.
+   */
+  push(event: unknown): boolean {
+    const e = event as DashboardEvent;
+    const requestId = (e.type === "request:new" || e.type === "request:update") ? e.request?.id : undefined;
+
+    if (requestId !== undefined) {
+      const index = this.pendingRequests.get(requestId);
+      if (index !== undefined) {
+        const existing = this.pending[index]!;
+        // Keep `request:new` so the client still inserts it
+        this.pending[index] = { ...e, type: existing.type, request: { ...existing.request, ...e.request } };
+        return true;
+      }
+      this.pendingRequests.set(requestId, this.pending.length);
+    }
+    this.pending.push(e);
+    return false;
+  }
+
+  /**
+   * Seal pending events into the next frame and add it to the ring.
+   * `pack` also encodes it in binary, for packed clients.
+   */
+  flush(pack = false): StreamFrame | null {
+    if (this.pending.length === 0) return null;
+
+    const seq = ++this.seq;
+    const body = {
+      type: "frame",
+      v: PROTOCOL_VERSION,
+      sessionId: this.sessionId,
+      epoch: this.epoch,
+      seq,
+      events: this.pending,
+    };
+    const frame: StreamFrame = { seq, message: JSON.stringify(body) };
+    if (pack) frame.packed = packMessage(body);
+    this.pending = [];
+    this.pendingRequests.clear();
+
+    this.ring.push(frame);
+    this.ringBytes += frame.message.length;
+    while (this.ring.length > RING_MAX_FRAMES || (this.ringBytes > RING_MAX_BYTES && this.ring.length > 1)) {
+      this.ringBytes -= this.ring.shift()!.message.length;
+    }
+    return frame;
+  }
+
+  /**
+   * Frames after `seq`, or null if some of them already left the ring.
+   */
+  since(seq: number): StreamFrame[] | null {
+    if (seq > this.seq || seq < 0) return null;
+    if (seq === this.seq) return [];
+    const oldest = this.ring[0]?.seq ?? this.seq + 1;
+    if (seq + 1 < oldest) return null;
+    return this.ring.slice(seq + 1 - oldest);
+  }
+}
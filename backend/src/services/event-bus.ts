@@ -0,0 +1,264 @@
+import { pgClient } from "../db/client";
+import { insertEventPayload, getEventPayload, deleteEventPayloadsBefore } from "../db/queries";
+import { INSTANCE_ID } from "../lib/instance";
+import { logger } from "../lib/logger";
+
+type EventHandler = (userId: string, sessionId: string, event: unknown) => void;
+
+export interface EventBusStats {
+  kind: "inprocess" | "postgres";
+  published: number;
+  delivered: number;
+  notifications: number;
+  remoteEvents: number;
+  spilledPayloads: number;
+  failures: number;
+}
+
+/**
+ * Fan-out of dashboard events to every backend instance. Each instance
+ * subscribes once and delivers to the WebSockets it holds.
+ */
+export interface EventBus {
+  publish(userId: string, sessionId: string, event: unknown): void;
+  subscribe(handler: EventHandler): void;
+  start(): Promise<void>;
+  stop(): Promise<void>;
+  readonly stats: EventBusStats;
+}
+
+/**
+ * Single-instance bus: publish delivers straight to local subscribers.
+ */
+export class InProcessEventBus implements EventBus {
+  private handlers: EventHandler[] = [];
+  private published = 0;
+  private delivered = 0;
+
+  publish(userId: string, sessionId: string, event: unknown): void {
+    this.published++;
+    for (const handler of this.handlers) {
+      handler(userId, sessionId, event);
+      this.delivered++;
+    }
+  }
+
+  subscribe(handler: EventHandler): void {
+    this.handlers.push(handler);
+  }
+
+  async start(): Promise<void> {}
+
+  async stop(): Promise<void> {}
+
+  get stats(): EventBusStats {
+    return {
+      kind: "inprocess",
+      published: this.published,
+      delivered: this.delivered,
+      notifications: 0,
+      remoteEvents: 0,
+      spilledPayloads: 0,
+      failures: 0,
+    };
+  }
+}
+
+const CHANNEL = "songflow_dashboard";
+const FLUSH_DELAY_MS = 10;
+// NOTIFY payloads must stay under 8000 bytes; leave room for the envelope
+const MAX_NOTIFY_BYTES = 7_500;
+const PAYLOAD_TTL_MS = 5 * 60_000;
+const PAYLOAD_SWEEP_INTERVAL_MS = 60_000;
+
+/**
+ * Wire format of one notification: origin instance, then events in publish
+ * order, each an inline [userId, sessionId, event] tuple or `{ r: id }` referencing a
+ * dashboard_event_payload row.
+ */
+interface Envelope {
+  o: string;
+  e: ([string, string, unknown] | { r: string })[];
+}
+
+/**
+ * Cross-instance bus over Postgres LISTEN/NOTIFY.
+ *
+ * Local subscribers are delivered to immediately; remote instances get the
+ * event through NOTIFY. Events are batched per channel for FLUSH_DELAY_MS
+ * and packed into notifications up to MAX_NOTIFY_BYTES. An event that
+ * doesn't fit on its own is stored in `dashboard_event_payload` and sent
+ * as an id reference. Notifications carry the origin instance id, so an
+ * instance ignores its own.
+ */
+export class PostgresEventBus implements EventBus {
+  private handlers: EventHandler[] = [];
+  private pending: string[] = [];
+  private pendingBytes = 0;
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private sweepTimer: ReturnType<typeof setInterval> | null = null;
+  private sendChain: Promise<void> = Promise.resolve();
+  private receiveChain: Promise<void> = Promise.resolve();
+  private unlisten: (() => Promise<void>) | null = null;
+  private published = 0;
+  private delivered = 0;
+  private notifications = 0;
+  private remoteEvents = 0;
+  private spilledPayloads = 0;
+  private failures = 0;
+
+  publish(userId: string, sessionId: string, event: unknown): void {
+    this.published++;
+    this.deliver(userId, sessionId, event);
+
+    const item = JSON.stringify([userId, sessionId, event]);
+    if (Buffer.byteLength(item) > MAX_NOTIFY_BYTES) {
+      this.enqueue(this.spill(item));
+      return;
+    }
+    this.enqueue(Promise.resolve(item));
+  }
+
+  subscribe(handler: EventHandler): void {
+    this.handlers.push(handler);
+  }
+
+  async start(): Promise<void> {
+    const { unlisten } = await pgClient.listen(
+      CHANNEL,
+      (payload) => {
+        // Serialize so events referenced by id keep their order
+        this.receiveChain = this.receiveChain.then(() => this.receive(payload));
+      },
+      () => logger.info("Event bus listening", { channel: CHANNEL, instance: INSTANCE_ID })
+    );
+    this.unlisten = unlisten;
+
+    this.sweepTimer = setInterval(() => {
+      deleteEventPayloadsBefore(new Date(Date.now() - PAYLOAD_TTL_MS)).catch((err) => {
+        logger.error("Failed to sweep event payloads", { error: String(err) });
+      });
+    }, PAYLOAD_SWEEP_INTERVAL_MS);
+  }
+
+  async stop(): Promise<void> {
+    if (this.sweepTimer) clearInterval(this.sweepTimer);
+    this.sweepTimer = null;
+    await this.sendChain;
+    await this.flush();
+    await this.unlisten?.();
+    this.unlisten = null;
+  }
+
+  get stats(): EventBusStats {
+    return {
+      kind: "postgres",
+      published: this.published,
+      delivered: this.delivered,
+      notifications: this.notifications,
+      remoteEvents: this.remoteEvents,
+      spilledPayloads: this.spilledPayloads,
+      failures: this.failures,
+    };
+  }
+
+  private deliver(userId: string, sessionId: string, event: unknown): void {
+    for (const handler of this.handlers) {
+      handler(userId, sessionId, event);
+      this.delivered++;
+    }
+  }
+
+  /**
+   * Queue a serialized item (kept in publish order even when spilling).
+   */
+  private enqueue(item: Promise<string>): void {
+    this.sendChain = this.sendChain.then(async () => {
+      let serialized: string;
+      try {
+        serialized = await item;
+      } catch (err) {
+        this.failures++;
+        logger.error("Failed to spill large dashboard event", { error: String(err) });
+        return;
+      }
+
+      const bytes = Buffer.byteLength(serialized) + 1;
+      if (this.pendingBytes + bytes > MAX_NOTIFY_BYTES) await this.flush();
+      this.pending.push(serialized);
+      this.pendingBytes += bytes;
+      if (!this.timer) {
+        this.timer = setTimeout(() => {
+          this.timer = null;
+          this.flush().catch(() => {});
+        }, FLUSH_DELAY_MS);
+      }
+    });
+  }
+
+  private async spill(item: string): Promise<string> {
+    const id = crypto.randomUUID();
+    await insertEventPayload(id, item);
+    this.spilledPayloads++;
+    return JSON.stringify({ r: id });
+  }
+
+  private async flush(): Promise<void> {
+    if (this.timer) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+    if (this.pending.length === 0) return;
+
+    const payload = `{"o":${JSON.stringify(INSTANCE_ID)},"e":[${this.pending.join(",")}]}`;
+    const count = this.pending.length;
+    this.pending = [];
+    this.pendingBytes = 0;
+
+    try {
+      await pgClient.notify(CHANNEL, payload);
+      this.notifications++;
+    } catch (err) {
+      this.failures++;
+      logger.error("Failed to publish dashboard events", { count, error: String(err) });
+    }
+  }
+
+  private async receive(payload: string): Promise<void> {
+    let envelope: Envelope;
+    try {
+      envelope = JSON.parse(payload) as Envelope;
+    } catch {
+      this.failures++;
+      return;
+    }
+    // Already delivered locally at publish time
+    if (envelope.o === INSTANCE_ID) return;
+
+    for (const entry of envelope.e) {
+      let tuple: [string, string, unknown];
+      if (Array.isArray(entry)) {
+        tuple = entry;
+      } else {
+        try {
+          const stored = await getEventPayload(entry.r);
+          if (!stored) continue;
+          tuple = JSON.parse(stored) as [string, string, unknown];
+        } catch (err) {
+          this.failures++;
+          logger.error("Failed to load dashboard event payload", { id: entry.r, error: String(err) });
+          continue;
+        }
+      }
+      this.remoteEvents++;
+      this.deliver(tuple[0], tuple[1], tuple[2]);
+    }
+  }
+}
+
+/**
+ * EVENT_BUS=postgres for multi-instance deployments; in-process otherwise.
+ */
+export function createEventBus(): EventBus {
+  return process.env.EVENT_BUS === "postgres" ? new PostgresEventBus() : new InProcessEventBus();
+}
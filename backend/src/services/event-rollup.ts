@@ -0,0 +1,133 @@
+import { upsertEventRollups } from "../db/queries";
+import type { TikTokEventRollup } from "../db/schema";
+import { logger } from "../lib/logger";
+
+const FLUSH_INTERVAL_MS = 1_000;
+const MAX_PENDING_BUCKETS = 50_000; // cap while the DB is unreachable
+
+export interface EventRollupStats {
+  pendingBuckets: number;
+  eventsAggregated: number;
+  rowsFlushed: number;
+  flushFailures: number;
+  droppedBuckets: number;
+}
+
+/**
+ * Aggregates high-volume TikTok events into per-session per-second counter
+ * rows. Completed seconds are upserted every FLUSH_INTERVAL_MS; everything
+ * (including the current second) is flushed on stop. Because rows are
+ * upserted additively, a second split across two flushes still sums up.
+ */
+export class EventRollup {
+  private buckets = new Map<string, TikTokEventRollup>();
+  private timer: ReturnType<typeof setInterval> | null = null;
+  private flushing: Promise<void> | null = null;
+  private eventsAggregated = 0;
+  private rowsFlushed = 0;
+  private flushFailures = 0;
+  private droppedBuckets = 0;
+
+  start(): void {
+    if (this.timer) return;
+    this.timer = setInterval(() => {
+      this.flush(false).catch(() => {});
+    }, FLUSH_INTERVAL_MS);
+  }
+
+  /**
+   * Count one event. `value` is the event's numeric payload (e.g. likeCount,
+   * viewerCount), or 1 when it has none.
+   */
+  record(liveSessionId: string, eventType: string, value: number, at = Date.now()): void {
+    const second = Math.floor(at / 1000) * 1000;
+    const key = `${liveSessionId}\u0000${eventType}\u0000${second}`;
+
+    const bucket = this.buckets.get(key);
+    if (bucket) {
+      bucket.eventCount++;
+      bucket.valueSum += value;
+      if (value > bucket.valueMax) bucket.valueMax = value;
+    } else {
+      this.buckets.set(key, {
+        liveSessionId,
+        eventType,
+        bucketStart: new Date(second),
+        eventCount: 1,
+        valueSum: value,
+        valueMax: value,
+      });
+    }
+    this.eventsAggregated++;
+  }
+
+  /**
+   * Upsert buffered buckets. Unless `all`, the current second is kept back
+   * so it is written once, complete.
+   */
+  async flush(all = true): Promise<void> {
+    while (this.flushing) await this.flushing;
+
+    const currentSecond = Math.floor(Date.now() / 1000) * 1000;
+    const rows: TikTokEventRollup[] = [];
+    for (const [key, bucket] of this.buckets) {
+      if (!all && bucket.bucketStart.getTime() >= currentSecond) continue;
+      rows.push(bucket);
+      this.buckets.delete(key);
+    }
+    if (rows.length === 0) return;
+
+    this.flushing = this.write(rows).finally(() => {
+      this.flushing = null;
+    });
+    await this.flushing;
+  }
+
+  async stop(): Promise<void> {
+    if (this.timer) clearInterval(this.timer);
+    this.timer = null;
+    await this.flush(true);
+  }
+
+  get stats(): EventRollupStats {
+    return {
+      pendingBuckets: this.buckets.size,
+      eventsAggregated: this.eventsAggregated,
+      rowsFlushed: this.rowsFlushed,
+      flushFailures: this.flushFailures,
+      droppedBuckets: this.droppedBuckets,
+    };
+  }
+
+  private async write(rows: TikTokEventRollup[]): Promise<void> {
+    try {
+      await upsertEventRollups(rows);
+      this.rowsFlushed += rows.length;
+    } catch (err) {
+      this.flushFailures++;
+      logger.error("Failed to flush event rollups", { count: rows.length, error: String(err) });
+      this.requeue(rows);
+    }
+  }
+
+  /**
+   * Merge a failed batch back into the buffer for the next flush.
+   */
+  private requeue(rows: TikTokEventRollup[]): void {
+    for (const row of rows) {
+      if (this.buckets.size >= MAX_PENDING_BUCKETS) {
+        this.droppedBuckets++;
+        continue;
+      }
+      const key = `${row.liveSessionId}\u0000${row.eventType}\u0000${row.bucketStart.getTime()}`;
+      const bucket = this.buckets.get(key);
+      if (bucket) {
+        bucket.eventCount += row.eventCount;
+        bucket.valueSum += row.valueSum;
+        bucket.valueMax = Math.max(bucket.valueMax, row.valueMax);
+      } else {
+        this.buckets.set(key, row);
+      }
+    }
+  }
+}
@@ -0,0 +1,446 @@
+import { getActiveSessionForUser, getGiftEventsForSession, getNowPlayingRequest, getUserIdForOverlayToken } from "../db/queries";
+import type { GiftEvent, SongRequest } from "../db/schema";
+import { TtlCache } from "../lib/ttl-cache";
+import { SingleFlight } from "../lib/single-flight";
+import { logger } from "../lib/logger";
+import { positiveIntEnv } from "../lib/env";
+import type { RequestPriorityQueue } from "./request-priority";
+
+const UP_NEXT_LIMIT = positiveIntEnv("OVERLAY_UP_NEXT", 5);
+const RECENT_GIFTS_LIMIT = positiveIntEnv("OVERLAY_RECENT_GIFTS", 10);
+const RENDER_DELAY_MS = 100; // coalesce bursts into one render
+const HEARTBEAT_INTERVAL_MS = 25_000;
+const IDLE_STATE_MS = 10 * 60_000; // drop snapshots nobody asked for since
+const TOKEN_CACHE_TTL_MS = 60_000;
+const MAX_CACHED_TOKENS = 10_000;
+// Unknown tokens are cached apart, so guessing can't evict real overlays
+const UNKNOWN_TOKEN_TTL_MS = 10_000;
+const MAX_UNKNOWN_TOKENS = 1_000;
+// rotateOverlayToken: 24 random bytes, base64url
+const TOKEN_PATTERN = /^[A-Za-z0-9_-]{32}$/;
+
+// Distinguishes this process's ETags from another instance's or a restart's
+const ETAG_EPOCH = crypto.randomUUID().slice(0, 8);
+const encoder = new TextEncoder();
+
+/** Track fields an overlay may show (overlay URLs are unauthenticated) */
+export interface OverlayTrack {
+  id: string;
+  viewerUsername: string;
+  trackName: string | null;
+  trackArtist: string | null;
+  albumImageUrl: string | null;
+  durationMs: number | null;
+}
+
+export interface OverlayGift {
+  id: string;
+  viewerUsername: string;
+  giftName: string | null;
+  diamondCount: number | null;
+  repeatCount: number;
+  receivedAt: Date;
+}
+
+/** A rendered snapshot, shared by every overlay client of a user */
+export interface OverlayRender {
+  version: number;
+  etag: string;
+  body: string;
+}
+
+export interface OverlayHubStats {
+  snapshots: number;
+  sseClients: number;
+  loads: number;
+  renders: number;
+  stateRequests: number;
+  notModified: number;
+  skippedWrites: number;
+  unknownTokens: number;
+}
+
+interface SseClient {
+  controller: ReadableStreamDefaultController<Uint8Array>;
+  /** Missed a render while its buffer was full */
+  stale: boolean;
+}
+
+interface OverlayState {
+  userId: string;
+  sessionId: string | null;
+  nowPlaying: OverlayTrack | null;
+  nowPlayingAt: number;
+  gifts: OverlayGift[];
+  version: number;
+  // Last rendered content (without version), to skip no-op renders
+  content: string | null;
+  render: OverlayRender | null;
+  chunk: Uint8Array | null;
+  renderTimer: ReturnType<typeof setTimeout> | null;
+  clients: Set<SseClient>;
+  lastAccess: number;
+  loading: Promise<void> | null;
+  // Events that arrived while loading, applied once it finishes
+  backlog: { sessionId: string; event: OverlayEvent }[];
+}
+
+interface OverlayEvent {
+  type?: string;
+  request?: Partial<SongRequest>;
+  gift?: GiftEvent;
+}
+
+function toTrack(request: Partial<SongRequest>): OverlayTrack {
+  return {
+    id: request.id!,
+    viewerUsername: request.viewerUsername ?? "",
+    trackName: request.trackName ?? null,
+    trackArtist: request.trackArtist ?? null,
+    albumImageUrl: request.albumImageUrl ?? null,
+    durationMs: request.durationMs ?? null,
+  };
+}
+
+function toGift(gift: GiftEvent): OverlayGift {
+  return {
+    id: gift.id,
+    viewerUsername: gift.viewerUsername,
+    giftName: gift.giftName,
+    diamondCount: gift.diamondCount,
+    repeatCount: gift.repeatCount,
+    receivedAt: gift.receivedAt,
+  };
+}
+
+function timeOf(value: Date | string | null | undefined): number {
+  return value ? new Date(value).getTime() : 0;
+}
+
+/**
+ * Live state for stream overlays, keyed by overlay token.
+ *
+ * One in-memory snapshot per user (now playing, recent gifts) is loaded
+ * from the DB when its first overlay connects, then kept current from
+ * dashboard events; up next is the head of the session's
+ * RequestPriorityQueue, so overlays show gift-boosted play order. Each change
+ * re-renders it once (JSON body + ETag + SSE chunk, coalesced over
+ * RENDER_DELAY_MS) and that render is shared by every poller and SSE
+ * client, so overlays cost no DB queries after the first.
+ */
+export class OverlayHub {
+  private states = new Map<string, OverlayState>();
+  private tokens = new TtlCache<string, string>({
+    maxEntries: MAX_CACHED_TOKENS,
+    defaultTtlMs: TOKEN_CACHE_TTL_MS,
+  });
+  private unknown = new TtlCache<string, true>({
+    maxEntries: MAX_UNKNOWN_TOKENS,
+    defaultTtlMs: UNKNOWN_TOKEN_TTL_MS,
+  });
+  private tokenLookups = new SingleFlight<string | null>();
+  private heartbeatTimer: ReturnType<typeof setInterval> | null = null;
+  private loads = 0;
+  private renders = 0;
+  private stateRequests = 0;
+  private notModified = 0;
+  private skippedWrites = 0;
+  private unknownTokens = 0;
+  private requests: RequestPriorityQueue;
+
+  constructor(requests: RequestPriorityQueue) {
+    this.requests = requests;
+  }
+
+  start(): void {
+    if (this.heartbeatTimer) return;
+    this.heartbeatTimer = setInterval(() => this.heartbeat(), HEARTBEAT_INTERVAL_MS);
+  }
+
+  stop(): void {
+    if (this.heartbeatTimer) clearInterval(this.heartbeatTimer);
+    this.heartbeatTimer = null;
+    for (const state of this.states.values()) {
+      if (state.renderTimer) clearTimeout(state.renderTimer);
+      for (const client of state.clients) this.closeClient(client);
+    }
+    this.states.clear();
+  }
+
+  /**
+   * Current render for a token, or null if the token is unknown.
+   * `ifNoneMatch` is counted as a 304 when it matches.
+   */
+  async getState(token: string, ifNoneMatch?: string | null): Promise<OverlayRender | null> {
+    const state = await this.stateForToken(token);
+    if (!state) return null;
+    this.stateRequests++;
+    const render = this.renderNow(state);
+    if (ifNoneMatch === render.etag) this.notModified++;
+    return render;
+  }
+
+  /**
+   * SSE stream for a token: the current state, then one `state` event per
+   * render. Null if the token is unknown.
+   */
+  async openStream(token: string, signal: AbortSignal): Promise<ReadableStream<Uint8Array> | null> {
+    const state = await this.stateForToken(token);
+    if (!state) return null;
+
+    let client: SseClient | null = null;
+    const detach = () => {
+      if (client && state.clients.delete(client)) this.closeClient(client);
+    };
+
+    return new ReadableStream<Uint8Array>({
+      start: (controller) => {
+        client = { controller, stale: false };
+        state.clients.add(client);
+        this.renderNow(state);
+        controller.enqueue(encoder.encode(`retry: 3000\n\n`));
+        controller.enqueue(state.chunk!);
+        signal.addEventListener("abort", detach);
+      },
+      cancel: detach,
+    });
+  }
+
+  /**
+   * Feed a dashboard event. Users without a loaded snapshot are skipped.
+   */
+  publish(userId: string, sessionId: string, event: unknown): void {
+    const state = this.states.get(userId);
+    if (!state) return;
+    if (state.loading) {
+      state.backlog.push({ sessionId, event: event as OverlayEvent });
+      return;
+    }
+    this.apply(state, sessionId, event as OverlayEvent);
+  }
+
+  /**
+   * Forget a rotated token and disconnect the overlays using it. Called for
+   * the `overlay:revoked` bus event, so every instance drops it.
+   */
+  revokeToken(userId: string, token: string | null): void {
+    if (token) this.tokens.delete(token);
+    const state = this.states.get(userId);
+    if (!state) return;
+    for (const client of state.clients) this.closeClient(client);
+    state.clients.clear();
+  }
+
+  get stats(): OverlayHubStats {
+    let sseClients = 0;
+    for (const state of this.states.values()) sseClients += state.clients.size;
+    return {
+      snapshots: this.states.size,
+      sseClients,
+      loads: this.loads,
+      renders: this.renders,
+      stateRequests: this.stateRequests,
+      notModified: this.notModified,
+      skippedWrites: this.skippedWrites,
+      unknownTokens: this.unknownTokens,
+    };
+  }
+
+  private async stateForToken(token: string): Promise<OverlayState | null> {
+    let userId = this.tokens.get(token) ?? null;
+    if (!userId) {
+      if (!TOKEN_PATTERN.test(token) || this.unknown.get(token)) {
+        this.unknownTokens++;
+        return null;
+      }
+      userId = await this.tokenLookups.do(token, () => getUserIdForOverlayToken(token));
+      if (!userId) {
+        this.unknownTokens++;
+        this.unknown.set(token, true);
+        return null;
+      }
+      this.tokens.set(token, userId);
+    }
+
+    let state = this.states.get(userId);
+    if (!state) {
+      state = {
+        userId,
+        sessionId: null,
+        nowPlaying: null,
+        nowPlayingAt: 0,
+        gifts: [],
+        version: 0,
+        content: null,
+        render: null,
+        chunk: null,
+        renderTimer: null,
+        clients: new Set(),
+        lastAccess: Date.now(),
+        loading: null,
+        backlog: [],
+      };
+      this.states.set(userId, state);
+      this.reload(state, null);
+    }
+    state.lastAccess = Date.now();
+    if (state.loading) await state.loading;
+    return state;
+  }
+
+  /**
+   * (Re)load a snapshot from the DB: the given session, or the user's
+   * active one when null.
+   */
+  private reload(state: OverlayState, sessionId: string | null): void {
+    if (state.loading) return;
+    this.loads++;
+    state.loading = (async () => {
+      const id = sessionId ?? (await getActiveSessionForUser(state.userId))?.id ?? null;
+      // Set first, so a failed load isn't retried on every event
+      state.sessionId = id;
+      let nowPlaying: SongRequest | null = null;
+      let gifts: GiftEvent[] = [];
+      if (id) {
+        [nowPlaying, gifts] = await Promise.all([
+          getNowPlayingRequest(id),
+          getGiftEventsForSession(id, null, RECENT_GIFTS_LIMIT),
+          this.requests.load(id),
+        ]);
+      }
+
+      state.nowPlaying = nowPlaying ? toTrack(nowPlaying) : null;
+      state.nowPlayingAt = timeOf(nowPlaying?.confirmedAt);
+      state.gifts = gifts.map(toGift);
+    })()
+      .catch((err) => {
+        logger.error("Failed to load overlay snapshot", { userId: state.userId, error: String(err) });
+      })
+      .finally(() => {
+        state.loading = null;
+        const backlog = state.backlog;
+        state.backlog = [];
+        for (const { sessionId, event } of backlog) this.apply(state, sessionId, event);
+        this.scheduleRender(state);
+      });
+  }
+
+  private apply(state: OverlayState, sessionId: string, event: OverlayEvent): void {
+    if (event.type === "session:ended") {
+      if (state.sessionId !== sessionId) return;
+      state.sessionId = null;
+      state.nowPlaying = null;
+      state.gifts = [];
+      this.scheduleRender(state);
+      return;
+    }
+    if (state.sessionId !== sessionId) {
+      // A session we haven't loaded (new session, or we missed its start)
+      this.reload(state, sessionId);
+      state.backlog.push({ sessionId, event });
+      return;
+    }
+
+    if (event.type === "request:update" && event.request?.id) {
+      // Up next may have changed too (render skips it if nothing did)
+      this.applyRequest(state, event.request);
+      this.scheduleRender(state);
+    } else if (event.type === "gift:new" && event.gift) {
+      state.gifts = [toGift(event.gift), ...state.gifts.filter((g) => g.id !== event.gift!.id)].slice(
+        0,
+        RECENT_GIFTS_LIMIT
+      );
+      this.scheduleRender(state);
+    }
+  }
+
+  /** Track the now playing request */
+  private applyRequest(state: OverlayState, request: Partial<SongRequest>): void {
+    const confirmedAt = timeOf(request.confirmedAt);
+    if (request.playStatus === "confirmed" && confirmedAt >= state.nowPlayingAt) {
+      state.nowPlaying = toTrack(request);
+      state.nowPlayingAt = confirmedAt;
+    }
+  }
+
+  private scheduleRender(state: OverlayState): void {
+    if (state.renderTimer) return;
+    state.renderTimer = setTimeout(() => {
+      state.renderTimer = null;
+      // Rescheduled once the load finishes
+      if (!state.loading) this.render(state);
+    }, RENDER_DELAY_MS);
+  }
+
+  /** The current render, rendering first if there is none yet */
+  private renderNow(state: OverlayState): OverlayRender {
+    if (!state.render) this.render(state);
+    return state.render!;
+  }
+
+  private render(state: OverlayState): void {
+    const upNext = state.sessionId ? this.requests.top(state.sessionId, UP_NEXT_LIMIT) : [];
+    const content = JSON.stringify({
+      sessionId: state.sessionId,
+      nowPlaying: state.nowPlaying,
+      upNext: upNext.map((p) => toTrack(p.request)),
+      recentGifts: state.gifts,
+    });
+    if (state.render && content === state.content) return;
+
+    this.renders++;
+    const version = ++state.version;
+    state.content = content;
+    const body = `{"version":${version},${content.slice(1)}`;
+    state.render = { version, etag: `"${ETAG_EPOCH}-${version}"`, body };
+    state.chunk = encoder.encode(`id: ${version}\nevent: state\ndata: ${body}\n\n`);
+
+    for (const client of state.clients) this.write(client, state.chunk);
+  }
+
+  /**
+   * Each event carries the full state, so a client with a full buffer
+   * simply skips renders and gets the latest one once it drains.
+   */
+  private write(client: SseClient, chunk: Uint8Array): void {
+    if ((client.controller.desiredSize ?? 1) <= 0) {
+      client.stale = true;
+      this.skippedWrites++;
+      return;
+    }
+    client.stale = false;
+    try {
+      client.controller.enqueue(chunk);
+    } catch {
+      // Stream already closed; cancel() removes it
+    }
+  }
+
+  private closeClient(client: SseClient): void {
+    try {
+      client.controller.close();
+    } catch {
+      // Already closed
+    }
+  }
+
+  /**
+   * Keep SSE connections alive through proxies, catch up clients that
+   * skipped renders, and drop snapshots nobody is using.
+   */
+  private heartbeat(): void {
+    const now = Date.now();
+    const ping = encoder.encode(`: ping\n\n`);
+    for (const [userId, state] of this.states) {
+      if (state.clients.size === 0 && now - state.lastAccess > IDLE_STATE_MS && !state.loading) {
+        if (state.renderTimer) clearTimeout(state.renderTimer);
+        this.states.delete(userId);
+        continue;
+      }
+      for (const client of state.clients) {
+        if (client.stale && state.chunk) this.write(client, state.chunk);
+        else this.write(client, ping);
+      }
+    }
+  }
+}
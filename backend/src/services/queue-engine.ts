@@ -0,0 +1,244 @@
+import { getQueueForSession } from "../db/queries";
+import type { QueueItem } from "../db/schema";
+import { OrderedIndex } from "../lib/ordered-index";
+import { SingleFlight } from "../lib/single-flight";
+import { QueueWriter, type QueueWriterStats } from "./queue-writer";
+import { logger } from "../lib/logger";
+
+// Gap between appended items; reorders take the midpoint of two neighbours
+const POSITION_STEP = 1024;
+// Below this gap (doubles allow ~40 halvings of STEP) the session is renumbered
+const MIN_POSITION_GAP = 1e-6;
+
+type EventEmitter = (userId: string, sessionId: string, event: unknown) => void;
+
+export type QueueStatus = QueueItem["status"];
+
+export interface QueueEngineStats {
+  sessions: number;
+  items: number;
+  loads: number;
+  moves: number;
+  renumbers: number;
+  writer: QueueWriterStats;
+}
+
+interface SessionQueue {
+  items: OrderedIndex<QueueItem>;
+}
+
+/** `queue:add` / `queue:update` carry one item; a renumber sends the whole queue */
+interface QueueEvent {
+  type?: string;
+  item?: QueueItem;
+  queue?: QueueItem[];
+}
+
+/**
+ * Authoritative in-memory queue per live session.
+ *
+ * Each session's queued items sit in an OrderedIndex by fractional
+ * position, so add, remove and move are O(log n) and reads return a cached
+ * array. Changes are persisted asynchronously in batches (QueueWriter) and
+ * published as `queue:add` / `queue:update` events; other instances apply
+ * those to their copy (see apply). A session is loaded from the DB on first
+ * use, which also rebuilds it after a restart, and dropped when it ends.
+ */
+export class QueueEngine {
+  private sessions = new Map<string, SessionQueue>();
+  // Queue events that arrived while a session was loading
+  private backlog = new Map<string, QueueEvent[]>();
+  private loader = new SingleFlight<SessionQueue>();
+  private writer = new QueueWriter();
+  private emit: EventEmitter;
+  private loads = 0;
+  private moves = 0;
+  private renumbers = 0;
+
+  constructor(emit: EventEmitter) {
+    this.emit = emit;
+  }
+
+  /** Queued items in order */
+  async list(sessionId: string): Promise<readonly QueueItem[]> {
+    return (await this.session(sessionId)).items.toArray();
+  }
+
+  /** Append an item to the end of the queue */
+  async add(
+    userId: string,
+    sessionId: string,
+    values: { viewerUsername: string | null; spotifyTrackId: string; trackTitle: string; trackArtist: string }
+  ): Promise<QueueItem> {
+    const { items } = await this.session(sessionId);
+    const last = items.at(items.size - 1);
+    const item: QueueItem = {
+      id: crypto.randomUUID(),
+      liveSessionId: sessionId,
+      viewerUsername: values.viewerUsername,
+      spotifyTrackId: values.spotifyTrackId,
+      trackTitle: values.trackTitle,
+      trackArtist: values.trackArtist,
+      status: "queued",
+      position: last ? last.position + POSITION_STEP : POSITION_STEP,
+      requestedAt: new Date(),
+    };
+
+    items.insert(item);
+    this.writer.put(item);
+    this.emit(userId, sessionId, { type: "queue:add", item });
+    return item;
+  }
+
+  /**
+   * Move a queued item to `toIndex` (clamped). Only the moved item's
+   * position changes, unless the gap has run out and the session is
+   * renumbered. Returns null if the item isn't queued in this session.
+   */
+  async move(userId: string, sessionId: string, itemId: string, toIndex: number): Promise<QueueItem | null> {
+    const queue = await this.session(sessionId);
+    const current = queue.items.remove(itemId);
+    if (!current) return null;
+
+    const index = Math.max(0, Math.min(Math.floor(toIndex), queue.items.size));
+    let position = this.positionAt(queue.items, index);
+    if (position === null) {
+      this.renumber(userId, sessionId, queue);
+      position = this.positionAt(queue.items, index)!;
+    }
+
+    const item: QueueItem = { ...current, position };
+    queue.items.insert(item);
+    this.moves++;
+    this.writer.put(item);
+    this.emit(userId, sessionId, { type: "queue:update", item });
+    return item;
+  }
+
+  /**
+   * Take an item out of the queue (skipped, revoked, playing, played).
+   * Returns null if it isn't queued in this session.
+   */
+  async setStatus(userId: string, sessionId: string, itemId: string, status: QueueStatus): Promise<QueueItem | null> {
+    if (status === "queued") return null;
+    const { items } = await this.session(sessionId);
+    const current = items.remove(itemId);
+    if (!current) return null;
+
+    const item: QueueItem = { ...current, status };
+    this.writer.put(item);
+    this.emit(userId, sessionId, { type: "queue:update", item });
+    return item;
+  }
+
+  /**
+   * Apply a queue event published by any instance. Our own events carry
+   * the item already in the index, so they're skipped.
+   */
+  apply(sessionId: string, event: unknown): void {
+    const queueEvent = event as QueueEvent;
+    if (queueEvent.type === "session:ended") {
+      this.sessions.delete(sessionId);
+      this.backlog.delete(sessionId);
+      return;
+    }
+    if (queueEvent.type !== "queue:add" && queueEvent.type !== "queue:update") return;
+
+    const pending = this.backlog.get(sessionId);
+    if (pending) {
+      pending.push(queueEvent);
+      return;
+    }
+    const queue = this.sessions.get(sessionId);
+    if (queue) this.applyEvent(queue, queueEvent);
+  }
+
+  /** Persist everything still buffered (shutdown); rejects if that fails */
+  async flush(): Promise<void> {
+    await this.writer.drain();
+  }
+
+  get stats(): QueueEngineStats {
+    let items = 0;
+    for (const queue of this.sessions.values()) items += queue.items.size;
+    return {
+      sessions: this.sessions.size,
+      items,
+      loads: this.loads,
+      moves: this.moves,
+      renumbers: this.renumbers,
+      writer: this.writer.stats,
+    };
+  }
+
+  private session(sessionId: string): Promise<SessionQueue> {
+    const queue = this.sessions.get(sessionId);
+    if (queue) return Promise.resolve(queue);
+    return this.loader.do(sessionId, () => this.load(sessionId));
+  }
+
+  private async load(sessionId: string): Promise<SessionQueue> {
+    this.backlog.set(sessionId, []);
+    try {
+      // Our own unflushed writes must be visible to the read
+      await this.writer.flush();
+      const rows = await getQueueForSession(sessionId);
+
+      const queue: SessionQueue = { items: new OrderedIndex<QueueItem>() };
+      for (const row of rows) queue.items.insert(row);
+      for (const event of this.backlog.get(sessionId) ?? []) this.applyEvent(queue, event);
+
+      this.sessions.set(sessionId, queue);
+      this.loads++;
+      return queue;
+    } catch (err) {
+      logger.error("Failed to load queue", { sessionId, error: String(err) });
+      throw err;
+    } finally {
+      this.backlog.delete(sessionId);
+    }
+  }
+
+  private applyEvent(queue: SessionQueue, event: QueueEvent): void {
+    if (event.item) {
+      const item = event.item;
+      if (queue.items.get(item.id) === item) return;
+      queue.items.remove(item.id);
+      if (item.status === "queued") queue.items.insert({ ...item, requestedAt: new Date(item.requestedAt) });
+      return;
+    }
+    if (event.queue) {
+      if (event.queue.every((item) => queue.items.get(item.id) === item)) return;
+      queue.items = new OrderedIndex<QueueItem>();
+      for (const item of event.queue) {
+        if (item.status === "queued") queue.items.insert({ ...item, requestedAt: new Date(item.requestedAt) });
+      }
+    }
+  }
+
+  /**
+   * Position for an item inserted at `index`, or null if its neighbours are
+   * too close together.
+   */
+  private positionAt(items: OrderedIndex<QueueItem>, index: number): number | null {
+    const before = items.at(index - 1);
+    const after = items.at(index);
+    if (!before && !after) return POSITION_STEP;
+    if (!before) return after!.position - POSITION_STEP;
+    if (!after) return before.position + POSITION_STEP;
+    if (after.position - before.position < MIN_POSITION_GAP) return null;
+    return (before.position + after.position) / 2;
+  }
+
+  /** Respace every item in the session by POSITION_STEP (rare, O(n)) */
+  private renumber(userId: string, sessionId: string, queue: SessionQueue): void {
+    const respaced = queue.items.toArray().map((item, i) => ({ ...item, position: (i + 1) * POSITION_STEP }));
+    queue.items = new OrderedIndex<QueueItem>();
+    for (const item of respaced) {
+      queue.items.insert(item);
+      this.writer.put(item);
+    }
+    this.renumbers++;
+    this.emit(userId, sessionId, { type: "queue:update", queue: respaced });
+  }
+}
@@ -0,0 +1,126 @@
+import { upsertQueueItems } from "../db/queries";
+import type { QueueItem } from "../db/schema";
+import { logger } from "../lib/logger";
+
+const FLUSH_DELAY_MS = 50;
+const MAX_BATCH_ROWS = 500;
+const RETRY_DELAY_MS = 1_000;
+const DRAIN_TIMEOUT_MS = 10_000;
+
+export interface QueueWriterStats {
+  pendingRows: number;
+  flushes: number;
+  flushedRows: number;
+  failedFlushes: number;
+}
+
+/**
+ * Write-behind persistence for `queue_item` (see QueueEngine).
+ *
+ * Rows are buffered by id, newest version wins, and flushed as one upsert
+ * every FLUSH_DELAY_MS or MAX_BATCH_ROWS. A reorder or skip rewrites a
+ * single row. A failed batch is kept (newer versions take precedence) and
+ * retried; nothing is dropped, since the queue is small next to requests.
+ */
+export class QueueWriter {
+  private pending = new Map<string, QueueItem>();
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private flushing: Promise<void> | null = null;
+  private failing = false;
+  private flushes = 0;
+  private flushedRows = 0;
+  private failedFlushes = 0;
+
+  /** Buffer the current version of a row */
+  put(row: QueueItem): void {
+    this.pending.set(row.id, { ...row });
+    this.schedule();
+  }
+
+  /**
+   * Flush everything buffered so far. Resolves once it is durable; rejects
+   * if the batch failed (it stays buffered and is retried later).
+   */
+  async flush(): Promise<void> {
+    if (this.timer) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+
+    while (this.flushing) await this.flushing.catch(() => {});
+    if (this.pending.size === 0) return;
+
+    this.flushing = this.flushBatch().finally(() => {
+      this.flushing = null;
+    });
+    try {
+      await this.flushing;
+    } finally {
+      if (this.pending.size > 0) this.schedule();
+    }
+  }
+
+  /**
+   * Flush, retrying failed batches until everything buffered so far is
+   * durable (shutdown). Rejects after `timeoutMs`.
+   */
+  async drain(timeoutMs = DRAIN_TIMEOUT_MS): Promise<void> {
+    const deadline = Date.now() + timeoutMs;
+    for (;;) {
+      try {
+        await this.flush();
+        return;
+      } catch (err) {
+        if (Date.now() + RETRY_DELAY_MS > deadline) {
+          throw new Error(
+            `Queue writes not durable after ${timeoutMs}ms (${this.pending.size} rows pending): ${String(err)}`
+          );
+        }
+        await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS));
+      }
+    }
+  }
+
+  get stats(): QueueWriterStats {
+    return {
+      pendingRows: this.pending.size,
+      flushes: this.flushes,
+      flushedRows: this.flushedRows,
+      failedFlushes: this.failedFlushes,
+    };
+  }
+
+  private schedule(): void {
+    if (!this.failing && this.pending.size >= MAX_BATCH_ROWS) {
+      this.flush().catch(() => {});
+      return;
+    }
+    if (!this.timer) {
+      this.timer = setTimeout(() => {
+        this.timer = null;
+        this.flush().catch(() => {});
+      }, this.failing ? RETRY_DELAY_MS : FLUSH_DELAY_MS);
+    }
+  }
+
+  private async flushBatch(): Promise<void> {
+    const batch = this.pending;
+    this.pending = new Map();
+
+    try {
+      await upsertQueueItems([...batch.values()]);
+    } catch (err) {
+      this.failing = true;
+      this.failedFlushes++;
+      logger.error("Failed to flush queue items", { count: batch.size, error: String(err) });
+      // Keep rows changed again since the batch was taken
+      for (const [id, row] of this.pending) batch.set(id, row);
+      this.pending = batch;
+      throw err;
+    }
+
+    this.failing = false;
+    this.flushes++;
+    this.flushedRows += batch.size;
+  }
+}
@@ -0,0 +1,135 @@
+import {
+  updateViewerRateLimit,
+  deleteExpiredViewerRateLimits,
+  countViewerRateLimits,
+} from "../db/queries";
+import {
+  ViewerRateLimiter,
+  DEFAULT_RATE_LIMIT_POLICY,
+  freshState,
+  consume,
+  addGiftBonus,
+  idleAt,
+  type RateLimiter,
+  type RateLimiterStats,
+  type RateLimitPolicy,
+  type LimiterState,
+} from "../lib/rate-limit";
+import { logger } from "../lib/logger";
+
+const SWEEP_INTERVAL_MS = 60_000;
+
+/**
+ * Rate limiter whose per-viewer state lives in Postgres (viewer_rate_limit),
+ * so every instance handling a streamer sees the same counts. Each check is
+ * one short row-locked transaction; expired rows are swept periodically.
+ * On DB errors the request is allowed (fail open) rather than dropped.
+ */
+export class PostgresRateLimiter implements RateLimiter {
+  private policies = new Map<string, RateLimitPolicy>();
+  private timer: ReturnType<typeof setInterval> | null = null;
+  private entries = 0;
+  private checks = 0;
+  private limited = 0;
+  private boosts = 0;
+  private expired = 0;
+  private errors = 0;
+
+  start(): void {
+    if (this.timer) return;
+    this.timer = setInterval(() => void this.sweep(), SWEEP_INTERVAL_MS);
+  }
+
+  stop(): void {
+    if (this.timer) clearInterval(this.timer);
+    this.timer = null;
+  }
+
+  setPolicy(sessionId: string, policy: RateLimitPolicy): void {
+    this.policies.set(sessionId, policy);
+  }
+
+  clearSession(sessionId: string): void {
+    this.policies.delete(sessionId);
+  }
+
+  async check(sessionId: string, viewer: string): Promise<boolean> {
+    this.checks++;
+    const policy = this.policies.get(sessionId) ?? DEFAULT_RATE_LIMIT_POLICY;
+    try {
+      const allowed = await this.update(sessionId, viewer, policy, (state, now) => consume(policy, state, now));
+      if (!allowed) this.limited++;
+      return allowed;
+    } catch (err) {
+      this.errors++;
+      logger.error("Rate limit check failed", { sessionId, viewer, error: String(err) });
+      return true;
+    }
+  }
+
+  async boost(sessionId: string, viewer: string, diamonds: number): Promise<void> {
+    const policy = this.policies.get(sessionId) ?? DEFAULT_RATE_LIMIT_POLICY;
+    if (!policy.giftBoost || diamonds <= 0) return;
+    try {
+      const granted = await this.update(sessionId, viewer, policy, (state, now) =>
+        addGiftBonus(policy, state, diamonds, now)
+      );
+      if (granted > 0) this.boosts++;
+    } catch (err) {
+      this.errors++;
+      logger.error("Rate limit boost failed", { sessionId, viewer, error: String(err) });
+    }
+  }
+
+  get stats(): RateLimiterStats & { errors: number } {
+    return {
+      store: "postgres",
+      entries: this.entries,
+      maxEntries: 0,
+      checks: this.checks,
+      limited: this.limited,
+      boosts: this.boosts,
+      expired: this.expired,
+      evicted: 0,
+      errors: this.errors,
+    };
+  }
+
+  private update<T>(
+    sessionId: string,
+    viewer: string,
+    policy: RateLimitPolicy,
+    apply: (state: LimiterState, now: number) => T
+  ): Promise<T> {
+    return updateViewerRateLimit(sessionId, viewer, (current) => {
+      const now = Date.now();
+      const state = current ?? freshState(policy, now);
+      const result = apply(state, now);
+      // Keep the row at least a tick past now so the write isn't moot
+      const expiresAt = new Date(Math.max(idleAt(policy, state), now + 1_000));
+      return { state, expiresAt, result };
+    });
+  }
+
+  private async sweep(): Promise<void> {
+    try {
+      this.expired += await deleteExpiredViewerRateLimits(new Date());
+      this.entries = await countViewerRateLimits();
+    } catch (err) {
+      logger.error("Rate limit sweep failed", { error: String(err) });
+    }
+  }
+}
+
+/**
+ * Rate limiter selected by RATE_LIMIT_STORE: "postgres" to share limits
+ * across instances, otherwise in memory.
+ */
+export function createRateLimiter(): RateLimiter {
+  if (process.env.RATE_LIMIT_STORE === "postgres") {
+    const limiter = new PostgresRateLimiter();
+    limiter.start();
+    return limiter;
+  }
+  return new ViewerRateLimiter();
+}
@@ -0,0 +1,329 @@
+import { mkdir, readdir, readFile, appendFile, rename, unlink } from "node:fs/promises";
+import { join } from "node:path";
+import { logRawTikTokEvents, pingDatabase, type RawTikTokEventInput } from "../db/queries";
+import { encodeSpillChunk, decodeSegment } from "../lib/spill-segment";
+import { logger } from "../lib/logger";
+
+const FLUSH_INTERVAL_MS = 1_000;
+const FLUSH_BATCH_SIZE = 2_000;
+const HIGH_WATER_MARK = 1_000; // early flush once this many events are buffered
+const MAX_BUFFERED = 10_000; // past this, events spill to disk instead of waiting
+const REPLAY_INTERVAL_MS = 5_000;
+const SEGMENT_MAX_BYTES = 8 * 1024 * 1024;
+const SEGMENT_MAX_AGE_MS = 60_000;
+const MAX_REPLAY_ATTEMPTS = 5;
+
+const SPILL_DIR = process.env.RAW_EVENT_SPILL_DIR ?? "./data/raw-event-spill";
+const SPILL_COMPRESS = process.env.RAW_EVENT_SPILL_COMPRESS === "true";
+
+export interface RawEventArchiverStats {
+  buffered: number;
+  flushFailures: number;
+  spilledEvents: number;
+  replayedEvents: number;
+  pendingSegments: number;
+}
+
+interface OpenSegment {
+  path: string;
+  bytes: number;
+  openedAt: number;
+}
+
+/**
+ * Raw TikTok event archiver: bounded in-memory buffer in front of
+ * `tiktok_raw_event`, with spill-to-disk when Postgres fails or lags.
+ *
+ * Events are batched and flushed every second, or early at the high-water
+ * mark. If a flush fails, or the buffer hits MAX_BUFFERED while a flush is
+ * still in flight, the batch is appended to an NDJSON segment file (gzip
+ * members when RAW_EVENT_SPILL_COMPRESS=true) instead of being dropped.
+ * Closed segments are replayed into the table in the background once
+ * flushes succeed again, and deleted after a successful replay. Segments
+ * left over from a previous run are replayed on start; a tail torn by a
+ * crash mid-append is skipped, and a segment that still fails after
+ * MAX_REPLAY_ATTEMPTS is parked as `.failed`.
+ *
+ * Each archiver owns one subdirectory of RAW_EVENT_SPILL_DIR, named by a
+ * slot that is stable across restarts ("main", or "w<n>" for session
+ * worker n). It only ever seals and replays segments in its own slot, so
+ * sibling workers never replay or rename each other's files, and a
+ * respawned worker picks up what its predecessor left behind.
+ */
+export class RawEventArchiver {
+  private buffer: RawTikTokEventInput[] = [];
+  private flushTimer: ReturnType<typeof setInterval> | null = null;
+  private replayTimer: ReturnType<typeof setInterval> | null = null;
+  private flushing: Promise<void> | null = null;
+  private replaying = false;
+  private dbHealthy = true;
+  private segment: OpenSegment | null = null;
+  private segmentSeq = 0;
+  private writeChain: Promise<void> = Promise.resolve();
+  private replayAttempts = new Map<string, number>();
+  private flushFailures = 0;
+  private spilledEvents = 0;
+  private replayedEvents = 0;
+  private pendingSegments = 0;
+  private readonly spillDir: string;
+
+  constructor(spillSlot = "main") {
+    this.spillDir = join(SPILL_DIR, spillSlot);
+  }
+
+  start(): void {
+    if (this.flushTimer) return;
+
+    // Segments still open when a previous process died are complete up to
+    // the last full line; seal them so they get replayed
+    this.writeChain = this.writeChain.then(() => recoverOpenSegments(this.spillDir)).catch((err) => {
+      logger.error("Failed to recover open raw event segments", { error: String(err) });
+    });
+
+    this.flushTimer = setInterval(() => {
+      this.flush().catch(() => {});
+    }, FLUSH_INTERVAL_MS);
+    this.replayTimer = setInterval(() => {
+      this.replay().catch((err) => {
+        logger.error("Raw event replay failed", { error: String(err) });
+      });
+    }, REPLAY_INTERVAL_MS);
+  }
+
+  push(event: RawTikTokEventInput): void {
+    this.buffer.push(event);
+
+    if (this.buffer.length >= MAX_BUFFERED && this.flushing) {
+      // DB is lagging: move the backlog to disk rather than grow memory
+      this.spill(this.buffer.splice(0, this.buffer.length));
+    } else if (this.buffer.length >= HIGH_WATER_MARK && !this.flushing) {
+      this.flush().catch(() => {});
+    }
+  }
+
+  /**
+   * Flush buffered events to the database, spilling on failure.
+   */
+  async flush(): Promise<void> {
+    while (this.flushing) await this.flushing;
+    if (this.buffer.length === 0) return;
+
+    this.flushing = this.flushBatches().finally(() => {
+      this.flushing = null;
+    });
+    await this.flushing;
+  }
+
+  /**
+   * Final flush for shutdown; waits for pending segment writes.
+   */
+  async stop(): Promise<void> {
+    if (this.flushTimer) clearInterval(this.flushTimer);
+    if (this.replayTimer) clearInterval(this.replayTimer);
+    this.flushTimer = null;
+    this.replayTimer = null;
+
+    await this.flush();
+    await this.writeChain;
+  }
+
+  get stats(): RawEventArchiverStats {
+    return {
+      buffered: this.buffer.length,
+      flushFailures: this.flushFailures,
+      spilledEvents: this.spilledEvents,
+      replayedEvents: this.replayedEvents,
+      pendingSegments: this.pendingSegments,
+    };
+  }
+
+  private async flushBatches(): Promise<void> {
+    while (this.buffer.length > 0) {
+      const batch = this.buffer.splice(0, FLUSH_BATCH_SIZE);
+
+      // While the DB is down, go straight to disk
+      if (!this.dbHealthy) {
+        this.spill(batch);
+        continue;
+      }
+
+      try {
+        await logRawTikTokEvents(batch);
+      } catch (err) {
+        this.flushFailures++;
+        this.dbHealthy = false;
+        logger.error("Failed to flush raw events, spilling to disk", {
+          count: batch.length,
+          error: String(err),
+        });
+        this.spill(batch);
+      }
+    }
+  }
+
+  /**
+   * Append events to the open segment (serialized through writeChain).
+   */
+  private spill(events: RawTikTokEventInput[]): void {
+    if (events.length === 0) return;
+
+    const chunk = encodeSpillChunk(events, SPILL_COMPRESS);
+    this.spilledEvents += events.length;
+
+    this.writeChain = this.writeChain
+      .then(async () => {
+        const segment = await this.openSegment();
+        await appendFile(segment.path, chunk);
+        segment.bytes += chunk.length;
+      })
+      .catch((err) => {
+        logger.error("Failed to spill raw events; events lost", {
+          count: events.length,
+          error: String(err),
+        });
+      });
+  }
+
+  private async openSegment(): Promise<OpenSegment> {
+    const now = Date.now();
+    if (
+      this.segment &&
+      this.segment.bytes < SEGMENT_MAX_BYTES &&
+      now - this.segment.openedAt < SEGMENT_MAX_AGE_MS
+    ) {
+      return this.segment;
+    }
+
+    await this.sealSegment();
+    await mkdir(this.spillDir, { recursive: true });
+    const ext = SPILL_COMPRESS ? ".ndjson.gz" : ".ndjson";
+    // Sortable name: replay order follows write order
+    const name = `raw-${String(now).padStart(15, "0")}-${String(this.segmentSeq++).padStart(6, "0")}${ext}.open`;
+    this.segment = { path: join(this.spillDir, name), bytes: 0, openedAt: now };
+    return this.segment;
+  }
+
+  /**
+   * Close the open segment so it becomes eligible for replay.
+   */
+  private async sealSegment(): Promise<void> {
+    if (!this.segment) return;
+    const { path } = this.segment;
+    this.segment = null;
+    await rename(path, path.slice(0, -".open".length));
+  }
+
+  /**
+   * Replay closed segments into the table, oldest first, once the DB is
+   * accepting writes again.
+   */
+  private async replay(): Promise<void> {
+    if (this.replaying) return;
+    this.replaying = true;
+
+    try {
+      // Probe the DB before touching segments
+      if (!this.dbHealthy) {
+        try {
+          await pingDatabase();
+          this.dbHealthy = true;
+        } catch {
+          return;
+        }
+      }
+
+      // Seal the open segment so its events can be replayed too
+      this.writeChain = this.writeChain
+        .then(() => this.sealSegment())
+        .catch((err) => {
+          logger.error("Failed to seal raw event segment", { error: String(err) });
+        });
+      await this.writeChain;
+
+      const segments = await listSegments(this.spillDir);
+      this.pendingSegments = segments.length;
+
+      for (const name of segments) {
+        if (!this.dbHealthy) return;
+        await this.replaySegment(name);
+        this.pendingSegments--;
+      }
+    } finally {
+      this.replaying = false;
+    }
+  }
+
+  private async replaySegment(name: string): Promise<void> {
+    const path = join(this.spillDir, name);
+
+    let events: RawTikTokEventInput[];
+    try {
+      events = decodeSegment(await readFile(path), name.endsWith(".gz"));
+    } catch (err) {
+      // Corrupt beyond a torn tail; retrying only helps if the read failed
+      await this.replayFailed(name, path, err);
+      return;
+    }
+
+    // One COPY for the whole segment (at most SEGMENT_MAX_BYTES): it either
+    // commits entirely or not at all, so a retry never duplicates a prefix
+    try {
+      await logRawTikTokEvents(events);
+    } catch (err) {
+      if (!(await this.replayFailed(name, path, err))) this.dbHealthy = false;
+      return;
+    }
+
+    await unlink(path);
+    this.replayAttempts.delete(name);
+    this.replayedEvents += events.length;
+    logger.info("Replayed spilled raw events", { segment: name, count: events.length });
+  }
+
+  /**
+   * Count a failed replay of a segment; after MAX_REPLAY_ATTEMPTS it is
+   * parked as `.failed` for manual inspection instead of retried forever.
+   * @returns true if the segment was parked
+   */
+  private async replayFailed(name: string, path: string, err: unknown): Promise<boolean> {
+    const attempts = (this.replayAttempts.get(name) ?? 0) + 1;
+    this.replayAttempts.set(name, attempts);
+    logger.error("Raw event segment replay failed", { segment: name, attempts, error: String(err) });
+
+    if (attempts < MAX_REPLAY_ATTEMPTS) return false;
+    await rename(path, `${path}.failed`);
+    this.replayAttempts.delete(name);
+    return true;
+  }
+}
+
+/**
+ * Closed segment files in a spill directory, oldest first.
+ */
+async function listSegments(dir: string): Promise<string[]> {
+  try {
+    const names = await readdir(dir);
+    return names
+      .filter((n) => n.startsWith("raw-") && (n.endsWith(".ndjson") || n.endsWith(".ndjson.gz")))
+      .sort();
+  } catch {
+    return [];
+  }
+}
+
+/**
+ * Seal `.open` segments left behind by a crashed process.
+ */
+async function recoverOpenSegments(dir: string): Promise<void> {
+  let names: string[];
+  try {
+    names = await readdir(dir);
+  } catch {
+    return;
+  }
+  for (const name of names) {
+    if (name.startsWith("raw-") && name.endsWith(".open")) {
+      await rename(join(dir, name), join(dir, name.slice(0, -".open".length)));
+    }
+  }
+}
@@ -0,0 +1,86 @@
+import {
+  isRawEventTablePartitioned,
+  listRawEventPartitions,
+  createRawEventPartition,
+} from "../db/queries";
+import { logger } from "../lib/logger";
+
+const DAY_MS = 86_400_000;
+const PARTITION_DAYS_AHEAD = 3;
+const MAINTENANCE_INTERVAL_MS = 60 * 60_000;
+
+export interface RawEventPartitionStats {
+  partitioned: boolean;
+  partitions: number;
+  created: number;
+  failures: number;
+}
+
+/**
+ * Keeps daily `tiktok_raw_event` partitions created ahead of time, so
+ * inserts never fall into the default partition. Runs on start and then
+ * hourly. Does nothing (besides one warning) until the table has been
+ * converted with sql/0001_partition_tiktok_raw_event.sql.
+ */
+export class RawEventPartitionManager {
+  private timer: ReturnType<typeof setInterval> | null = null;
+  private partitioned = false;
+  private partitions = 0;
+  private created = 0;
+  private failures = 0;
+  private warned = false;
+
+  start(): void {
+    if (this.timer) return;
+    this.ensure().catch(() => {});
+    this.timer = setInterval(() => {
+      this.ensure().catch(() => {});
+    }, MAINTENANCE_INTERVAL_MS);
+  }
+
+  stop(): void {
+    if (this.timer) clearInterval(this.timer);
+    this.timer = null;
+  }
+
+  /**
+   * Create any missing partitions from today through PARTITION_DAYS_AHEAD.
+   */
+  async ensure(now = Date.now()): Promise<void> {
+    try {
+      this.partitioned = await isRawEventTablePartitioned();
+      if (!this.partitioned) {
+        if (!this.warned) {
+          logger.warn("tiktok_raw_event is not partitioned; run sql/0001_partition_tiktok_raw_event.sql");
+          this.warned = true;
+        }
+        return;
+      }
+
+      const existing = new Set((await listRawEventPartitions()).map((p) => p.day.getTime()));
+      const today = Math.floor(now / DAY_MS) * DAY_MS;
+
+      for (let day = today; day <= today + PARTITION_DAYS_AHEAD * DAY_MS; day += DAY_MS) {
+        if (existing.has(day)) continue;
+        const name = await createRawEventPartition(new Date(day));
+        existing.add(day);
+        this.created++;
+        logger.info("Created raw event partition", { partition: name });
+      }
+      this.partitions = existing.size;
+    } catch (err) {
+      this.failures++;
+      logger.error("Raw event partition maintenance failed", { error: String(err) });
+      throw err;
+    }
+  }
+
+  get stats(): RawEventPartitionStats {
+    return {
+      partitioned: this.partitioned,
+      partitions: this.partitions,
+      created: this.created,
+      failures: this.failures,
+    };
+  }
+}
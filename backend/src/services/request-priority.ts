@@ -0,0 +1,224 @@
+import { getPendingRequests, getViewerDiamondsSince } from "../db/queries";
+import type { GiftEvent, SongRequest } from "../db/schema";
+import { IndexedHeap } from "../lib/indexed-heap";
+import { SingleFlight } from "../lib/single-flight";
+import { logger } from "../lib/logger";
+import { positiveIntEnv } from "../lib/env";
+
+// Each diamond moves a viewer's requests this much earlier...
+const BOOST_MS_PER_DIAMOND = positiveIntEnv("QUEUE_BOOST_MS_PER_DIAMOND", 5_000);
+// ...up to this much, so a request waiting longer than it can't be passed
+const MAX_BOOST_MS = positiveIntEnv("QUEUE_MAX_BOOST_MINUTES", 10) * 60_000;
+// Gifts count toward requests made within this long after them
+const GIFT_WINDOW_MS = 30 * 60_000;
+const MAX_LOADED_REQUESTS = 20_000;
+
+export interface PrioritizedRequest {
+  request: SongRequest;
+  /** Diamonds credited to this request */
+  diamonds: number;
+  /** How far ahead of its arrival time it's ordered */
+  boostMs: number;
+}
+
+export interface RequestPriorityStats {
+  sessions: number;
+  pending: number;
+  loads: number;
+  boosts: number;
+}
+
+interface ViewerCredit {
+  diamonds: number;
+  lastGiftAt: number;
+}
+
+interface SessionRequests {
+  heap: IndexedHeap<PrioritizedRequest>;
+  /** viewer → their pending request ids */
+  byViewer: Map<string, Set<string>>;
+  credits: Map<string, ViewerCredit>;
+}
+
+interface RequestEvent {
+  type?: string;
+  request?: SongRequest;
+  gift?: GiftEvent;
+}
+
+function boostFor(diamonds: number): number {
+  return Math.min(MAX_BOOST_MS, diamonds * BOOST_MS_PER_DIAMOND);
+}
+
+function isWaiting(request: Partial<SongRequest>): boolean {
+  return request.searchStatus === "matched" && request.playStatus === "pending";
+}
+
+/**
+ * Play order for matched requests waiting in a session, with gift boosts.
+ *
+ * Priority is arrival time minus a boost for the viewer's recent diamonds
+ * (BOOST_MS_PER_DIAMOND each, capped at MAX_BOOST_MS). Since priority is
+ * measured in time, the cap doubles as aging: a request that has waited
+ * longer than MAX_BOOST_MS is ahead of anything that arrives after it,
+ * however much was gifted. Pending requests sit in an IndexedHeap; a gift
+ * decreases the key of each of the gifter's pending requests in place.
+ *
+ * Every instance loads a session from the DB when it connects (or on first
+ * use, e.g. after a restart) and then keeps it current from dashboard
+ * events. Loading on `session:connected` matters: request rows are written
+ * behind, possibly in a worker thread, so a load that starts after a
+ * request's `request:update` may not find its row in the DB either.
+ */
+export class RequestPriorityQueue {
+  private sessions = new Map<string, SessionRequests>();
+  // Events that arrived while a session was loading
+  private backlog = new Map<string, RequestEvent[]>();
+  private loader = new SingleFlight<SessionRequests>();
+  private loads = 0;
+  private boosts = 0;
+
+  /** Load a session (no-op once loaded) */
+  async load(sessionId: string): Promise<void> {
+    await this.session(sessionId);
+  }
+
+  /** The next `limit` requests to play, loading the session if needed */
+  async list(sessionId: string, limit: number): Promise<PrioritizedRequest[]> {
+    await this.session(sessionId);
+    return this.top(sessionId, limit);
+  }
+
+  /** The next `limit` requests to play; empty if the session isn't loaded */
+  top(sessionId: string, limit: number): PrioritizedRequest[] {
+    const requests = this.sessions.get(sessionId);
+    if (!requests) return [];
+    return requests.heap.top(limit).map((entry) => entry.value);
+  }
+
+  /** Feed a dashboard event. Sessions that aren't loaded are skipped. */
+  apply(sessionId: string, event: unknown): void {
+    const requestEvent = event as RequestEvent;
+    if (requestEvent.type === "session:ended") {
+      this.sessions.delete(sessionId);
+      this.backlog.delete(sessionId);
+      return;
+    }
+    if (requestEvent.type === "session:connected") {
+      // The backlog exists from here on, so no later event is missed
+      this.load(sessionId).catch(() => {});
+      return;
+    }
+    if (requestEvent.type !== "request:update" && requestEvent.type !== "gift:new") return;
+
+    const pending = this.backlog.get(sessionId);
+    if (pending) {
+      pending.push(requestEvent);
+      return;
+    }
+    const requests = this.sessions.get(sessionId);
+    if (requests) this.applyEvent(requests, requestEvent);
+  }
+
+  get stats(): RequestPriorityStats {
+    let pending = 0;
+    for (const requests of this.sessions.values()) pending += requests.heap.size;
+    return { sessions: this.sessions.size, pending, loads: this.loads, boosts: this.boosts };
+  }
+
+  private session(sessionId: string): Promise<SessionRequests> {
+    const requests = this.sessions.get(sessionId);
+    if (requests) return Promise.resolve(requests);
+    return this.loader.do(sessionId, () => this.loadSession(sessionId));
+  }
+
+  private async loadSession(sessionId: string): Promise<SessionRequests> {
+    const backlog: RequestEvent[] = [];
+    this.backlog.set(sessionId, backlog);
+    try {
+      const [pending, diamonds] = await Promise.all([
+        getPendingRequests(sessionId, MAX_LOADED_REQUESTS),
+        getViewerDiamondsSince(sessionId, new Date(Date.now() - GIFT_WINDOW_MS)),
+      ]);
+
+      const requests: SessionRequests = { heap: new IndexedHeap(), byViewer: new Map(), credits: new Map() };
+      for (const { viewerUsername, diamonds: total, lastGiftAt } of diamonds) {
+        requests.credits.set(viewerUsername, { diamonds: total, lastGiftAt: lastGiftAt.getTime() });
+      }
+      for (const request of pending) this.upsert(requests, request);
+      for (const event of backlog) this.applyEvent(requests, event);
+
+      // Not kept if the session ended while loading
+      if (this.backlog.get(sessionId) === backlog) this.sessions.set(sessionId, requests);
+      this.loads++;
+      return requests;
+    } catch (err) {
+      logger.error("Failed to load request queue", { sessionId, error: String(err) });
+      throw err;
+    } finally {
+      if (this.backlog.get(sessionId) === backlog) this.backlog.delete(sessionId);
+    }
+  }
+
+  private applyEvent(requests: SessionRequests, event: RequestEvent): void {
+    if (event.type === "request:update" && event.request?.id) {
+      const request = { ...event.request, requestedAt: new Date(event.request.requestedAt) };
+      if (isWaiting(request)) this.upsert(requests, request);
+      else this.removeRequest(requests, request);
+    } else if (event.type === "gift:new" && event.gift) {
+      this.credit(requests, event.gift);
+    }
+  }
+
+  private upsert(requests: SessionRequests, request: SongRequest): void {
+    const existing = requests.heap.get(request.id)?.value;
+    const credit = this.activeCredit(requests, request.viewerUsername);
+    // Credit attached earlier is kept even after the gift window passes
+    const diamonds = Math.max(existing?.diamonds ?? 0, credit);
+    const boostMs = boostFor(diamonds);
+    requests.heap.push(request.id, request.requestedAt.getTime() - boostMs, { request, diamonds, boostMs });
+
+    let ids = requests.byViewer.get(request.viewerUsername);
+    if (!ids) {
+      ids = new Set();
+      requests.byViewer.set(request.viewerUsername, ids);
+    }
+    ids.add(request.id);
+  }
+
+  private removeRequest(requests: SessionRequests, request: SongRequest): void {
+    if (!requests.heap.remove(request.id)) return;
+    const ids = requests.byViewer.get(request.viewerUsername);
+    ids?.delete(request.id);
+    if (ids?.size === 0) requests.byViewer.delete(request.viewerUsername);
+  }
+
+  /** Add a gift to the viewer's credit and move their pending requests up */
+  private credit(requests: SessionRequests, gift: GiftEvent): void {
+    const diamonds = (gift.diamondCount ?? 0) * gift.repeatCount;
+    if (diamonds <= 0) return;
+    const receivedAt = new Date(gift.receivedAt).getTime();
+    const total = this.activeCredit(requests, gift.viewerUsername, receivedAt) + diamonds;
+    requests.credits.set(gift.viewerUsername, { diamonds: total, lastGiftAt: receivedAt });
+
+    for (const id of requests.byViewer.get(gift.viewerUsername) ?? []) {
+      const entry = requests.heap.get(id);
+      if (!entry || entry.value.diamonds >= total) continue;
+      const boostMs = boostFor(total);
+      entry.value = { ...entry.value, diamonds: total, boostMs };
+      // Decrease-key: priority only moves earlier
+      requests.heap.update(id, entry.value.request.requestedAt.getTime() - boostMs);
+      this.boosts++;
+    }
+  }
+
+  private activeCredit(requests: SessionRequests, viewer: string, now = Date.now()): number {
+    const credit = requests.credits.get(viewer);
+    if (!credit) return 0;
+    if (now - credit.lastGiftAt > GIFT_WINDOW_MS) {
+      requests.credits.delete(viewer);
+      return 0;
+    }
+    return credit.diamonds;
+  }
+}
@@ -0,0 +1,306 @@
+import { mkdir, open, stat, truncate } from "node:fs/promises";
+import { join } from "node:path";
+import { gzipSync } from "node:zlib";
+import {
+  getExpiredSessionIds,
+  fetchRowsForArchive,
+  getRetentionCheckpoint,
+  commitRetentionBatch,
+  isRawEventTablePartitioned,
+  listRawEventPartitions,
+  dropRawEventPartition,
+  withRetentionLock,
+  type RetentionTable,
+} from "../db/queries";
+import type { RetentionCheckpoint } from "../db/schema";
+import { logger } from "../lib/logger";
+
+const DAY_MS = 86_400_000;
+const BATCH_ROWS = 5_000;
+const SESSIONS_PER_PASS = 100;
+const FIRST_RUN_DELAY_MS = 60_000;
+
+const ARCHIVE_DIR = process.env.RETENTION_ARCHIVE_DIR ?? "./data/archive";
+const INTERVAL_MS = Number(process.env.RETENTION_INTERVAL_MINUTES ?? 360) * 60_000;
+
+// Days to keep rows after their session ended (partition age for
+// partitioned raw events). 0 keeps rows forever.
+const TTL_DAYS: Record<RetentionTable, number> = {
+  tiktok_raw_event: Number(process.env.RETENTION_RAW_EVENT_DAYS ?? 30),
+  gift_event: Number(process.env.RETENTION_GIFT_EVENT_DAYS ?? 0),
+  song_request: Number(process.env.RETENTION_SONG_REQUEST_DAYS ?? 0),
+};
+
+export interface RetentionStats {
+  running: boolean;
+  runs: number;
+  failures: number;
+  rowsArchived: number;
+  rowsDeleted: number;
+  bytesWritten: number;
+  partitionsDropped: number;
+  lastRunAt: string | null;
+  lastRunDurationMs: number;
+  lastRunRowsPerSec: number;
+}
+
+interface ArchiveScope {
+  table: RetentionTable;
+  /** Session id, or partition name for partitioned raw events */
+  scope: string;
+  /** Table or partition to read from */
+  source: string;
+  sessionId: string | null;
+}
+
+/**
+ * Retention job for `tiktok_raw_event`, `gift_event` and `song_request`.
+ *
+ * Expired rows are streamed out in BATCH_ROWS batches (bounded memory) to
+ * gzip NDJSON files under RETENTION_ARCHIVE_DIR, one file per session or
+ * raw event partition, and then removed: per-session rows are deleted in
+ * the same transaction that records the batch's checkpoint, and whole
+ * partitions are detached and dropped once archived.
+ *
+ * Each batch is fsynced before its checkpoint commits, and a resumed scope
+ * first truncates its file back to the checkpointed length, so rerunning
+ * after a crash neither loses nor duplicates rows. An advisory lock keeps
+ * concurrent instances from running it twice.
+ */
+export class RetentionJob {
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private running: Promise<void> | null = null;
+  private stopping = false;
+  private runs = 0;
+  private failures = 0;
+  private rowsArchived = 0;
+  private rowsDeleted = 0;
+  private bytesWritten = 0;
+  private partitionsDropped = 0;
+  private lastRunAt: Date | null = null;
+  private lastRunDurationMs = 0;
+  private lastRunRowsPerSec = 0;
+
+  start(): void {
+    if (this.timer || Object.values(TTL_DAYS).every((days) => days <= 0)) return;
+    this.stopping = false;
+    this.schedule(FIRST_RUN_DELAY_MS);
+  }
+
+  /**
+   * Stop scheduling and wait for the current batch to commit.
+   */
+  async stop(): Promise<void> {
+    this.stopping = true;
+    if (this.timer) clearTimeout(this.timer);
+    this.timer = null;
+    await this.running;
+  }
+
+  /**
+   * Run one retention pass now (no-op if one is already running).
+   */
+  async run(): Promise<void> {
+    if (this.running) return this.running;
+    this.running = this.runPass().finally(() => {
+      this.running = null;
+    });
+    return this.running;
+  }
+
+  get stats(): RetentionStats {
+    return {
+      running: this.running !== null,
+      runs: this.runs,
+      failures: this.failures,
+      rowsArchived: this.rowsArchived,
+      rowsDeleted: this.rowsDeleted,
+      bytesWritten: this.bytesWritten,
+      partitionsDropped: this.partitionsDropped,
+      lastRunAt: this.lastRunAt?.toISOString() ?? null,
+      lastRunDurationMs: this.lastRunDurationMs,
+      lastRunRowsPerSec: this.lastRunRowsPerSec,
+    };
+  }
+
+  private schedule(delayMs: number): void {
+    this.timer = setTimeout(() => {
+      this.timer = null;
+      this.run()
+        .catch(() => {})
+        .finally(() => {
+          if (!this.stopping) this.schedule(INTERVAL_MS);
+        });
+    }, delayMs);
+  }
+
+  private async runPass(): Promise<void> {
+    const startedAt = Date.now();
+    const archivedBefore = this.rowsArchived;
+
+    try {
+      const acquired = await withRetentionLock(async () => {
+        for (const table of Object.keys(TTL_DAYS) as RetentionTable[]) {
+          if (TTL_DAYS[table] <= 0 || this.stopping) continue;
+          const cutoff = new Date(startedAt - TTL_DAYS[table] * DAY_MS);
+
+          if (table === "tiktok_raw_event" && (await isRawEventTablePartitioned())) {
+            await this.expirePartitions(cutoff);
+          }
+          await this.expireSessions(table, cutoff);
+        }
+      });
+      if (!acquired) {
+        logger.info("Retention pass skipped, another instance holds the lock");
+        return;
+      }
+    } catch (err) {
+      this.failures++;
+      logger.error("Retention pass failed", { error: String(err) });
+      throw err;
+    } finally {
+      this.runs++;
+      this.lastRunAt = new Date(startedAt);
+      this.lastRunDurationMs = Date.now() - startedAt;
+      this.lastRunRowsPerSec = rate(this.rowsArchived - archivedBefore, this.lastRunDurationMs);
+    }
+
+    logger.info("Retention pass complete", {
+      rowsArchived: this.rowsArchived - archivedBefore,
+      durationMs: this.lastRunDurationMs,
+      rowsPerSec: this.lastRunRowsPerSec,
+    });
+  }
+
+  /**
+   * Archive and drop daily raw event partitions that ended before `cutoff`.
+   */
+  private async expirePartitions(cutoff: Date): Promise<void> {
+    for (const partition of await listRawEventPartitions()) {
+      if (this.stopping) return;
+      if (partition.day.getTime() + DAY_MS > cutoff.getTime()) break;
+
+      const done = await this.archiveScope({
+        table: "tiktok_raw_event",
+        scope: partition.name,
+        source: partition.name,
+        sessionId: null,
+      });
+      if (!done) return;
+
+      await dropRawEventPartition(partition.name);
+      this.partitionsDropped++;
+      logger.info("Dropped raw event partition", { partition: partition.name });
+    }
+  }
+
+  /**
+   * Archive and delete rows of sessions that ended before `cutoff`.
+   */
+  private async expireSessions(table: RetentionTable, cutoff: Date): Promise<void> {
+    while (!this.stopping) {
+      const sessionIds = await getExpiredSessionIds(table, cutoff, SESSIONS_PER_PASS);
+      if (sessionIds.length === 0) return;
+
+      for (const sessionId of sessionIds) {
+        const done = await this.archiveScope({ table, scope: sessionId, source: table, sessionId });
+        if (!done) return;
+      }
+    }
+  }
+
+  /**
+   * Stream one scope to its archive file, committing a checkpoint per
+   * batch. Returns false if interrupted by stop().
+   */
+  private async archiveScope(target: ArchiveScope): Promise<boolean> {
+    const { table, scope, source, sessionId } = target;
+    const startedAt = Date.now();
+    const path = join(ARCHIVE_DIR, table, `${scope}.ndjson.gz`);
+    await mkdir(join(ARCHIVE_DIR, table), { recursive: true });
+
+    const checkpoint: RetentionCheckpoint = (await getRetentionCheckpoint(table, scope)) ?? {
+      tableName: table,
+      scope,
+      lastId: null,
+      archivedRows: 0,
+      archivedBytes: 0,
+      completedAt: null,
+      updatedAt: new Date(),
+    };
+    const resumedRows = checkpoint.archivedRows;
+    await truncateTo(path, checkpoint.archivedBytes);
+
+    // Session scopes delete as they go, so only partition scopes page by id
+    const afterId = () => (sessionId === null ? checkpoint.lastId : null);
+    const deleteFromSession = sessionId === null ? null : { table, sessionId };
+
+    for (;;) {
+      if (this.stopping) return false;
+
+      const rows = await fetchRowsForArchive(source, sessionId, afterId(), BATCH_ROWS);
+      if (rows.length === 0) break;
+
+      const chunk = gzipSync(rows.map((row) => JSON.stringify(row)).join("\n") + "\n");
+      await appendDurably(path, chunk);
+
+      checkpoint.lastId = String(rows[rows.length - 1]!.id);
+      checkpoint.archivedRows += rows.length;
+      checkpoint.archivedBytes += chunk.length;
+      checkpoint.updatedAt = new Date();
+      await commitRetentionBatch(checkpoint, deleteFromSession);
+
+      this.rowsArchived += rows.length;
+      this.bytesWritten += chunk.length;
+      if (deleteFromSession) this.rowsDeleted += rows.length;
+    }
+
+    checkpoint.completedAt = new Date();
+    checkpoint.updatedAt = checkpoint.completedAt;
+    await commitRetentionBatch(checkpoint, null);
+
+    const durationMs = Date.now() - startedAt;
+    const rows = checkpoint.archivedRows - resumedRows;
+    logger.info("Archived expired rows", {
+      table,
+      scope,
+      rows,
+      totalRows: checkpoint.archivedRows,
+      bytes: checkpoint.archivedBytes,
+      durationMs,
+      rowsPerSec: rate(rows, durationMs),
+      file: path,
+    });
+    return true;
+  }
+}
+
+/**
+ * Cut a resumed archive file back to its last committed length.
+ */
+async function truncateTo(path: string, bytes: number): Promise<void> {
+  let size: number;
+  try {
+    size = (await stat(path)).size;
+  } catch {
+    if (bytes > 0) {
+      logger.error("Retention archive file missing, continuing from checkpoint", { file: path });
+    }
+    return;
+  }
+  if (size > bytes) await truncate(path, bytes);
+}
+
+async function appendDurably(path: string, chunk: Buffer): Promise<void> {
+  const file = await open(path, "a");
+  try {
+    await file.write(chunk);
+    await file.sync();
+  } finally {
+    await file.close();
+  }
+}
+
+function rate(rows: number, durationMs: number): number {
+  return durationMs > 0 ? Math.round((rows * 1000) / durationMs) : rows;
+}
@@ -0,0 +1,97 @@
+import { TikTokService, type TikTokServiceStats } from "./tiktok";
+import { SessionLeaseKeeper, type SessionLeaseStats } from "./session-leases";
+
+type EventEmitter = (userId: string, sessionId: string, event: unknown) => void;
+
+/**
+ * Where TikTok connections run: in this process (LocalSessionHost) or
+ * sharded across Bun Workers (WorkerPool). Either way a session is only
+ * listened to by whoever holds its `live_session_lease`.
+ */
+export interface SessionHost {
+  /**
+   * Claim the session's lease and connect. Resolves false if another
+   * owner already holds the lease; throws if the TikTok connect fails.
+   */
+  startListening(sessionId: string, tiktokUsername: string, userId: string): Promise<boolean>;
+  stopListening(sessionId: string): Promise<void>;
+  disconnectAll(): Promise<void>;
+  readonly activeConnections: number;
+  readonly stats: unknown;
+}
+
+export interface LocalSessionHostStats extends TikTokServiceStats {
+  mode: "in-process";
+  leases: SessionLeaseStats;
+}
+
+/**
+ * Runs TikTok connections in the current thread, holding a lease per
+ * session. Used directly when WORKER_COUNT=0, and inside each worker.
+ */
+export class LocalSessionHost implements SessionHost {
+  private service: TikTokService;
+  private leases: SessionLeaseKeeper;
+
+  /**
+   * @param onReleased called when a session stops here without a
+   *   stopListening call (stream ended, or lease lost)
+   * @param spillSlot raw event spill subdirectory, stable across restarts
+   *   (unlike ownerId)
+   */
+  constructor(
+    emitEvent: EventEmitter,
+    ownerId: string,
+    onReleased: (sessionId: string) => void = () => {},
+    spillSlot = "main"
+  ) {
+    this.leases = new SessionLeaseKeeper(ownerId, (sessionId) => {
+      // Ended elsewhere or taken over after expiry: whoever holds it now
+      // finalizes it, so only drop our copy
+      this.service.abandon(sessionId);
+      onReleased(sessionId);
+    });
+    this.service = new TikTokService(
+      emitEvent,
+      (sessionId) => {
+        this.leases.release(sessionId).finally(() => onReleased(sessionId));
+      },
+      spillSlot
+    );
+    this.leases.start();
+  }
+
+  async startListening(sessionId: string, tiktokUsername: string, userId: string): Promise<boolean> {
+    if (!(await this.leases.claim(sessionId))) return false;
+
+    try {
+      await this.service.startListening(sessionId, tiktokUsername, userId);
+    } catch (err) {
+      await this.leases.release(sessionId);
+      throw err;
+    }
+    return true;
+  }
+
+  async stopListening(sessionId: string): Promise<void> {
+    await this.service.stopListening(sessionId);
+    await this.leases.release(sessionId);
+  }
+
+  async disconnectAll(): Promise<void> {
+    await this.service.disconnectAll();
+    await this.leases.stop();
+  }
+
+  get activeConnections(): number {
+    return this.service.activeConnections;
+  }
+
+  get leaseStats(): SessionLeaseStats {
+    return this.leases.stats;
+  }
+
+  get stats(): LocalSessionHostStats {
+    return { mode: "in-process", leases: this.leases.stats, ...this.service.getStats() };
+  }
+}
@@ -0,0 +1,120 @@
+import {
+  claimSessionLease,
+  renewSessionLeases,
+  releaseSessionLease,
+  releaseLeasesForOwner,
+} from "../db/queries";
+import { logger } from "../lib/logger";
+
+export const LEASE_TTL_MS = 30_000;
+const HEARTBEAT_INTERVAL_MS = 10_000;
+
+export interface SessionLeaseStats {
+  ownerId: string;
+  held: number;
+  claims: number;
+  conflicts: number;
+  lost: number;
+  heartbeatFailures: number;
+}
+
+/**
+ * Holds `live_session_lease` rows for one owner (a worker or an in-process
+ * host). Leases are renewed every HEARTBEAT_INTERVAL_MS; a lease that
+ * can't be renewed (expired and taken over, or its session ended) is
+ * reported through `onLost` so the owner stops listening.
+ */
+export class SessionLeaseKeeper {
+  readonly ownerId: string;
+  private held = new Set<string>();
+  private onLost: (sessionId: string) => void;
+  private timer: ReturnType<typeof setInterval> | null = null;
+  private claims = 0;
+  private conflicts = 0;
+  private lost = 0;
+  private heartbeatFailures = 0;
+
+  constructor(ownerId: string, onLost: (sessionId: string) => void) {
+    this.ownerId = ownerId;
+    this.onLost = onLost;
+  }
+
+  start(): void {
+    if (this.timer) return;
+    this.timer = setInterval(() => {
+      this.heartbeat().catch(() => {});
+    }, HEARTBEAT_INTERVAL_MS);
+  }
+
+  /**
+   * Claim a session. False if another owner holds a live lease on it.
+   */
+  async claim(sessionId: string): Promise<boolean> {
+    const claimed = await claimSessionLease(sessionId, this.ownerId, LEASE_TTL_MS);
+    if (claimed) {
+      this.held.add(sessionId);
+      this.claims++;
+    } else {
+      this.conflicts++;
+    }
+    return claimed;
+  }
+
+  async release(sessionId: string): Promise<void> {
+    if (!this.held.delete(sessionId)) return;
+    try {
+      await releaseSessionLease(sessionId, this.ownerId);
+    } catch (err) {
+      // It expires on its own
+      logger.error("Failed to release session lease", { sessionId, error: String(err) });
+    }
+  }
+
+  /**
+   * Stop heartbeating and release everything held.
+   */
+  async stop(): Promise<void> {
+    if (this.timer) clearInterval(this.timer);
+    this.timer = null;
+    this.held.clear();
+    try {
+      await releaseLeasesForOwner(this.ownerId);
+    } catch (err) {
+      logger.error("Failed to release session leases", { ownerId: this.ownerId, error: String(err) });
+    }
+  }
+
+  get stats(): SessionLeaseStats {
+    return {
+      ownerId: this.ownerId,
+      held: this.held.size,
+      claims: this.claims,
+      conflicts: this.conflicts,
+      lost: this.lost,
+      heartbeatFailures: this.heartbeatFailures,
+    };
+  }
+
+  private async heartbeat(): Promise<void> {
+    if (this.held.size === 0) return;
+
+    let renewed: Set<string>;
+    try {
+      renewed = new Set(await renewSessionLeases(this.ownerId, LEASE_TTL_MS));
+    } catch (err) {
+      // Keep listening; if the DB stays away the leases expire and another
+      // instance may take over, which the next successful heartbeat detects
+      this.heartbeatFailures++;
+      logger.error("Session lease heartbeat failed", { ownerId: this.ownerId, error: String(err) });
+      return;
+    }
+
+    for (const sessionId of [...this.held]) {
+      if (renewed.has(sessionId)) continue;
+      this.held.delete(sessionId);
+      this.lost++;
+      logger.warn("Session lease lost", { sessionId, ownerId: this.ownerId });
+      this.onLost(sessionId);
+    }
+  }
+}
@@ -0,0 +1,145 @@
+import {
+  getReportRequests,
+  getGiftTotals,
+  upsertSessionReports,
+  type SongRequestPatch,
+} from "../db/queries";
+import type { SongRequest } from "../db/schema";
+import { SessionReportAggregate } from "../lib/session-report";
+import type { SongRequestObserver } from "./song-request-writer";
+import { logger } from "../lib/logger";
+import { positiveIntEnv } from "../lib/env";
+
+const CHECKPOINT_INTERVAL_MS = positiveIntEnv("REPORT_CHECKPOINT_SECONDS", 5) * 1_000;
+
+export interface SessionReportTrackerStats {
+  sessions: number;
+  requests: number;
+  checkpoints: number;
+  checkpointedReports: number;
+  failedCheckpoints: number;
+}
+
+interface TrackedSession {
+  aggregate: SessionReportAggregate;
+  /** aggregate.version as of the last successful checkpoint */
+  checkpointed: number;
+}
+
+/**
+ * Keeps a SessionReportAggregate per session this process is listening
+ * to, fed by the request writer (every insert and patch) and gift
+ * handler, and checkpoints changed reports to `session_report` every
+ * CHECKPOINT_INTERVAL_MS. /report reads the checkpoint, so it costs one
+ * primary key lookup however long the stream runs.
+ *
+ * A session is rebuilt from the DB when it (re)starts on this process, and
+ * checkpointed one last time when it stops.
+ */
+export class SessionReportTracker implements SongRequestObserver {
+  private sessions = new Map<string, TrackedSession>();
+  private timer: ReturnType<typeof setInterval> | null = null;
+  private checkpointing: Promise<void> | null = null;
+  private checkpoints = 0;
+  private checkpointedReports = 0;
+  private failedCheckpoints = 0;
+
+  start(): void {
+    if (this.timer) return;
+    this.timer = setInterval(() => {
+      this.checkpoint().catch(() => {});
+    }, CHECKPOINT_INTERVAL_MS);
+  }
+
+  async stop(): Promise<void> {
+    if (this.timer) clearInterval(this.timer);
+    this.timer = null;
+    await this.checkpoint();
+  }
+
+  /**
+   * Start tracking a session, rebuilding its report from what's already
+   * stored. Call before any of its requests are written.
+   */
+  async open(sessionId: string): Promise<void> {
+    const [requests, gifts] = await Promise.all([getReportRequests(sessionId), getGiftTotals(sessionId)]);
+    const aggregate = new SessionReportAggregate();
+    for (const request of requests) aggregate.addRequest(request.id, request);
+    aggregate.addGifts(gifts.totalDiamonds, gifts.giftCount);
+    this.sessions.set(sessionId, { aggregate, checkpointed: -1 });
+  }
+
+  /**
+   * Stop tracking a session after the poller's finalize (remaining pending
+   * requests become not_played), writing its final report.
+   */
+  async close(sessionId: string): Promise<void> {
+    const session = this.sessions.get(sessionId);
+    if (!session) return;
+    session.aggregate.markPendingNotPlayed();
+    await this.checkpoint();
+    this.sessions.delete(sessionId);
+  }
+
+  /** Stop tracking a session without writing it (failed start) */
+  drop(sessionId: string): void {
+    this.sessions.delete(sessionId);
+  }
+
+  inserted(row: SongRequest): void {
+    this.sessions.get(row.liveSessionId)?.aggregate.addRequest(row.id, row);
+  }
+
+  updated(id: string, patch: SongRequestPatch): void {
+    // Patches carry no session id; a process holds few sessions
+    for (const { aggregate } of this.sessions.values()) {
+      if (aggregate.updateRequest(id, patch)) return;
+    }
+  }
+
+  addGift(sessionId: string, diamondCount: number | null, repeatCount: number): void {
+    this.sessions.get(sessionId)?.aggregate.addGift(diamondCount, repeatCount);
+  }
+
+  get stats(): SessionReportTrackerStats {
+    let requests = 0;
+    for (const { aggregate } of this.sessions.values()) requests += aggregate.requestCount;
+    return {
+      sessions: this.sessions.size,
+      requests,
+      checkpoints: this.checkpoints,
+      checkpointedReports: this.checkpointedReports,
+      failedCheckpoints: this.failedCheckpoints,
+    };
+  }
+
+  /** Write every report that changed since its last checkpoint */
+  private async checkpoint(): Promise<void> {
+    while (this.checkpointing) await this.checkpointing;
+    this.checkpointing = this.writeChanged().finally(() => {
+      this.checkpointing = null;
+    });
+    await this.checkpointing;
+  }
+
+  private async writeChanged(): Promise<void> {
+    const changed: { session: TrackedSession; version: number; sessionId: string }[] = [];
+    for (const [sessionId, session] of this.sessions) {
+      if (session.aggregate.version !== session.checkpointed) {
+        changed.push({ session, version: session.aggregate.version, sessionId });
+      }
+    }
+    if (changed.length === 0) return;
+
+    try {
+      await upsertSessionReports(changed.map((c) => ({ sessionId: c.sessionId, report: c.session.aggregate.report() })));
+    } catch (err) {
+      this.failedCheckpoints++;
+      logger.error("Failed to checkpoint session reports", { count: changed.length, error: String(err) });
+      return;
+    }
+    for (const { session, version } of changed) session.checkpointed = version;
+    this.checkpoints++;
+    this.checkpointedReports += changed.length;
+  }
+}
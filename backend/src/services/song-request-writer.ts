@@ -0,0 +1,285 @@
+import {
+  insertSongRequests,
+  applySongRequestPatches,
+  type SongRequestPatch,
+} from "../db/queries";
+import type { SongRequest } from "../db/schema";
+import { logger } from "../lib/logger";
+
+const FLUSH_DELAY_MS = 20;
+const MAX_BATCH_ROWS = 200;
+const MAX_PENDING_ROWS = 20_000; // hard cap while the DB is unreachable
+const RETRY_DELAY_MS = 1_000;
+const DRAIN_TIMEOUT_MS = 10_000;
+
+/** Sees every row and patch as it's buffered (e.g. SessionReportTracker) */
+export interface SongRequestObserver {
+  inserted(row: SongRequest): void;
+  updated(id: string, patch: SongRequestPatch): void;
+}
+
+export interface SongRequestWriterStats {
+  pendingInserts: number;
+  pendingUpdates: number;
+  flushes: number;
+  flushedRows: number;
+  failedFlushes: number;
+  droppedRows: number;
+}
+
+/**
+ * Write-behind writer for `song_request` rows (group commit).
+ *
+ * Rows get client-side ids and are returned immediately so they can be
+ * emitted to the dashboard before they hit the database. Inserts and
+ * status patches are buffered and flushed together every FLUSH_DELAY_MS or
+ * MAX_BATCH_ROWS, as one multi-row INSERT plus one multi-row UPDATE. A patch
+ * for a row that is still buffered is merged into its insert, so the common
+ * insert-then-update pair costs a single row write.
+ *
+ * Flushes are serialized, so a patch never reaches the DB before its insert.
+ * A failed batch is put back and retried in the background; `flush()`
+ * rejects when it fails, and `drain()` retries up to a deadline. A retried
+ * insert may find its row already committed (only the ack was lost); the
+ * patches merged into it are then applied as an UPDATE instead.
+ */
+export class SongRequestWriter {
+  private inserts = new Map<string, SongRequest>();
+  private patches = new Map<string, SongRequestPatch>();
+  private timer: ReturnType<typeof setTimeout> | null = null;
+  private flushing: Promise<void> | null = null;
+  private flushedRows = 0;
+  private flushes = 0;
+  private failedFlushes = 0;
+  private droppedRows = 0;
+  private failing = false;
+  private observer: SongRequestObserver | null;
+
+  constructor(observer: SongRequestObserver | null = null) {
+    this.observer = observer;
+  }
+
+  /**
+   * Buffer a new request row and return it (id already assigned).
+   */
+  insert(values: {
+    liveSessionId: string;
+    viewerUsername: string;
+    rawMessage: string;
+    parsedQuery: string;
+    searchStatus?: SongRequest["searchStatus"];
+  }): SongRequest {
+    const row: SongRequest = {
+      id: crypto.randomUUID(),
+      liveSessionId: values.liveSessionId,
+      viewerUsername: values.viewerUsername,
+      rawMessage: values.rawMessage,
+      parsedQuery: values.parsedQuery,
+      spotifyTrackId: null,
+      trackName: null,
+      trackArtist: null,
+      albumName: null,
+      albumImageUrl: null,
+      durationMs: null,
+      spotifyUri: null,
+      searchStatus: values.searchStatus ?? "pending",
+      playStatus: "pending",
+      requestedAt: new Date(),
+      matchedAt: null,
+      confirmedAt: null,
+    };
+
+    this.inserts.set(row.id, row);
+    this.observer?.inserted(row);
+    this.schedule();
+    return row;
+  }
+
+  /**
+   * Buffer a patch for an existing row.
+   */
+  update(id: string, patch: SongRequestPatch): void {
+    this.observer?.updated(id, patch);
+    const pendingInsert = this.inserts.get(id);
+    if (pendingInsert) {
+      Object.assign(pendingInsert, patch);
+      return;
+    }
+
+    this.patches.set(id, { ...this.patches.get(id), ...patch });
+    this.schedule();
+  }
+
+  /**
+   * Flush everything buffered so far. Resolves once it is durable; rejects
+   * if the batch failed (it stays buffered and is retried later).
+   */
+  async flush(): Promise<void> {
+    if (this.timer) {
+      clearTimeout(this.timer);
+      this.timer = null;
+    }
+
+    // Serialize: wait for any in-flight flush, then flush what's left
+    while (this.flushing) await this.flushing.catch(() => {});
+    if (this.inserts.size === 0 && this.patches.size === 0) return;
+
+    this.flushing = this.flushBatch().finally(() => {
+      this.flushing = null;
+    });
+    try {
+      await this.flushing;
+    } finally {
+      if (this.inserts.size > 0 || this.patches.size > 0) this.schedule();
+    }
+  }
+
+  /**
+   * Flush, retrying failed batches until everything buffered so far is
+   * durable. Rejects after `timeoutMs`, or if rows were dropped meanwhile,
+   * so callers never finalize a session on top of rows that were lost.
+   */
+  async drain(timeoutMs = DRAIN_TIMEOUT_MS): Promise<void> {
+    const deadline = Date.now() + timeoutMs;
+    const droppedBefore = this.droppedRows;
+
+    for (;;) {
+      try {
+        await this.flush();
+        break;
+      } catch (err) {
+        if (Date.now() + RETRY_DELAY_MS > deadline) {
+          throw new Error(
+            `Song request writes not durable after ${timeoutMs}ms ` +
+              `(${this.inserts.size} inserts, ${this.patches.size} updates pending): ${String(err)}`
+          );
+        }
+        await new Promise((resolve) => setTimeout(resolve, RETRY_DELAY_MS));
+      }
+    }
+
+    const dropped = this.droppedRows - droppedBefore;
+    if (dropped > 0) throw new Error(`Song request writer dropped ${dropped} rows while draining`);
+  }
+
+  get stats(): SongRequestWriterStats {
+    return {
+      pendingInserts: this.inserts.size,
+      pendingUpdates: this.patches.size,
+      flushes: this.flushes,
+      flushedRows: this.flushedRows,
+      failedFlushes: this.failedFlushes,
+      droppedRows: this.droppedRows,
+    };
+  }
+
+  private schedule(): void {
+    if (!this.failing && this.inserts.size + this.patches.size >= MAX_BATCH_ROWS) {
+      this.flush().catch(() => {});
+      return;
+    }
+    if (!this.timer) {
+      this.timer = setTimeout(() => {
+        this.timer = null;
+        this.flush().catch(() => {});
+      }, this.failing ? RETRY_DELAY_MS : FLUSH_DELAY_MS);
+    }
+  }
+
+  private async flushBatch(): Promise<void> {
+    const inserts = this.inserts;
+    const patches = this.patches;
+    this.inserts = new Map();
+    this.patches = new Map();
+
+    let inserted: Set<string>;
+    try {
+      inserted = new Set(await insertSongRequests([...inserts.values()]));
+    } catch (err) {
+      this.failing = true;
+      this.failedFlushes++;
+      logger.error("Failed to flush song request inserts", {
+        count: inserts.size,
+        error: String(err),
+      });
+      this.requeue(inserts, patches);
+      throw err;
+    }
+
+    // Rows that were already there: re-apply what was merged into them
+    for (const [id, row] of inserts) {
+      if (inserted.has(id)) continue;
+      const patch = mergedPatch(row);
+      if (Object.keys(patch).length > 0) patches.set(id, patch);
+    }
+
+    try {
+      await applySongRequestPatches([...patches.entries()]);
+    } catch (err) {
+      this.failing = true;
+      this.failedFlushes++;
+      logger.error("Failed to flush song request updates", {
+        count: patches.size,
+        error: String(err),
+      });
+      this.requeue(new Map(), patches);
+      this.flushes++;
+      this.flushedRows += inserts.size;
+      throw err;
+    }
+
+    this.failing = false;
+    this.flushes++;
+    this.flushedRows += inserts.size + patches.size;
+  }
+
+  /**
+   * Put a failed batch back in front of newer writes, capped so a long
+   * DB outage cannot grow memory without bound.
+   */
+  private requeue(inserts: Map<string, SongRequest>, patches: Map<string, SongRequestPatch>): void {
+    for (const [id, patch] of this.patches) {
+      const row = inserts.get(id);
+      if (row) {
+        Object.assign(row, patch);
+      } else {
+        patches.set(id, { ...patches.get(id), ...patch });
+      }
+    }
+    for (const [id, row] of this.inserts) inserts.set(id, row);
+    this.inserts = inserts;
+    this.patches = patches;
+
+    const overflow = this.inserts.size + this.patches.size - MAX_PENDING_ROWS;
+    if (overflow > 0) {
+      let dropped = 0;
+      for (const id of this.inserts.keys()) {
+        if (dropped >= overflow) break;
+        this.inserts.delete(id);
+        dropped++;
+      }
+      this.droppedRows += dropped;
+      logger.error("Song request writer over capacity, dropped oldest rows", { dropped });
+    }
+  }
+}
+
+/**
+ * Everything patched into a buffered row since it was created: the fields
+ * an UPDATE must set for an existing row to match it.
+ */
+function mergedPatch(row: SongRequest): SongRequestPatch {
+  const patch: SongRequestPatch = {};
+  if (row.searchStatus !== "pending") patch.searchStatus = row.searchStatus;
+  if (row.playStatus !== "pending") patch.playStatus = row.playStatus;
+  if (row.spotifyTrackId !== null) patch.spotifyTrackId = row.spotifyTrackId;
+  if (row.trackName !== null) patch.trackName = row.trackName;
+  if (row.trackArtist !== null) patch.trackArtist = row.trackArtist;
+  if (row.albumName !== null) patch.albumName = row.albumName;
+  if (row.albumImageUrl !== null) patch.albumImageUrl = row.albumImageUrl;
+  if (row.durationMs !== null) patch.durationMs = row.durationMs;
+  if (row.spotifyUri !== null) patch.spotifyUri = row.spotifyUri;
+  if (row.matchedAt !== null) patch.matchedAt = row.matchedAt;
+  if (row.confirmedAt !== null) patch.confirmedAt = row.confirmedAt;
+  return patch;
+}
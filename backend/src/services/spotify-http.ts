@@ -0,0 +1,219 @@
+import { logger } from "../lib/logger";
+import { TtlCache } from "../lib/ttl-cache";
+
+const MAX_CONCURRENT = Number(process.env.SPOTIFY_MAX_CONCURRENT ?? 16);
+const INTERACTIVE_RESERVED = 4; // slots background calls may never take
+const REQUEST_TIMEOUT_MS = 5_000;
+const MAX_RETRIES = 2;
+const BACKOFF_BASE_MS = 250;
+const MAX_RETRY_AFTER_MS = 30_000; // longer waits are returned to the caller as-is
+
+// Per-user token bucket: burst of 10, refilled at 5 requests/s
+const BUCKET_CAPACITY = 10;
+const BUCKET_REFILL_PER_SEC = 5;
+const BUCKET_IDLE_TTL_MS = 10 * 60_000;
+
+export type SpotifyPriority = "interactive" | "background";
+
+export interface SpotifyFetchOptions {
+  method?: string;
+  headers?: Record<string, string>;
+  body?: BodyInit;
+  /** Interactive (chat-driven) calls always dequeue before background ones */
+  priority: SpotifyPriority;
+  /** Pacing key, usually the user's access token; omitted = no per-user pacing */
+  bucketKey?: string;
+}
+
+export interface SpotifyHttpStats {
+  inFlight: number;
+  queued: Record<SpotifyPriority, number>;
+  requests: number;
+  retries: number;
+  timeouts: number;
+  throttled: number;
+  throttleMs: number;
+  bucketWaitMs: number;
+}
+
+interface TokenBucket {
+  tokens: number;
+  updatedAt: number;
+}
+
+const sleep = (ms: number) => new Promise<void>((resolve) => setTimeout(resolve, ms));
+
+/**
+ * Shared HTTP client for every Spotify call.
+ *
+ * - concurrency cap with two priority lanes (interactive before background,
+ *   and a few slots background can never use)
+ * - per-user token-bucket pacing
+ * - 429 Retry-After honored per host, so one throttle pauses everyone
+ * - request timeouts; GETs get bounded retries with backoff on network
+ *   errors, timeouts and 5xx (a write that timed out may have landed, and
+ *   sending it again would e.g. queue a track twice)
+ * - keep-alive connection reuse (Bun pools connections per host)
+ */
+class SpotifyHttpClient {
+  private inFlight = 0;
+  private lanes: Record<SpotifyPriority, (() => void)[]> = { interactive: [], background: [] };
+  private buckets = new TtlCache<string, TokenBucket>({
+    maxEntries: 10_000,
+    defaultTtlMs: BUCKET_IDLE_TTL_MS,
+  });
+  private blockedUntil = new Map<string, number>();
+  private requests = 0;
+  private retries = 0;
+  private timeouts = 0;
+  private throttled = 0;
+  private throttleMs = 0;
+  private bucketWaitMs = 0;
+
+  async fetch(url: string, options: SpotifyFetchOptions): Promise<Response> {
+    const host = new URL(url).host;
+    const idempotent = (options.method ?? "GET") === "GET";
+
+    for (let attempt = 0; ; attempt++) {
+      if (options.bucketKey) await this.takeToken(options.bucketKey);
+      await this.waitForHost(host);
+      await this.acquire(options.priority);
+
+      let response: Response;
+      try {
+        this.requests++;
+        response = await fetch(url, {
+          method: options.method,
+          headers: options.headers,
+          body: options.body,
+          signal: AbortSignal.timeout(REQUEST_TIMEOUT_MS),
+          keepalive: true,
+        });
+      } catch (err) {
+        const timedOut = err instanceof DOMException && err.name === "TimeoutError";
+        if (timedOut) this.timeouts++;
+        if (!idempotent || attempt >= MAX_RETRIES) throw err;
+        this.retries++;
+        logger.warn("Spotify request failed, retrying", { host, attempt, error: String(err) });
+        await sleep(backoff(attempt));
+        continue;
+      } finally {
+        this.release();
+      }
+
+      if (response.status === 429) {
+        this.throttled++;
+        const retryAfterMs = parseRetryAfter(response.headers.get("retry-after"));
+        // Other callers wait at most MAX_RETRY_AFTER_MS; a longer
+        // Retry-After is only returned to this caller
+        const blockMs = Math.min(retryAfterMs, MAX_RETRY_AFTER_MS);
+        this.blockedUntil.set(host, Math.max(this.blockedUntil.get(host) ?? 0, Date.now() + blockMs));
+        if (attempt >= MAX_RETRIES || retryAfterMs > MAX_RETRY_AFTER_MS) return response;
+        this.retries++;
+        logger.warn("Spotify rate limited, honoring Retry-After", { host, retryAfterMs, attempt });
+        continue;
+      }
+
+      if (response.status >= 500 && idempotent && attempt < MAX_RETRIES) {
+        this.retries++;
+        await sleep(backoff(attempt));
+        continue;
+      }
+
+      return response;
+    }
+  }
+
+  get stats(): SpotifyHttpStats {
+    return {
+      inFlight: this.inFlight,
+      queued: {
+        interactive: this.lanes.interactive.length,
+        background: this.lanes.background.length,
+      },
+      requests: this.requests,
+      retries: this.retries,
+      timeouts: this.timeouts,
+      throttled: this.throttled,
+      throttleMs: this.throttleMs,
+      bucketWaitMs: this.bucketWaitMs,
+    };
+  }
+
+  private acquire(priority: SpotifyPriority): Promise<void> {
+    if (this.canStart(priority)) {
+      this.inFlight++;
+      return Promise.resolve();
+    }
+    return new Promise((resolve) => this.lanes[priority].push(resolve));
+  }
+
+  private release(): void {
+    this.inFlight--;
+    // Hand the freed slot straight to the next waiter, interactive first
+    for (const priority of ["interactive", "background"] as const) {
+      if (this.lanes[priority].length > 0 && this.canStart(priority)) {
+        this.inFlight++;
+        this.lanes[priority].shift()!();
+        return;
+      }
+    }
+  }
+
+  private canStart(priority: SpotifyPriority): boolean {
+    if (priority === "interactive") return this.inFlight < MAX_CONCURRENT;
+    return (
+      this.lanes.interactive.length === 0 &&
+      this.inFlight < MAX_CONCURRENT - INTERACTIVE_RESERVED
+    );
+  }
+
+  private async waitForHost(host: string): Promise<void> {
+    const until = this.blockedUntil.get(host);
+    if (!until) return;
+
+    const waitMs = until - Date.now();
+    if (waitMs <= 0) {
+      this.blockedUntil.delete(host);
+      return;
+    }
+    this.throttleMs += waitMs;
+    await sleep(waitMs);
+  }
+
+  private async takeToken(key: string): Promise<void> {
+    const now = Date.now();
+    const bucket = this.buckets.get(key) ?? { tokens: BUCKET_CAPACITY, updatedAt: now };
+
+    bucket.tokens = Math.min(
+      BUCKET_CAPACITY,
+      bucket.tokens + ((now - bucket.updatedAt) / 1000) * BUCKET_REFILL_PER_SEC
+    );
+    bucket.updatedAt = now;
+    bucket.tokens -= 1; // may go negative: callers queue behind each other
+    this.buckets.set(key, bucket);
+
+    if (bucket.tokens < 0) {
+      const waitMs = Math.ceil((-bucket.tokens / BUCKET_REFILL_PER_SEC) * 1000);
+      this.bucketWaitMs += waitMs;
+      await sleep(waitMs);
+    }
+  }
+}
+
+function backoff(attempt: number): number {
+  return BACKOFF_BASE_MS * 2 ** attempt + Math.floor(Math.random() * BACKOFF_BASE_MS);
+}
+
+/**
+ * Retry-After is seconds (Spotify) or an HTTP date; default to 1s.
+ */
+function parseRetryAfter(header: string | null): number {
+  if (!header) return 1_000;
+  const seconds = Number(header);
+  if (Number.isFinite(seconds)) return Math.max(0, seconds * 1000);
+  const date = Date.parse(header);
+  return Number.isNaN(date) ? 1_000 : Math.max(0, date - Date.now());
+}
+
+export const spotifyHttp = new SpotifyHttpClient();
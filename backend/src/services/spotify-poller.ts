@@ -1,11 +1,14 @@
 import { getSpotifyToken } from "./spotify";
 import { getRecentlyPlayed } from "./spotify";
-import { getPendingRequests, updatePlayStatus } from "../db/queries";
+import { getPendingRequests, markPendingNotPlayed } from "../db/queries";
+import type { SongRequestWriter } from "./song-request-writer";
+import type { SongRequest } from "../db/schema";
 import { logger } from "../lib/logger";
 
 const POLL_INTERVAL_MS = 30_000; // 30 seconds
 
 type SpotifyErrorEmitter = (message: string) => void;
+type PlayConfirmedEmitter = (request: SongRequest) => void;
 
 /**
  * Polls Spotify recently-played to confirm which requested songs were
@@ -17,17 +20,23 @@ export class SpotifyPoller {
   private afterTimestamp: number | null = null;
   private readonly sessionId: string;
   private readonly userId: string;
+  private readonly writer: SongRequestWriter;
   private readonly onSpotifyError: SpotifyErrorEmitter;
+  private readonly onConfirmed: PlayConfirmedEmitter;
   private stopped = false;
 
   constructor(
     sessionId: string,
     userId: string,
-    onSpotifyError: SpotifyErrorEmitter
+    writer: SongRequestWriter,
+    onSpotifyError: SpotifyErrorEmitter,
+    onConfirmed: PlayConfirmedEmitter = () => {}
   ) {
     this.sessionId = sessionId;
     this.userId = userId;
+    this.writer = writer;
     this.onSpotifyError = onSpotifyError;
+    this.onConfirmed = onConfirmed;
   }
 
   /**
@@ -49,6 +58,17 @@ export class SpotifyPoller {
     logger.info("Spotify poller started", { sessionId: this.sessionId });
   }
 
+  /**
+   * Stop polling without finalizing, for when the session can't be ended
+   * yet (its request rows aren't durable). stopAndFinalize still works after.
+   */
+  stop(): void {
+    if (this.timer) {
+      clearInterval(this.timer);
+      this.timer = null;
+    }
+  }
+
   /**
    * Sequential shutdown: stop → final poll → finalize remaining as not_played.
    * Must be awaited. Safe to call multiple times (idempotent after first).
@@ -104,6 +124,8 @@ export class SpotifyPoller {
     if (items.length === 0) return;
 
     // Get pending requests that we're waiting to confirm
+    // (flush buffered request writes first so the read sees them)
+    await this.writer.flush();
     const pending = await getPendingRequests(this.sessionId);
     if (pending.length === 0) return;
 
@@ -113,7 +135,9 @@ export class SpotifyPoller {
     // Cross-reference
     for (const request of pending) {
       if (request.spotifyTrackId && playedTrackIds.has(request.spotifyTrackId)) {
-        await updatePlayStatus(request.id, "confirmed");
+        const patch = { playStatus: "confirmed" as const, confirmedAt: new Date() };
+        this.writer.update(request.id, patch);
+        this.onConfirmed({ ...request, ...patch });
         logger.info("Play confirmed", {
           sessionId: this.sessionId,
           trackId: request.spotifyTrackId,
@@ -127,14 +151,13 @@ export class SpotifyPoller {
    * Mark all remaining pending+matched requests as not_played.
    */
   private async finalizeRemaining(): Promise<void> {
-    const pending = await getPendingRequests(this.sessionId);
-    for (const request of pending) {
-      await updatePlayStatus(request.id, "not_played");
-    }
-    if (pending.length > 0) {
+    // Confirmations from the final poll must land before the bulk update
+    await this.writer.flush();
+    const count = await markPendingNotPlayed(this.sessionId);
+    if (count > 0) {
       logger.info("Finalized remaining requests as not_played", {
         sessionId: this.sessionId,
-        count: pending.length,
+        count,
       });
     }
   }
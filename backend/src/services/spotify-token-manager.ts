@@ -0,0 +1,285 @@
+import { db } from "../db/client";
+import { accounts } from "../db/schema";
+import { eq, and } from "drizzle-orm";
+import { logger } from "../lib/logger";
+import { SingleFlight, type SingleFlightStats } from "../lib/single-flight";
+import { spotifyHttp } from "./spotify-http";
+
+const SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token";
+
+const EXPIRY_BUFFER_MS = 60_000; // same 60s buffer as the frontend client
+const REFRESH_AHEAD_MS = 5 * 60_000; // proactive refresh 5 min before expiry
+const REVALIDATE_INTERVAL_MS = 60_000; // re-read the account row at most once a minute
+const IDLE_EVICT_MS = 15 * 60_000; // stop refreshing tokens nobody asked for
+const MIN_TIMER_DELAY_MS = 1_000;
+
+interface SpotifyTokenResponse {
+  access_token: string;
+  refresh_token?: string;
+  expires_in: number;
+  token_type: string;
+}
+
+interface TokenEntry {
+  accessToken: string;
+  refreshToken: string | null;
+  /** Epoch ms; Infinity when the row has no expires_at */
+  expiresAt: number;
+  /** Last time the entry was synced with the account row */
+  syncedAt: number;
+  lastUsedAt: number;
+  timer: ReturnType<typeof setTimeout> | null;
+}
+
+interface AccountTokens {
+  accessToken: string;
+  refreshToken: string | null;
+  expiresAt: number;
+}
+
+export interface TokenManagerStats {
+  cachedUsers: number;
+  hits: number;
+  loads: number;
+  refreshes: number;
+  refreshFailures: number;
+  externalUpdates: number;
+  refreshFlight: SingleFlightStats;
+}
+
+/**
+ * In-memory Spotify access tokens per user.
+ *
+ * Hot path is a Map lookup; the account row is only read on a miss, in the
+ * background at most once per REVALIDATE_INTERVAL_MS, and right before a
+ * refresh. Reading the row first means a token rewritten by another backend
+ * instance or the frontend OAuth flow is adopted instead of refreshed again.
+ */
+export class SpotifyTokenManager {
+  private entries = new Map<string, TokenEntry>();
+  private loadFlights = new SingleFlight<string | null>();
+  private refreshFlights = new SingleFlight<string | null>();
+  private hits = 0;
+  private loads = 0;
+  private refreshes = 0;
+  private refreshFailures = 0;
+  private externalUpdates = 0;
+
+  /**
+   * Get a valid access token, refreshing if needed. Null if Spotify is not
+   * connected or the refresh failed.
+   */
+  async getToken(userId: string): Promise<string | null> {
+    const now = Date.now();
+    const entry = this.entries.get(userId);
+
+    if (entry && entry.expiresAt - EXPIRY_BUFFER_MS > now) {
+      this.hits++;
+      entry.lastUsedAt = now;
+      if (now - entry.syncedAt > REVALIDATE_INTERVAL_MS) {
+        entry.syncedAt = now;
+        this.loadFlights.do(userId, () => this.sync(userId)).catch((err) => {
+          logger.error("Spotify token revalidation failed", { userId, error: String(err) });
+        });
+      }
+      return entry.accessToken;
+    }
+
+    return this.loadFlights.do(userId, () => this.sync(userId));
+  }
+
+  /**
+   * Drop a cached token so the next call re-reads the account row.
+   */
+  invalidate(userId: string): void {
+    const entry = this.entries.get(userId);
+    if (entry?.timer) clearTimeout(entry.timer);
+    this.entries.delete(userId);
+  }
+
+  get stats(): TokenManagerStats {
+    return {
+      cachedUsers: this.entries.size,
+      hits: this.hits,
+      loads: this.loads,
+      refreshes: this.refreshes,
+      refreshFailures: this.refreshFailures,
+      externalUpdates: this.externalUpdates,
+      refreshFlight: this.refreshFlights.stats,
+    };
+  }
+
+  /**
+   * Read the account row and reconcile with the cache: adopt the row if it
+   * stays valid for `minValidityMs`, otherwise refresh with the row's
+   * (freshest) refresh token.
+   */
+  private async sync(userId: string, minValidityMs = EXPIRY_BUFFER_MS): Promise<string | null> {
+    this.loads++;
+    const row = await readAccountTokens(userId);
+    if (!row) {
+      this.invalidate(userId);
+      return null;
+    }
+
+    const cached = this.entries.get(userId);
+    if (cached && cached.accessToken !== row.accessToken) {
+      this.externalUpdates++;
+    }
+
+    if (row.expiresAt - minValidityMs > Date.now()) {
+      this.store(userId, row);
+      return row.accessToken;
+    }
+
+    return this.refresh(userId, row.refreshToken);
+  }
+
+  private refresh(userId: string, refreshToken: string | null): Promise<string | null> {
+    if (!refreshToken) {
+      this.invalidate(userId);
+      return Promise.resolve(null);
+    }
+
+    return this.refreshFlights.do(userId, async () => {
+      this.refreshes++;
+      const refreshed = await refreshSpotifyToken(userId, refreshToken);
+      if (!refreshed) {
+        this.refreshFailures++;
+        this.invalidate(userId);
+        return null;
+      }
+      this.store(userId, refreshed);
+      return refreshed.accessToken;
+    });
+  }
+
+  private store(userId: string, tokens: AccountTokens): void {
+    const now = Date.now();
+    const previous = this.entries.get(userId);
+    if (previous?.timer) clearTimeout(previous.timer);
+
+    const entry: TokenEntry = {
+      ...tokens,
+      syncedAt: now,
+      lastUsedAt: previous?.lastUsedAt ?? now,
+      timer: null,
+    };
+
+    if (Number.isFinite(entry.expiresAt)) {
+      const delay = Math.max(MIN_TIMER_DELAY_MS, entry.expiresAt - REFRESH_AHEAD_MS - now);
+      entry.timer = setTimeout(() => this.refreshAhead(userId), delay);
+    }
+
+    this.entries.set(userId, entry);
+  }
+
+  /**
+   * Timer callback: refresh ahead of expiry, or evict if unused.
+   */
+  private refreshAhead(userId: string): void {
+    const entry = this.entries.get(userId);
+    if (!entry) return;
+    entry.timer = null;
+
+    if (Date.now() - entry.lastUsedAt > IDLE_EVICT_MS) {
+      this.invalidate(userId);
+      logger.debug("Evicted idle Spotify token", { userId });
+      return;
+    }
+
+    // Refresh unless the row was already rewritten elsewhere
+    this.loadFlights.do(userId, () => this.sync(userId, REFRESH_AHEAD_MS)).catch((err) => {
+      logger.error("Proactive Spotify token refresh failed", { userId, error: String(err) });
+    });
+  }
+}
+
+/**
+ * Read the Spotify account row for a user
+ */
+async function readAccountTokens(userId: string): Promise<AccountTokens | null> {
+  const [account] = await db
+    .select({
+      accessToken: accounts.access_token,
+      refreshToken: accounts.refresh_token,
+      expiresAt: accounts.expires_at,
+    })
+    .from(accounts)
+    .where(
+      and(
+        eq(accounts.userId, userId),
+        eq(accounts.provider, "spotify")
+      )
+    )
+    .limit(1);
+
+  if (!account?.accessToken) return null;
+
+  return {
+    accessToken: account.accessToken,
+    refreshToken: account.refreshToken,
+    expiresAt: account.expiresAt ? account.expiresAt * 1000 : Number.POSITIVE_INFINITY,
+  };
+}
+
+/**
+ * Refresh Spotify access token and persist it to the account row
+ */
+async function refreshSpotifyToken(userId: string, refreshToken: string): Promise<AccountTokens | null> {
+  const clientId = process.env.AUTH_SPOTIFY_ID;
+  const clientSecret = process.env.AUTH_SPOTIFY_SECRET;
+
+  if (!clientId || !clientSecret) {
+    logger.error("Spotify credentials not configured", { userId });
+    return null;
+  }
+
+  try {
+    const response = await spotifyHttp.fetch(SPOTIFY_TOKEN_URL, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/x-www-form-urlencoded",
+        Authorization: `Basic ${Buffer.from(`${clientId}:${clientSecret}`).toString("base64")}`,
+      },
+      body: new URLSearchParams({
+        grant_type: "refresh_token",
+        refresh_token: refreshToken,
+      }),
+      // Searches wait on the token, so refreshes share their lane
+      priority: "interactive",
+    });
+
+    if (!response.ok) {
+      logger.error("Failed to refresh Spotify token", { userId, status: response.status });
+      return null;
+    }
+
+    const data = await response.json() as SpotifyTokenResponse;
+    const expiresAtSec = Math.floor(Date.now() / 1000) + data.expires_in;
+
+    // Update token in database
+    await db
+      .update(accounts)
+      .set({
+        access_token: data.access_token,
+        expires_at: expiresAtSec,
+        ...(data.refresh_token && { refresh_token: data.refresh_token }),
+      })
+      .where(
+        and(
+          eq(accounts.userId, userId),
+          eq(accounts.provider, "spotify")
+        )
+      );
+
+    return {
+      accessToken: data.access_token,
+      refreshToken: data.refresh_token ?? refreshToken,
+      expiresAt: expiresAtSec * 1000,
+    };
+  } catch (err) {
+    logger.error("Error refreshing Spotify token", { userId, error: String(err) });
+    return null;
+  }
+}
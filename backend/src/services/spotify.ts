@@ -1,122 +1,122 @@
-import { db } from "../db/client";
-import { accounts } from "../db/schema";
-import { eq, and } from "drizzle-orm";
 import { logger } from "../lib/logger";
+import { positiveIntEnv } from "../lib/env";
+import { TtlCache, type TtlCacheStats } from "../lib/ttl-cache";
+import { SingleFlight, type SingleFlightStats } from "../lib/single-flight";
+import { SpotifyTokenManager, type TokenManagerStats } from "./spotify-token-manager";
+import { spotifyHttp, type SpotifyHttpStats } from "./spotify-http";
 
 const SPOTIFY_API_BASE = "https://api.spotify.com/v1";
-const SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token";
 
-interface SpotifyTokenResponse {
-  access_token: string;
-  refresh_token?: string;
-  expires_in: number;
-  token_type: string;
-}
+const SEARCH_CACHE_MAX_ENTRIES = positiveIntEnv("SPOTIFY_SEARCH_CACHE_SIZE", 5_000);
+const SEARCH_CACHE_TTL_MS = 60 * 60 * 1000; // 1 hour
+const SEARCH_NEGATIVE_TTL_MS = 60_000; // not_found results: 1 minute
 
 /**
- * Get Spotify access token for a user
+ * Process-wide search cache keyed by normalized query. Shared by every
+ * session, so one streamer's resolution answers the same query elsewhere.
+ * `null` values are cached not_found results.
  */
-export async function getSpotifyToken(userId: string): Promise<string | null> {
-  const [account] = await db
-    .select()
-    .from(accounts)
-    .where(
-      and(
-        eq(accounts.userId, userId),
-        eq(accounts.provider, "spotify")
-      )
-    )
-    .limit(1);
-
-  if (!account?.access_token) return null;
-
-  // Check if token is expired
-  if (account.expires_at && account.expires_at * 1000 < Date.now()) {
-    // Token expired, try to refresh
-    if (account.refresh_token) {
-      const newToken = await refreshSpotifyToken(userId, account.refresh_token);
-      return newToken;
-    }
-    return null;
-  }
+const searchCache = new TtlCache<string, SpotifyTrack | null>({
+  maxEntries: SEARCH_CACHE_MAX_ENTRIES,
+  defaultTtlMs: SEARCH_CACHE_TTL_MS,
+});
+
+// Concurrent identical searches (keyed by normalized query) share one
+// in-flight request. Token refreshes are coalesced by the token manager.
+const searchFlights = new SingleFlight<SpotifyTrack | null>();
+
+const tokenManager = new SpotifyTokenManager();
 
-  return account.access_token;
+/**
+ * Get Spotify access token for a user (in-memory, refreshed ahead of expiry)
+ */
+export function getSpotifyToken(userId: string): Promise<string | null> {
+  return tokenManager.getToken(userId);
 }
 
 /**
- * Refresh Spotify access token
+ * Token cache counters
  */
-async function refreshSpotifyToken(userId: string, refreshToken: string): Promise<string | null> {
-  const clientId = process.env.AUTH_SPOTIFY_ID;
-  const clientSecret = process.env.AUTH_SPOTIFY_SECRET;
+export function getTokenManagerStats(): TokenManagerStats {
+  return tokenManager.stats;
+}
 
-  if (!clientId || !clientSecret) {
-    logger.error("Spotify credentials not configured", { userId });
-    return null;
-  }
+/**
+ * Normalize a search query for cache keys: case, whitespace and
+ * unicode-compatibility variants of the same request collapse together.
+ */
+export function normalizeQuery(query: string): string {
+  return query.normalize("NFKC").toLowerCase().replace(/\s+/g, " ").trim();
+}
 
-  try {
-    const response = await fetch(SPOTIFY_TOKEN_URL, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/x-www-form-urlencoded",
-        Authorization: `Basic ${Buffer.from(`${clientId}:${clientSecret}`).toString("base64")}`,
-      },
-      body: new URLSearchParams({
-        grant_type: "refresh_token",
-        refresh_token: refreshToken,
-      }),
-    });
+/**
+ * Search for a track on Spotify (served from the shared cache when possible)
+ */
+export async function searchSpotifyTrack(
+  accessToken: string,
+  query: string
+): Promise<SpotifyTrack | null> {
+  const key = normalizeQuery(query);
+  const cached = searchCache.get(key);
+  if (cached !== undefined) return cached;
+
+  return searchFlights.do(key, async () => {
+    const result = await fetchSpotifySearch(accessToken, key);
+    // Errors are not cached; not_found is cached briefly
+    if (result === undefined) return null;
+
+    searchCache.set(key, result, result ? SEARCH_CACHE_TTL_MS : SEARCH_NEGATIVE_TTL_MS);
+    return result;
+  });
+}
 
-    if (!response.ok) {
-      logger.error("Failed to refresh Spotify token", { userId, status: response.status });
-      return null;
-    }
+/**
+ * Search cache hit/miss/eviction counters
+ */
+export function getSearchCacheStats(): TtlCacheStats {
+  return searchCache.stats;
+}
 
-    const data = await response.json() as SpotifyTokenResponse;
-
-    // Update token in database
-    await db
-      .update(accounts)
-      .set({
-        access_token: data.access_token,
-        expires_at: Math.floor(Date.now() / 1000) + data.expires_in,
-        ...(data.refresh_token && { refresh_token: data.refresh_token }),
-      })
-      .where(
-        and(
-          eq(accounts.userId, userId),
-          eq(accounts.provider, "spotify")
-        )
-      );
-
-    return data.access_token;
-  } catch (err) {
-    logger.error("Error refreshing Spotify token", { userId, error: String(err) });
-    return null;
-  }
+/**
+ * Single-flight counters for searches and token refreshes
+ */
+export function getSingleFlightStats(): { search: SingleFlightStats; refresh: SingleFlightStats } {
+  return {
+    search: searchFlights.stats,
+    refresh: tokenManager.stats.refreshFlight,
+  };
 }
 
 /**
- * Search for a track on Spotify
+ * Shared HTTP client counters (in-flight, throttle time, retries)
  */
-export async function searchSpotifyTrack(
+export function getSpotifyHttpStats(): SpotifyHttpStats {
+  return spotifyHttp.stats;
+}
+
+/**
+ * Uncached search. Returns null when nothing matched and undefined on
+ * request failure, so callers can tell not_found apart from errors.
+ */
+async function fetchSpotifySearch(
   accessToken: string,
   query: string
-): Promise<SpotifyTrack | null> {
+): Promise<SpotifyTrack | null | undefined> {
   try {
-    const response = await fetch(
+    const response = await spotifyHttp.fetch(
       `${SPOTIFY_API_BASE}/search?q=${encodeURIComponent(query)}&type=track&limit=1`,
       {
         headers: {
           Authorization: `Bearer ${accessToken}`,
         },
+        priority: "interactive",
+        bucketKey: accessToken,
       }
     );
 
     if (!response.ok) {
       logger.error("Spotify search failed", { query, status: response.status });
-      return null;
+      return undefined;
     }
 
 interface SpotifySearchResponse {
@@ -129,7 +129,7 @@ interface SpotifySearchResponse {
     return data.tracks?.items?.[0] ?? null;
   } catch (err) {
     logger.error("Error searching Spotify", { query, error: String(err) });
-    return null;
+    return undefined;
   }
 }
 
@@ -141,13 +141,15 @@ export async function addToSpotifyQueue(
   trackUri: string
 ): Promise<boolean> {
   try {
-    const response = await fetch(
+    const response = await spotifyHttp.fetch(
       `${SPOTIFY_API_BASE}/me/player/queue?uri=${encodeURIComponent(trackUri)}`,
       {
         method: "POST",
         headers: {
           Authorization: `Bearer ${accessToken}`,
         },
+        priority: "interactive",
+        bucketKey: accessToken,
       }
     );
 
@@ -193,10 +195,12 @@ export async function getRecentlyPlayed(
     const params = new URLSearchParams({ limit: "50" });
     if (after) params.set("after", String(after));
 
-    const response = await fetch(
+    const response = await spotifyHttp.fetch(
       `${SPOTIFY_API_BASE}/me/player/recently-played?${params}`,
       {
         headers: { Authorization: `Bearer ${accessToken}` },
+        priority: "background",
+        bucketKey: accessToken,
       }
     );
 
@@ -223,8 +227,10 @@ export async function getRecentlyPlayed(
  */
 export async function checkSpotifyPremium(accessToken: string): Promise<boolean> {
   try {
-    const response = await fetch(`${SPOTIFY_API_BASE}/me`, {
+    const response = await spotifyHttp.fetch(`${SPOTIFY_API_BASE}/me`, {
       headers: { Authorization: `Bearer ${accessToken}` },
+      priority: "background",
+      bucketKey: accessToken,
     });
 
     if (!response.ok) return false;
@@ -1,45 +1,86 @@
 import { WebcastPushConnection } from "tiktok-live-connector";
 import { parseCommand } from "../lib/parser";
-import { checkRateLimit } from "../lib/rate-limit";
+import { parseRateLimitPolicy, DEFAULT_RATE_LIMIT_POLICY, type RateLimiterStats } from "../lib/rate-limit";
+import { IngestQueue, type IngestQueueStats } from "../lib/ingest-queue";
+import { DedupWindow } from "../lib/dedup-window";
+import { parseEventPolicies, policyFor } from "../lib/event-policy";
+import { projectRawEvent } from "../lib/raw-event-projection";
 import {
   endLiveSession,
-  logSongRequest,
-  updateRequestAfterSearch,
-  findRecentDuplicate,
+  searchResultPatch,
+  getRecentRequestKeys,
   logGiftEvent,
-  logRawTikTokEvents,
+  getRateLimitPolicy,
 } from "../db/queries";
 import { searchSpotifyTrack, getSpotifyToken } from "./spotify";
 import { SpotifyPoller } from "./spotify-poller";
+import { SongRequestWriter, type SongRequestWriterStats } from "./song-request-writer";
+import { RawEventArchiver, type RawEventArchiverStats } from "./raw-event-archiver";
+import { EventRollup, type EventRollupStats } from "./event-rollup";
+import { RawEventPartitionManager, type RawEventPartitionStats } from "./raw-event-partitions";
+import { createRateLimiter } from "./rate-limiter";
+import { SessionReportTracker, type SessionReportTrackerStats } from "./session-report-tracker";
 import { logger } from "../lib/logger";
-
-const RAW_EVENT_FLUSH_INTERVAL_MS = 1_000;
-const MAX_RAW_PAYLOAD_BYTES = 10_240; // 10KB
-
-type EventEmitter = (userId: string, event: unknown) => void;
+import { positiveIntEnv } from "../lib/env";
+
+const INGEST_CONCURRENCY = positiveIntEnv("INGEST_CONCURRENCY", 4);
+const INGEST_MAX_DEPTH = positiveIntEnv("INGEST_MAX_DEPTH", 200);
+const DEDUP_WINDOW_MS = 5_000;
+const STREAM_END_RETRY_MS = 5_000;
+const RAW_EVENT_POLICIES = parseEventPolicies(process.env.RAW_EVENT_POLICY);
+
+type EventEmitter = (userId: string, sessionId: string, event: unknown) => void;
+
+export interface TikTokServiceStats {
+  activeConnections: number;
+  ingest: Record<string, IngestQueueStats>;
+  requestWriter: SongRequestWriterStats;
+  rawEvents: RawEventArchiverStats;
+  rollups: EventRollupStats;
+  rawEventPartitions: RawEventPartitionStats;
+  rateLimit: RateLimiterStats;
+  reports: SessionReportTrackerStats;
+}
 
 interface ConnectionInfo {
   connection: WebcastPushConnection;
   userId: string;
   sessionId: string;
   poller: SpotifyPoller;
-  rawEventBuffer: RawEventBufferItem[];
-  rawEventTimer: ReturnType<typeof setInterval> | null;
-}
-
-interface RawEventBufferItem {
-  liveSessionId: string;
-  eventType: string;
-  viewerUsername: string | null;
-  payload: unknown;
+  ingest: IngestQueue;
 }
 
 export class TikTokService {
   private connections = new Map<string, ConnectionInfo>();
   private emitEvent: EventEmitter;
+  private onSessionEnded: (sessionId: string) => void;
+  // Live /report aggregates, fed by every request write
+  private reports = new SessionReportTracker();
+  private requestWriter = new SongRequestWriter(this.reports);
+  private rawEvents: RawEventArchiver;
+  private rollups = new EventRollup();
+  private rawEventPartitions = new RawEventPartitionManager();
+  private rateLimiter = createRateLimiter();
+  // Per session+event type counters for sample:N policies
+  private sampleCounts = new Map<string, number>();
 
-  constructor(emitEvent: EventEmitter) {
+  /**
+   * @param onSessionEnded called after a stream ends on TikTok's side (not
+   *   for stopListening), so the caller can release its lease
+   * @param spillSlot raw event spill subdirectory owned by this service
+   */
+  constructor(
+    emitEvent: EventEmitter,
+    onSessionEnded: (sessionId: string) => void = () => {},
+    spillSlot = "main"
+  ) {
     this.emitEvent = emitEvent;
+    this.onSessionEnded = onSessionEnded;
+    this.rawEvents = new RawEventArchiver(spillSlot);
+    this.rawEvents.start();
+    this.rollups.start();
+    this.rawEventPartitions.start();
+    this.reports.start();
   }
 
   /**
@@ -61,43 +102,67 @@ export class TikTokService {
     });
 
     // Create poller (started after connection succeeds)
-    const poller = new SpotifyPoller(sessionId, userId, (message) => {
-      this.emitEvent(userId, { type: "session:spotify_error", message });
-    });
+    const poller = new SpotifyPoller(
+      sessionId,
+      userId,
+      this.requestWriter,
+      (message) => this.emitEvent(userId, sessionId, { type: "session:spotify_error", message }),
+      (request) => this.emitEvent(userId, sessionId, { type: "request:update", request })
+    );
+
+    // In-memory dedup window, seeded from the DB so a recovered session
+    // still suppresses repeats sent just before the restart
+    const dedup = new DedupWindow(DEDUP_WINDOW_MS);
+    const recent = await getRecentRequestKeys(sessionId, DEDUP_WINDOW_MS);
+    dedup.seed(recent.map((r) => ({ key: dedupKey(r.viewerUsername, r.parsedQuery), at: r.requestedAt })));
+
+    // Streamer's request limit policy, fixed for the session
+    const policy = parseRateLimitPolicy(await getRateLimitPolicy(userId)) ?? DEFAULT_RATE_LIMIT_POLICY;
+    this.rateLimiter.setPolicy(sessionId, policy);
 
-    // Raw event buffer
-    const rawEventBuffer: RawEventBufferItem[] = [];
-    const rawEventTimer = setInterval(() => {
-      this.flushRawEvents(rawEventBuffer, sessionId);
-    }, RAW_EVENT_FLUSH_INTERVAL_MS);
+    // Session report aggregate, rebuilt from the DB when recovering
+    await this.reports.open(sessionId);
+
+    // Bounded ingest queue: caps concurrent DB/Spotify work per session
+    const ingest = new IngestQueue(sessionId, {
+      concurrency: INGEST_CONCURRENCY,
+      maxDepth: INGEST_MAX_DEPTH,
+    });
 
     // ---- Event handlers ----
 
-    // Chat messages (song requests)
-    connection.on("chat", async (data) => {
-      try {
-        this.bufferRawEvent(rawEventBuffer, sessionId, "chat", data.uniqueId, data);
-        await this.handleChat(sessionId, userId, data);
-      } catch (err) {
-        logger.error("Error handling chat", { sessionId, error: String(err) });
-      }
+    // Chat messages (song requests) — only !play is queued, and may be shed
+    connection.on("chat", (data) => {
+      this.bufferRawEvent(sessionId, "chat", data.uniqueId, data);
+
+      const command = parseCommand(data.comment);
+      if (!command || command.type !== "play") return;
+      const query = command.query;
+
+      ingest.push({
+        kind: "chat",
+        droppable: true,
+        run: () => this.handleChat(sessionId, userId, data, query, dedup),
+        onDrop: () => this.handleDroppedChat(sessionId, data, query),
+      });
     });
 
-    // Gift events
-    connection.on("gift", async (data) => {
-      try {
-        this.bufferRawEvent(rawEventBuffer, sessionId, "gift", data.uniqueId, data);
-        await this.handleGift(sessionId, userId, data);
-      } catch (err) {
-        logger.error("Error handling gift", { sessionId, error: String(err) });
-      }
+    // Gift events — never shed
+    connection.on("gift", (data) => {
+      this.bufferRawEvent(sessionId, "gift", data.uniqueId, data);
+
+      ingest.push({
+        kind: "gift",
+        droppable: false,
+        run: () => this.handleGift(sessionId, userId, data),
+      });
     });
 
-    // Other events → raw log only
+    // Other events → raw log / sample / rollup per RAW_EVENT_POLICY
     for (const eventType of ["member", "like", "share", "roomUser", "follow", "subscribe"] as const) {
       connection.on(eventType, (data: Record<string, unknown>) => {
         const username = typeof data.uniqueId === "string" ? data.uniqueId : null;
-        this.bufferRawEvent(rawEventBuffer, sessionId, eventType, username, data);
+        this.bufferRawEvent(sessionId, eventType, username, data);
       });
     }
 
@@ -126,43 +191,50 @@ export class TikTokService {
         userId,
         sessionId,
         poller,
-        rawEventBuffer,
-        rawEventTimer,
+        ingest,
       });
 
       // Start poller after successful connection
       poller.start();
 
       // Notify frontend
-      this.emitEvent(userId, {
+      this.emitEvent(userId, sessionId, {
         type: "session:connected",
         roomId: state.roomId,
       });
     } catch (err) {
-      clearInterval(rawEventTimer);
       logger.error("Failed to connect to TikTok stream", {
         sessionId,
         username: tiktokUsername,
         error: String(err),
       });
+      this.rateLimiter.clearSession(sessionId);
+      this.reports.drop(sessionId);
       throw err;
     }
   }
 
   /**
    * Stop listening to a session and finalize all data.
-   * Calls sequential shutdown: poller → flush raw events → end session.
+   * Calls sequential shutdown: ingest → request writes → poller → flush raw
+   * events → end session. Rejects, leaving the session connected, if the
+   * request writes can't be made durable; calling it again retries.
    */
   async stopListening(sessionId: string): Promise<void> {
     const info = this.connections.get(sessionId);
     if (!info) return;
 
     // Sequential shutdown (H3 fix)
+    await info.ingest.drain();
+    await this.requestWriter.drain();
     await info.poller.stopAndFinalize();
+    await this.reports.close(sessionId);
 
-    // Flush remaining raw events
-    if (info.rawEventTimer) clearInterval(info.rawEventTimer);
-    await this.flushRawEvents(info.rawEventBuffer, sessionId);
+    // Flush remaining raw events and rollups
+    await this.rawEvents.flush();
+    await this.rollups.flush();
+    this.clearSampleCounts(sessionId);
+    this.rateLimiter.clearSession(sessionId);
 
     info.connection.disconnect();
     this.connections.delete(sessionId);
@@ -170,6 +242,27 @@ export class TikTokService {
     logger.info("Stopped listening to session", { sessionId });
   }
 
+  /**
+   * Drop a session that is now owned elsewhere (lease lost) without
+   * finalizing it: no not_played marking and no report checkpoint, both of
+   * which belong to the new owner. Queued ingest tasks are discarded;
+   * requests already handed to the writer are still saved.
+   */
+  abandon(sessionId: string): void {
+    const info = this.connections.get(sessionId);
+    if (!info) return;
+
+    info.connection.disconnect();
+    info.ingest.discard();
+    info.poller.stop();
+    this.reports.drop(sessionId);
+    this.clearSampleCounts(sessionId);
+    this.rateLimiter.clearSession(sessionId);
+    this.connections.delete(sessionId);
+
+    logger.info("Abandoned session", { sessionId });
+  }
+
   /**
    * Handle incoming chat message — song request flow.
    * H1: token lazy-fetched. H2: dedup check before insert.
@@ -177,37 +270,51 @@ export class TikTokService {
   private async handleChat(
     sessionId: string,
     userId: string,
-    data: { uniqueId: string; nickname: string; comment: string }
+    data: { uniqueId: string; nickname: string; comment: string },
+    query: string,
+    dedup: DedupWindow
   ): Promise<void> {
-    const command = parseCommand(data.comment);
-    if (!command || command.type !== "play") return;
-
     const viewerUsername = data.uniqueId;
+    const key = dedupKey(viewerUsername, query);
 
-    // Rate limit check
-    if (!checkRateLimit(viewerUsername)) {
+    // Rate limit check (per viewer in this session, gifts may extend it)
+    if (!(await this.rateLimiter.check(sessionId, viewerUsername))) {
       // Still log the request, but mark as rate_limited
-      const request = await logSongRequest(sessionId, viewerUsername, data.comment, command.query);
-      await updateRequestAfterSearch(request.id, { status: "rate_limited" });
+      dedup.record(key);
+      this.requestWriter.insert({
+        liveSessionId: sessionId,
+        viewerUsername,
+        rawMessage: data.comment,
+        parsedQuery: query,
+        searchStatus: "rate_limited",
+      });
       logger.debug("Rate limited viewer", { sessionId, viewerUsername });
       return;
     }
 
-    // Dedup check (H2): same viewer + same query within 5s
-    const duplicate = await findRecentDuplicate(sessionId, viewerUsername, command.query);
-    if (duplicate) {
-      logger.debug("Duplicate request suppressed", { sessionId, viewerUsername, query: command.query });
+    // Dedup check (H2): same viewer + same query within 5s.
+    // Synchronous check-and-record, so concurrent ingest tasks can't race.
+    if (!dedup.checkAndRecord(key)) {
+      logger.debug("Duplicate request suppressed", { sessionId, viewerUsername, query });
       return;
     }
 
-    // Log the request
-    const request = await logSongRequest(sessionId, viewerUsername, data.comment, command.query);
+    // Log the request (write-behind) and show it on the dashboard right away
+    const request = this.requestWriter.insert({
+      liveSessionId: sessionId,
+      viewerUsername,
+      rawMessage: data.comment,
+      parsedQuery: query,
+    });
+    this.emitEvent(userId, sessionId, { type: "request:new", request });
 
     // Get Spotify token (H1: lazy fetch, handles refresh)
     const token = await getSpotifyToken(userId);
     if (!token) {
-      await updateRequestAfterSearch(request.id, { status: "error" });
-      this.emitEvent(userId, {
+      const patch = searchResultPatch({ status: "error" });
+      this.requestWriter.update(request.id, patch);
+      this.emitEvent(userId, sessionId, { type: "request:update", request: { ...request, ...patch } });
+      this.emitEvent(userId, sessionId, {
         type: "session:spotify_error",
         message: "Spotify token unavailable",
       });
@@ -215,18 +322,18 @@ export class TikTokService {
     }
 
     // Search Spotify
-    const track = await searchSpotifyTrack(token, command.query);
+    const track = await searchSpotifyTrack(token, query);
     if (!track) {
-      await updateRequestAfterSearch(request.id, { status: "not_found" });
       // Still emit to show the failed request in the dashboard
-      const updatedRequest = { ...request, searchStatus: "not_found" as const };
-      this.emitEvent(userId, { type: "request:new", request: updatedRequest });
-      logger.debug("No track found for query", { sessionId, query: command.query });
+      const patch = searchResultPatch({ status: "not_found" });
+      this.requestWriter.update(request.id, patch);
+      this.emitEvent(userId, sessionId, { type: "request:update", request: { ...request, ...patch } });
+      logger.debug("No track found for query", { sessionId, query });
       return;
     }
 
-    // Update with match data
-    await updateRequestAfterSearch(request.id, {
+    // Update with match data and emit the fully-hydrated request
+    const patch = searchResultPatch({
       status: "matched",
       track: {
         id: track.id,
@@ -238,22 +345,8 @@ export class TikTokService {
         uri: track.uri,
       },
     });
-
-    // Emit the fully-hydrated request to the dashboard
-    const matchedRequest = {
-      ...request,
-      spotifyTrackId: track.id,
-      trackName: track.name,
-      trackArtist: track.artists.map((a) => a.name).join(", "),
-      albumName: track.album.name,
-      albumImageUrl: track.album.images[0]?.url ?? null,
-      durationMs: track.duration_ms,
-      spotifyUri: track.uri,
-      searchStatus: "matched" as const,
-      matchedAt: new Date(),
-    };
-
-    this.emitEvent(userId, { type: "request:new", request: matchedRequest });
+    this.requestWriter.update(request.id, patch);
+    this.emitEvent(userId, sessionId, { type: "request:update", request: { ...request, ...patch } });
 
     logger.info("Song request logged", {
       sessionId,
@@ -263,6 +356,24 @@ export class TikTokService {
     });
   }
 
+  /**
+   * Handle a `!play` shed by the ingest queue: record it as dropped
+   * without searching. Buffered by the writer so shedding stays cheap.
+   */
+  private handleDroppedChat(
+    sessionId: string,
+    data: { uniqueId: string; comment: string },
+    query: string
+  ): void {
+    this.requestWriter.insert({
+      liveSessionId: sessionId,
+      viewerUsername: data.uniqueId,
+      rawMessage: data.comment,
+      parsedQuery: query,
+      searchStatus: "dropped",
+    });
+  }
+
   /**
    * Handle gift event
    */
@@ -290,7 +401,9 @@ export class TikTokService {
       data.repeatCount ?? 1
     );
 
-    this.emitEvent(userId, { type: "gift:new", gift });
+    this.emitEvent(userId, sessionId, { type: "gift:new", gift });
+    this.reports.addGift(sessionId, gift.diamondCount, gift.repeatCount);
+    await this.rateLimiter.boost(sessionId, data.uniqueId, (data.diamondCount ?? 0) * (data.repeatCount ?? 1));
 
     logger.info("Gift received", {
       sessionId,
@@ -301,74 +414,93 @@ export class TikTokService {
   }
 
   /**
-   * Handle stream ending — sequential shutdown (H3 fix).
+   * Handle stream ending — sequential shutdown (H3 fix). If the request
+   * writes can't be made durable yet, the session stays here, lease held,
+   * and finalizing is retried every STREAM_END_RETRY_MS.
    */
   private async handleStreamEnd(sessionId: string, userId: string): Promise<void> {
     const info = this.connections.get(sessionId);
     if (info) {
-      // Sequential: poller stop → final poll → finalize remaining
+      // Sequential: drain ingest → flush writes → poller stop → final poll → finalize remaining
+      await info.ingest.drain();
+      try {
+        await this.requestWriter.drain();
+      } catch (err) {
+        // Finalizing now would mark and snapshot a session missing these
+        // rows. Keep the session (and its lease) and try again shortly.
+        logger.error("Stream ended with unsaved song requests, retrying finalize", {
+          sessionId,
+          error: String(err),
+        });
+        info.poller.stop();
+        setTimeout(() => {
+          // Stopped, abandoned or shut down meanwhile
+          if (this.connections.get(sessionId) !== info) return;
+          this.handleStreamEnd(sessionId, userId).catch((retryErr) => {
+            logger.error("Failed to finalize ended stream", { sessionId, error: String(retryErr) });
+          });
+        }, STREAM_END_RETRY_MS);
+        return;
+      }
       await info.poller.stopAndFinalize();
+      await this.reports.close(sessionId);
 
-      // Flush remaining raw events
-      if (info.rawEventTimer) clearInterval(info.rawEventTimer);
-      await this.flushRawEvents(info.rawEventBuffer, sessionId);
+      // Flush remaining raw events and rollups
+      await this.rawEvents.flush();
+      await this.rollups.flush();
+      this.clearSampleCounts(sessionId);
+      this.rateLimiter.clearSession(sessionId);
 
       this.connections.delete(sessionId);
     }
 
     await endLiveSession(sessionId);
+    this.onSessionEnded(sessionId);
 
-    this.emitEvent(userId, {
+    this.emitEvent(userId, sessionId, {
       type: "session:ended",
       reason: "stream_ended",
     });
   }
 
   /**
-   * Buffer a raw event for async batch insert.
-   * Payload is capped at 10KB to prevent bloat.
+   * Buffer a raw event for async batch insert, applying the event type's
+   * retention policy (raw, sample 1-in-N, per-second rollup, or drop).
+   * Only whitelisted fields are kept, serialized once and capped at 10KB.
    */
   private bufferRawEvent(
-    buffer: RawEventBufferItem[],
     sessionId: string,
     eventType: string,
     viewerUsername: string | null,
     data: unknown
   ): void {
-    let payload = data;
-    try {
-      const serialized = JSON.stringify(data);
-      if (serialized.length > MAX_RAW_PAYLOAD_BYTES) {
-        payload = { _truncated: true, _originalSize: serialized.length };
-      }
-    } catch {
-      payload = { _serializationError: true };
+    const policy = policyFor(RAW_EVENT_POLICIES, eventType);
+    if (policy.mode === "drop") return;
+
+    if (policy.mode === "rollup") {
+      this.rollups.record(sessionId, eventType, rollupValue(eventType, data));
+      return;
+    }
+
+    if (policy.mode === "sample") {
+      const key = `${sessionId}\u0000${eventType}`;
+      const seen = (this.sampleCounts.get(key) ?? 0) + 1;
+      this.sampleCounts.set(key, seen);
+      if ((seen - 1) % policy.every !== 0) return;
     }
 
-    buffer.push({
+    this.rawEvents.push({
       liveSessionId: sessionId,
       eventType,
       viewerUsername,
-      payload,
+      payload: projectRawEvent(eventType, data),
+      receivedAt: new Date(),
     });
   }
 
-  /**
-   * Flush buffered raw events to the database.
-   * Fire-and-forget — errors logged but never block main flow.
-   */
-  private async flushRawEvents(buffer: RawEventBufferItem[], sessionId: string): Promise<void> {
-    if (buffer.length === 0) return;
-
-    const batch = buffer.splice(0, buffer.length);
-    try {
-      await logRawTikTokEvents(batch);
-    } catch (err) {
-      logger.error("Failed to flush raw events", {
-        sessionId,
-        count: batch.length,
-        error: String(err),
-      });
+  private clearSampleCounts(sessionId: string): void {
+    for (const key of this.sampleCounts.keys()) {
+      if (key.startsWith(`${sessionId}\u0000`)) this.sampleCounts.delete(key);
     }
   }
 
@@ -379,16 +511,113 @@ export class TikTokService {
     return this.connections.size;
   }
 
+  /**
+   * Per-session ingest queue depth/drop counters
+   */
+  getIngestStats(): Record<string, IngestQueueStats> {
+    const stats: Record<string, IngestQueueStats> = {};
+    for (const [sessionId, info] of this.connections) {
+      stats[sessionId] = info.ingest.stats;
+    }
+    return stats;
+  }
+
+  /**
+   * Song request write-behind counters
+   */
+  getWriterStats(): SongRequestWriterStats {
+    return this.requestWriter.stats;
+  }
+
+  /**
+   * Raw event buffer/spill counters
+   */
+  getRawEventStats(): RawEventArchiverStats {
+    return this.rawEvents.stats;
+  }
+
+  /**
+   * Event rollup counters
+   */
+  getRollupStats(): EventRollupStats {
+    return this.rollups.stats;
+  }
+
+  /**
+   * Raw event partition maintenance counters
+   */
+  getRawEventPartitionStats(): RawEventPartitionStats {
+    return this.rawEventPartitions.stats;
+  }
+
+  /**
+   * Song request rate limiter counters
+   */
+  getRateLimitStats(): RateLimiterStats {
+    return this.rateLimiter.stats;
+  }
+
+  /**
+   * Session report aggregate/checkpoint counters
+   */
+  getReportStats(): SessionReportTrackerStats {
+    return this.reports.stats;
+  }
+
+  /**
+   * All counters, as served by /metrics
+   */
+  getStats(): TikTokServiceStats {
+    return {
+      activeConnections: this.activeConnections,
+      ingest: this.getIngestStats(),
+      requestWriter: this.getWriterStats(),
+      rawEvents: this.getRawEventStats(),
+      rollups: this.getRollupStats(),
+      rawEventPartitions: this.getRawEventPartitionStats(),
+      rateLimit: this.getRateLimitStats(),
+      reports: this.getReportStats(),
+    };
+  }
+
   /**
    * Disconnect all connections (for server shutdown)
    */
   async disconnectAll(): Promise<void> {
+    for (const info of this.connections.values()) await info.ingest.drain();
+
+    let durable = true;
+    try {
+      await this.requestWriter.drain();
+    } catch (err) {
+      durable = false;
+      logger.error("Shutting down with unsaved song requests, sessions left unfinalized", {
+        sessions: this.connections.size,
+        error: String(err),
+      });
+    }
+
     for (const info of this.connections.values()) {
-      await info.poller.stopAndFinalize();
-      if (info.rawEventTimer) clearInterval(info.rawEventTimer);
+      if (durable) {
+        try {
+          await info.poller.stopAndFinalize();
+          await this.reports.close(info.sessionId);
+        } catch (err) {
+          logger.error("Failed to finalize session on shutdown", { sessionId: info.sessionId, error: String(err) });
+        }
+      } else {
+        info.poller.stop();
+        this.reports.drop(info.sessionId);
+      }
       info.connection.disconnect();
     }
     this.connections.clear();
+    this.sampleCounts.clear();
+    await this.rawEvents.stop();
+    await this.rollups.stop();
+    this.rawEventPartitions.stop();
+    this.rateLimiter.stop?.();
+    await this.reports.stop();
   }
 
   /**
@@ -406,3 +635,22 @@ export class TikTokService {
   }
 }
 
+/**
+ * Dedup key for a viewer's query
+ */
+function dedupKey(viewerUsername: string, query: string): string {
+  return `${viewerUsername}\u0000${query}`;
+}
+
+/**
+ * Numeric value a rollup accumulates for an event: likes per tap batch,
+ * viewer count for roomUser, otherwise 1 (plain event count).
+ */
+function rollupValue(eventType: string, data: unknown): number {
+  const record = data as { likeCount?: unknown; viewerCount?: unknown };
+  const value =
+    eventType === "like" ? record.likeCount
+    : eventType === "roomUser" ? record.viewerCount
+    : 1;
+  return typeof value === "number" && Number.isFinite(value) ? value : 1;
+}
@@ -0,0 +1,243 @@
+import { releaseLeasesForOwner } from "../db/queries";
+import { INSTANCE_ID } from "../lib/instance";
+import { logger } from "../lib/logger";
+import type { SessionHost } from "./session-host";
+import type { SupervisorMessage, WorkerMessage, WorkerStats } from "./worker-protocol";
+
+type EventEmitter = (userId: string, sessionId: string, event: unknown) => void;
+
+const RESPAWN_DELAY_MS = 1_000;
+
+interface AssignedSession {
+  tiktokUsername: string;
+  userId: string;
+}
+
+interface WorkerHandle {
+  index: number;
+  generation: number;
+  ownerId: string;
+  worker: Worker;
+  ready: Promise<void>;
+  sessions: Map<string, AssignedSession>;
+  pending: Map<number, { resolve: (value: unknown) => void; reject: (err: Error) => void }>;
+  stats: WorkerStats | null;
+  alive: boolean;
+}
+
+export interface WorkerPoolStats {
+  mode: "workers";
+  activeConnections: number;
+  restarts: number;
+  workers: {
+    index: number;
+    ownerId: string;
+    sessions: number;
+    stats: WorkerStats | null;
+  }[];
+}
+
+/**
+ * Supervisor for session workers (src/worker.ts, one Bun Worker each).
+ *
+ * New sessions go to the worker with the fewest sessions; the worker
+ * claims the session's lease itself. Dashboard events come back as
+ * messages and are handed to `emitEvent`. When a worker dies its leases
+ * are released right away (instead of waiting for expiry), a replacement
+ * is spawned, and its sessions are reassigned across the pool.
+ */
+export class WorkerPool implements SessionHost {
+  private workers: WorkerHandle[] = [];
+  private emitEvent: EventEmitter;
+  private nextRequestId = 1;
+  private restarts = 0;
+  private shuttingDown = false;
+  private readonly workerUrl: string;
+
+  /**
+   * @param workerUrl worker script speaking worker-protocol (tests use a stub)
+   */
+  constructor(size: number, emitEvent: EventEmitter, workerUrl = new URL("../worker.ts", import.meta.url).href) {
+    this.emitEvent = emitEvent;
+    this.workerUrl = workerUrl;
+    for (let i = 0; i < size; i++) {
+      this.workers.push(this.spawn(i, 0));
+    }
+  }
+
+  async startListening(sessionId: string, tiktokUsername: string, userId: string): Promise<boolean> {
+    const existing = this.workerFor(sessionId);
+    if (existing) return true;
+
+    const handle = this.leastLoaded();
+    await handle.ready;
+    const started = (await this.request(handle, {
+      type: "start",
+      requestId: this.nextRequestId++,
+      sessionId,
+      tiktokUsername,
+      userId,
+    })) as boolean;
+
+    if (started) handle.sessions.set(sessionId, { tiktokUsername, userId });
+    return started;
+  }
+
+  async stopListening(sessionId: string): Promise<void> {
+    const handle = this.workerFor(sessionId);
+    if (!handle) return;
+    await this.request(handle, { type: "stop", requestId: this.nextRequestId++, sessionId });
+    handle.sessions.delete(sessionId);
+  }
+
+  async disconnectAll(): Promise<void> {
+    this.shuttingDown = true;
+    await Promise.all(
+      this.workers.map(async (handle) => {
+        try {
+          await this.request(handle, { type: "shutdown", requestId: this.nextRequestId++ });
+        } catch (err) {
+          logger.error("Session worker shutdown failed", { worker: handle.index, error: String(err) });
+        }
+        handle.worker.terminate();
+      })
+    );
+  }
+
+  get activeConnections(): number {
+    let total = 0;
+    for (const handle of this.workers) total += handle.sessions.size;
+    return total;
+  }
+
+  get stats(): WorkerPoolStats {
+    return {
+      mode: "workers",
+      activeConnections: this.activeConnections,
+      restarts: this.restarts,
+      workers: this.workers.map((handle) => ({
+        index: handle.index,
+        ownerId: handle.ownerId,
+        sessions: handle.sessions.size,
+        stats: handle.stats,
+      })),
+    };
+  }
+
+  private spawn(index: number, generation: number): WorkerHandle {
+    const worker = new Worker(this.workerUrl);
+    let markReady!: () => void;
+
+    const handle: WorkerHandle = {
+      index,
+      generation,
+      ownerId: `${INSTANCE_ID}/w${index}.${generation}`,
+      worker,
+      ready: new Promise<void>((resolve) => {
+        markReady = resolve;
+      }),
+      sessions: new Map(),
+      pending: new Map(),
+      stats: null,
+      alive: true,
+    };
+
+    worker.onmessage = (e: MessageEvent<WorkerMessage>) => {
+      const msg = e.data;
+      switch (msg.type) {
+        case "ready":
+          markReady();
+          break;
+        case "result": {
+          const pending = handle.pending.get(msg.requestId);
+          handle.pending.delete(msg.requestId);
+          if (msg.ok) pending?.resolve(msg.value);
+          else pending?.reject(new Error(msg.error));
+          break;
+        }
+        case "event":
+          this.emitEvent(msg.userId, msg.sessionId, msg.event);
+          break;
+        case "released":
+          handle.sessions.delete(msg.sessionId);
+          break;
+        case "stats":
+          handle.stats = msg.stats;
+          break;
+      }
+    };
+
+    worker.addEventListener("error", (e) => {
+      logger.error("Session worker error", { worker: index, error: String(e.message ?? e) });
+    });
+    worker.addEventListener("close", () => {
+      this.handleExit(handle).catch((err) => {
+        logger.error("Failed to recover session worker", { worker: index, error: String(err) });
+      });
+    });
+
+    // Same slot for every generation, so a respawn replays its spill files
+    this.post(handle, { type: "init", ownerId: handle.ownerId, spillSlot: `w${index}` });
+    return handle;
+  }
+
+  /**
+   * Worker exited: fail its in-flight requests, free its leases, replace it
+   * and move its sessions to live workers.
+   */
+  private async handleExit(handle: WorkerHandle): Promise<void> {
+    handle.alive = false;
+    for (const pending of handle.pending.values()) {
+      pending.reject(new Error("Session worker exited"));
+    }
+    handle.pending.clear();
+    if (this.shuttingDown) return;
+
+    logger.error("Session worker exited, reassigning its sessions", {
+      worker: handle.index,
+      sessions: handle.sessions.size,
+    });
+
+    await releaseLeasesForOwner(handle.ownerId);
+    const orphaned = [...handle.sessions];
+
+    await Bun.sleep(RESPAWN_DELAY_MS);
+    this.restarts++;
+    this.workers[handle.index] = this.spawn(handle.index, handle.generation + 1);
+
+    for (const [sessionId, session] of orphaned) {
+      try {
+        await this.startListening(sessionId, session.tiktokUsername, session.userId);
+      } catch (err) {
+        // The orphan sweep retries (or ends) it
+        logger.error("Failed to reassign session", { sessionId, error: String(err) });
+      }
+    }
+  }
+
+  private request(handle: WorkerHandle, msg: SupervisorMessage & { requestId: number }): Promise<unknown> {
+    if (!handle.alive) return Promise.reject(new Error("Session worker exited"));
+    return new Promise((resolve, reject) => {
+      handle.pending.set(msg.requestId, { resolve, reject });
+      this.post(handle, msg);
+    });
+  }
+
+  private post(handle: WorkerHandle, msg: SupervisorMessage): void {
+    handle.worker.postMessage(msg);
+  }
+
+  private workerFor(sessionId: string): WorkerHandle | undefined {
+    return this.workers.find((handle) => handle.sessions.has(sessionId));
+  }
+
+  private leastLoaded(): WorkerHandle {
+    let best: WorkerHandle | undefined;
+    for (const handle of this.workers) {
+      if (!handle.alive) continue;
+      if (!best || handle.sessions.size < best.sessions.size) best = handle;
+    }
+    if (!best) throw new Error("No session workers available");
+    return best;
+  }
+}
@@ -0,0 +1,26 @@
+import type { TikTokServiceStats } from "./tiktok";
+import type { SessionLeaseStats } from "./session-leases";
+
+/**
+ * Messages between the front process (WorkerPool) and session workers
+ * (src/worker.ts).
+ */
+
+export type SupervisorMessage =
+  | { type: "init"; ownerId: string; spillSlot: string }
+  | { type: "start"; requestId: number; sessionId: string; tiktokUsername: string; userId: string }
+  | { type: "stop"; requestId: number; sessionId: string }
+  | { type: "shutdown"; requestId: number };
+
+export type WorkerMessage =
+  | { type: "ready" }
+  | { type: "result"; requestId: number; ok: true; value?: unknown }
+  | { type: "result"; requestId: number; ok: false; error: string }
+  | { type: "event"; userId: string; sessionId: string; event: unknown }
+  | { type: "released"; sessionId: string }
+  | { type: "stats"; stats: WorkerStats };
+
+export interface WorkerStats extends TikTokServiceStats {
+  leases: SessionLeaseStats;
+  spotify: Record<string, unknown>;
+}
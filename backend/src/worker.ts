@@ -0,0 +1,84 @@
+/**
+ * Session worker: runs a share of the TikTok connections on its own event
+ * loop. Spawned by WorkerPool when WORKER_COUNT > 0; dashboard events are
+ * posted back to the front process, which owns the WebSockets.
+ */
+import { LocalSessionHost } from "./services/session-host";
+import {
+  getSearchCacheStats,
+  getSingleFlightStats,
+  getTokenManagerStats,
+  getSpotifyHttpStats,
+} from "./services/spotify";
+import type { SupervisorMessage, WorkerMessage } from "./services/worker-protocol";
+import { logger } from "./lib/logger";
+
+declare var self: Worker;
+
+const STATS_INTERVAL_MS = 5_000;
+
+let host: LocalSessionHost | null = null;
+let statsTimer: ReturnType<typeof setInterval> | null = null;
+
+function post(message: WorkerMessage): void {
+  self.postMessage(message);
+}
+
+function postStats(): void {
+  if (!host) return;
+  const { mode: _mode, ...stats } = host.stats;
+  post({
+    type: "stats",
+    stats: {
+      ...stats,
+      spotify: {
+        searchCache: getSearchCacheStats(),
+        singleFlight: getSingleFlightStats(),
+        tokens: getTokenManagerStats(),
+        http: getSpotifyHttpStats(),
+      },
+    },
+  });
+}
+
+async function reply(requestId: number, fn: () => Promise<unknown>): Promise<void> {
+  try {
+    post({ type: "result", requestId, ok: true, value: await fn() });
+  } catch (err) {
+    post({ type: "result", requestId, ok: false, error: String(err) });
+  }
+}
+
+self.onmessage = (e: MessageEvent<SupervisorMessage>) => {
+  const msg = e.data;
+
+  switch (msg.type) {
+    case "init":
+      host = new LocalSessionHost(
+        (userId, sessionId, event) => post({ type: "event", userId, sessionId, event }),
+        msg.ownerId,
+        (sessionId) => post({ type: "released", sessionId }),
+        msg.spillSlot
+      );
+      statsTimer = setInterval(postStats, STATS_INTERVAL_MS);
+      logger.info("Session worker started", { ownerId: msg.ownerId });
+      post({ type: "ready" });
+      break;
+
+    case "start":
+      reply(msg.requestId, () => host!.startListening(msg.sessionId, msg.tiktokUsername, msg.userId));
+      break;
+
+    case "stop":
+      reply(msg.requestId, () => host!.stopListening(msg.sessionId));
+      break;
+
+    case "shutdown":
+      if (statsTimer) clearInterval(statsTimer);
+      reply(msg.requestId, async () => {
+        await host?.disconnectAll();
+        host = null;
+      });
+      break;
+  }
+};
@@ -344,7 +344,7 @@ function StatusDot({ request }: { request: SongRequest }) {
   if (request.searchStatus === "not_found") {
     return <span className="block w-2.5 h-2.5 rounded-full bg-[hsl(var(--status-error))]" />;
   }
-  if (request.searchStatus === "rate_limited") {
+  if (request.searchStatus === "rate_limited" || request.searchStatus === "dropped") {
     return <span className="block w-2.5 h-2.5 rounded-full bg-muted-foreground/40" />;
   }
   if (request.searchStatus === "error") {
@@ -366,6 +366,7 @@ function StatusDot({ request }: { request: SongRequest }) {
 function getStatusLabel(request: SongRequest): string {
   if (request.searchStatus === "not_found") return "Not found on Spotify";
   if (request.searchStatus === "rate_limited") return "Rate limited";
+  if (request.searchStatus === "dropped") return "Dropped (chat overload)";
   if (request.searchStatus === "error") return "Search error";
   if (request.playStatus === "confirmed") return "Played ✓";
   if (request.playStatus === "not_played") return "Not played";
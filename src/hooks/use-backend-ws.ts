@@ -1,6 +1,16 @@
 "use client";
 
 import { useEffect, useRef, useState, useCallback } from "react";
+import {
+  checkFrame,
+  reconnectDelay,
+  resumeQuery,
+  upsertById,
+  applyQueueItem,
+  type StreamFrame,
+  type StreamPosition,
+} from "@/lib/dashboard/stream";
+import { PACK_ENCODING, unpackMessage } from "@/lib/dashboard/codec";
 
 export interface QueueItem {
   id: string;
@@ -18,7 +28,7 @@ export interface SongRequest {
   viewerUsername: string;
   rawComment: string;
   parsedQuery: string;
-  searchStatus: "pending" | "matched" | "not_found" | "error" | "rate_limited";
+  searchStatus: "pending" | "matched" | "not_found" | "error" | "rate_limited" | "dropped";
   spotifyTrackId: string | null;
   trackName: string | null;
   trackArtist: string | null;
@@ -50,6 +60,11 @@ export interface LiveSession {
 
 interface WSMessage {
   type: string;
+  // v1 snapshot/frame envelope
+  sessionId?: string | null;
+  epoch?: string;
+  seq?: number;
+  state?: Omit<WSMessage, "type"> | null;
   session?: LiveSession;
   queue?: QueueItem[];
   requests?: SongRequest[];
@@ -74,6 +89,7 @@ interface UseBackendWSReturn {
   startSession: () => Promise<void>;
   endSession: () => Promise<void>;
   removeFromQueue: (itemId: string) => Promise<void>;
+  moveInQueue: (itemId: string, index: number) => Promise<void>;
 }
 
 // Backend URL configuration:
@@ -102,7 +118,8 @@ export function useBackendWS(): UseBackendWSReturn {
   const [error, setError] = useState<string | null>(null);
   const [spotifyError, setSpotifyError] = useState<string | null>(null);
 
-  // Connect to WebSocket
+  // Connect to WebSocket (protocol v1), reconnecting with backoff and
+  // resuming from the last applied frame
   useEffect(() => {
     // Build WebSocket URL
     let wsUrl: string;
@@ -114,81 +131,130 @@ export function useBackendWS(): UseBackendWSReturn {
       const protocol = window.location.protocol === "https:" ? "wss:" : "ws:";
       wsUrl = `${protocol}//${window.location.host}/ws/dashboard`;
     }
-    const ws = new WebSocket(wsUrl);
-    wsRef.current = ws;
 
-    ws.onopen = () => {
-      setIsConnected(true);
-      setError(null);
-    };
+    let position: StreamPosition | null = null;
+    let attempt = 0;
+    let disposed = false;
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
 
-    ws.onclose = () => {
-      setIsConnected(false);
+    const applyState = (data: Omit<WSMessage, "type">) => {
+      setSession(data.session ?? null);
+      setQueue(data.queue ?? []);
+      setRequests(data.requests ?? []);
+      setGifts(data.gifts ?? []);
     };
 
-    ws.onerror = () => {
-      setError("WebSocket connection failed");
+    const applyEvent = (data: WSMessage) => {
+      switch (data.type) {
+        case "init":
+          applyState(data);
+          break;
+        case "session:connected":
+          // Session started
+          break;
+        case "session:ended":
+          setSession(null);
+          setQueue([]);
+          setRequests([]);
+          setGifts([]);
+          break;
+        case "request:new":
+        case "request:update":
+          // Upsert: replayed frames may repeat what a snapshot already has
+          if (data.request) {
+            setRequests((prev) => upsertById(prev, data.request!, true));
+          }
+          break;
+        case "gift:new":
+          if (data.gift) {
+            setGifts((prev) => upsertById(prev, data.gift!, true));
+          }
+          break;
+        case "queue:add":
+        case "queue:update":
+          // One item changed (added, moved, removed); a renumber sends all
+          if (data.item) {
+            setQueue((prev) => applyQueueItem(prev, data.item!));
+          } else if (data.queue) {
+            setQueue(data.queue);
+          }
+          break;
+        case "session:spotify_error":
+          setSpotifyError(data.message ?? "Spotify error");
+          break;
+        case "server:shutdown":
+          setError("Server is restarting...");
+          break;
+      }
     };
 
-    ws.onmessage = (event) => {
-      try {
-        const data: WSMessage = JSON.parse(event.data);
-
-        switch (data.type) {
-          case "init":
-            if (data.session) setSession(data.session);
-            if (data.queue) setQueue(data.queue);
-            if (data.requests) setRequests(data.requests);
-            if (data.gifts) setGifts(data.gifts);
-            break;
-          case "session:connected":
-            // Session started
-            break;
-          case "session:ended":
-            setSession(null);
-            setQueue([]);
-            setRequests([]);
-            setGifts([]);
-            break;
-          case "request:new":
-            if (data.request) {
-              setRequests((prev) => [data.request!, ...prev]);
-            }
-            break;
-          case "request:update":
-            if (data.request) {
-              setRequests((prev) =>
-                prev.map((r) => (r.id === data.request!.id ? data.request! : r))
-              );
-            }
-            break;
-          case "gift:new":
-            if (data.gift) {
-              setGifts((prev) => [data.gift!, ...prev]);
+    const connect = () => {
+      // Binary frames: smaller than JSON over long sessions on mobile data
+      const ws = new WebSocket(`${wsUrl}?${resumeQuery(position)}&enc=${PACK_ENCODING}`);
+      ws.binaryType = "arraybuffer";
+      wsRef.current = ws;
+
+      ws.onopen = () => {
+        attempt = 0;
+        setIsConnected(true);
+        setError(null);
+      };
+
+      ws.onclose = () => {
+        setIsConnected(false);
+        if (disposed) return;
+        reconnectTimer = setTimeout(connect, reconnectDelay(attempt++));
+      };
+
+      ws.onerror = () => {
+        setError("WebSocket connection failed");
+      };
+
+      ws.onmessage = (event) => {
+        try {
+          const data = (
+            event.data instanceof ArrayBuffer
+              ? unpackMessage(new Uint8Array(event.data))
+              : JSON.parse(event.data)
+          ) as WSMessage;
+
+          if (data.type === "snapshot") {
+            if (data.sessionId && data.epoch !== undefined && data.seq !== undefined) {
+              position = { sessionId: data.sessionId, epoch: data.epoch, seq: data.seq };
+            } else {
+              position = null;
             }
-            break;
-          case "queue:add":
-            if (data.item) {
-              setQueue((prev) => [...prev, data.item!]);
+            applyState(data.state ?? {});
+            return;
+          }
+
+          if (data.type === "frame") {
+            const frame = data as unknown as StreamFrame;
+            const check = checkFrame(position, frame);
+            if (check === "duplicate") return;
+            if (check === "gap") {
+              // Missed frames: reconnect, resuming (or snapshotting) from here
+              ws.close();
+              return;
             }
-            break;
-          case "queue:update":
-            if (data.queue) setQueue(data.queue);
-            break;
-          case "session:spotify_error":
-            setSpotifyError(data.message ?? "Spotify error");
-            break;
-          case "server:shutdown":
-            setError("Server is restarting...");
-            break;
+            for (const e of frame.events) applyEvent(e as WSMessage);
+            position = { sessionId: frame.sessionId, epoch: frame.epoch, seq: frame.seq };
+            return;
+          }
+
+          applyEvent(data);
+        } catch (e) {
+          console.error("Failed to parse WS message:", e);
         }
-      } catch (e) {
-        console.error("Failed to parse WS message:", e);
-      }
+      };
     };
 
+    connect();
+
     return () => {
-      ws.close();
+      disposed = true;
+      if (reconnectTimer) clearTimeout(reconnectTimer);
+      wsRef.current?.close();
     };
   }, []);
 
@@ -253,6 +319,20 @@ export function useBackendWS(): UseBackendWSReturn {
     }
   }, []);
 
+  // Move a queue item to a new index (the update arrives as queue:update)
+  const moveInQueue = useCallback(async (itemId: string, index: number) => {
+    try {
+      await fetch(`${BACKEND_URL}/queue/${itemId}`, {
+        method: "PATCH",
+        credentials: "include",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ index }),
+      });
+    } catch (e) {
+      console.error("Failed to reorder queue:", e);
+    }
+  }, []);
+
   return {
     session,
     queue,
@@ -265,6 +345,7 @@ export function useBackendWS(): UseBackendWSReturn {
     startSession,
     endSession,
     removeFromQueue,
+    moveInQueue,
   };
 }
 
@@ -0,0 +1,52 @@
+import { describe, it, expect } from "vitest";
+import { unpackMessage } from "../codec";
+
+// Encoded by the backend's packMessage (backend/src/lib/dashboard-codec.ts)
+function bytes(hex: string): Uint8Array {
+  return Uint8Array.from(hex.match(/../g)!.map((byte) => parseInt(byte, 16)));
+}
+
+describe("unpackMessage", () => {
+  it("should decode indexed keys and timestamps", () => {
+    const message = unpackMessage(
+      bytes("8200a8676966743a6e65770c8411a46a616e6522a4526f7365230125d7ff1d5353006ad36340")
+    );
+    expect(message).toEqual({
+      type: "gift:new",
+      gift: {
+        viewerUsername: "jane",
+        giftName: "Rose",
+        diamondCount: 1,
+        receivedAt: "2026-10-17T12:00:00.123Z",
+      },
+    });
+  });
+
+  it("should resolve interned strings, wide integers and unknown keys", () => {
+    const message = unpackMessage(
+      bytes(
+        "8300a56672616d6504cd012c05928200ab726571756573743a6e65770b8111a46a616e65" +
+          "8200ae726571756573743a7570646174650b8311d401021bce000390f0a6637573746f6dfb"
+      )
+    );
+    expect(message).toEqual({
+      type: "frame",
+      seq: 300,
+      events: [
+        { type: "request:new", request: { viewerUsername: "jane" } },
+        { type: "request:update", request: { viewerUsername: "jane", durationMs: 233712, custom: -5 } },
+      ],
+    });
+  });
+
+  it("should decode plain MessagePack scalars", () => {
+    expect(unpackMessage(bytes("c0"))).toBeNull();
+    expect(unpackMessage(bytes("c3"))).toBe(true);
+    expect(unpackMessage(bytes("d1fc18"))).toBe(-1000);
+    expect(unpackMessage(bytes("cb3ff8000000000000"))).toBe(1.5);
+  });
+
+  it("should reject unknown type bytes", () => {
+    expect(() => unpackMessage(bytes("c1"))).toThrow();
+  });
+});
@@ -0,0 +1,91 @@
+import { describe, it, expect } from "vitest";
+import { checkFrame, resumeQuery, reconnectDelay, upsertById, applyQueueItem, type StreamFrame } from "../stream";
+
+function frame(seq: number, sessionId = "s1", epoch = "e1"): StreamFrame {
+  return { type: "frame", sessionId, epoch, seq, events: [] };
+}
+
+describe("checkFrame", () => {
+  const pos = { sessionId: "s1", epoch: "e1", seq: 4 };
+
+  it("should apply the next frame in sequence", () => {
+    expect(checkFrame(pos, frame(5))).toBe("apply");
+  });
+
+  it("should ignore frames already applied", () => {
+    expect(checkFrame(pos, frame(4))).toBe("duplicate");
+    expect(checkFrame(pos, frame(2))).toBe("duplicate");
+  });
+
+  it("should report a gap when a frame is skipped", () => {
+    expect(checkFrame(pos, frame(6))).toBe("gap");
+  });
+
+  it("should report a gap when the epoch changes", () => {
+    expect(checkFrame(pos, frame(5, "s1", "e2"))).toBe("gap");
+  });
+
+  it("should apply the first frame of a new session", () => {
+    expect(checkFrame(pos, frame(1, "s2"))).toBe("apply");
+    expect(checkFrame(null, frame(1))).toBe("apply");
+  });
+
+  it("should report a gap when joining a session mid-stream", () => {
+    expect(checkFrame(null, frame(3))).toBe("gap");
+  });
+});
+
+describe("resumeQuery", () => {
+  it("should request v1 without a position", () => {
+    expect(resumeQuery(null)).toBe("v=1");
+  });
+
+  it("should include the position to resume from", () => {
+    expect(resumeQuery({ sessionId: "s1", epoch: "e1", seq: 7 })).toBe("v=1&session=s1&epoch=e1&seq=7");
+  });
+});
+
+describe("reconnectDelay", () => {
+  it("should grow exponentially up to the cap", () => {
+    expect(reconnectDelay(0, () => 1)).toBe(500);
+    expect(reconnectDelay(3, () => 1)).toBe(4000);
+    expect(reconnectDelay(20, () => 1)).toBe(15_000);
+  });
+
+  it("should apply jitter", () => {
+    expect(reconnectDelay(3, () => 0.5)).toBe(2000);
+    expect(reconnectDelay(3, () => 0)).toBe(0);
+  });
+});
+
+describe("upsertById", () => {
+  it("should insert new items at the requested end", () => {
+    expect(upsertById([{ id: "a" }], { id: "b" }, true)).toEqual([{ id: "b" }, { id: "a" }]);
+    expect(upsertById([{ id: "a" }], { id: "b" }, false)).toEqual([{ id: "a" }, { id: "b" }]);
+  });
+
+  it("should replace an existing item in place", () => {
+    const list = [{ id: "a", n: 1 }, { id: "b", n: 1 }];
+    expect(upsertById(list, { id: "a", n: 2 }, true)).toEqual([{ id: "a", n: 2 }, { id: "b", n: 1 }]);
+  });
+});
+
+describe("applyQueueItem", () => {
+  const queue = [
+    { id: "a", status: "queued", position: 1024 },
+    { id: "b", status: "queued", position: 2048 },
+    { id: "c", status: "queued", position: 3072 },
+  ];
+
+  it("should move an item by its new position", () => {
+    const moved = applyQueueItem(queue, { id: "c", status: "queued", position: 1536 });
+    expect(moved.map((item) => item.id)).toEqual(["a", "c", "b"]);
+  });
+
+  it("should append new items and drop ones no longer queued", () => {
+    expect(applyQueueItem(queue, { id: "d", status: "queued", position: 4096 }).map((item) => item.id))
+      .toEqual(["a", "b", "c", "d"]);
+    expect(applyQueueItem(queue, { id: "b", status: "skipped", position: 2048 }).map((item) => item.id))
+      .toEqual(["a", "c"]);
+  });
+});
@@ -0,0 +1,126 @@
+/**
+ * Decoder for the dashboard's compact binary encoding (`enc=pack1`).
+ *
+ * MessagePack plus the backend's additions (backend/src/lib/dashboard-codec.ts):
+ * integer map keys index PACK_KEYS, ext type 1 references a string
+ * interned earlier in the same message, and timestamps (ext -1) decode to
+ * ISO strings so messages have the same shape as their JSON form.
+ */
+
+export const PACK_ENCODING = "pack1";
+
+/** Must match the backend's list exactly */
+export const PACK_KEYS = [
+  "type", "v", "sessionId", "epoch", "seq", "events", "state", "session",
+  "queue", "requests", "gifts", "request", "gift", "item", "id", "userId",
+  "liveSessionId", "viewerUsername", "rawMessage", "parsedQuery", "searchStatus",
+  "spotifyTrackId", "trackName", "trackArtist", "trackTitle", "albumName",
+  "albumImageUrl", "durationMs", "spotifyUri", "playStatus", "requestedAt",
+  "matchedAt", "confirmedAt", "giftId", "giftName", "diamondCount", "repeatCount",
+  "receivedAt", "tiktokUsername", "status", "startedAt", "endedAt", "position",
+  "roomId", "reason", "message",
+] as const;
+
+const MIN_INTERN_LENGTH = 4;
+const MAX_INTERNED = 0xffff;
+const EXT_STRING_REF = 1;
+const EXT_TIMESTAMP = -1;
+
+const textDecoder = new TextDecoder();
+
+class Reader {
+  bytes: Uint8Array;
+  view: DataView;
+  offset = 0;
+  interned: string[] = [];
+
+  constructor(bytes: Uint8Array) {
+    this.bytes = bytes;
+    this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  }
+
+  value(): unknown {
+    const byte = this.view.getUint8(this.offset++);
+    if (byte < 0x80) return byte;
+    if (byte >= 0xe0) return byte - 0x100;
+    if (byte >= 0xa0 && byte < 0xc0) return this.string(byte & 0x1f);
+    if (byte >= 0x90 && byte < 0xa0) return this.array(byte & 0x0f);
+    if (byte >= 0x80 && byte < 0x90) return this.map(byte & 0x0f);
+
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xcc: return this.view.getUint8(this.advance(1));
+      case 0xcd: return this.view.getUint16(this.advance(2));
+      case 0xce: return this.view.getUint32(this.advance(4));
+      case 0xd0: return this.view.getInt8(this.advance(1));
+      case 0xd1: return this.view.getInt16(this.advance(2));
+      case 0xd2: return this.view.getInt32(this.advance(4));
+      case 0xca: return this.view.getFloat32(this.advance(4));
+      case 0xcb: return this.view.getFloat64(this.advance(8));
+      case 0xd9: return this.string(this.view.getUint8(this.advance(1)));
+      case 0xda: return this.string(this.view.getUint16(this.advance(2)));
+      case 0xdb: return this.string(this.view.getUint32(this.advance(4)));
+      case 0xdc: return this.array(this.view.getUint16(this.advance(2)));
+      case 0xdd: return this.array(this.view.getUint32(this.advance(4)));
+      case 0xde: return this.map(this.view.getUint16(this.advance(2)));
+      case 0xdf: return this.map(this.view.getUint32(this.advance(4)));
+      case 0xd4: return this.ext(1);
+      case 0xd5: return this.ext(2);
+      case 0xd7: return this.ext(8);
+    }
+    throw new Error(`Unsupported pack byte 0x${byte.toString(16)} at ${this.offset - 1}`);
+  }
+
+  advance(n: number): number {
+    const at = this.offset;
+    this.offset += n;
+    return at;
+  }
+
+  string(size: number): string {
+    const start = this.advance(size);
+    const value = textDecoder.decode(this.bytes.subarray(start, start + size));
+    if (value.length >= MIN_INTERN_LENGTH && this.interned.length < MAX_INTERNED) this.interned.push(value);
+    return value;
+  }
+
+  array(n: number): unknown[] {
+    const items = new Array<unknown>(n);
+    for (let i = 0; i < n; i++) items[i] = this.value();
+    return items;
+  }
+
+  map(n: number): Record<string, unknown> {
+    const object: Record<string, unknown> = {};
+    for (let i = 0; i < n; i++) {
+      const key = this.value();
+      object[typeof key === "number" ? (PACK_KEYS[key] ?? String(key)) : String(key)] = this.value();
+    }
+    return object;
+  }
+
+  ext(size: number): unknown {
+    const type = this.view.getInt8(this.advance(1));
+    if (type === EXT_STRING_REF) {
+      const ref = size === 1 ? this.view.getUint8(this.advance(1)) : this.view.getUint16(this.advance(2));
+      return this.interned[ref];
+    }
+    if (type === EXT_TIMESTAMP && size === 8) {
+      const hi = this.view.getUint32(this.advance(4));
+      const lo = this.view.getUint32(this.advance(4));
+      const sec = (hi & 0x3) * 2 ** 32 + lo;
+      const nsec = hi >>> 2;
+      return new Date(sec * 1000 + Math.round(nsec / 1e6)).toISOString();
+    }
+    throw new Error(`Unsupported pack extension ${type}`);
+  }
+}
+
+/**
+ * Decode a binary dashboard message.
+ */
+export function unpackMessage(bytes: Uint8Array): unknown {
+  return new Reader(bytes).value();
+}
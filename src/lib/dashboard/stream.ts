@@ -0,0 +1,88 @@
+/**
+ * Client side of the /ws/dashboard v1 protocol: sequenced frames, resume on
+ * reconnect, snapshot fallback.
+ */
+
+export const PROTOCOL_VERSION = 1;
+
+const RECONNECT_BASE_MS = 500;
+const RECONNECT_MAX_MS = 15_000;
+
+/** Last applied position in a session's stream */
+export interface StreamPosition {
+  sessionId: string;
+  epoch: string;
+  seq: number;
+}
+
+export interface StreamFrame {
+  type: "frame";
+  sessionId: string;
+  epoch: string;
+  seq: number;
+  events: { type: string }[];
+}
+
+export type FrameCheck = "apply" | "duplicate" | "gap";
+
+/**
+ * Decide what to do with a frame given the last applied position:
+ * apply the next one in sequence, ignore one already applied, and treat
+ * anything else (skipped frame, server restart) as a gap to resync from.
+ */
+export function checkFrame(pos: StreamPosition | null, frame: StreamFrame): FrameCheck {
+  if (!pos || pos.sessionId !== frame.sessionId) {
+    // First frame of a session that started after our snapshot
+    return frame.seq === 1 ? "apply" : "gap";
+  }
+  if (pos.epoch !== frame.epoch) return "gap";
+  if (frame.seq <= pos.seq) return "duplicate";
+  return frame.seq === pos.seq + 1 ? "apply" : "gap";
+}
+
+/**
+ * Query string for connecting (or reconnecting) at a position.
+ */
+export function resumeQuery(pos: StreamPosition | null): string {
+  const params = new URLSearchParams({ v: String(PROTOCOL_VERSION) });
+  if (pos) {
+    params.set("session", pos.sessionId);
+    params.set("epoch", pos.epoch);
+    params.set("seq", String(pos.seq));
+  }
+  return params.toString();
+}
+
+/**
+ * Exponential backoff with full jitter, so dashboards don't reconnect in
+ * lockstep after a restart.
+ */
+export function reconnectDelay(attempt: number, random: () => number = Math.random): number {
+  const ceiling = Math.min(RECONNECT_MAX_MS, RECONNECT_BASE_MS * 2 ** attempt);
+  return Math.round(ceiling * random());
+}
+
+/**
+ * Insert or replace by id. Replayed frames may repeat events the snapshot
+ * already has, so inserts must be idempotent.
+ */
+export function upsertById<T extends { id: string }>(list: T[], item: T, prepend: boolean): T[] {
+  const index = list.findIndex((existing) => existing.id === item.id);
+  if (index === -1) return prepend ? [item, ...list] : [...list, item];
+  const next = list.slice();
+  next[index] = item;
+  return next;
+}
+
+/**
+ * Apply one queue item change: queued items stay sorted by position
+ * (moves only change the moved item's position), anything else leaves.
+ */
+export function applyQueueItem<T extends { id: string; status: string; position: number }>(queue: T[], item: T): T[] {
+  const next = queue.filter((existing) => existing.id !== item.id);
+  if (item.status !== "queued") return next;
+  let index = next.findIndex((existing) => existing.position > item.position);
+  if (index === -1) index = next.length;
+  next.splice(index, 0, item);
+  return next;
+}
@@ -1,4 +1,4 @@
-import { pgTable, text, timestamp, primaryKey, integer } from "drizzle-orm/pg-core";
+import { pgTable, text, timestamp, primaryKey, integer, doublePrecision } from "drizzle-orm/pg-core";
 import type { AdapterAccountType } from "next-auth/adapters";
 
 // ============ NextAuth Required Tables ============
@@ -53,6 +53,6 @@ export const queueItems = pgTable("queue_item", {
   trackTitle: text("track_title").notNull(),
   trackArtist: text("track_artist").notNull(),
   status: text("status", { enum: ["queued", "playing", "played", "skipped", "revoked"] }).default("queued").notNull(),
-  position: integer("position").notNull(),
+  position: doublePrecision("position").notNull(),
   requestedAt: timestamp("requested_at", { mode: "date" }).notNull(),
 });